@@ -1,9 +1,9 @@
 import re
-import string
 import sys
 import threading
 import time
 import traceback
+from collections import OrderedDict
 
 import b311
 import b311.events
@@ -53,6 +53,117 @@ class ClientVar(object):
         return len(self.value)
 
 
+class ClientVarSlot(ClientVar):
+    """
+    A variable declared in a plugin ClientVarSchema, as returned by Client.var and Client.setvar.
+    """
+
+    def __init__(self, record, key):
+        """
+        Object constructor.
+        :param record: The client record holding the variable.
+        :param key: The name of the variable.
+        """
+        self._record = record
+        self._key = key
+
+    def _get_value(self):
+        return getattr(self._record, self._key)
+
+    def _set_value(self, value):
+        setattr(self._record, self._key, value)
+
+    value = property(_get_value, _set_value)
+
+
+class ClientVarRecord(object):
+    """
+    Base class of the records holding the variables declared in a ClientVarSchema. A variable which has not been
+    set reads as its default value: the slot is only filled when the variable is set, so that Client.isvar can tell.
+    """
+    __slots__ = ()
+    _schema = None
+
+    def __getattr__(self, key):
+        # only called for the slots which are not filled
+        try:
+            value = self._schema.defaults[key]
+        except KeyError:
+            raise AttributeError(key)
+        if isinstance(value, (list, dict, set)):
+            # a mutable default is stored so that changes made to it are kept
+            value = value.copy()
+            setattr(self, key, value)
+        return value
+
+
+class ClientVarSchema(object):
+    """
+    The variables a plugin stores in client objects, declared once with their default values.
+
+    Every client gets a record holding the variables in __slots__: plugins read and write them as plain attributes
+    (i.e: self._clientVars.get(client).kills += 1), which is faster and takes less memory than the ClientVar objects
+    stored by Client.setvar. Client.var, Client.setvar, Client.isvar and Client.delvar keep working on the declared
+    variables, using the record.
+    """
+
+    def __init__(self, plugin, defaults):
+        """
+        Object constructor.
+        :param plugin: The plugin storing the variables.
+        :param defaults: A dict mapping variable names to their default values (lists, dicts and sets are copied for
+                         every client).
+        """
+        self.key = id(plugin)
+        self.defaults = dict(defaults)
+        self.record = type('%sClientVars' % plugin.__class__.__name__, (ClientVarRecord,),
+                           {'__slots__': tuple(self.defaults), '_schema': self})
+        self._slots = dict((x, getattr(self.record, x)) for x in self.defaults)
+
+    def get(self, client):
+        """
+        Return the record of the given client, creating it if needed.
+        """
+        try:
+            return client._pluginRecords[self.key]
+        except KeyError:
+            # the record is never replaced: the ClientVarSlot objects returned by Client.var keep pointing to it
+            record = client._pluginRecords[self.key] = self.record()
+            return record
+
+    def reset(self, client):
+        """
+        Reset all the variables of the given client to their default value.
+        :return: The client record
+        """
+        record = self.get(client)
+        for key in self.defaults:
+            self.unset(record, key)
+        return record
+
+    def isset(self, client, key):
+        """
+        Whether a variable has been set for the given client.
+        """
+        record = client._pluginRecords.get(self.key)
+        if record is None:
+            return False
+        try:
+            self._slots[key].__get__(record)
+        except AttributeError:
+            return False
+        return True
+
+    def unset(self, record, key):
+        """
+        Bring a variable of a record back to its default value.
+        """
+        try:
+            self._slots[key].__delete__(record)
+        except AttributeError:
+            pass
+
+
 class Client(object):
     ## PVT
     _autoLogin = 1
@@ -73,7 +184,9 @@ class Client(object):
     _name = ''
     _password = ''
     _pluginData = None
+    _pluginRecords = None
     _pbid = ''
+    _state = None
     _team = b311.TEAM_UNKNOWN
     _tempLevel = None
     _timeAdd = 0
@@ -87,7 +200,6 @@ class Client(object):
     connected = True
     console = None
     hide = False
-    state = None
 
     def __init__(self, **kwargs):
         """
@@ -95,6 +207,7 @@ class Client(object):
         :param kwargs: A dict containing client object attributes.
         """
         self._pluginData = {}
+        self._pluginRecords = {}
         self.state = b311.STATE_UNKNOWN
         self._data = {}
 
@@ -102,7 +215,7 @@ class Client(object):
         if 'console' in kwargs:
             self.console = kwargs['console']
 
-        for k, v in kwargs.iteritems():
+        for k, v in kwargs.items():
             setattr(self, k, v)
 
     ####################################################################################################################
@@ -118,11 +231,26 @@ class Client(object):
         :param key: The key associated to the value.
         :return True if there is a value, False otherwise
         """
-        try:
-            d = self._pluginData[id(plugin)][key]
-            return True
-        except Exception:
-            return False
+        schema = getattr(plugin, '_clientVars', None)
+        if schema is not None and key in schema.defaults:
+            return schema.isset(self, key)
+        data = self._pluginData.get(id(plugin))
+        return data is not None and key in data
+
+    def _newvar(self, plugin, key, value):
+        """
+        Create a variable indexed under the plugin/key combination: variables declared in the plugin ClientVarSchema
+        are kept in the client record.
+        """
+        data = self._pluginData.get(id(plugin))
+        if data is None:
+            data = self._pluginData[id(plugin)] = {}
+        schema = getattr(plugin, '_clientVars', None)
+        if schema is not None and key in schema.defaults:
+            var = data[key] = ClientVarSlot(schema.get(self), key)
+        else:
+            var = data[key] = ClientVar(value)
+        return var
 
     def setvar(self, plugin, key, value=None):
         """
@@ -133,29 +261,25 @@ class Client(object):
         :return The stored variable.
         """
         try:
-            self._pluginData[id(plugin)]
-        except Exception:
-            self._pluginData[id(plugin)] = {}
-
-        try:
-            self._pluginData[id(plugin)][key].value = value
-        except Exception:
-            self._pluginData[id(plugin)][key] = ClientVar(value)
-
-        return self._pluginData[id(plugin)][key]
+            var = self._pluginData[id(plugin)][key]
+        except KeyError:
+            var = self._newvar(plugin, key, value)
+        var.value = value
+        return var
 
     def var(self, plugin, key, default=None):
         """
         Return a variable previously stored by a plugin.
         :param plugin: The plugin that stored the variable.
         :param key: The key of the variable.
-        :param default: A default value to be returned if the variable is not stored.
+        :param default: A default value to be returned if the variable is not stored (ignored for the variables
+                        declared in the plugin ClientVarSchema, which default to the value given in the schema).
         :return The variable saved under the plugin/key combination or default if it doesn't exists.
         """
         try:
             return self._pluginData[id(plugin)][key]
-        except Exception:
-            return self.setvar(plugin, key, default)
+        except KeyError:
+            return self._newvar(plugin, key, default)
 
     def varlist(self, plugin, key, default=None):
         if not default:
@@ -169,14 +293,20 @@ class Client(object):
 
     def delvar(self, plugin, key):
         """
-        Delelte a variable stored by a plugin.
+        Delelte a variable stored by a plugin (variables declared in the plugin ClientVarSchema are brought back to
+        their default value).
         :param plugin: The plugin that stored the variable.
         :param key: The key of the variable.
         """
-        try:
-            del self._pluginData[id(plugin)][key]
-        except Exception:
-            pass
+        schema = getattr(plugin, '_clientVars', None)
+        if schema is not None and key in schema.defaults:
+            record = self._pluginRecords.get(schema.key)
+            if record is not None:
+                schema.unset(record, key)
+        else:
+            data = self._pluginData.get(id(plugin))
+            if data is not None:
+                data.pop(key, None)
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -199,7 +329,7 @@ class Client(object):
     # -----------------------
 
     def _set_data(self, data):
-        for k, v in data.iteritems():
+        for k, v in data.items():
             self._data[k] = v
 
     def _get_data(self):
@@ -212,7 +342,7 @@ class Client(object):
     def _get_firstWarn(self):
         if not self.id:
             return None
-        return self.console.storage.getClientFirstPenalty(self, 'Warning')
+        return self.console.clients.getPenaltySummary(self).firstWarning
 
     firstWarning = property(_get_firstWarn)
 
@@ -220,16 +350,7 @@ class Client(object):
 
     def getGroups(self):
         if not self._groups:
-            self._groups = []
-            groups = self.console.storage.getGroups()
-            guest_group = None
-            for g in groups:
-                if g.id == 0:
-                    guest_group = g
-                if g.id & self._groupBits:
-                    self._groups.append(g)
-            if not len(self._groups) and guest_group:
-                self._groups.append(guest_group)
+            self._groups = self.console.clients.getGroups(self._groupBits)
         return self._groups
 
     groups = property(getGroups)
@@ -256,7 +377,7 @@ class Client(object):
     def _get_lastBan(self):
         if not self.id:
             return None
-        return self.console.storage.getClientLastPenalty(self, ('Ban', 'TempBan'))
+        return self.console.clients.getPenaltySummary(self).lastBan
 
     lastBan = property(_get_lastBan)
 
@@ -265,7 +386,7 @@ class Client(object):
     def _get_lastWarn(self):
         if not self.id:
             return None
-        return self.console.storage.getClientLastPenalty(self, 'Warning')
+        return self.console.clients.getPenaltySummary(self).lastWarning
 
     lastWarning = property(_get_lastWarn)
 
@@ -304,7 +425,7 @@ class Client(object):
     def _get_numBans(self):
         if not self.id:
             return 0
-        return self.console.storage.numPenalties(self, ('Ban', 'TempBan'))
+        return self.console.clients.getPenaltySummary(self).numBans
 
     numBans = property(_get_numBans)
 
@@ -313,7 +434,7 @@ class Client(object):
     def _get_numWarns(self):
         if not self.id:
             return 0
-        return self.console.storage.numPenalties(self, 'Warning')
+        return self.console.clients.getPenaltySummary(self).numWarnings
 
     numWarnings = property(_get_numWarns)
 
@@ -323,6 +444,7 @@ class Client(object):
         if self._team != team:
             previous_team = self.team
             self._team = team
+            self._reindex()
             if self.console:
                 self.console.queueEvent(self.console.getEvent('EVT_CLIENT_TEAM_CHANGE', self.team, self))
                 self.console.queueEvent(self.console.getEvent('EVT_CLIENT_TEAM_CHANGE2', {'previous': previous_team,
@@ -335,6 +457,18 @@ class Client(object):
 
     # -----------------------
 
+    def _set_state(self, state):
+        if self._state != state:
+            self._state = state
+            self._reindex()
+
+    def _get_state(self):
+        return self._state
+
+    state = property(_get_state, _set_state)
+
+    # -----------------------
+
     def getWarnings(self):
         return self.console.storage.getClientPenalties(self, type='Warning')
 
@@ -413,9 +547,12 @@ class Client(object):
                 self.authed = False
             elif not self._guid:
                 self._guid = guid
+                self._reindex()
         else:
             self.authed = False
-            self._guid = ''
+            if self._guid:
+                self._guid = ''
+                self._reindex()
 
     def _get_guid(self):
         return self._guid
@@ -470,7 +607,12 @@ class Client(object):
             return None
         elif not self._maskGroup:
             try:
-                group = self.console.storage.getGroup(Group(level=self.maskLevel))
+                # look in the groups table kept in memory by the storage before querying it
+                for group in self.console.storage.getGroups():
+                    if group.level == self.maskLevel:
+                        break
+                else:
+                    group = self.console.storage.getGroup(Group(level=self.maskLevel))
             except Exception as err:
                 self.console.error("Could not find group with level %r" % self.maskLevel, exc_info=err)
                 self.maskLevel = 0
@@ -531,6 +673,7 @@ class Client(object):
         self.makeAlias(self._name)
         self._name = newName
         self._exactName = name + '^7'
+        self._reindex()
 
         if self.console and self.authed:
             self.console.queueEvent(self.console.getEvent('EVT_CLIENT_NAME_CHANGE', self.name, self))
@@ -597,6 +740,14 @@ class Client(object):
         self._maxLevel = None
         self._groups = None
 
+    def _reindex(self):
+        """
+        Update the online clients index after a change of name, guid, team or state.
+        """
+        clients = getattr(self.console, 'clients', None)
+        if clients is not None:
+            clients.reindex(self)
+
     def disconnect(self):
         """
         Disconnect the client.
@@ -686,7 +837,7 @@ class Client(object):
         :param silent: Whether or not to announce this tempban
         :param data: Extra data to add to the penalty
         """
-        duration = functions.time2minutes(duration)
+        duration = b311.functions.time2minutes(duration)
         self.console.tempban(self, reason, duration, admin, silent)
 
         if self.id:
@@ -723,7 +874,7 @@ class Client(object):
         :param data: Extra data to add to the penalty
         """
         if self.id:
-            duration = functions.time2minutes(duration)
+            duration = b311.functions.time2minutes(duration)
             warn = ClientWarning()
 
             if admin:
@@ -781,51 +932,27 @@ class Client(object):
 
     def makeAlias(self, name):
         """
-        Create a new alias for this client.
+        Create a new alias for this client (or count one more use of an existing one).
+        The alias is written by the storage write-behind queue.
         :param name: The alias string
         """
         if not self.id or not name:
             return
 
-        try:
-            alias = self.console.storage.getClientAlias(Alias(clientId=self.id, alias=name))
-        except KeyError:
-            alias = None
-
-        if alias:
-            if alias.numUsed > 0:
-                alias.numUsed += 1
-            else:
-                alias.numUsed = 1
-        else:
-            alias = Alias(clientId=self.id, alias=name)
-
-        alias.save(self.console)
-        self.console.bot('Created new alias for client @%s: %s', str(self.id), alias.alias)
+        self.console.storage.queueClientAlias(Alias(clientId=self.id, alias=name, timeEdit=self.console.time()))
+        self.console.bot('Created new alias for client @%s: %s', str(self.id), name)
 
     def makeIpAlias(self, ip):
         """
-        Create a new ip alias for this client.
+        Create a new ip alias for this client (or count one more use of an existing one).
+        The ip alias is written by the storage write-behind queue.
         :param ip: The ip string
         """
         if not self.id or not ip:
             return
 
-        try:
-            alias = self.console.storage.getClientIpAddress(IpAlias(clientId=self.id, ip=ip))
-        except KeyError:
-            alias = None
-
-        if alias:
-            if alias.numUsed > 0:
-                alias.numUsed += 1
-            else:
-                alias.numUsed = 1
-        else:
-            alias = IpAlias(clientId=self.id, ip=ip)
-
-        alias.save(self.console)
-        self.console.bot('created new IP alias for client @%s: %s', str(self.id), alias.ip)
+        self.console.storage.queueClientIpAddress(IpAlias(clientId=self.id, ip=ip, timeEdit=self.console.time()))
+        self.console.bot('created new IP alias for client @%s: %s', str(self.id), ip)
 
     def save(self, console=None):
         """
@@ -842,7 +969,8 @@ class Client(object):
                 self.pbid = ''
             if console:
                 self.console.queueEvent(self.console.getEvent('EVT_CLIENT_UPDATE', data=self, client=self))
-            return self.console.storage.setClient(self)
+            # clients already stored are updated by the storage write-behind queue
+            return self.console.storage.queueClient(self)
 
     def auth(self):
         """
@@ -864,35 +992,51 @@ class Client(object):
                 self.authorizing = False
                 return False
 
-            if inStorage:
-                self.console.bot('Client found in storage %s: welcome back %s', str(self.id), self.name)
-                self.lastVisit = self.timeEdit
-            else:
-                self.console.bot('Client not found in the storage %s: create new', str(self.guid))
-
-            self.connections = int(self.connections) + 1
-            self.name = name
-            self.ip = ip
-            self.save()
-            self.authed = True
-
-            self.console.debug('Client authorized: [%s] %s - %s', self.cid, self.name, self.guid)
-
-            # check for bans
-            if self.numBans > 0:
-                ban = self.lastBan
-                if ban:
-                    self.reBan(ban)
-                    self.authorizing = False
-                    return False
-
-            self.refreshLevel()
-            self.console.queueEvent(self.console.getEvent('EVT_CLIENT_AUTH', data=self, client=self))
-            self.authorizing = False
-            return self.authed
+            return self._auth(inStorage, name, ip)
         else:
             return False
 
+    def _auth(self, inStorage, name, ip, bans=None):
+        """
+        Complete the authorization of this client once it has been looked up in the storage.
+        :param inStorage: Whether the client has been found in the storage
+        :param name: The client name before the storage lookup
+        :param ip: The client ip before the storage lookup
+        :param bans: Dict of the last active ban of many clients (by client id): if None the storage is queried
+        """
+        if inStorage:
+            self.console.bot('Client found in storage %s: welcome back %s', str(self.id), self.name)
+            self.lastVisit = self.timeEdit
+        else:
+            self.console.bot('Client not found in the storage %s: create new', str(self.guid))
+
+        self.connections = int(self.connections) + 1
+        self.name = name
+        self.ip = ip
+        self.save()
+        self.authed = True
+
+        self.console.debug('Client authorized: [%s] %s - %s', self.cid, self.name, self.guid)
+
+        if not inStorage and self.id:
+            # a client just created has no penalty yet
+            self.console.clients.setPenaltySummary(self.id, [])
+
+        # check for bans
+        if bans is None:
+            ban = self.lastBan if self.numBans > 0 else None
+        else:
+            ban = bans.get(self.id)
+        if ban:
+            self.reBan(ban)
+            self.authorizing = False
+            return False
+
+        self.refreshLevel()
+        self.console.queueEvent(self.console.getEvent('EVT_CLIENT_AUTH', data=self, client=self))
+        self.authorizing = False
+        return self.authed
+
     def __str__(self):
         return "Client<@%s:%s|%s:\"%s\":%s>" % (self.id, self.guid, self.pbid, self.name, self.cid)
 
@@ -907,7 +1051,7 @@ class Struct(object):
         """
         Object constructor.
         """
-        for k, v in kwargs.iteritems():
+        for k, v in kwargs.items():
             setattr(self, k, v)
 
     def _set_id(self, v):
@@ -956,7 +1100,7 @@ class Penalty(Struct):
     clientId = property(_get_client_id, _set_client_id)
 
     def _set_duration(self, v):
-        self._duration = functions.time2minutes(v)
+        self._duration = b311.functions.time2minutes(v)
 
     def _get_duration(self):
         return self._duration
@@ -1242,11 +1386,163 @@ class Group(Struct):
         return "Group(%r)" % self.__dict__
 
 
+class PenaltySummary(object):
+    """
+    The active bans and warnings of a client, computed from a single storage query.
+    The summary is valid until one of its penalties expires.
+    """
+    types = ('Ban', 'TempBan', 'Warning')
+
+    def __init__(self, penalties):
+        """
+        Object constructor.
+        :param penalties: The active penalties of the client, most recent first
+        """
+        bans = [x for x in penalties if x.type in ('Ban', 'TempBan')]
+        warnings = [x for x in penalties if x.type == 'Warning']
+        self.numBans = len(bans)
+        self.lastBan = bans[0] if bans else None
+        self.numWarnings = len(warnings)
+        self.lastWarning = warnings[0] if warnings else None
+        # same order as Storage.getClientFirstPenalty(): the warning expiring last, then the oldest one
+        self.firstWarning = min(warnings, key=lambda x: (-x.timeExpire, x.timeAdd)) if warnings else None
+        expiring = [x.timeExpire for x in penalties if x.timeExpire != -1]
+        self.expires = min(expiring) if expiring else None
+
+    def valid(self, now):
+        """
+        Tell whether none of the penalties of the summary expired.
+        """
+        return self.expires is None or now < self.expires
+
+
+class ClientIndex(object):
+    """
+    Lookup tables of the online clients (by name, exact name, guid, truncated guid, team and state) updated on
+    connect, disconnect and whenever an indexed attribute of a client changes.
+    Every table maps a key to an ordered dict of the matching clients by slot number.
+    """
+    tables = ('name', 'exactName', 'guid', 'truncatedGuid', 'team', 'state')
+
+    def __init__(self):
+        """
+        Object constructor.
+        """
+        self._lock = threading.RLock()
+        self._entries = {}  # cid -> (client, {table: keys})
+        self._names = OrderedDict()  # cid -> (lowercase name, lowercase name without whitespace)
+        self._tables = dict((x, {}) for x in self.tables)
+        self._truncatedGuids = False  # whether the truncated guids are indexed (once a truncated guid is looked up)
+        self._shortGuids = 0  # amount of clients indexed with a 31 characters guid
+
+    def clear(self):
+        """
+        Remove all the clients from the index.
+        """
+        with self._lock:
+            self._entries = {}
+            self._names = OrderedDict()
+            self._tables = dict((x, {}) for x in self.tables)
+            self._shortGuids = 0
+
+    def _keys(self, client, indexState):
+        """
+        Return the keys of a client in every table.
+        """
+        guid = (client.guid or '').upper()
+        keys = {
+            'name': [(client.name or '').lower()],
+            'exactName': [(client.exactName or '').lower()],
+            'guid': [guid] if guid else [],
+            'truncatedGuid': self._truncate(guid) if self._truncatedGuids else [],
+            'team': [client.team],
+            'state': [client.state] if indexState else [],
+        }
+        return keys
+
+    @staticmethod
+    def _truncate(guid):
+        """
+        Return the given GUID truncated by one character at every position (see functions.fuzzyGuidMatch).
+        """
+        return [guid[:i] + guid[i + 1:] for i in range(32)] if len(guid) == 32 else []
+
+    def add(self, cid, client, indexState=True):
+        """
+        Index a client (replacing the client previously indexed under the same slot number).
+        """
+        with self._lock:
+            self.remove(cid)
+            keys = self._keys(client, indexState)
+            self._entries[cid] = (client, keys)
+            for table, values in keys.items():
+                for value in values:
+                    self._tables[table].setdefault(value, OrderedDict())[cid] = client
+            if keys['guid'] and len(keys['guid'][0]) == 31:
+                self._shortGuids += 1
+            name = keys['name'][0]
+            self._names[cid] = (name, re.sub(r'\s', '', name))
+
+    def remove(self, cid):
+        """
+        Remove the client indexed under the given slot number.
+        """
+        with self._lock:
+            entry = self._entries.pop(cid, None)
+            if entry is None:
+                return
+            for table, values in entry[1].items():
+                for value in values:
+                    bucket = self._tables[table].get(value)
+                    if bucket is not None:
+                        bucket.pop(cid, None)
+                        if not bucket:
+                            del self._tables[table][value]
+            if entry[1]['guid'] and len(entry[1]['guid'][0]) == 31:
+                self._shortGuids -= 1
+            self._names.pop(cid, None)
+
+    def find(self, table, key):
+        """
+        Return the list of clients indexed under the given key.
+        """
+        with self._lock:
+            bucket = self._tables[table].get(key)
+            return list(bucket.values()) if bucket else []
+
+    def findTruncatedGuid(self, guid):
+        """
+        Return the list of clients whose 32 characters GUID is the given GUID with one more character.
+        The truncated GUIDs are only indexed from the first call on.
+        """
+        with self._lock:
+            if not self._truncatedGuids:
+                self._truncatedGuids = True
+                for cid, (client, keys) in self._entries.items():
+                    keys['truncatedGuid'] = self._truncate(keys['guid'][0]) if keys['guid'] else []
+                    for value in keys['truncatedGuid']:
+                        self._tables['truncatedGuid'].setdefault(value, OrderedDict())[cid] = client
+            return self.find('truncatedGuid', guid)
+
+    def hasShortGuids(self):
+        """
+        Whether a client with a 31 characters GUID is indexed.
+        """
+        return self._shortGuids > 0
+
+    def search(self, needle, compact=False):
+        """
+        Return the clients whose lowercase name contains the given lowercase string.
+        :param needle: The string to look for
+        :param compact: Whether to match names with their whitespaces removed
+        """
+        with self._lock:
+            return [self._entries[cid][0] for cid, names in self._names.items() if needle in names[compact]]
+
+
 class Clients(dict):
     _authorizing = False
-    _exactNameIndex = None
-    _guidIndex = None
-    _nameIndex = None
+    _index = None
 
     console = None
 
@@ -1257,9 +1553,95 @@ class Clients(dict):
         """
         super(Clients, self).__init__()
         self.console = console
-        self._exactNameIndex = {}
-        self._guidIndex = {}
-        self._nameIndex = {}
+        self._index = ClientIndex()
+        self._summaries = OrderedDict()  # client id -> PenaltySummary, least recently used first
+        self._groupsByBits = {}  # group bits -> list of groups
+        self._groupsSource = None
+        self.cacheHits = 0
+        self.cacheMisses = 0
+
+    ####################################################################################################################
+    #                                                                                                                  #
+    #   PENALTY SUMMARIES AND GROUPS CACHE                                                                             #
+    #                                                                                                                  #
+    ####################################################################################################################
+
+    _summariesLimit = 1024
+
+    def getPenaltySummary(self, client):
+        """
+        Return the active bans and warnings of a client: the storage is queried only when the summary of the client
+        is not cached, when one of its penalties expired or when its penalties have been changed.
+        :param client: The client (it must have an id)
+        """
+        summary = self._summaries.get(client.id)
+        if summary is not None and summary.valid(self.console.time()):
+            self.cacheHits += 1
+            try:
+                self._summaries.move_to_end(client.id)
+            except KeyError:
+                # invalidated in the meantime by another thread
+                pass
+            return summary
+        self.cacheMisses += 1
+        return self.setPenaltySummary(client.id,
+                                       self.console.storage.getClientPenalties(client, type=PenaltySummary.types))
+
+    def setPenaltySummary(self, clientId, penalties):
+        """
+        Cache the penalty summary of a client whose penalties have been fetched from the storage.
+        :param clientId: The client id
+        :param penalties: The active bans and warnings of the client, most recent first
+        """
+        self._summaries.pop(clientId, None)
+        # offline clients looked up by commands also end up here: drop the least recently used summaries
+        while len(self._summaries) >= self._summariesLimit:
+            try:
+                self._summaries.popitem(last=False)
+            except KeyError:
+                break
+        summary = self._summaries[clientId] = PenaltySummary(penalties)
+        return summary
+
+    def invalidatePenaltySummary(self, clientId):
+        """
+        Drop the cached penalty summary of a client (called by the storage when its penalties change).
+        :param clientId: The client id
+        """
+        self._summaries.pop(clientId, None)
+
+    def getGroups(self, groupBits):
+        """
+        Return the groups matching the given group bits (the guest group if none is matching).
+        :param groupBits: The client group bits
+        """
+        source = self.console.storage.getGroups()
+        if source is not self._groupsSource:
+            # the storage loaded its groups again
+            self._groupsByBits = {}
+            self._groupsSource = source
+        groups = self._groupsByBits.get(groupBits)
+        if groups is not None:
+            self.cacheHits += 1
+        else:
+            self.cacheMisses += 1
+            groups = [g for g in source if g.id & groupBits]
+            if not groups:
+                groups = [g for g in source if g.id == 0][:1]
+            self._groupsByBits[groupBits] = groups
+        return list(groups)
+
+    def cacheStats(self):
+        """
+        Return the penalty summaries and groups cache metrics.
+        """
+        lookups = self.cacheHits + self.cacheMisses
+        return {
+            'hits': self.cacheHits,
+            'misses': self.cacheMisses,
+            'hit_ratio': round(float(self.cacheHits) / lookups, 3) if lookups else 0,
+            'summaries': len(self._summaries),
+        }
 
     def find(self, handle, maxres=None):
         """
@@ -1281,14 +1663,10 @@ class Clients(dict):
         :param name: The name to use for the search
         """
         name = name.lower()
-        try:
-            return self[self._nameIndex[name]]
-        except Exception:
-            for cid, c in self.items():
-                if c.name and c.name.lower() == name:
-                    # self.console.debug('found client by name %s = %s', name, c.name)
-                    self._nameIndex[name] = c.cid
-                    return c
+        if not name:
+            return None
+        for c in self._index.find('name', name):
+            return c
         return None
 
     def getByExactName(self, name):
@@ -1296,17 +1674,8 @@ class Clients(dict):
         Search a client by matching his exact name.
         :param name: The name to use for the search
         """
-        name = name.lower() + '^7'
-        try:
-            c = self[self._exactNameIndex[name]]
-            # self.console.debug('found client by exact name in index %s = %s : %s', name, c.exactName, c.__class__.__name__)
+        for c in self._index.find('exactName', name.lower() + '^7'):
             return c
-        except Exception:
-            for cid, c in self.items():
-                if c.exactName and c.exactName.lower() == name:
-                    # self.console.debug('Found client by exact name %s = %s', name, c.exactName)
-                    self._exactNameIndex[name] = c.cid
-                    return c
         return None
 
     def getList(self):
@@ -1345,22 +1714,16 @@ class Clients(dict):
         Return a list of clients matching the given name.
         :param name: The name to match
         """
-        clist = []
         needle = re.sub(r'\s', '', name.lower())
-        for cid, c in self.items():
-            cleanname = re.sub(r'\s', '', c.name.lower())
-            if not c.hide and needle in cleanname:
-                clist.append(c)
-        return clist
+        return [c for c in self._index.search(needle, compact=True) if not c.hide]
 
     def getClientLikeName(self, name):
         """
         Return the client who has the given name in its name (match substring).
         :param name: The name to match
         """
-        name = name.lower()
-        for cid, c in self.items():
-            if not c.hide and string.find(c.name.lower(), name) != -1:
+        for c in self._index.search(name.lower()):
+            if not c.hide:
                 return c
         return None
 
@@ -1369,11 +1732,17 @@ class Clients(dict):
         Return a list ofclients matching the given state.
         :param state: The clients state
         """
-        clist = []
-        for cid, c in self.items():
-            if not c.hide and c.state == state:
-                clist.append(c)
-        return clist
+        if not self.console.indexClientState:
+            # the state is read from the game server (see the frostbite parsers)
+            return [c for c in self.getList() if c.state == state]
+        return [c for c in self._index.find('state', state) if not c.hide]
+
+    def getClientsByTeam(self, team):
+        """
+        Return a list of clients matching the given team.
+        :param team: The team
+        """
+        return [c for c in self._index.find('team', team) if not c.hide]
 
     def getByDB(self, client_id):
         """
@@ -1433,15 +1802,15 @@ class Clients(dict):
         :param guid: The GUID to match
         """
         guid = guid.upper()
-        try:
-            return self[self._guidIndex[guid]]
-        except Exception:
-            for cid, c in self.items():
-                if c.guid and c.guid == guid:
-                    self._guidIndex[guid] = c.cid
-                    return c
-                elif functions.fuzzyGuidMatch(c.guid, guid):
-                    # found by fuzzy matching: don't index
+        for c in self._index.find('guid', guid):
+            return c
+        # fuzzy matching: a GUID truncated by one character (see functions.fuzzyGuidMatch)
+        if len(guid) == 31:
+            for c in self._index.findTruncatedGuid(guid):
+                return c
+        elif len(guid) == 32 and self._index.hasShortGuids():
+            for i in range(32):
+                for c in self._index.find('guid', guid[:i] + guid[i + 1:]):
                     return c
         return None
 
@@ -1532,33 +1901,58 @@ class Clients(dict):
             del self[cid]
             self.console.queueEvent(self.console.getEvent('EVT_CLIENT_DISCONNECT', data=cid, client=client))
 
-        self.resetIndex()
+        self.invalidatePenaltySummary(client.id)
+
+    def __setitem__(self, cid, client):
+        super(Clients, self).__setitem__(cid, client)
+        if client is None:
+            self._index.remove(cid)
+        else:
+            self._index.add(cid, client, self.console.indexClientState)
+
+    def __delitem__(self, cid):
+        super(Clients, self).__delitem__(cid)
+        self._index.remove(cid)
+
+    def pop(self, cid, *args):
+        self._index.remove(cid)
+        return super(Clients, self).pop(cid, *args)
+
+    def reindex(self, client):
+        """
+        Update the index entries of an online client (called by the client when an indexed attribute changes).
+        :param client: The client
+        """
+        if client.cid is not None and dict.get(self, client.cid) is client:
+            self._index.add(client.cid, client, self.console.indexClientState)
 
     def resetIndex(self):
         """
-        Reset the indexes.
+        Rebuild the indexes from the clients list.
         """
-        self._nameIndex = {}
-        self._guidIndex = {}
-        self._exactNameIndex = {}
+        self._index.clear()
+        for cid, c in list(self.items()):
+            if c is not None:
+                self._index.add(cid, c, self.console.indexClientState)
 
-    def newClient(self, cid, **kwargs):
+    def newClient(self, cid, auth=True, **kwargs):
         """
         Create a new client.
         :param cid: The client slot number
+        :param auth: Whether to authorize the client right away (False when many clients are then given to authClients)
         :param kwargs: The client attributes
         """
         client = Client(console=self.console, cid=cid, timeAdd=self.console.time(), **kwargs)
         self[client.cid] = client
-        self.resetIndex()
         self.console.debug('Client connected: [%s] %s - %s (%s)', self[client.cid].cid,
                            self[client.cid].name, self[client.cid].guid, self[client.cid].data)
         self.console.queueEvent(self.console.getEvent('EVT_CLIENT_CONNECT', data=client, client=client))
 
-        if client.guid and not client.bot:
-            client.auth()
-        elif not client.authed:
-            self.authorizeClients()
+        if auth:
+            if client.guid and not client.bot:
+                client.auth()
+            elif not client.authed:
+                self.authorizeClients()
         return client
 
     def empty(self):
@@ -1569,10 +1963,9 @@ class Clients(dict):
 
     def clear(self):
         """
-        Empty the clients list and reset the indexes.
+        Empty the clients list (hidden clients are kept).
         """
-        self.resetIndex()
-        for cid, c in self.items():
+        for cid, c in list(self.items()):
             if not c.hide:
                 del self[cid]
 
@@ -1584,7 +1977,7 @@ class Clients(dict):
         # remove existing clients
         self.clear()
         # add list of matching clients
-        for cid, c in mlist.iteritems():
+        for cid, c in mlist.items():
             self[cid] = c
 
     def authorizeClients(self):
@@ -1599,6 +1992,52 @@ class Clients(dict):
             t = threading.Timer(5, self._authorizeClients)
             t.start()
 
+    def authClients(self, clients):
+        """
+        Authorize many clients at once: the clients are looked up in the storage with a single query and the
+        active bans and warnings of all the clients found are retrieved with a single query too (filling the penalty
+        summaries cache). Groups are resolved from the groups table kept in memory by the storage. If the bulk
+        lookup fails, clients are authorized one by one.
+        :param clients: The clients to authorize (clients without guid or already authorized are skipped)
+        :return: The list of clients which have been authorized
+        """
+        pending = []
+        for client in clients:
+            if not client.authed and client.guid and not client.authorizing and not client.bot:
+                client.authorizing = True
+                pending.append((client, client.name, client.ip))
+        if not pending:
+            return []
+
+        storage = self.console.storage
+        try:
+            found = storage.getClientsByGuid([x[0] for x in pending])
+            penalties = storage.getClientsPenalties(found, type=PenaltySummary.types)
+            storage.getGroups()
+        except Exception as e:
+            self.console.error('Could not authorize %s clients at once: authorizing them one by one: %s\n%s',
+                               len(pending), e, traceback.extract_tb(sys.exc_info()[2]))
+            for client, name, ip in pending:
+                client.authorizing = False
+                client.auth()
+            return [x[0] for x in pending if x[0].authed]
+
+        bans = {}
+        for client in found:
+            bans[client.id] = self.setPenaltySummary(client.id, penalties.get(client.id, [])).lastBan
+
+        found = set(id(x) for x in found)
+        authed = []
+        for client, name, ip in pending:
+            try:
+                if client._auth(id(client) in found, name, ip, bans=bans):
+                    authed.append(client)
+            except Exception as e:
+                client.authorizing = False
+                self.console.error('Could not authorize client %s: %s\n%s', client,
+                                   e, traceback.extract_tb(sys.exc_info()[2]))
+        return authed
+
     def _authorizeClients(self):
         """
         Authorize the online clients.
@@ -0,0 +1,191 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__version__ = '1.0'
+
+import threading
+
+import b311.events
+
+DAMAGE_EVENTS = ('EVT_CLIENT_DAMAGE', 'EVT_CLIENT_DAMAGE_TEAM', 'EVT_CLIENT_DAMAGE_SELF')
+MAX_HIT_DAMAGE = 100  # damage points a single hit can count for (the health of a player)
+
+
+class DamageSummary(tuple):
+    """
+    Data of a summarized damage event: the data of the first damage event merged, with the damage points replaced by
+    the total amount of damage points of the merged events (each of them counting for MAX_HIT_DAMAGE at most).
+    """
+    hits = 1
+
+    def __new__(cls, data, damage, hits):
+        """
+        Object constructor.
+        :param data: The data of the first damage event merged
+        :param damage: The total amount of damage points (capped hit by hit)
+        :param hits: The amount of damage events merged
+        """
+        summary = tuple.__new__(cls, (damage,) + tuple(data[1:]))
+        summary.hits = hits
+        return summary
+
+
+class DamageCoalescer(object):
+    """
+    Merge the damage events produced by the same attacker on the same victim, with the same weapon on the same hit
+    location, within a short window into a single event whose data is a DamageSummary.
+
+    Summaries are only delivered to the plugins accepting them (see Plugin.coalesceDamage): the other plugins keep
+    receiving every damage event, which is only queued if at least one of them listens for it. The pending summaries
+    of a client are queued before any other event involving the client, so that plugins see them in order.
+    """
+
+    def __init__(self, console, window=0.25):
+        """
+        Object constructor.
+        :param console: The console instance
+        :param window: The amount of seconds damage events are merged for
+        """
+        self.console = console
+        self.window = window
+        self.types = set(console.getEventID(x) for x in DAMAGE_EVENTS)
+        self.received = 0
+        self.queued = 0
+        self._pending = {}  # key -> [first event, damage, hits], in the order of the first events
+        self._clients = {}  # cid -> keys of the pending summaries involving the client
+        self._lock = threading.Lock()
+        self._flushLock = threading.Lock()
+        self._stopEvent = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='DamageCoalescer')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def mergeable(self, event):
+        """
+        Whether the given event is a damage event which can be merged.
+        """
+        return event.type in self.types and event.client is not None and event.target is not None and \
+            isinstance(event.data, tuple) and len(event.data) >= 2 and not isinstance(event.data, DamageSummary)
+
+    def accepts(self, plugin, event):
+        """
+        Whether the given event must be delivered to the given plugin.
+        """
+        if event.type not in self.types:
+            return True
+        if isinstance(event.data, DamageSummary):
+            return plugin.coalesceDamage
+        return not (plugin.coalesceDamage and self.mergeable(event))
+
+    def filter(self, event):
+        """
+        Merge the given event if it is a damage event, otherwise queue the pending summaries involving its clients.
+        :return: Whether the event itself must be queued
+        """
+        if event.type in self.types:
+            if not self.mergeable(event):
+                return True
+            handlers = self.console._handlers.get(event.type, ())
+            if any(x.coalesceDamage for x in handlers):
+                self.add(event)
+            return any(not x.coalesceDamage for x in handlers)
+
+        if self._pending:
+            if event.client is None and event.target is None:
+                self.flush()
+            else:
+                self.flush([x.cid for x in (event.client, event.target) if x is not None])
+        return True
+
+    def add(self, event):
+        """
+        Merge a damage event in the pending summaries.
+        """
+        damage = event.data[0]
+        if not isinstance(damage, (int, float)):
+            try:
+                damage = float(damage)
+            except (TypeError, ValueError):
+                damage = 0
+        # cap every hit: the sum of the hits is then what summing the raw events with their cap would give
+        damage = min(damage, MAX_HIT_DAMAGE)
+        key = (event.type, event.client.cid, event.target.cid) + tuple(event.data[1:])
+        with self._lock:
+            self.received += 1
+            try:
+                pending = self._pending[key]
+                pending[1] += damage
+                pending[2] += 1
+            except KeyError:
+                self._pending[key] = [event, damage, 1]
+                self._clients.setdefault(event.client.cid, set()).add(key)
+                self._clients.setdefault(event.target.cid, set()).add(key)
+
+    def flush(self, cids=None):
+        """
+        Queue the pending summaries.
+        :param cids: Only queue the summaries involving the clients with these slot numbers
+        """
+        # the flush lock keeps the summaries of concurrent flushes in order, while damage events keep being merged
+        # when queueing blocks on a full event queue
+        with self._flushLock:
+            summaries = []
+            with self._lock:
+                if cids is None:
+                    keys = list(self._pending)
+                else:
+                    wanted = set()
+                    for cid in cids:
+                        wanted.update(self._clients.get(cid, ()))
+                    keys = [x for x in self._pending if x in wanted] if wanted else []
+                for key in keys:
+                    event, damage, hits = self._pending.pop(key)
+                    for cid in (key[1], key[2]):
+                        self._clients[cid].discard(key)
+                        if not self._clients[cid]:
+                            del self._clients[cid]
+                    summary = b311.events.Event(event.type, DamageSummary(event.data, damage, hits), event.client,
+                                                event.target)
+                    summary.time = event.time
+                    summaries.append(summary)
+                self.queued += len(summaries)
+
+            for summary in summaries:
+                self.console.putEvent(summary)
+
+    def run(self):
+        """
+        Queue the pending summaries at the end of every window.
+        """
+        while not self._stopEvent.wait(self.window):
+            if self._pending:
+                self.flush()
+
+    def stop(self):
+        """
+        Stop queueing the pending summaries.
+        """
+        self._stopEvent.set()
+
+    def dumpStats(self):
+        """
+        Print damage coalescing stats in the log file.
+        """
+        if self.received:
+            self.console.verbose('Damage coalescing : %s damage events merged into %s summaries (%0.1f%%)',
+                                 self.received, self.queued, 100.0 * self.queued / self.received)
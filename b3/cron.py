@@ -25,16 +25,27 @@
 #                                 - add tests
 # 11/16/2010 - 1.4.1 - Courgette  - removing a non existing crontab does not raise a KeyError anymore
 # 21/07/2014 - 1.5   - Fenix      - syntax cleanup
+# 18/10/2026 - 1.6   - agent      - compute the next time every crontab is due and keep them in a priority queue
+#                                   instead of matching every crontab every second
+#                                 - run crontab commands on a pool of worker threads
+#                                 - collect run duration and lateness statistics for every crontab
 #
 __author__ = 'ThorN, Courgette'
-__version__ = '1.5'
+__version__ = '1.6'
 
+import bisect
+import calendar
+import heapq
+import itertools
+import queue
 import re
 import sys
 import threading
 import time
 import traceback
 
+from b311.output import VERBOSE
+
 
 class ReMatcher(object):
     _re = None
@@ -56,6 +67,43 @@ class ReMatcher(object):
     results = property(_get_match)
 
 
+class CronTabStats(object):
+    """
+    Run duration and lateness (time elapsed between the moment a crontab is due and the moment its command
+    starts) of a crontab, in seconds.
+    """
+
+    def __init__(self):
+        """
+        Object constructor.
+        """
+        self.runs = 0
+        self.skipped = 0
+        self.lastDuration = self.maxDuration = self.totalDuration = 0.0
+        self.lastLateness = self.maxLateness = self.totalLateness = 0.0
+
+    def add(self, lateness, duration):
+        """
+        Record a run of the crontab.
+        """
+        self.runs += 1
+        self.lastDuration = duration
+        self.maxDuration = max(self.maxDuration, duration)
+        self.totalDuration += duration
+        self.lastLateness = lateness
+        self.maxLateness = max(self.maxLateness, lateness)
+        self.totalLateness += lateness
+
+    def _get_mean_duration(self):
+        return self.totalDuration / self.runs if self.runs else 0.0
+
+    def _get_mean_lateness(self):
+        return self.totalLateness / self.runs if self.runs else 0.0
+
+    meanDuration = property(_get_mean_duration)
+    meanLateness = property(_get_mean_lateness)
+
+
 class CronTab(object):
     _second = None
     _minute = None
@@ -63,10 +111,13 @@ class CronTab(object):
     _day = None
     _month = None
     _dow = None
+    _cron = None
+    _lastDay = None
 
     command = None
     maxRuns = 0
     numRuns = 0
+    stats = None
 
     def __init__(self, command, second=0, minute='*', hour='*', day='*', month='*', dow='*'):
         """
@@ -79,6 +130,7 @@ class CronTab(object):
         self.month = month
         self.dow = dow
         self.command = command
+        self.stats = CronTabStats()
 
     def run(self):
         """
@@ -86,38 +138,52 @@ class CronTab(object):
         """
         self.command()
 
+    def _changed(self):
+        """
+        Compute again the next time this crontab is due if it is already scheduled.
+        """
+        self._lastDay = None
+        if self._cron:
+            self._cron.reschedule(self)
+
     def _set_second(self, value):
         self._second = self._getRate(value, 60)
+        self._changed()
 
     def _get_second(self):
         return self._second
 
     def _set_minute(self, value):
         self._minute = self._getRate(value, 60)
+        self._changed()
 
     def _get_minute(self):
         return self._minute
 
     def _set_hour(self, value):
         self._hour = self._getRate(value, 24)
+        self._changed()
 
     def _get_hour(self):
         return self._hour
 
     def _set_day(self, value):
         self._day = self._getRate(value, 31)
+        self._changed()
 
     def _get_day(self):
         return self._day
 
     def _set_month(self, value):
         self._month = self._getRate(value, 12)
+        self._changed()
 
     def _get_month(self):
         return self._month
 
     def _set_dow(self, value):
         self._dow = self._getRate(value, 7)
+        self._changed()
 
     def _get_dow(self):
         return self._dow
@@ -157,9 +223,7 @@ class CronTab(object):
                         for val in result:
                             myset[int(val)] = None
 
-                mylist = myset.keys()
-                mylist.sort()
-                return mylist
+                return sorted(myset)
             else:
                 return self._getRateFromFragment(rate, maxrate)
         elif isinstance(rate, int):
@@ -231,6 +295,68 @@ class CronTab(object):
         timematch = timematch and self._match(self.dow, timetuple[6])
         return timematch
 
+    @staticmethod
+    def _nextValue(unit, value):
+        """
+        Return the smallest value greater than or equal to the given one accepted by the given unit, or None.
+        """
+        if type(unit) == int:
+            if unit == -1:
+                return value
+            return unit if unit >= value else None
+        if isinstance(unit, range):
+            if value <= unit.start:
+                return unit.start if len(unit) else None
+            value = unit.start - (unit.start - value) // unit.step * unit.step
+            return value if value < unit.stop else None
+        # sorted list
+        index = bisect.bisect_left(unit, value)
+        return unit[index] if index < len(unit) else None
+
+    def _matchDay(self, day):
+        """
+        Check whether the given day (amount of days since the epoch) matches the day, month and weekday of this
+        crontab. The result for the last day checked is cached.
+        :return: True if the day matches, otherwise the timestamp of the next day which may match
+        """
+        if self._lastDay is not None and self._lastDay[0] == day:
+            return self._lastDay[1]
+        tt = time.gmtime(day * 86400)
+        if not self._match(self.month, tt[1]):
+            # first day of the next month
+            result = calendar.timegm((tt[0] + tt[1] // 12, tt[1] % 12 + 1, 1, 0, 0, 0))
+        elif not self._match(self.day, tt[2]) or not self._match(self.dow, tt[6]):
+            result = (day + 1) * 86400
+        else:
+            result = True
+        self._lastDay = (day, result)
+        return result
+
+    def nextRun(self, after):
+        """
+        Compute the next time this crontab is due.
+        Units which don't match are skipped as a whole: a crontab running once a day costs a few steps, not one
+        per second.
+        :param after: The timestamp after which the crontab is due
+        :return: The timestamp of the next second matching this crontab or None if no second within the next 28
+        years (the period of the calendar) matches it
+        """
+        t = int(after) + 1
+        limit = t + 28 * 366 * 86400
+        while t < limit:
+            day = self._matchDay(t // 86400)
+            if day is not True:
+                t = day
+            elif not self._match(self.hour, t // 3600 % 24):
+                t += 3600 - t % 3600
+            elif not self._match(self.minute, t // 60 % 60):
+                t += 60 - t % 60
+            else:
+                second = self._nextValue(self.second, t % 60)
+                if second is not None:
+                    return t - t % 60 + second
+                t += 60 - t % 60
+        return None
 
 class OneTimeCronTab(CronTab):
 
@@ -271,13 +397,37 @@ class PluginCronTab(CronTab):
 
 
 class Cron(object):
+    """
+    Run crontabs when they are due.
 
-    def __init__(self, console):
+    The next time every crontab is due is computed once, when the crontab is added or changed and after it ran, and
+    kept in a priority queue: the scheduler thread sleeps until the first crontab of the queue is due (or a crontab is
+    added or changed) instead of matching every crontab every second. Due commands are handed to a pool of worker
+    threads so that a slow command does not delay the others; a crontab still running when it is due again skips
+    that run.
+    """
+    _stop_token = object()
+
+    # seconds the scheduler sleeps at most, so that system clock changes are noticed
+    maxWait = 60
+
+    def __init__(self, console, workers=4):
         """
         Object constructor.
+        :param console: The console instance
+        :param workers: The amount of worker threads running the crontab commands
         """
         self._tabs = {}
         self.console = console
+        self.workers = max(1, workers)
+
+        self._condition = threading.Condition()
+        self._schedule = []  # heap of (due time, sequence, tab id)
+        self._sequence = itertools.count()
+        self._due = {}  # tab id -> sequence of the valid schedule entry
+        self._running = set()
+        self._jobs = queue.Queue()
+        self._threads = []
 
         # thread will stop if this event gets set
         self._stopEvent = threading.Event()
@@ -293,7 +443,11 @@ class Cron(object):
         """
         Add a CronTab to the list of active cron tabs.
         """
-        self._tabs[id(tab)] = tab
+        with self._condition:
+            self._tabs[id(tab)] = tab
+            tab._cron = self
+            self._scheduleTab(tab, self.time())
+            self._condition.notify()
         self.console.verbose('Added crontab %s (%s) - %ss %sm %sh %sd %sM %sDOW' % (tab.command, id(tab), tab.second,
                                                                                     tab.minute, tab.hour, tab.day,
                                                                                     tab.month, tab.dow))
@@ -303,23 +457,80 @@ class Cron(object):
         """
         Remove a CronTab from the list of active cron tabs.
         """
-        try:
-            del self._tabs[tab_id]
+        with self._condition:
+            tab = self._tabs.pop(tab_id, None)
+            self._due.pop(tab_id, None)
+            if tab is not None and tab._cron is self:
+                tab._cron = None
+        if tab is not None:
             self.console.verbose('Removed crontab %s' % tab_id)
-        except KeyError:
+        else:
             self.console.verbose('Crontab %s not found' % tab_id)
 
+    def reschedule(self, tab):
+        """
+        Compute again the next time the given CronTab is due (called when its schedule is changed).
+        """
+        with self._condition:
+            if self._tabs.get(id(tab)) is tab:
+                self._scheduleTab(tab, self.time())
+                self._condition.notify()
+
     def __add__(self, tab):
         self.add(tab)
 
     def __sub__(self, tab):
         self.cancel(id(tab))
 
+    def _scheduleTab(self, tab, after):
+        """
+        Push the next time the given CronTab is due in the schedule, invalidating the previous entry.
+        Must be called holding the condition.
+        """
+        due = tab.nextRun(after)
+        if due is None:
+            self._due.pop(id(tab), None)
+            self.console.warning('Crontab %s (%s) will never run' % (tab.command, id(tab)))
+            return
+        sequence = next(self._sequence)
+        self._due[id(tab)] = sequence
+        heapq.heappush(self._schedule, (due, sequence, id(tab)))
+
+    def _popDue(self, now):
+        """
+        Pop the CronTabs due at the given time from the schedule and schedule their next run.
+        Late runs are not caught up: a crontab late by several runs runs once.
+        Must be called holding the condition.
+        :return: A list of (due time, tab)
+        """
+        result = []
+        while self._schedule and self._schedule[0][0] <= now:
+            due, sequence, tab_id = heapq.heappop(self._schedule)
+            if self._due.get(tab_id) != sequence:
+                # the tab was cancelled or rescheduled
+                continue
+            tab = self._tabs[tab_id]
+            self._scheduleTab(tab, max(due, now))
+            result.append((due, tab))
+        return result
+
     def start(self):
         """
         Start the cron scheduler in a separate thread.
         """
-        thread.start_new_thread(self.run, ())
+        thread = threading.Thread(target=self.run, name='Cron')
+        thread.daemon = True
+        thread.start()
+
+    def _startWorkers(self):
+        """
+        Start the worker threads running the crontab commands.
+        """
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name='CronWorker-%s' % len(self._threads))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
 
     @staticmethod
     def time():
@@ -331,8 +542,13 @@ class Cron(object):
     def stop(self):
         """
         Stop the cron scheduler.
+        Commands already handed to the worker threads are run before the workers terminate.
         """
         self._stopEvent.set()
+        with self._condition:
+            self._condition.notify()
+        for _ in self._threads:
+            self._jobs.put(self._stop_token)
 
     def run(self):
         """
@@ -340,38 +556,92 @@ class Cron(object):
         Will terminate when stop event is set.
         """
         self.console.info("Cron scheduler started")
-        nexttime = self.getNextTime()
-        while not self._stopEvent.isSet():
-            now = self.time()
-            if now < nexttime:
-                self._stopEvent.wait(nexttime - now + .1)
-
-            # Check if the time has changed by more than two minutes. This
-            # case arises when the system clock is changed. We must reset the timer.
-            if abs(self.time() - nexttime) > 120:
-                nexttime = self.getNextTime()
-
-            t = time.gmtime(nexttime)
-            for k, c in self._tabs.items():
-                if c.match(t):
-                    if 0 < c.maxRuns < c.numRuns + 1:
-                        # reached max executions, remove tab
-                        del self._tabs[k]
-                    else:
-                        c.numRuns += 1
-                        try:
-                            c.run()
-                        except Exception as msg:
-                            self.console.error('Exception raised while executing crontab %s: %s\n%s', c.command,
-                                               msg, traceback.extract_tb(sys.exc_info()[2]))
-            nexttime += 1
+        self._startWorkers()
+        last = self.time()
+        while not self._stopEvent.is_set():
+            with self._condition:
+                now = self.time()
+                # Check if the time has changed by more than two minutes. This case arises when the system clock
+                # is changed: we must compute again the next time every crontab is due.
+                if now < last - 1 or now > last + self.maxWait + 120:
+                    self.console.warning('System clock changed by %0.1f seconds: rescheduling crontabs' % (
+                                         now - last))
+                    self._schedule = []
+                    for tab in self._tabs.values():
+                        self._scheduleTab(tab, now)
+                last = now
+                due = self._popDue(now)
+                if not due:
+                    wait = self.maxWait
+                    if self._schedule:
+                        wait = min(wait, self._schedule[0][0] - now)
+                    if not self._stopEvent.is_set():
+                        self._condition.wait(wait)
+                    continue
+
+            for when, tab in due:
+                self._dispatch(tab, when)
 
         self.console.info("Cron scheduler ended")
 
-    @staticmethod
-    def getNextTime():
-        # store the time first, we don't want it to change on us
-        t = time.time()
-        # current time, minus it's 1 second remainder, plus 1 seconds
-        # will round to the next nearest 1 seconds
-        return (t - t % 1) + 1
+    def _dispatch(self, tab, due):
+        """
+        Hand a due CronTab to the worker threads.
+        """
+        if not tab.match(time.gmtime(due)):
+            # i.e: a PluginCronTab whose plugin is disabled
+            return
+        with self._condition:
+            if id(tab) in self._running:
+                tab.stats.skipped += 1
+                self.console.debug('Crontab %s (%s) is still running: skipping the run due at %s' % (
+                                   tab.command, id(tab), time.strftime('%H:%M:%S', time.gmtime(due))))
+                return
+            tab.numRuns += 1
+            self._running.add(id(tab))
+        if 0 < tab.maxRuns <= tab.numRuns:
+            # reached max executions, remove tab
+            self.cancel(id(tab))
+        self._jobs.put((tab, due))
+
+    def _work(self):
+        """
+        Worker thread running the crontab commands.
+        """
+        while True:
+            job = self._jobs.get(True)
+            if job is self._stop_token:
+                break
+            tab, due = job
+            start = self.time()
+            try:
+                tab.run()
+            except Exception as msg:
+                self.console.error('Exception raised while executing crontab %s: %s\n%s', tab.command,
+                                   msg, traceback.extract_tb(sys.exc_info()[2]))
+            finally:
+                tab.stats.add(start - due, self.time() - start)
+                with self._condition:
+                    self._running.discard(id(tab))
+
+    def getStats(self):
+        """
+        Return the run statistics of the active cron tabs.
+        :return: A list of (tab, CronTabStats) tuples
+        """
+        with self._condition:
+            return [(x, x.stats) for x in self._tabs.values()]
+
+    def dumpStats(self):
+        """
+        Print crontab stats in the log file.
+        """
+        if self.console.log.isEnabledFor(VERBOSE):
+            for tab, stats in self.getStats():
+                if stats.runs or stats.skipped:
+                    self.console.verbose("Crontab %s : runs(%s), skipped(%s), duration (ms) last(%0.1f), max(%0.1f), "
+                                         "mean(%0.1f), lateness (ms) last(%0.1f), max(%0.1f), mean(%0.1f)",
+                                         tab.command, stats.runs, stats.skipped, stats.lastDuration * 1000,
+                                         stats.maxDuration * 1000, stats.meanDuration * 1000,
+                                         stats.lastLateness * 1000, stats.maxLateness * 1000,
+                                         stats.meanLateness * 1000)
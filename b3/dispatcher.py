@@ -0,0 +1,150 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__version__ = '1.0'
+
+import logging
+import queue
+import threading
+import time
+
+
+class DispatchLane(object):
+    """
+    A FIFO queue of events consumed by a dedicated worker thread.
+    Events dispatched on the same lane are handled one at a time, in the order they were dispatched.
+    """
+    _stop_token = object()
+
+    def __init__(self, dispatcher, plugin, index):
+        """
+        Object constructor.
+        :param dispatcher: The EventDispatcher instance which owns this lane
+        :param plugin: The plugin handling the events dispatched on this lane
+        :param index: The shard index of this lane
+        """
+        self.dispatcher = dispatcher
+        self.plugin = plugin
+        self.index = index
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name='%s-%s' % (plugin.__class__.__name__, index))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, event, event_name):
+        """
+        Enqueue an event on this lane.
+        :return: The amount of events waiting on this lane
+        """
+        self.queue.put((event, event_name))
+        return self.queue.qsize()
+
+    def stop(self):
+        """
+        Stop the lane worker once all the events already queued have been handled.
+        """
+        self.queue.put((self._stop_token, None))
+
+    def run(self):
+        """
+        Lane worker thread.
+        """
+        console = self.dispatcher.console
+        while True:
+            event, event_name = self.queue.get(True)
+            if event is self._stop_token:
+                break
+            # vetoes are logged by the console but cannot stop other plugins from handling asynchronous events
+            console.handleEvent(self.plugin, event, event_name)
+
+
+class EventDispatcher(object):
+    """
+    Dispatch events to plugins asynchronously, using one or more lanes per plugin.
+
+    Every plugin gets its own set of lanes so that a slow plugin does not delay the others. Plugins which declare
+    more than one lane (see Plugin.dispatchShards) have their events sharded by client: all the events produced by
+    the same client are delivered on the same lane, thus in order. Events with no client are delivered on the
+    first lane. Plugins which declare Plugin.synchronousDispatch are never handled here.
+    """
+
+    def __init__(self, console):
+        """
+        Object constructor.
+        :param console: The console instance
+        """
+        self.console = console
+        self._lanes = {}
+        self._lock = threading.Lock()
+
+    def _get_lanes(self, plugin):
+        """
+        Return the lanes of the given plugin, creating them if needed.
+        """
+        try:
+            return self._lanes[plugin]
+        except KeyError:
+            with self._lock:
+                if plugin not in self._lanes:
+                    shards = max(1, int(getattr(plugin, 'dispatchShards', 1)))
+                    self._lanes[plugin] = [DispatchLane(self, plugin, i) for i in range(shards)]
+                return self._lanes[plugin]
+
+    def dispatch(self, plugin, event, event_name):
+        """
+        Dispatch an event to a plugin.
+        :param plugin: The plugin which is going to handle the event
+        :param event: The event to be dispatched
+        :param event_name: The event name
+        """
+        lanes = self._get_lanes(plugin)
+        lane = lanes[0]
+        if len(lanes) > 1 and event.client is not None:
+            lane = lanes[hash(event.client.cid) % len(lanes)]
+        backlog = lane.put(event, event_name)
+        self.console._eventsStats.add_plugin_backlog(plugin.__class__.__name__, backlog)
+
+    def getBacklog(self):
+        """
+        Return the amount of events waiting to be handled, by plugin name.
+        """
+        with self._lock:
+            items = list(self._lanes.items())
+        return dict((plugin.__class__.__name__, sum(x.queue.qsize() for x in lanes)) for plugin, lanes in items)
+
+    def dumpStats(self):
+        """
+        Print the amount of events currently waiting to be handled by every plugin in the log file.
+        """
+        if self.console.log.isEnabledFor(logging.DEBUG):
+            for plugin_name, backlog in sorted(self.getBacklog().items()):
+                self.console.debug("%s backlog : (events) now(%s)", plugin_name, backlog)
+
+    def stop(self, timeout=None):
+        """
+        Stop all the lanes, waiting for the events already dispatched to be handled.
+        :param timeout: The maximum amount of seconds to wait for all the lanes to finish
+        """
+        with self._lock:
+            lanes = [x for plugin_lanes in self._lanes.values() for x in plugin_lanes]
+            self._lanes = {}
+        for lane in lanes:
+            lane.stop()
+        deadline = None if timeout is None else time.time() + timeout
+        for lane in lanes:
+            lane.thread.join(None if deadline is None else max(0, deadline - time.time()))
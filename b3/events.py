@@ -36,17 +36,21 @@
 # 19/03/2015 - 1.8.1 - Fenix        - fixed test for membership using 'if not X in Y' (now use 'if X not in Y')
 # 04/05/2015 - 1.8.2 - Fenix        - removed reference to global variable b311.console on b311.console.time(): using
 #                                     time.time() instead (changed after reply mode removal)
+# 18/10/2026 - 1.8.3 - agent        - EventsStats samples are added and read under a lock: plugins handle events on
+#                                     their own threads in parallel dispatch mode
 
 __author__ = 'ThorN, xlr8or, Courgette'
-__version__ = '1.8.2'
+__version__ = '1.8.3'
 
 import re
+import threading
 import time
 from collections import deque
 from logging import DEBUG
 
 from b311.decorators import Memoize
 from b311.functions import meanstdv
+from b311.functions import percentile
 from b311.output import VERBOSE
 
 
@@ -208,7 +212,11 @@ class EventsStats(object):
         self.console = console
         self._max_samples = max_samples
         self._handling_timers = {}
+        self._plugin_backlog = {}
         self._queue_wait = deque(maxlen=max_samples)
+        self._queue_size = deque(maxlen=max_samples)
+        # samples are added by the event handling threads while dumpStats() reads them from the cron thread
+        self._lock = threading.Lock()
 
     def add_event_handled(self, plugin_name, event_name, milliseconds_elapsed):
         """
@@ -217,38 +225,89 @@ class EventsStats(object):
         :param event_name: The event name
         :param milliseconds_elapsed: The amount of milliseconds necessary to handle the event
         """
-        if plugin_name not in self._handling_timers:
-            self._handling_timers[plugin_name] = {}
-        if event_name not in self._handling_timers[plugin_name]:
-            self._handling_timers[plugin_name][event_name] = deque(maxlen=self._max_samples)
-        self._handling_timers[plugin_name][event_name].append(milliseconds_elapsed)
+        with self._lock:
+            if plugin_name not in self._handling_timers:
+                self._handling_timers[plugin_name] = {}
+            if event_name not in self._handling_timers[plugin_name]:
+                self._handling_timers[plugin_name][event_name] = deque(maxlen=self._max_samples)
+            self._handling_timers[plugin_name][event_name].append(milliseconds_elapsed)
         self.console.verbose2("%s event handled by %s in %0.3f ms", event_name, plugin_name, milliseconds_elapsed)
 
+    def add_plugin_backlog(self, plugin_name, backlog):
+        """
+        Add a sample of the amount of events waiting to be handled by a plugin.
+        :param plugin_name: The name of the plugin
+        :param backlog: The amount of events waiting to be handled by the plugin
+        """
+        with self._lock:
+            if plugin_name not in self._plugin_backlog:
+                self._plugin_backlog[plugin_name] = deque(maxlen=self._max_samples)
+            self._plugin_backlog[plugin_name].append(backlog)
+
     def add_event_wait(self, milliseconds_wait):
         """
         Add delay to the event processing.
         :param milliseconds_wait: The amount of milliseconds to wait
         """
-        self._queue_wait.append(milliseconds_wait)
+        with self._lock:
+            self._queue_wait.append(milliseconds_wait)
+
+    def add_queue_size(self, size):
+        """
+        Add a sample of the amount of events waiting in the queue.
+        :param size: The amount of events waiting in the queue
+        """
+        with self._lock:
+            self._queue_size.append(size)
 
     def dumpStats(self):
         """
         Print event stats in the log file.
         """
         if self.console.log.isEnabledFor(VERBOSE):
-            for plugin_name, plugin_timers in self._handling_timers.iteritems():
-                for event_name, event_timers in plugin_timers.iteritems():
-                    mean, stdv = meanstdv(event_timers)
-                    if len(event_timers):
-                        self.console.verbose("%s %s : (ms) min(%0.1f), max(%0.1f), mean(%0.1f), "
-                                             "stddev(%0.1f)", plugin_name, event_name, min(event_timers),
-                                             max(event_timers), mean, stdv)
+            with self._lock:
+                handling_timers = [(plugin_name, event_name, list(event_timers))
+                                   for plugin_name, plugin_timers in self._handling_timers.items()
+                                   for event_name, event_timers in plugin_timers.items()]
+            for plugin_name, event_name, event_timers in handling_timers:
+                mean, stdv = meanstdv(event_timers)
+                if len(event_timers):
+                    self.console.verbose("%s %s : (ms) min(%0.1f), max(%0.1f), mean(%0.1f), "
+                                         "stddev(%0.1f)", plugin_name, event_name, min(event_timers),
+                                         max(event_timers), mean, stdv)
 
         if self.console.log.isEnabledFor(DEBUG):
-            mean, stdv = meanstdv(self._queue_wait)
-            if len(self._queue_wait):
+            with self._lock:
+                plugin_backlog = [(plugin_name, list(backlog)) for plugin_name, backlog in self._plugin_backlog.items()]
+                queue_wait = list(self._queue_wait)
+                queue_size = list(self._queue_size)
+
+            for plugin_name, backlog in plugin_backlog:
+                if len(backlog):
+                    mean, stdv = meanstdv(backlog)
+                    self.console.debug("%s backlog : (events) last(%s), max(%s), mean(%0.1f)", plugin_name,
+                                       backlog[-1], max(backlog), mean)
+
+            mean, stdv = meanstdv(queue_wait)
+            if len(queue_wait):
                 self.console.debug("Events waiting in queue stats : (ms) min(%0.1f), max(%0.1f), mean(%0.1f), "
-                                   "stddev(%0.1f)", min(self._queue_wait), max(self._queue_wait), mean, stdv)
+                                   "stddev(%0.1f), p50(%0.1f), p95(%0.1f), p99(%0.1f)", min(queue_wait),
+                                   max(queue_wait), mean, stdv, *[percentile(queue_wait, x) for x in (50, 95, 99)])
+
+            if len(queue_size):
+                mean, stdv = meanstdv(queue_size)
+                self.console.debug("Event queue size : (events) last(%s), max(%s), mean(%0.1f)",
+                                   queue_size[-1], max(queue_size), mean)
+
+    def get_queue_wait_percentiles(self, percentiles=(50, 95, 99)):
+        """
+        Return the requested percentiles of the time events spent waiting in the queue.
+        :param percentiles: A sequence of percentiles to compute
+        :return: A tuple of milliseconds values, in the same order as the requested percentiles
+        """
+        with self._lock:
+            queue_wait = list(self._queue_wait)
+        return tuple(percentile(queue_wait, x) for x in percentiles)
 
 
 class VetoEvent(Exception):
@@ -340,7 +340,6 @@ class FakeClient(b311.clients.Client):
         # self.console.clients.newClient(cid)
         clients = self.console.clients
         clients[self.cid] = self
-        clients.resetIndex()
 
         self.console.debug('client connected: [%s] %s - %s (%s)', clients[self.cid].cid,
                            clients[self.cid].name, clients[self.cid].guid, clients[self.cid].data)
@@ -2,9 +2,8 @@ import collections
 import os
 import re
 import shutil
-import string
 import sys
-import urllib
+import urllib.request
 import zipfile
 from hashlib import md5
 
@@ -105,14 +104,14 @@ def confirm(client):
     msg = 'No confirmation...'
     try:
         # First test again known guids
-        f = urllib.urlopen('http://www.bigbrotherbot.net/confirm.php?uid=%s' % client.guid)
-        response = f.read()
+        f = urllib.request.urlopen('http://www.bigbrotherbot.net/confirm.php?uid=%s' % client.guid)
+        response = f.read().decode('utf-8')
         if not response == 'Error' and not response == 'False':
             msg = '%s is confirmed to be %s!' % (client.name, response)
         else:
             # If it fails, try ip (must be static)
-            f = urllib.urlopen('http://www.bigbrotherbot.net/confirm.php?ip=%s' % client.ip)
-            response = f.read()
+            f = urllib.request.urlopen('http://www.bigbrotherbot.net/confirm.php?ip=%s' % client.ip)
+            response = f.read().decode('utf-8')
             if not response == 'Error' and not response == 'False':
                 msg = '%s is confirmed to be %s!' % (client.name, response)
     except:
@@ -205,7 +204,7 @@ def escape(text, esc):
     :param esc: The character to escape
     :return: string
     """
-    return string.replace(text, esc, '\\%s' % esc)
+    return text.replace(esc, '\\%s' % esc)
 
 
 def decode(text):
@@ -291,14 +290,14 @@ def soundex(s1):
     """
     Return the soundex value to a string argument.
     """
-    ignore = "~!@#$%^&*()_+=-`[]\|;:'/?.,<>\" \t\f\v"
-    table = string.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', '01230120022455012623010202')
+    ignore = "~!@#$%^&*()_+=-`[]\\|;:'/?.,<>\" \t\f\v"
+    table = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', '01230120022455012623010202', ignore)
 
-    s1 = string.strip(string.upper(s1))
+    s1 = s1.upper().strip()
     if not s1:
         return "Z000"
     s2 = s1[0]
-    s1 = string.translate(s1.encode('ascii', 'ignore'), table, ignore)
+    s1 = s1.encode('ascii', 'ignore').decode('ascii').translate(table)
     if not s1:
         return "Z000"
     prev = s1[0]
@@ -335,6 +334,20 @@ def meanstdv(x):
     return mean, std
 
 
+def percentile(x, pct):
+    """
+    Return the given percentile of data x[] using the nearest-rank method.
+    :param x: A collection of numeric values
+    :param pct: The percentile to compute (0-100)
+    :return: The percentile value or 0 if x is empty
+    """
+    if not x:
+        return 0
+    data = sorted(x)
+    rank = int(round(pct / 100.0 * (len(data) - 1)))
+    return data[clamp(rank, 0, len(data) - 1)]
+
+
 def fuzzyGuidMatch(a, b):
     """
     Matches guid using the levenshtein distance if necessary,
@@ -0,0 +1,249 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Network core shared by the RCON protocols: a single asyncio event loop, run by one daemon thread, serves the
+connections of every game server of the process.
+
+Protocol modules subclass StreamConnection (TCP) or DatagramConnection (UDP) and implement the handle_* methods,
+which are called from the loop thread and must not block. The other threads (parser, plugins, crontabs) only use the
+thread-safe methods (send, close, wait_connected) or submit coroutines to the loop with NetworkCore.submit().
+"""
+
+__version__ = '1.0'
+
+import asyncio
+import logging
+import threading
+
+
+class NetworkCore(object):
+    """
+    Own the event loop and the thread running it. The thread is started by the first connection.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the loop thread if it is not running yet.
+        :return: The event loop
+        """
+        with self._lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(target=self.run, name='NetworkCore')
+                self.thread.daemon = True
+                self.thread.start()
+            return self.loop
+
+    def run(self):
+        """
+        Threaded code.
+        """
+        asyncio.set_event_loop(self.loop)
+        self.getLogger().info('start loop')
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+        self.getLogger().info('end loop')
+
+    def stop(self):
+        """
+        Stop the loop thread (the connections still opened are dropped).
+        """
+        with self._lock:
+            if self.thread is not None and self.thread.is_alive():
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                if not self.inLoopThread():
+                    self.thread.join(5)
+            self.thread = None
+
+    def inLoopThread(self):
+        """
+        Whether the caller is running in the loop thread.
+        """
+        return threading.current_thread() is self.thread
+
+    def call(self, func, *args):
+        """
+        Call a function from the loop thread: directly if the caller is the loop thread, else as soon as possible
+        (calls made by the same thread keep their order).
+        """
+        if self.inLoopThread():
+            func(*args)
+        else:
+            self.start().call_soon_threadsafe(func, *args)
+
+    def submit(self, coroutine):
+        """
+        Run a coroutine in the loop thread.
+        :return: A concurrent.futures.Future resolving to the coroutine result
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.start())
+
+    def getLogger(self):
+        return logging.getLogger('NetworkCore')
+
+
+core = NetworkCore()
+
+
+class Connection(object):
+    """
+    Base class of the connections served by the network core.
+    """
+    transport = None
+    connected = False
+
+    def __init__(self, host, port, netcore=None):
+        """
+        Object constructor: start connecting.
+        :param host: The game server host
+        :param port: The game server port
+        :param netcore: The NetworkCore serving the connection (default to the shared one)
+        """
+        self.host = host
+        self.port = port
+        self.netcore = netcore or core
+        self.closing = False
+        self._connecting = self.netcore.submit(self._connect())
+
+    def wait_connected(self, timeout=None):
+        """
+        Block until the connection is established or failed.
+        :return: Whether the connection is established
+        """
+        try:
+            self._connecting.result(timeout)
+        except Exception as err:
+            self.getLogger().debug('could not connect to %s:%s: %r' % (self.host, self.port, err))
+        return self.connected
+
+    def send(self, data):
+        """
+        Send data to the game server (thread-safe: data is written by the loop thread, in the order of the calls).
+        """
+        self.netcore.call(self._write, data)
+
+    def close(self):
+        """
+        Close the connection (thread-safe).
+        """
+        self.closing = True
+        self._connecting.cancel()
+        self.netcore.call(self._close)
+
+    def getLogger(self):
+        return logging.getLogger(self.__class__.__name__)
+
+    def handle_connect(self):
+        """
+        Called when the connection is established.
+        """
+        pass
+
+    def handle_close(self):
+        """
+        Called when the connection is closed, by either side.
+        """
+        pass
+
+    def _write(self, data):
+        if self.transport is None:
+            self.getLogger().warning('dropping %s bytes: not connected' % len(data))
+        else:
+            self._transportWrite(data)
+
+    def _transportWrite(self, data):
+        raise NotImplementedError
+
+    def _close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+    async def _connect(self):
+        raise NotImplementedError
+
+    def connection_made(self, transport):
+        self.transport = transport
+        if self.closing:
+            transport.close()
+            return
+        self.connected = True
+        self.handle_connect()
+
+    def connection_lost(self, exc):
+        self.transport = None
+        self.connected = False
+        self.handle_close()
+
+
+class StreamConnection(Connection, asyncio.Protocol):
+    """
+    TCP connection: received data is passed to handle_data() as it arrives.
+    """
+
+    def handle_data(self, data):
+        """
+        Called with the bytes received from the game server.
+        """
+        pass
+
+    def data_received(self, data):
+        self.handle_data(data)
+
+    def _transportWrite(self, data):
+        self.transport.write(data)
+
+    async def _connect(self):
+        await self.netcore.loop.create_connection(lambda: self, self.host, self.port)
+
+
+class DatagramConnection(Connection, asyncio.DatagramProtocol):
+    """
+    Connected UDP socket: every received datagram is passed to handle_datagram().
+    """
+
+    def handle_datagram(self, data):
+        """
+        Called with every datagram received from the game server.
+        """
+        pass
+
+    def handle_error(self, err):
+        """
+        Called when sending or receiving failed (i.e: ICMP port unreachable).
+        """
+        self.getLogger().debug('network error: %r' % err)
+
+    def datagram_received(self, data, addr):
+        self.handle_datagram(data)
+
+    def error_received(self, exc):
+        self.handle_error(exc)
+
+    def _transportWrite(self, data):
+        self.transport.sendto(data)
+
+    async def _connect(self):
+        await self.netcore.loop.create_datagram_endpoint(lambda: self, remote_addr=(self.host, self.port))
@@ -26,12 +26,15 @@
 # 21/07/2014 - 1.7   - Fenix     - syntax cleanup
 # 04/02/2015 - 1.7.1 - Fenix     - getInstance() now accepts an optional 'logsize' parameter (amount of bytes of the log file)
 # 04/07/2015 - 1.7.2 - Fenix     - changed log formatter to keep the same width for log levels
+# 18/10/2026 - 1.8   - agent     - added the asynchronous log modes: log records are written by a background thread
 
 __author__ = 'ThorN'
-__version__ = '1.7.2'
+__version__ = '1.8'
 
 import logging
+import queue
 import sys
+import threading
 from logging import CRITICAL, ERROR, INFO, WARNING, DEBUG
 from logging import handlers
 
@@ -57,6 +60,9 @@ logging._srcfile = None
 # logger object instance
 __output = None
 
+# log modes accepted by getInstance()
+LOG_MODES = ('default', 'async', 'async_drop')
+
 
 class OutputHandler(logging.Logger):
 
@@ -80,25 +86,29 @@ class OutputHandler(logging.Logger):
         """
         Log 'msg % args' with severity 'CONSOLE'.
         """
-        self.log(CONSOLE, msg, *args, **kwargs)
+        if self.isEnabledFor(CONSOLE):
+            self._log(CONSOLE, msg, args, **kwargs)
 
     def bot(self, msg, *args, **kwargs):
         """
         Log 'msg % args' with severity 'BOT'.
         """
-        self.log(BOT, msg, *args, **kwargs)
+        if self.isEnabledFor(BOT):
+            self._log(BOT, msg, args, **kwargs)
 
     def verbose(self, msg, *args, **kwargs):
         """
         Log 'msg % args' with severity 'VERBOSE'.
         """
-        self.log(VERBOSE, msg, *args, **kwargs)
+        if self.isEnabledFor(VERBOSE):
+            self._log(VERBOSE, msg, args, **kwargs)
 
     def verbose2(self, msg, *args, **kwargs):
         """
         Log 'msg % args' with severity 'VERBOSE2'.
         """
-        self.log(VERBOSE2, msg, *args, **kwargs)
+        if self.isEnabledFor(VERBOSE2):
+            self._log(VERBOSE2, msg, args, **kwargs)
 
     def raiseError(self, raiseError, msg, *args, **kwargs):
         """
@@ -149,22 +159,166 @@ class STDErrLogger:
         self.logger.error('STDERR %r' % msg)
 
 
+class AsyncHandler(logging.Handler):
+    """
+    A handler which queues the log records and writes them to the wrapped handlers from a background thread, in
+    batches: the threads logging messages don't wait for the disk (nor the log rotation) anymore.
+
+    Messages are formatted in the logging thread, since their arguments may change before the writer thread gets to
+    them. When the queue is full, records are either dropped (the amount of dropped records is logged as soon as the
+    writer catches up) or the logging thread waits for the writer.
+    """
+    _stop_token = object()
+
+    def __init__(self, targets, queuesize=10000, drop=False, batchsize=500):
+        """
+        Object constructor.
+        :param targets: The list of handlers writing the log records
+        :param queuesize: The maximum amount of records waiting to be written
+        :param drop: Whether to drop records when the queue is full instead of waiting
+        :param batchsize: The maximum amount of records written at once
+        """
+        logging.Handler.__init__(self)
+        self.targets = targets
+        self.drop = drop
+        self.batchsize = batchsize
+        self.dropped = 0
+        self._droppedLock = threading.Lock()
+        self.queue = queue.Queue(queuesize)
+        self.thread = threading.Thread(target=self.run, name='LogWriter')
+        self.thread.daemon = True
+        self.thread.start()
+
+    @staticmethod
+    def prepare(record):
+        """
+        Merge the message arguments and the exception traceback in the record message.
+        """
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        """
+        Queue a record.
+        """
+        try:
+            record = self.prepare(record)
+            if self.drop or threading.current_thread() is self.thread:
+                # the writer thread logs handler errors through STDErrLogger: never wait for itself
+                try:
+                    self.queue.put_nowait(record)
+                except queue.Full:
+                    with self._droppedLock:
+                        self.dropped += 1
+            else:
+                self.queue.put(record)
+        except Exception:
+            self.handleError(record)
+
+    def run(self):
+        """
+        Writer thread.
+        """
+        while True:
+            records = [self.queue.get(True)]
+            while len(records) < self.batchsize:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = self._stop_token in records
+            if stop:
+                records.remove(self._stop_token)
+            with self._droppedLock:
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                records.insert(0, logging.makeLogRecord({'name': 'output', 'levelno': WARNING,
+                                                         'levelname': logging.getLevelName(WARNING),
+                                                         'msg': 'log queue full: %s log messages dropped' % dropped}))
+            for target in self.targets:
+                try:
+                    self.write(target, records)
+                except Exception:
+                    target.handleError(records[-1])
+            for _ in range(len(records) - (1 if dropped else 0) + (1 if stop else 0)):
+                self.queue.task_done()
+            if stop:
+                break
+
+    @staticmethod
+    def write(target, records):
+        """
+        Write the given records with the given handler.
+        Stream handlers get the whole batch in a single write (and rollover check).
+        """
+        records = [x for x in records if x.levelno >= target.level and target.filter(x)]
+        if not records:
+            return
+        if not isinstance(target, logging.StreamHandler):
+            for record in records:
+                target.handle(record)
+            return
+        target.acquire()
+        try:
+            text = ''.join('%s%s' % (target.format(x), target.terminator) for x in records)
+            if isinstance(target, handlers.RotatingFileHandler):
+                if target.stream is None:
+                    target.stream = target._open()
+                if target.maxBytes > 0:
+                    target.stream.seek(0, 2)
+                    if target.stream.tell() + len(text) >= target.maxBytes:
+                        target.doRollover()
+            target.stream.write(text)
+            target.flush()
+        except Exception:
+            target.handleError(records[-1])
+        finally:
+            target.release()
+
+    def flush(self):
+        """
+        Wait for the records already queued to be written.
+        """
+        if self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.queue.join()
+
+    def close(self):
+        """
+        Write the records already queued, stop the writer thread and close the wrapped handlers.
+        """
+        if self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.queue.put(self._stop_token)
+            self.thread.join()
+        for target in self.targets:
+            target.close()
+        logging.Handler.close(self)
+
+
 logging.setLoggerClass(OutputHandler)
 
 
-def getInstance(logfile='b311.log', loglevel=21, logsize=10485760, log2console=False):
+def getInstance(logfile='b311.log', loglevel=21, logsize=10485760, log2console=False, logmode='default',
+                logqueuesize=10000):
     """
     Return a Logger instance.
     :param logfile: The logfile name.
     :param loglevel: The logging level.
     :param logsize: The size of the log file (in bytes)
     :param log2console: Whether or not to extend logging to the console.
+    :param logmode: 'default' to write log records in the logging thread, 'async' to write them from a background
+    thread (waiting when more than logqueuesize records are queued) or 'async_drop' (dropping them instead)
+    :param logqueuesize: The maximum amount of log records waiting to be written in the asynchronous log modes
     """
     global __output
 
     if __output is None:
 
         __output = logging.getLogger('output')
+        targets = []
 
         # FILE HANDLER
         file_formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)r', '%y%m%d %H:%M:%S')
@@ -172,7 +326,7 @@ def getInstance(logfile='b311.log', loglevel=21, logsize=10485760, log2console=F
         handler.doRollover()
         handler.setFormatter(file_formatter)
 
-        __output.addHandler(handler)
+        targets.append(handler)
 
         if log2console:
             # CONSOLE HANDLER
@@ -180,13 +334,19 @@ def getInstance(logfile='b311.log', loglevel=21, logsize=10485760, log2console=F
             handler2 = logging.StreamHandler(sys.stdout)
             handler2.setFormatter(console_formatter)
 
-            __output.addHandler(handler2)
+            targets.append(handler2)
 
             handler_error = logging.StreamHandler(sys.stderr)
             handler_error.setFormatter(console_formatter)
             handler_error.setLevel(logging.ERROR)
 
-            __output.addHandler(handler_error)
+            targets.append(handler_error)
+
+        if logmode in ('async', 'async_drop'):
+            __output.addHandler(AsyncHandler(targets, logqueuesize, drop=logmode == 'async_drop'))
+        else:
+            for target in targets:
+                __output.addHandler(target)
 
         __output.setLevel(loglevel)
 
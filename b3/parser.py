@@ -3,12 +3,14 @@ import datetime
 import glob
 import imp
 import os
+import queue
 import re
 import socket
 import sys
 import time
 import _thread
 from collections import OrderedDict
+from concurrent.futures import Future
 from textwrap import TextWrapper
 from traceback import extract_tb
 
@@ -16,8 +18,10 @@ import b311.lib.dateutil.tz
 from configparser import NoOptionError
 
 import b311
+import b311.coalescer
 import b311.config
 import b311.cron
+import b311.dispatcher
 import b311.events
 import b311.game
 import b311.output
@@ -49,7 +53,10 @@ class Parser(object):
 
     _commands = {}  # will hold RCON commands for the current game
     _cron = None  # cron instance
+    _damageCoalescer = None  # damage event coalescer (only used when 'damage_coalescing' is set)
     _events = {}  # available events (K=>EVENT)
+    _eventDispatchModes = ('default', 'lowlatency', 'parallel')  # supported event dispatch modes
+    _dispatcher = None  # asynchronous plugin event dispatcher (only used in 'parallel' dispatch mode)
     _eventNames = {}  # available event names (K=>NAME)
     _eventsStats_cronTab = None  # crontab used to log event statistics
     _handlers = {}  # event handlers
@@ -76,6 +83,8 @@ class Parser(object):
     config = None  # parser configuration file instance
     delay = 0.33  # time between each game log lines fetching
     delay2 = 0.02  # time between each game log line processing: max number of lines processed in one second
+    eventDispatch = 'default'  # event dispatch mode: 'default', 'lowlatency' or 'parallel'
+    indexClientState = True  # whether the clients are indexed by state (False if Client.state is read from the server)
     encoding = 'latin-1'
     game = None
     gameName = None  # console name
@@ -187,8 +196,20 @@ class Parser(object):
         except (TypeError, NoOptionError):
             logsize = b311.functions.getBytes('10MB')
 
+        logmode = 'default'
+        if self.config.has_option('b311', 'log_mode'):
+            logmode = self.config.get('b311', 'log_mode').strip().lower()
+
+        try:
+            logqueuesize = self.config.getint('b311', 'log_queue_size')
+        except (ValueError, NoOptionError):
+            logqueuesize = 10000
+
         # create the main logger instance
-        self.log = b311.output.getInstance(logfile, self.config.getint('b311', 'log_level'), logsize, log2console)
+        self.log = b311.output.getInstance(logfile, self.config.getint('b311', 'log_level'), logsize, log2console,
+                                           logmode, logqueuesize)
+        if logmode not in b311.output.LOG_MODES:
+            self.warning("Unknown log mode '%s': using 'default'", logmode)
 
         # save screen output to self.screen
         self.screen = sys.stdout
@@ -401,7 +422,30 @@ class Parser(object):
             self.warning(err)
 
         self.debug("Creating the event queue with size %s", queuesize)
-        self.queue = Queue.Queue(queuesize)
+        self.queue = queue.Queue(queuesize)
+
+        if self.config.has_option('b311', 'event_dispatch'):
+            dispatch = self.config.get('b311', 'event_dispatch').strip().lower()
+            if dispatch in self._eventDispatchModes:
+                self.eventDispatch = dispatch
+            else:
+                self.warning("Unknown event dispatch mode '%s': using '%s'", dispatch, self.eventDispatch)
+
+        self.bot("Event dispatch mode: %s", self.eventDispatch)
+        if self.eventDispatch == 'parallel':
+            self._dispatcher = b311.dispatcher.EventDispatcher(self)
+
+        try:
+            window = self.config.getint('b311', 'damage_coalescing')
+        except NoOptionError:
+            window = 0
+        except ValueError as err:
+            window = 0
+            self.warning(err)
+
+        if window > 0:
+            self.bot("Damage events coalesced every %sms for the plugins accepting them", window)
+            self._damageCoalescer = b311.coalescer.DamageCoalescer(self, window / 1000.0)
 
         atexit.register(self.shutdown)
 
@@ -414,9 +458,15 @@ class Parser(object):
 
     def _dumpEventsStats(self):
         """
-        Dump event statistics into the B3 log file.
+        Dump event and crontab statistics into the B3 log file.
         """
         self._eventsStats.dumpStats()
+        if self._dispatcher:
+            self._dispatcher.dumpStats()
+        if self._damageCoalescer:
+            self._damageCoalescer.dumpStats()
+        if self._cron:
+            self._cron.dumpStats()
 
     def start(self):
         """
@@ -433,7 +483,7 @@ class Parser(object):
         self.bot("All plugins started")
         self.pluginsStarted()
         self.bot("Starting event dispatching thread")
-        thread.start_new_thread(self.handleEvents, ())
+        _thread.start_new_thread(self.handleEvents, ())
         self.bot("Start reading game events")
         self.run()
 
@@ -1144,7 +1194,8 @@ class Parser(object):
                             except Exception as msg:
                                 self.error('Could not parse line %s: %s', msg, extract_tb(sys.exc_info()[2]))
 
-                            time.sleep(self.delay2)
+                            if self.eventDispatch == 'default':
+                                time.sleep(self.delay2)
 
             time.sleep(self.delay)
 
@@ -1186,22 +1237,34 @@ class Parser(object):
 
     def queueEvent(self, event, expire=10):
         """
-        QueEvents.gevent for processing.
+        Queue an event for processing.
+        Events are consumed by a single handler thread from a FIFO queue, so the order in which they are
+        queued is the order in which plugins will see them: in 'lowlatency' and 'parallel' dispatch modes we
+        rely on this alone and do not sleep before queueing.
         """
         if not hasattr(event, 'type'):
             return False
         elif event.type in self._handlers:  # queue only if there are handlers to listen for this event
-            self.verbose('Queueing event %s : %s', self.getEventName(event.type), event.data)
-            try:
-                time.sleep(0.001)  # wait a bit so event doesnt get jumbled
-                self.queue.put((self.time(), self.time() + expire, event), True, 2)
-                return True
-            except Queue.Full:
-                self.error('**** Event queue was full (%s)', self.queue.qsize())
-                return False
+            if self._damageCoalescer and not self._damageCoalescer.filter(event):
+                return True  # merged into a damage summary which will be queued later
+            return self.putEvent(event, expire)
 
         return False
 
+    def putEvent(self, event, expire=10):
+        """
+        Put an event in the event queue.
+        """
+        self.verbose('Queueing event %s : %s', self.getEventName(event.type), event.data)
+        try:
+            if self.eventDispatch == 'default':
+                time.sleep(0.001)  # wait a bit so event doesnt get jumbled
+            self.queue.put((time.time(), self.time() + expire, event), True, 2)
+            return True
+        except queue.Full:
+            self.error('**** Event queue was full (%s)', self.queue.qsize())
+            return False
+
     def handleEvents(self):
         """
         Event handler thread.
@@ -1212,34 +1275,29 @@ class Parser(object):
                 self.working = False
 
             event_name = self.getEventName(event.type)
-            self._eventsStats.add_event_wait((self.time() - added) * 1000)
+            self._eventsStats.add_event_wait((time.time() - added) * 1000)
+            self._eventsStats.add_queue_size(self.queue.qsize())
             if self.time() >= expire:  # events can only sit in the queue until expire time
                 self.error('**** Event sat in queue too long: %s %s', event_name, self.time() - expire)
             else:
-                nomore = False
+                coalescer = self._damageCoalescer
                 for hfunc in self._handlers[event.type]:
                     if not hfunc.isEnabled():
                         continue
-                    elif nomore:
+                    if coalescer and not coalescer.accepts(hfunc, event):
+                        continue
+                    if self._dispatcher and not hfunc.synchronousDispatch:
+                        self._dispatcher.dispatch(hfunc, event, event_name)
+                        continue
+                    if not self.handleEvent(hfunc, event, event_name):
                         break
 
-                    self.verbose('Parsing event: %s: %s', event_name, hfunc.__class__.__name__)
-                    timer_plugin_begin = time.clock()
-                    try:
-                        hfunc.parseEvent(event)
+                    if self.eventDispatch == 'default':
                         time.sleep(0.001)
-                    except b311.events.VetoEvent:
-                        # plugin called for event hault, do not continue processing
-                        self.bot('Event %s vetoed by %s', event_name, str(hfunc))
-                        nomore = True
-                    except SystemExit as e:
-                        self.exitcode = e.code
-                    except Exception as msg:
-                        self.error('Handler %s could not handle event %s: %s: %s %s', hfunc.__class__.__name__,
-                                   event_name, msg.__class__.__name__, msg, extract_tb(sys.exc_info()[2]))
-                    finally:
-                        elapsed = time.clock() - timer_plugin_begin
-                        self._eventsStats.add_event_handled(hfunc.__class__.__name__, event_name, elapsed * 1000)
+
+        if self._dispatcher:
+            self.bot('Waiting for plugins to handle pending events')
+            self._dispatcher.stop(timeout=10)
 
         self.bot('Shutting down event handler')
 
@@ -1247,6 +1305,32 @@ class Parser(object):
         if self.exiting.locked():
             self.exiting.release()
 
+    def handleEvent(self, hfunc, event, event_name):
+        """
+        Dispatch a single event to a single plugin.
+        :param hfunc: The plugin which is going to handle the event
+        :param event: The event to be dispatched
+        :param event_name: The event name (used for logging and statistics)
+        :return: False if the plugin vetoed the event, True otherwise
+        """
+        self.verbose('Parsing event: %s: %s', event_name, hfunc.__class__.__name__)
+        timer_plugin_begin = time.perf_counter()
+        try:
+            hfunc.parseEvent(event)
+        except b311.events.VetoEvent:
+            # plugin called for event hault, do not continue processing
+            self.bot('Event %s vetoed by %s', event_name, str(hfunc))
+            return False
+        except SystemExit as e:
+            self.exitcode = e.code
+        except Exception as msg:
+            self.error('Handler %s could not handle event %s: %s: %s %s', hfunc.__class__.__name__,
+                       event_name, msg.__class__.__name__, msg, extract_tb(sys.exc_info()[2]))
+        finally:
+            elapsed = time.perf_counter() - timer_plugin_begin
+            self._eventsStats.add_event_handled(hfunc.__class__.__name__, event_name, elapsed * 1000)
+        return True
+
     def write(self, msg, maxRetries=None, socketTimeout=None):
         """
         Write a message to Rcon/Console
@@ -1266,6 +1350,25 @@ class Parser(object):
             self.output.flush()
             return res
 
+    def writeAsync(self, msg, expectReply=None, maxRetries=None, socketTimeout=None):
+        """
+        Write a message to Rcon/Console without blocking the caller.
+        Output classes not supporting pipelining will send the message synchronously.
+        :param msg: The message to be sent to Rcon/Console
+        :param expectReply: Whether the reply is needed (let the output class decide when not specified)
+        :return: A concurrent.futures.Future resolving to the reply
+        """
+        if hasattr(self.output, 'writeAsync'):
+            return self.output.writeAsync(msg, expectReply=expectReply, maxRetries=maxRetries,
+                                          socketTimeout=socketTimeout)
+
+        future = Future()
+        try:
+            future.set_result(self.write(msg, maxRetries=maxRetries, socketTimeout=socketTimeout))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
     def __read_input(self, game_log):
         """
         Read lines from the log file
@@ -1314,6 +1417,8 @@ class Parser(object):
                 if self._cron:
                     self.bot('Stopping cron')
                     self._cron.stop()
+                if self._damageCoalescer:
+                    self._damageCoalescer.stop()
                 if self.storage:
                     self.bot('Shutting down database connection')
                     self.storage.shutdown()
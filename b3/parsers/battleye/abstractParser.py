@@ -59,6 +59,7 @@
 #                     - correct capitalization in _use_color_codes
 # 16/04/2015 - 1.3.3  - uniform class variables (dict -> variable)
 #                     - implement missing abstract class methods
+# 18/10/2026 - 1.4    - sync() and authorizeClients() authorize all the new clients at once
 
 import re
 import sys
@@ -84,7 +85,7 @@ from b311.parsers.battleye.protocol import CommandFailedError
 from b311.parsers.battleye.rcon import Rcon as BattleyeRcon
 
 __author__ = '82ndab-Bravo17, Courgette'
-__version__ = '1.3.3'
+__version__ = '1.4'
 
 # disable the authorizing timer that come by default with the b311.clients.Clients class
 Clients.authorizeClients = lambda *args, **kwargs: None
@@ -497,11 +498,13 @@ class AbstractParser(b311.parser.Parser):
         self.debug('getCommand: %s', result)
         return result
 
-    def getClient(self, name, guid=None, cid=None, ip='', auth=True):
+    def getClient(self, name, guid=None, cid=None, ip='', auth=True, delayAuth=False):
         """
         Get a connected client from storage or create it
         B3 CID   <--> cid
         B3 GUID  <--> guid
+        When delayAuth is True, a newly created client is not authorized: it must then be given to
+        Clients.authClients() along with the other clients created.
         """
         client = None
         if guid:
@@ -513,7 +516,7 @@ class AbstractParser(b311.parser.Parser):
         if auth and not client and cid and name:
             if cid == 'Server':
                 return self.clients.newClient('Server', guid='Server', name='Server', hide=True)
-            client = self.clients.newClient(cid, guid=guid, name=name, ip=ip)
+            client = self.clients.newClient(cid, auth=not delayAuth, guid=guid, name=name, ip=ip)
         return client
 
     def getTeam(self, team):
@@ -812,9 +815,10 @@ class AbstractParser(b311.parser.Parser):
 
     def authorizeClients(self):
         """
-        Authorise clients from player list
+        Authorise clients from player list: clients are normally authorized as soon as their guid is
+        known, this authorizes all at once the clients left with a guid but not authorized yet.
         """
-        pass  # no need in this game as we always know player guid and verified status
+        self.clients.authClients([c for c in self.clients.getList() if c.guid and not c.authed])
 
     def sync(self):
         """
@@ -825,6 +829,7 @@ class AbstractParser(b311.parser.Parser):
         """
         plist = self.getPlayerList()
         mlist = {}
+        created = []
         for cid, c in plist.iteritems():
             client = self.clients.getByCID(cid)
             c_guid = c.get('guid', None)
@@ -852,19 +857,24 @@ class AbstractParser(b311.parser.Parser):
                     c_verified = c.get('verified', None)
                     c_ip = c.get('ip', None)
                     if c_verified == 'OK' or self._useunverifiedguid:
-                        cl = self.getClient(c['name'], guid=c_guid, cid=c['cid'], ip=c_ip)
+                        cl = self.getClient(c['name'], guid=c_guid, cid=c['cid'], ip=c_ip, delayAuth=True)
                     elif c_ip:
                         # case where guid is not verified but as we have an IP we can try to verify it ourselves
                         client_matches = self.storage.getClientsMatching({'guid': c_guid, 'ip': c_ip})
                         if len(client_matches) == 1:
                             # assume that guid is OK as it matches a known client entry in database with that same IP
-                            cl = self.getClient(c['name'], guid=c_guid, cid=c['cid'], ip=c_ip)
+                            cl = self.getClient(c['name'], guid=c_guid, cid=c['cid'], ip=c_ip, delayAuth=True)
                         else:
                             cl = self.getClient(c['name'], guid=None, cid=c['cid'], ip=c_ip)
                     else:
                         cl = self.getClient(c['name'], guid=None, cid=c['cid'], ip=c_ip)
                 if cl:
                     mlist[cid] = cl
+                    if not cl.authed:
+                        created.append(cl)
+
+        # lookup all the new clients in the storage at once
+        self.clients.authClients(created)
 
         # now we need to remove any players that have left
         if self.clients:
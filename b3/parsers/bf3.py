@@ -36,6 +36,7 @@
 #        - correctly initialize class attributes
 # 1.11   - syntax cleanup
 # 1.12   - make use of dict comprehension to generate map/gamemode dictionaries
+# 1.13   - ported to python 3
 
 import threading
 from time import sleep
@@ -48,7 +49,7 @@ from b311.parsers.frostbite2.protocol import CommandFailedError
 from b311.parsers.frostbite2.util import PlayerInfoBlock
 
 __author__ = 'Courgette'
-__version__ = '1.12'
+__version__ = '1.13'
 
 BF3_REQUIRED_VERSION = 1149977
 
@@ -441,6 +442,7 @@ GUNMASTER_WEAPONS_PRESET_BY_NAME = {x[0]: x[1] for x in GUNMASTER_WEAPONS_PRESET
 
 class Bf3Parser(AbstractParser):
     gameName = 'bf3'
+    indexClientState = False  # Client.state is read from the game server (see patch_b3_Client_isAlive)
 
     _gameServerVars = (
         '3dSpotting',
@@ -525,7 +527,7 @@ class Bf3Parser(AbstractParser):
         AbstractParser.pluginsStarted(self)
         self.info('Connecting all players...')
         plist = self.getPlayerList()
-        for cid, p in plist.iteritems():
+        for cid, p in plist.items():
             client = self.clients.getByCID(cid)
             if not client:
                 self.debug('Client %s found on the server' % cid)
@@ -724,7 +726,7 @@ class Bf3Parser(AbstractParser):
         Return a list of supported levels for the current game mod.
         """
         # TODO : remove this method once the method on from AbstractParser is working
-        return MAP_NAME_BY_ID.keys()
+        return list(MAP_NAME_BY_ID.keys())
 
     def getSupportedGameModesByMapId(self, map_id):
         """
@@ -926,7 +928,7 @@ class Bf3Parser(AbstractParser):
                     return False
             except IndexError:
                 pass
-            except CommandFailedError, err:
+            except CommandFailedError as err:
                 if err.message[0] == 'InvalidPlayerName':
                     pass
                 else:
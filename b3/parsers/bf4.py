@@ -18,6 +18,7 @@
 #
 # CHANGELOG
 #
+# 1.1.4 - ported to python 3
 # 1.1.3 - make use of dict comprehension to generate map/gamemode dictionaries
 # 1.1.2 - update to server version R46
 #       - add DLC4 (Final Stand) map pack
@@ -44,7 +45,7 @@ from b311.parsers.frostbite2.protocol import CommandFailedError
 from b311.parsers.frostbite2.util import PlayerInfoBlock
 
 __author__ = 'Courgette, ozon, Dwarfer'
-__version__ = '1.1.3'
+__version__ = '1.1.4'
 
 BF4_REQUIRED_VERSION = 155011
 
@@ -500,6 +501,7 @@ COMROSE_CHAT_NAME_BY_ID = {
 
 class Bf4Parser(AbstractParser):
     gameName = 'bf4'
+    indexClientState = False  # Client.state is read from the game server (see patch_b3_Client_properties)
 
     _gamePort = None
 
@@ -603,7 +605,7 @@ class Bf4Parser(AbstractParser):
         AbstractParser.pluginsStarted(self)
         self.info('Connecting all players...')
         plist = self.getPlayerList()
-        for cid, p in plist.iteritems():
+        for cid, p in plist.items():
             self.getClient(cid)
 
     ####################################################################################################################
@@ -856,7 +858,7 @@ class Bf4Parser(AbstractParser):
         Return a list of supported levels for the current game mod.
         """
         # TODO : remove this method once the method on from AbstractParser is working
-        return MAP_NAME_BY_ID.keys()
+        return list(MAP_NAME_BY_ID.keys())
 
     def getSupportedGameModesByMapId(self, map_id):
         """
@@ -984,7 +986,7 @@ class Bf4Parser(AbstractParser):
         # If this fails, we use the old method and get the map name from the server vars.
         try:
             return self.write(('currentLevel',))[0]
-        except CommandFailedError, err:
+        except CommandFailedError as err:
             self.warning(err)
             self.getServerInfo()
             return self.game.mapName
@@ -1097,7 +1099,7 @@ class Bf4Parser(AbstractParser):
                         return False
             except IndexError:
                 pass
-            except CommandFailedError, err:
+            except CommandFailedError as err:
                 if err.message[0] == 'InvalidPlayerName':
                     pass
                 else:
@@ -24,6 +24,7 @@
 #                                  - removed EVT_CLIENT_COMROSE and EVT_CLIENT_DISCONNECT_REASON
 # 2015-04-13 - 0.2 - Thomas LEVEIL - adjust BFH_REQUIRED_VERSION
 #                                  - fix map recognition
+# 2026-10-18 - 0.3 - agent         - ported to python 3
 
 import csv
 import sys
@@ -39,7 +40,7 @@ from b311.parsers.frostbite2.protocol import CommandFailedError
 from b311.parsers.frostbite2.util import PlayerInfoBlock
 
 __author__ = 'Thomas LEVEIL, Fenix'
-__version__ = '0.2'
+__version__ = '0.3'
 
 csv.register_dialect('dice', delimiter=';', quoting=csv.QUOTE_NONE)
 
@@ -160,6 +161,7 @@ GAME_MODES_BY_MAP_ID = dict([(x['Engine name'].lower(), x['Game modes,,,,,,,,,']
 
 class BfhParser(AbstractParser):
     gameName = 'bfh'
+    indexClientState = False  # Client.state is read from the game server (see patch_b3_client_properties)
 
     _gamePort = None
 
@@ -257,7 +259,7 @@ class BfhParser(AbstractParser):
         AbstractParser.pluginsStarted(self)
         self.info('Connecting all players...')
         plist = self.getPlayerList()
-        for cid, p in plist.iteritems():
+        for cid, p in plist.items():
             self.getClient(cid)
 
     ####################################################################################################################
@@ -496,7 +498,7 @@ class BfhParser(AbstractParser):
         Return a list of supported levels for the current game mod.
         """
         # TODO : remove this method once the method on from AbstractParser is working
-        return MAP_NAME_BY_ID.keys()
+        return list(MAP_NAME_BY_ID.keys())
 
     def getSupportedGameModesByMapId(self, map_id):
         """
@@ -627,7 +629,7 @@ class BfhParser(AbstractParser):
         # If this fails, we use the old method and get the map name from the server vars.
         try:
             return self.write(('currentLevel',))[0]
-        except CommandFailedError, err:
+        except CommandFailedError as err:
             self.warning(err)
             self.getServerInfo()
             return self.game.mapName
@@ -748,7 +750,7 @@ class BfhParser(AbstractParser):
                         return False
             except IndexError:
                 pass
-            except CommandFailedError, err:
+            except CommandFailedError as err:
                 if err.message[0] == 'InvalidPlayerName':
                     pass
                 else:
@@ -43,14 +43,15 @@
 # 2010/10/23 - 2.0    - Courgette - refactor to make this module generic for all frostbite games
 # 2014/08/05 - 2.1    - Fenix     - syntax cleanup
 #                                 - do not raise FrostbiteConnection since it's not an exception class
+# 2026/10/18 - 2.2    - agent     - keep received data in a protocol.PacketBuffer
+# 2026/10/18 - 2.3    - agent     - ported the except clauses to python 3
 
 __author__ = 'Courgette'
-__version__ = '2.1'
+__version__ = '2.3'
 
 debug = True
 
 import socket
-import string
 
 import b311.parsers.frostbite.protocol as protocol
 
@@ -96,7 +97,7 @@ class FrostbiteConnection(object):
         try:
             self._connect()
             self._auth()
-        except socket.error, detail:
+        except socket.error as detail:
             raise FrostbiteNetworkException('cannot create FrostbiteConnection: %s' % detail)
 
     def __del__(self):
@@ -108,7 +109,7 @@ class FrostbiteConnection(object):
         """
         try:
             self.console.debug('opening FrostbiteConnection socket')
-            self._receiveBuffer = ''
+            self._receiveBuffer = protocol.PacketBuffer()
             self._serverSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self._serverSocket.connect((self._host, self._port))
         except Exception as err:
@@ -149,7 +150,7 @@ class FrostbiteConnection(object):
         try:
             self._serverSocket.sendall(request)
             [response, self._receiveBuffer] = protocol.receivePacket(self._serverSocket, self._receiveBuffer)
-        except socket.error, detail:
+        except socket.error as detail:
             raise FrostbiteNetworkException(detail)
 
         if response is None:
@@ -176,9 +177,9 @@ class FrostbiteConnection(object):
             raise FrostbiteException("Could not retrieve salt")
 
         # given the salt and the password, combine them and compute hash value
-        salt = words[1].decode("hex")
+        salt = bytes.fromhex(words[1])
         passwordHash = protocol.generatePasswordHash(salt, self._password)
-        passwordHashHexString = string.upper(passwordHash.encode("hex"))
+        passwordHashHexString = passwordHash.hex().upper()
 
         # send password hash to server
         loginResponse = self.sendRequest("login.hashed", passwordHashHexString)
@@ -226,7 +227,7 @@ class FrostbiteConnection(object):
                     self.printPacket(protocol.DecodePacket(request))
                     self._serverSocket.sendall(request)
                     timeout_counter = 0
-            except socket.error, detail:
+            except socket.error as detail:
                 raise FrostbiteNetworkException('readEvent: %r' % detail)
 
         try:
@@ -246,7 +247,7 @@ class FrostbiteConnection(object):
 
             try:
                 self._serverSocket.sendall(response)
-            except socket.error, detail:
+            except socket.error as detail:
                 self.console.warning("in readEvent while sending response OK to server : %s" % detail)
 
             return words
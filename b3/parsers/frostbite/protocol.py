@@ -20,12 +20,21 @@
 #
 # 2010/07/23 - xlr8or - 1.0.1 - fixed infinite loop in a python socket thread in receive_packet() on gameserver restart
 # 2014/08/05 - Fenix  - 1.1   - syntax cleanup
-
-__version__ = '1.1'
-
-import socket
-
-from struct import *
+# 2026/10/18 - agent  - 1.2   - use the Frostbite2 packet codec (PacketBuffer based receivePacket)
+
+__version__ = '1.2'
+
+from b311.parsers.frostbite2.codec import DecodeHeader
+from b311.parsers.frostbite2.codec import DecodeInt32
+from b311.parsers.frostbite2.codec import DecodePacket
+from b311.parsers.frostbite2.codec import DecodeWords
+from b311.parsers.frostbite2.codec import EncodeHeader
+from b311.parsers.frostbite2.codec import EncodeInt32
+from b311.parsers.frostbite2.codec import EncodePacket
+from b311.parsers.frostbite2.codec import EncodeWords
+from b311.parsers.frostbite2.codec import PacketBuffer
+from b311.parsers.frostbite2.codec import containsCompletePacket
+from b311.parsers.frostbite2.codec import receivePacket
 
 try:
     from hashlib import md5 as newmd5
@@ -34,79 +43,6 @@ except ImportError:
     from md5 import new as newmd5
 
 
-def EncodeHeader(isFromServer, isResponse, sequence):
-    header = sequence & 0x3fffffff
-    if isFromServer:
-        header += 0x80000000
-    if isResponse:
-        header += 0x40000000
-    return pack('<I', header)
-
-
-def DecodeHeader(data):
-    [header] = unpack('<I', data[0: 4])
-    return [header & 0x80000000, header & 0x40000000, header & 0x3fffffff]
-
-
-def EncodeInt32(size):
-    return pack('<I', size)
-
-
-def DecodeInt32(data):
-    return unpack('<I', data[0: 4])[0]
-
-
-def EncodeWords(words):
-    size = 0
-    encodedWords = ''
-    for word in words:
-        strWord = str(word)
-        encodedWords += EncodeInt32(len(strWord))
-        encodedWords += strWord
-        encodedWords += '\x00'
-        size += len(strWord) + 5
-
-    return size, encodedWords
-
-
-def DecodeWords(size, data):
-    numWords = DecodeInt32(data[0:])
-    words = []
-    offset = 0
-    while offset < size:
-        wordLen = DecodeInt32(data[offset: offset + 4])
-        word = data[offset + 4: offset + 4 + wordLen]
-        words.append(word)
-        offset += wordLen + 5
-
-    return words
-
-
-def EncodePacket(isFromServer, isResponse, sequence, words):
-    encodedHeader = EncodeHeader(isFromServer, isResponse, sequence)
-    encodedNumWords = EncodeInt32(len(words))
-    [wordsSize, encodedWords] = EncodeWords(words)
-    encodedSize = EncodeInt32(wordsSize + 12)
-    return encodedHeader + encodedSize + encodedNumWords + encodedWords
-
-
-def DecodePacket(data):
-    """
-    Decode a request or response packet.
-    Return format is:
-    [is_from_server, is_response, sequence, words]
-    where
-        is_from_server = the command in this command/response packet pair originated on the server
-        is_response = True if this is a response, False otherwise
-        sequence = sequence number
-        words = list of words
-    """
-    [isFromServer, isResponse, sequence] = DecodeHeader(data)
-    wordsSize = DecodeInt32(data[4:8]) - 12
-    words = DecodeWords(wordsSize, data[12:])
-    return [isFromServer, isResponse, sequence, words]
-
-
 clientSequenceNr = 0
 
 
@@ -162,37 +98,10 @@ def printPacket(packet):
 def generatePasswordHash(salt, password):
     m = newmd5()
     m.update(salt)
-    m.update(password)
+    m.update(password.encode('utf-8') if isinstance(password, str) else password)
     return m.digest()
 
 
-def containsCompletePacket(data):
-    if len(data) < 8:
-        return False
-    if len(data) < DecodeInt32(data[4:8]):
-        return False
-    return True
-
-
-def receivePacket(_socket, receiveBuffer):
-    """
-    Wait until the local receive buffer contains a full packet (appending data from the network socket),
-    then split receive buffer into first packet and remaining buffer data
-    """
-    while not containsCompletePacket(receiveBuffer):
-        data = _socket.recv(4096)  # was 16384
-        # make sure we raise a socket error when the socket is hanging
-        # on a loose end (receiving no data after server restart)
-        if not data:
-            raise socket.error('no data received: remote end unexpectedly closed socket')
-        receiveBuffer += data
-
-    packetSize = DecodeInt32(receiveBuffer[4:8])
-    packet = receiveBuffer[0:packetSize]
-    receiveBuffer = receiveBuffer[packetSize:len(receiveBuffer)]
-
-    return [packet, receiveBuffer]
-
 ########################################################################################################################
 # EXAMPLE PROGRAM
 ########################################################################################################################
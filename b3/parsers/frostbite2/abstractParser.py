@@ -53,19 +53,22 @@
 # 1.14.1 - add color code options for new getWrap method
 # 1.14.2 - uniform class variables (dict -> variable)
 # 1.15   - fixed regression introduced in 1.14.2
+# 1.16   - added writeBatch() method
+#        - getFullBanList() and getFullMapRotationList() request many pages at once
+# 1.17   - authorizeClients() authorizes all the clients at once
+# 1.17.1 - OnFrosbiteEvent() drops the event when the event queue is full instead of blocking the network core
+# 1.18   - ported to python 3
 
 __author__ = 'Courgette'
-__version__ = '1.15'
+__version__ = '1.18'
 
+import queue
 import re
-import string
 import sys
 import threading
 import time
 import traceback
-
-import Queue
-import new
+import types
 
 import b311.clients
 import b311.cron
@@ -99,8 +102,8 @@ class AbstractParser(b311.parser.Parser):
     PunkBuster = None
     ban_with_server = True
 
-    frostbite_event_queue = Queue.Queue(400)
-    sayqueue = Queue.Queue(100)
+    frostbite_event_queue = queue.Queue(400)
+    sayqueue = queue.Queue(100)
     sayqueue_get_timeout = 2
     sayqueuelistener = None
 
@@ -115,6 +118,7 @@ class AbstractParser(b311.parser.Parser):
     _line_length = 128
     _line_color_prefix = ''
     _message_delay = .8
+    _list_pages_in_flight = 4   # amount of list pages requested at once by getFullBanList/getFullMapRotationList
     _big_msg_duration = 4
     _big_b3_private_responses = False
     _big_msg_repeat = 'off'
@@ -252,7 +256,7 @@ class AbstractParser(b311.parser.Parser):
             if not self._serverConnection or not self._serverConnection.connected:
                 try:
                     self.setup_frostbite_connection()
-                except CommandError, err:
+                except CommandError as err:
                     if err.message[0] == 'InvalidPasswordHash':
                         self.error("Your rcon password is incorrect: "
                                    "check setting 'rcon_password' in your main config file")
@@ -260,7 +264,7 @@ class AbstractParser(b311.parser.Parser):
                         break
                     else:
                         self.error(err)
-                except IOError, err:
+                except IOError as err:
                     self.error("IOError %s" % err)
                 except Exception as err:
                     self.error(err)
@@ -270,13 +274,13 @@ class AbstractParser(b311.parser.Parser):
             try:
                 added, expire, packet = self.frostbite_event_queue.get(timeout=5)
                 self.routeFrostbitePacket(packet)
-            except Queue.Empty:
+            except queue.Empty:
                 self.verbose2("No game server event to treat in the last 5s")
-            except CommandError, err:
+            except CommandError as err:
                 # it does not matter from the parser perspective if Frostbite command failed
                 # (timeout or bad reply)
                 self.warning(err)
-            except NetworkError, e:
+            except NetworkError as e:
                 # the connection to the frostbite server is lost
                 self.warning(e)
                 self.close_frostbite_connection()
@@ -359,7 +363,7 @@ class AbstractParser(b311.parser.Parser):
         try:
             # checkout punkbuster support
             result = self._serverConnection.command('punkBuster.isActive')
-        except CommandError, e:
+        except CommandError as e:
             self.error("Could not get punkbuster status : %r" % e)
             self.PunkBuster = None
             self.ban_with_server = True
@@ -390,8 +394,9 @@ class AbstractParser(b311.parser.Parser):
             self.verbose("Dropping Frostbite event %r" % packet)
         self.console(repr(packet))
         try:
-            self.frostbite_event_queue.put((self.time(), self.time() + 10, packet), timeout=2)
-        except Queue.Full:
+            # called from the network core thread: waiting for room in the queue would hold every connection
+            self.frostbite_event_queue.put_nowait((self.time(), self.time() + 10, packet))
+        except queue.Full:
             self.error("Frostbite2 event queue full: dropping event %r" % packet)
 
     def routeFrostbitePacket(self, packet):
@@ -406,8 +411,8 @@ class AbstractParser(b311.parser.Parser):
         match = re.search(r"^(?P<actor>[^.]+)\.(on)?(?P<event>.+)$", eventType)
         func = None
         if match:
-            func = 'On%s%s' % (string.capitalize(match.group('actor')),
-                               string.capitalize(match.group('event')))
+            func = 'On%s%s' % (match.group('actor').capitalize(),
+                               match.group('event').capitalize())
             self.verbose2("Looking for event handling method called : " + func)
 
         if match and hasattr(self, func):
@@ -440,7 +445,7 @@ class AbstractParser(b311.parser.Parser):
                     if self.working:
                         time.sleep(self._message_delay)
                 self.sayqueue.task_done()
-            except Queue.Empty:
+            except queue.Empty:
                 # self.verbose2("sayqueuelistener: had nothing to do in the last %s sec" % self.sayqueue_get_timeout)
                 pass
             except (KeyboardInterrupt, SystemExit):
@@ -493,6 +498,17 @@ class AbstractParser(b311.parser.Parser):
                 self.output.flush()
                 return res
 
+    def writeBatch(self, msgs):
+        """
+        Send many commands at once to the game server and wait for all the replies.
+        Commands are sent without waiting for each other so this is much faster than calling write() in a loop.
+        :param msgs: A list of commands
+        :return: The list of replies, in the same order as the commands (failed commands are replaced
+                 by the raised CommandError)
+        """
+        if self.output:
+            return self.output.writeBatch(msgs)
+
     ####################################################################################################################
     #                                                                                                                  #
     #   FROSTBITE2 EVENTS HANDLERS                                                                                     #
@@ -875,13 +891,14 @@ class AbstractParser(b311.parser.Parser):
     def authorizeClients(self):
         """
         For all connected players, fill the client object with properties allowing to find
-        the user in the database (usualy guid, or punkbuster id, ip) and call the
-        Client.auth() method.
+        the user in the database (usualy guid, or punkbuster id, ip) and authorize them
+        all at once with the Clients.authClients() method.
         """
         players = self.getPlayerList()
         self.verbose('authorizeClients() = %s' % players)
 
-        for cid, p in players.iteritems():
+        clients = []
+        for cid, p in players.items():
             sp = self.clients.getByCID(cid)
             if sp:
                 # Only set provided data, otherwise use the currently set data
@@ -893,7 +910,10 @@ class AbstractParser(b311.parser.Parser):
                 if newTeam is not None:
                     sp.team = self.getTeam(newTeam)
                 sp.teamId = int(newTeam)
-                sp.auth()
+                clients.append(sp)
+
+        # lookup all the clients in the storage at once
+        self.clients.authClients(clients)
 
     def sync(self):
         """
@@ -904,7 +924,7 @@ class AbstractParser(b311.parser.Parser):
         """
         plist = self.getPlayerList()
         mlist = {}
-        for cid, c in plist.iteritems():
+        for cid, c in plist.items():
             client = self.clients.getByCID(cid)
             if client:
                 mlist[cid] = client
@@ -995,7 +1015,7 @@ class AbstractParser(b311.parser.Parser):
         :param silent: Whether or not to announce this ban
         """
         self.debug('BAN : client: %s, reason: %s', client, reason)
-        if isinstance(client, basestring):
+        if isinstance(client, str):
             # TODO: remove this stack trace when we figured out when tempban is called with a str as client
             traceback.print_stack()
             self.write(self.getCommand('banByName', name=client, reason=reason[:80]))
@@ -1020,7 +1040,7 @@ class AbstractParser(b311.parser.Parser):
                     self.write(('banList.save',))
                     if admin:
                         admin.message('Banned: %s (@%s) has been added to banlist' % (client.exactName, client.id))
-                except CommandFailedError, err:
+                except CommandFailedError as err:
                     self.error(err)
             elif not client.guid:
                 # ban by name
@@ -1030,7 +1050,7 @@ class AbstractParser(b311.parser.Parser):
                     self.write(('banList.save',))
                     if admin:
                         admin.message('Banned: %s (@%s) has been added to banlist' % (client.exactName, client.id))
-                except CommandFailedError, err:
+                except CommandFailedError as err:
                     self.error(err)
             else:
                 # ban by guid
@@ -1040,7 +1060,7 @@ class AbstractParser(b311.parser.Parser):
                     self.write(('banList.save',))
                     if admin:
                         admin.message('Banned: %s (@%s) has been added to banlist' % (client.exactName, client.id))
-                except CommandFailedError, err:
+                except CommandFailedError as err:
                     self.error(err)
 
         if self.PunkBuster:
@@ -1081,7 +1101,7 @@ class AbstractParser(b311.parser.Parser):
 
                 if not silent and fullreason != '':
                     self.say(fullreason)
-            except CommandFailedError, err:
+            except CommandFailedError as err:
                 if "NotInList" in err.message:
                     pass
                 else:
@@ -1092,7 +1112,7 @@ class AbstractParser(b311.parser.Parser):
             self.verbose('UNBAN: Removed guid (%s) from banlist' % client.guid)
             if admin:
                 admin.message('Unbanned: Removed %s guid from banlist' % client.exactName)
-        except CommandFailedError, err:
+        except CommandFailedError as err:
             if "NotInList" in err.message:
                 pass
             else:
@@ -1112,7 +1132,7 @@ class AbstractParser(b311.parser.Parser):
         """
         duration = b311.functions.time2minutes(duration)
 
-        if isinstance(client, basestring):
+        if isinstance(client, str):
             # TODO: remove this stack trace when we figured out when tempban is called with a str as client
             traceback.print_stack()
             self.write(self.getCommand('tempbanByName', name=client, duration=duration * 60, reason=reason[:80]))
@@ -1147,7 +1167,7 @@ class AbstractParser(b311.parser.Parser):
                 try:
                     self.write(self.getCommand('tempban', guid=client.guid, duration=duration * 60, reason=reason[:80]))
                     self.write(('banList.save',))
-                except CommandFailedError, err:
+                except CommandFailedError as err:
                     if admin:
                         admin.message("server replied with error %s" % err.message[0])
                     else:
@@ -1157,7 +1177,7 @@ class AbstractParser(b311.parser.Parser):
                     self.write(
                         self.getCommand('tempbanByName', name=client.name, duration=duration * 60, reason=reason[:80]))
                     self.write(('banList.save',))
-                except CommandFailedError, err:
+                except CommandFailedError as err:
                     if admin:
                         admin.message("server replied with error %s" % err.message[0])
                     else:
@@ -1166,7 +1186,7 @@ class AbstractParser(b311.parser.Parser):
                 try:
                     self.write(self.getCommand('tempban', guid=client.guid, duration=duration * 60, reason=reason[:80]))
                     self.write(('banList.save',))
-                except CommandFailedError, err:
+                except CommandFailedError as err:
                     if admin:
                         admin.message("server replied with error %s" % err.message[0])
                     else:
@@ -1259,14 +1279,14 @@ class AbstractParser(b311.parser.Parser):
             if gamemode_id is not None:
                 maps_for_current_gamemode = mapList.getByNameAndGamemode(map_id, gamemode_id)
                 if len(maps_for_current_gamemode):
-                    nextMapListIndex = maps_for_current_gamemode.keys()[0]
+                    nextMapListIndex = list(maps_for_current_gamemode.keys())[0]
 
             # FIXME: some logic here is wrong (Fenix)
             # or it could be in map rotation list for another gamemode
             if nextMapListIndex is None:
                 filtered_mapList = mapList.getByName(map_id)
                 if len(filtered_mapList):
-                    nextMapListIndex = filtered_mapList.keys()[0]
+                    nextMapListIndex = list(filtered_mapList.keys())[0]
 
             # or map is not found in mapList and we need to insert it after the index of the current map
             current_index = self.write(('mapList.getMapIndices',))[0]
@@ -1337,30 +1357,43 @@ class AbstractParser(b311.parser.Parser):
         Query the Frostbite2 game server and return a MapListBlock containing
         all maps of the current map rotation list.
         """
-        response = MapListBlock()
-        offset = 0
-        tmp = self.write(('mapList.list', offset))
-        tmp_num_maps = len(MapListBlock(tmp))
-        while tmp_num_maps:
-            response.append(tmp)
-            tmp = self.write(('mapList.list', len(response)))
-            tmp_num_maps = len(MapListBlock(tmp))
-        return response
+        return self._getFullList('mapList.list', MapListBlock)
 
     def getFullBanList(self):
         """
         Query the Frostbite2 game server and return a BanlistContent object
         containing all bans stored on the game server memory.
         """
-        response = BanlistContent()
-        offset = 0
-        tmp = self.write(('banList.list', offset))
-        tmp_num_bans = len(BanlistContent(tmp))
-        while tmp_num_bans:
-            response.append(tmp)
-            tmp = self.write(('banList.list', len(response)))
-            tmp_num_bans = len(BanlistContent(tmp))
-        return response
+        return self._getFullList('banList.list', BanlistContent)
+
+    def _getFullList(self, command, block_class):
+        """
+        Query all the pages of a paged Frostbite2 list command.
+        The first page tells us the page size, the following pages are then requested
+        by batches of self._list_pages_in_flight until we get a short or empty page.
+        :param command: The list command ('banList.list' or 'mapList.list')
+        :param block_class: The class used to parse a page (BanlistContent or MapListBlock)
+        """
+        response = block_class()
+        tmp = self.write((command, 0))
+        page_size = len(block_class(tmp))
+        if not page_size:
+            return response
+        response.append(tmp)
+        offset = page_size
+        while True:
+            offsets = [offset + page_size * i for i in range(self._list_pages_in_flight)]
+            pages = self.writeBatch([(command, x) for x in offsets])
+            for page in pages:
+                if isinstance(page, Exception):
+                    raise page
+                num_items = len(block_class(page))
+                if not num_items:
+                    return response
+                response.append(page)
+                if num_items < page_size:
+                    return response
+            offset = offsets[-1] + page_size
 
     def getHardName(self, mapname):
         """
@@ -1396,10 +1429,10 @@ class AbstractParser(b311.parser.Parser):
 
         try:
             words = self.write(('vars.%s' % cvarName,))
-        except CommandFailedError, err:
+        except CommandFailedError as err:
             self.warning(err)
             return
-        except (CommandDisallowedError, CommandUnknownCommandError), err:
+        except (CommandDisallowedError, CommandUnknownCommandError) as err:
             self.warning('unable to retrieve cvar: %s : error: %s' % (cvarName, err))
             return None
 
@@ -1422,7 +1455,7 @@ class AbstractParser(b311.parser.Parser):
         self.debug('Set cvar: %s = %s', cvarName, value)
         try:
             self.write(('vars.%s' % cvarName, value))
-        except CommandFailedError, err:
+        except CommandFailedError as err:
             self.warning(err)
 
     def checkVersion(self):
@@ -1522,7 +1555,7 @@ class AbstractParser(b311.parser.Parser):
             elif clean_gamemode_name == self.getGameMode(_id).lower():
                 return _id
 
-        supported_gamemode_names = map(self.getGameMode, supported_gamemode_ids)
+        supported_gamemode_names = [self.getGameMode(x) for x in supported_gamemode_ids]
         aliases = getattr(self, '_gamemode_aliases', {})
         clean_gamemode_name = aliases.get(clean_gamemode_name, clean_gamemode_name)
 
@@ -1576,7 +1609,7 @@ class AbstractParser(b311.parser.Parser):
                 self._big_b3_private_responses = self.config.getboolean(self.gameName, 'big_b3_private_responses')
                 self.info("value for setting %s.big_b3_private_responses is " % self.gameName + (
                     'ON' if self._big_b3_private_responses else 'OFF'))
-            except ValueError, err:
+            except ValueError as err:
                 self._big_b3_private_responses = default_value
                 self.warning("Invalid value: %s: using default value '%s'" % (err, default_value))
         else:
@@ -1591,7 +1624,7 @@ class AbstractParser(b311.parser.Parser):
             try:
                 self._big_msg_duration = self.config.getint(self.gameName, 'big_msg_duration')
                 self.info("value for setting %s.big_msg_duration is %s" % (self.gameName, self._big_msg_duration))
-            except ValueError, err:
+            except ValueError as err:
                 self._big_msg_duration = default_value
                 self.warning("Invalid value: %s: using default value '%s'" % (err, default_value))
         else:
@@ -1646,7 +1679,7 @@ class AbstractParser(b311.parser.Parser):
                     _default_value = _cfg_result
                 else:
                     raise ValueError('invalid value %s' % _cfg_result)
-            except ValueError, err:
+            except ValueError as err:
                 # Houston - We have a problem.
                 # We give an error message and use the default value.
                 self.error('Failed to read big_msg_repeat setting: use default: %s' % err)
@@ -1765,7 +1798,7 @@ class AbstractParser(b311.parser.Parser):
 
             try:
                 suggestions = this.console.changeMap(map_id, gamemode_id=gamemode_id, number_of_rounds=num_rounds)
-            except CommandFailedError, err:
+            except CommandFailedError as err:
                 if err.message == ['InvalidGameModeOnMap']:
                     client.message("%s cannot be played with gamemode %s" % (this.console.getEasyName(map_id),
                                                                              this.console.getGameMode(gamemode_id)))
@@ -1787,9 +1820,9 @@ class AbstractParser(b311.parser.Parser):
                     return
 
         adminplugin = self.getPlugin('admin')
-        adminplugin.parse_map_parameters = new.instancemethod(parse_map_parameters, adminplugin)
+        adminplugin.parse_map_parameters = types.MethodType(parse_map_parameters, adminplugin)
         command = adminplugin._commands['map']
-        command.func = new.instancemethod(new_cmd_map, adminplugin)
+        command.func = types.MethodType(new_cmd_map, adminplugin)
         command.help = new_cmd_map.__doc__.strip()
 
 
@@ -1821,13 +1854,13 @@ def patch_b3_clients():
         if msg and len(msg.strip()) > 0:
             # do we have a queue?
             if not hasattr(self, 'messagequeue'):
-                self.messagequeue = Queue.Queue()
+                self.messagequeue = queue.Queue()
             # fill the queue
             text = self.console.stripColors(self.console.msgPrefix + ' [pm] ' + msg)
             for line in self.console.getWrap(text):
                 self.messagequeue.put(line)
             # create a thread that executes the worker and pushes out the queue
-            if not hasattr(self, 'messagehandler') or not self.messagehandler.isAlive():
+            if not hasattr(self, 'messagehandler') or not self.messagehandler.is_alive():
                 self.messagehandler = threading.Thread(target=self.messagequeueworker, name="%s_messagehandler" % self)
                 self.messagehandler.setDaemon(True)
                 self.messagehandler.start()
@@ -0,0 +1,284 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Frostbite packet codec shared by the Frostbite (BFBC2, MoH) and Frostbite2 (BF3, BF4, BFH, MoHW) protocols.
+
+A packet is made of a 12 bytes header (sequence and flags, packet size, number of words) followed by the words,
+each word being its length, its bytes and a NULL terminator. Packets are encoded with a single join and decoded
+with struct.unpack_from at increasing offsets: received data is accumulated in a PacketBuffer which decodes the
+complete packets where they lie, without re-slicing what is left in the buffer.
+"""
+
+__version__ = '1.0'
+
+import socket
+import struct
+
+HEADER_SIZE = 12
+MAX_PACKET_SIZE = 1 << 20  # the protocol limits packets to 16KB: anything much bigger is a corrupted stream
+
+_header = struct.Struct('<III')
+_int32 = struct.Struct('<I')
+
+
+class PacketError(socket.error):
+    """
+    Raised when the received data can't be a Frostbite packet. The stream can't be resynchronized: it is a
+    socket.error so that callers drop the connection as they do on network errors.
+    """
+    pass
+
+
+def EncodeHeader(isFromServer, isResponse, sequence):
+    header = sequence & 0x3fffffff
+    if isFromServer:
+        header |= 0x80000000
+    if isResponse:
+        header |= 0x40000000
+    return _int32.pack(header)
+
+
+def DecodeHeader(data, offset=0):
+    header = _int32.unpack_from(data, offset)[0]
+    return [header & 0x80000000, header & 0x40000000, header & 0x3fffffff]
+
+
+def EncodeInt32(size):
+    return _int32.pack(size)
+
+
+def DecodeInt32(data, offset=0):
+    return _int32.unpack_from(data, offset)[0]
+
+
+def _encode(word):
+    """
+    Return the bytes of a word.
+    """
+    if isinstance(word, bytes):
+        return word
+    return str(word).encode('utf-8')
+
+
+def _pack_words(parts, words):
+    """
+    Append the encoded words to the list of packet parts.
+    :return: The size of the encoded words
+    """
+    pack = _int32.pack
+    size = 0
+    for word in words:
+        word = _encode(word)
+        parts.append(pack(len(word)))
+        parts.append(word)
+        parts.append(b'\x00')
+        size += len(word) + 5
+    return size
+
+
+def EncodeWords(words):
+    """
+    Encode a list of words.
+    :return: A tuple (size of the encoded words, encoded words)
+    """
+    parts = []
+    size = _pack_words(parts, words)
+    return size, b''.join(parts)
+
+
+def DecodeWords(size, data, offset=0):
+    """
+    Decode size bytes of words found in data at the given offset.
+    """
+    if not isinstance(data, bytes):
+        # a single copy of the words: slicing bytes and decoding is faster than decoding memoryview slices
+        data = bytes(memoryview(data)[offset:offset + size])
+        offset = 0
+    unpack_from = _int32.unpack_from
+    words = []
+    append = words.append
+    end = offset + size
+    while offset < end:
+        length = unpack_from(data, offset)[0]
+        offset += 4
+        append(data[offset:offset + length].decode('utf-8', 'replace'))
+        offset += length + 1
+    return words
+
+
+def EncodePacket(isFromServer, isResponse, sequence, words):
+    header = sequence & 0x3fffffff
+    if isFromServer:
+        header |= 0x80000000
+    if isResponse:
+        header |= 0x40000000
+    parts = [None]
+    size = HEADER_SIZE + _pack_words(parts, words)
+    parts[0] = _header.pack(header, size, len(words))
+    return b''.join(parts)
+
+
+def DecodePacket(data, offset=0):
+    """
+    Decode a request or response packet found in data at the given offset.
+    Return format is:
+    [is_from_server, is_response, sequence, words]
+    where
+        is_from_server = the command in this command/response packet pair originated on the server
+        is_response = True if this is a response, False otherwise
+        sequence = sequence number
+        words = list of words
+    """
+    header, size, numWords = _header.unpack_from(data, offset)
+    words = DecodeWords(size - HEADER_SIZE, data, offset + HEADER_SIZE)
+    return [header & 0x80000000, header & 0x40000000, header & 0x3fffffff, words]
+
+
+def containsCompletePacket(data):
+    if len(data) < 8:
+        return False
+    if len(data) < _int32.unpack_from(data, 4)[0]:
+        return False
+    return True
+
+
+class PacketBuffer(object):
+    """
+    Receive buffer accumulating the data read from a Frostbite server connection.
+    Data is read directly in a reusable bytearray; complete packets are decoded in place and the read
+    position moves forward. The remaining partial packet is moved back at the start of the buffer only
+    when there is no more room to read, and the buffer grows only for packets bigger than itself.
+    """
+
+    def __init__(self, size=16384):
+        """
+        Object constructor.
+        :param size: The initial size of the buffer
+        """
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        self._start = 0  # position of the first byte not yet consumed
+        self._end = 0  # position following the last byte received
+
+    def __len__(self):
+        return self._end - self._start
+
+    def _reserve(self, size):
+        """
+        Make sure at least size bytes can be written after the data already in the buffer.
+        """
+        if len(self._buffer) - self._end >= size:
+            return
+        pending = self._end - self._start
+        if pending + size > len(self._buffer):
+            # grow the buffer: release the memoryview first as a bytearray cannot be resized while exported
+            self._view.release()
+            self._buffer = self._buffer[self._start:self._end] + bytearray(max(len(self._buffer), size))
+            self._view = memoryview(self._buffer)
+        else:
+            self._buffer[:pending] = self._buffer[self._start:self._end]
+        self._start = 0
+        self._end = pending
+
+    def feed(self, data):
+        """
+        Append data to the buffer.
+        """
+        self._reserve(len(data))
+        self._buffer[self._end:self._end + len(data)] = data
+        self._end += len(data)
+
+    def recv_into(self, sock, size=8192):
+        """
+        Read data from the given socket directly into the buffer.
+        :return: The amount of bytes read (0 if the remote end closed the connection)
+        """
+        self._reserve(size)
+        received = sock.recv_into(self._view[self._end:self._end + size], size)
+        self._end += received
+        return received
+
+    def _packet_size(self):
+        """
+        Return the size of the first packet in the buffer or None if that packet is not complete yet.
+        :raise PacketError: If the packet size is not valid
+        """
+        if self._end - self._start < 8:
+            return None
+        size = _int32.unpack_from(self._buffer, self._start + 4)[0]
+        if size < HEADER_SIZE or size > MAX_PACKET_SIZE:
+            raise PacketError('invalid packet size: %s bytes' % size)
+        if self._end - self._start < size:
+            return None
+        return size
+
+    def next_packet(self):
+        """
+        Consume and return the raw bytes of the first packet, or None if no complete packet has been received.
+        :raise PacketError: If the first packet size is not valid
+        """
+        size = self._packet_size()
+        if size is None:
+            return None
+        packet = bytes(self._view[self._start:self._start + size])
+        self._consume(size)
+        return packet
+
+    def packets(self):
+        """
+        Consume and decode all the complete packets currently in the buffer.
+        :return: A list of [is_from_server, is_response, sequence, words]
+        :raise PacketError: If a packet size is not valid
+        """
+        decoded = []
+        size = self._packet_size()
+        while size is not None:
+            decoded.append(DecodePacket(self._buffer, self._start))
+            self._consume(size)
+            size = self._packet_size()
+        return decoded
+
+    def _consume(self, size):
+        self._start += size
+        if self._start == self._end:
+            self._start = self._end = 0
+
+
+def receivePacket(_socket, receiveBuffer):
+    """
+    Wait until the local receive buffer contains a full packet (appending data from the network socket),
+    then split receive buffer into first packet and remaining buffer data.
+    receiveBuffer should be a PacketBuffer, which is returned as is: a bytes buffer is accepted too
+    for backward compatibility and is then turned into a PacketBuffer.
+    """
+    if not isinstance(receiveBuffer, PacketBuffer):
+        data = receiveBuffer
+        receiveBuffer = PacketBuffer()
+        if data:
+            receiveBuffer.feed(data.encode('latin-1') if isinstance(data, str) else data)
+
+    packet = receiveBuffer.next_packet()
+    while packet is None:
+        # make sure we raise a socket error when the socket is hanging
+        # on a loose end (receiving no data after server restart)
+        if not receiveBuffer.recv_into(_socket, 4096):
+            raise socket.error('no data received: remote end unexpectedly closed socket')
+        packet = receiveBuffer.next_packet()
+
+    return [packet, receiveBuffer]
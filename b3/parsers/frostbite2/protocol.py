@@ -21,90 +21,41 @@
 # 2010/07/23 - xlr8or    - 1.0.1 - fixed infinite loop in a socket thread in receive_packet() on gameserver restart
 # 2014/01/02 - Courgette - 1.1   - fix FrostbiteServer not closing properly the asyncore connection when the server is unreachable
 # 2014/08/05 - Fenix     - 1.2   - syntax cleanup
+# 2026/10/18 - agent     - 1.3   - each command gets its own Future: many commands can be in flight at once
+#                                 - added command_async() and command_batch()
+# 2026/10/18 - agent     - 1.4   - packets are encoded/decoded by the codec module: received data is accumulated in a
+#                                   PacketBuffer instead of re-slicing the whole receive buffer after every packet
+# 2026/10/18 - agent     - 1.5   - the connection is served by the shared network core (b311.netcore) instead of
+#                                   running its own asyncore loop thread
+#                                 - FrostbiteServer waits for the connection instead of sleeping 1.5 seconds
+# 2026/10/18 - agent     - 1.6   - drop the connection when a packet with an invalid size is received
+# 2026/10/18 - agent     - 1.7   - ported printPacket() to python 3
+#                                 - FrostbiteError.message gives the first argument of the error, as on python 2
+
+__version__ = '1.7'
 
-__version__ = '1.2'
-
-import asyncore
 import hashlib
 import logging
 import socket
 import threading
 import time
-from struct import pack
-from struct import unpack
-
-
-def EncodeHeader(isFromServer, isResponse, sequence):
-    header = sequence & 0x3fffffff
-    if isFromServer:
-        header += 0x80000000
-    if isResponse:
-        header += 0x40000000
-    return pack('<I', header)
-
-
-def DecodeHeader(data):
-    [header] = unpack('<I', data[0: 4])
-    return [header & 0x80000000, header & 0x40000000, header & 0x3fffffff]
-
-
-def EncodeInt32(size):
-    return pack('<I', size)
-
-
-def DecodeInt32(data):
-    return unpack('<I', data[0: 4])[0]
-
-
-def EncodeWords(words):
-    size = 0
-    encodedWords = ''
-    for word in words:
-        strWord = str(word)
-        encodedWords += EncodeInt32(len(strWord))
-        encodedWords += strWord
-        encodedWords += '\x00'
-        size += len(strWord) + 5
-
-    return size, encodedWords
-
-
-def DecodeWords(size, data):
-    numWords = DecodeInt32(data[0:])
-    words = []
-    offset = 0
-    while offset < size:
-        wordLen = DecodeInt32(data[offset: offset + 4])
-        word = data[offset + 4: offset + 4 + wordLen]
-        words.append(word)
-        offset += wordLen + 5
-
-    return words
-
-
-def EncodePacket(isFromServer, isResponse, sequence, words):
-    encodedHeader = EncodeHeader(isFromServer, isResponse, sequence)
-    encodedNumWords = EncodeInt32(len(words))
-    [wordsSize, encodedWords] = EncodeWords(words)
-    encodedSize = EncodeInt32(wordsSize + 12)
-    return encodedHeader + encodedSize + encodedNumWords + encodedWords
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError
 
+from b311.netcore import StreamConnection
 
-def DecodePacket(data):
-    """
-    Decode a request or response packet
-    Return format is:
-    [is_from_server, is_response, sequence, words]
-    where
-    is_from_server = the command in this command/response packet pair originated on the server
-        is_response = True if this is a response, False otherwise
-        sequence = sequence number
-        words = list of words
-    """
-    [isFromServer, isResponse, sequence] = DecodeHeader(data)
-    wordsSize = DecodeInt32(data[4:8]) - 12
-    words = DecodeWords(wordsSize, data[12:])
-    return [isFromServer, isResponse, sequence, words]
+from b311.parsers.frostbite2.codec import DecodeHeader
+from b311.parsers.frostbite2.codec import DecodeInt32
+from b311.parsers.frostbite2.codec import DecodePacket
+from b311.parsers.frostbite2.codec import DecodeWords
+from b311.parsers.frostbite2.codec import EncodeHeader
+from b311.parsers.frostbite2.codec import EncodeInt32
+from b311.parsers.frostbite2.codec import EncodePacket
+from b311.parsers.frostbite2.codec import EncodeWords
+from b311.parsers.frostbite2.codec import PacketBuffer
+from b311.parsers.frostbite2.codec import PacketError
+from b311.parsers.frostbite2.codec import containsCompletePacket
+from b311.parsers.frostbite2.codec import receivePacket
 
 
 clientSequenceNr = 0
@@ -132,71 +83,40 @@ def printPacket(packet):
     Display contents of packet in user-friendly format, useful for debugging purposes.
     """
     if packet[0]:
-        print
-        "IsFromServer, ",
+        print("IsFromServer, ", end='')
     else:
-        print
-        "IsFromClient, ",
+        print("IsFromClient, ", end='')
 
     if packet[1]:
-        print
-        "Response, ",
+        print("Response, ", end='')
     else:
-        print
-        "Request, ",
+        print("Request, ", end='')
 
-    print
-    "Sequence: " + str(packet[2]),
+    print("Sequence: " + str(packet[2]), end='')
 
     if packet[3]:
-        print
-        " Words:",
+        print(" Words:", end='')
         for word in packet[3]:
-            print
-            "\"" + word + "\"",
+            print(" \"" + word + "\"", end='')
 
-    print
-    ""
+    print()
 
 
 def generatePasswordHash(salt, password):
     m = hashlib.new('md5')
     m.update(salt)
-    m.update(password)
+    m.update(password.encode('utf-8') if isinstance(password, str) else password)
     return m.digest()
 
 
-def containsCompletePacket(data):
-    if len(data) < 8:
-        return False
-    if len(data) < DecodeInt32(data[4:8]):
-        return False
-    return True
-
-
-def receivePacket(_socket, receiveBuffer):
-    """
-    Wait until the local receive buffer contains a full packet (appending data from the network socket),
-    then split receive buffer into first packet and remaining buffer data
-    """
-    while not containsCompletePacket(receiveBuffer):
-        data = _socket.recv(4096)  # was 16384
-        # make sure we raise a socket error when the socket is hanging
-        # on a loose end (receiving no data after server restart)
-        if not data:
-            raise socket.error('no data received - Remote end unexpectedly closed socket')
-        receiveBuffer += data
-
-    packetSize = DecodeInt32(receiveBuffer[4:8])
-
-    packet = receiveBuffer[0:packetSize]
-    receiveBuffer = receiveBuffer[packetSize:len(receiveBuffer)]
-
-    return [packet, receiveBuffer]
-
-
 class FrostbiteError(Exception):
-    pass
+
+    @property
+    def message(self):
+        """
+        The first argument of the error: the words of the server response for command errors.
+        """
+        return self.args[0] if self.args else ''
 
 
 class CommandError(FrostbiteError):
@@ -223,7 +143,10 @@ class NetworkError(FrostbiteError):
     pass
 
 
-class FrostbiteDispatcher(asyncore.dispatcher_with_send):
+class FrostbiteDispatcher(StreamConnection):
+    """
+    Connection to a Frostbite2 server, served by the network core: the handlers are called from the loop thread.
+    """
 
     def __init__(self, host, port):
         """
@@ -231,13 +154,12 @@ class FrostbiteDispatcher(asyncore.dispatcher_with_send):
         :param host: The Frostbite2 server host
         :param port: The Frostbite2 server port
         """
-        asyncore.dispatcher_with_send.__init__(self)
-        self._buffer_in = ''
-        self.getLogger().info("connecting")
-        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
-        asyncore.dispatcher_with_send.connect(self, (host, port))
+        self._buffer_in = PacketBuffer()
         self._frostbite_event_handler = None
         self._frostbite_command_response_handler = None
+        self._frostbite_close_handler = None
+        self.getLogger().info("connecting")
+        StreamConnection.__init__(self, host, port)
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -257,6 +179,12 @@ class FrostbiteDispatcher(asyncore.dispatcher_with_send):
         """
         self._frostbite_command_response_handler = func
 
+    def set_frostbite_close_handler(self, func):
+        """
+        Register a function that will be called when the connection with the Frostbite server is closed.
+        """
+        self._frostbite_close_handler = func
+
     def send_command(self, *command):
         """
         Send a command to the Frosbite server and return the command
@@ -269,10 +197,10 @@ class FrostbiteDispatcher(asyncore.dispatcher_with_send):
             words = command
 
         request = EncodeClientRequest(words)
-        [sequence, words] = DecodePacket(request)[2:]
+        sequence = DecodeHeader(request)[2]
 
         self.getLogger().debug("sending command request #%i: %s " % (sequence, words))
-        asyncore.dispatcher_with_send.send(self, request)
+        self.send(request)
 
         return sequence
 
@@ -293,29 +221,32 @@ class FrostbiteDispatcher(asyncore.dispatcher_with_send):
         Called when the socket is closed.
         """
         self.getLogger().debug("handle_close")
-        self.close()
+        if self._frostbite_close_handler is not None:
+            self._frostbite_close_handler()
 
-    def handle_read(self):
+    def handle_data(self, data):
         """
-        Called when the asynchronous loop detects that a read() call on the channel's socket will succeed.
+        Called with the raw data received from the Frostbite2 server.
         """
-        # received raw data
-        data = self.recv(8192)
-        self._buffer_in += data
+        self._buffer_in.feed(data)
         self.getLogger().debug('read %s char from Frostbite2 gameserver' % len(data))
 
         # cook it into Frosbite packets
-        while containsCompletePacket(self._buffer_in):
-            packetSize = DecodeInt32(self._buffer_in[4:8])
-            packet = self._buffer_in[0:packetSize]
-            self._buffer_in = self._buffer_in[packetSize:len(self._buffer_in)]
+        try:
+            packets = self._buffer_in.packets()
+        except PacketError as err:
+            self.getLogger().error("dropping the connection: %s" % err)
+            self.close()
+            return
+        for packet in packets:
             self.handle_packet(packet)
 
     def handle_packet(self, packet):
         """
         Called when a full Frosbite packet has been received.
+        :param packet: The decoded packet: [is_from_server, is_response, sequence, words]
         """
-        [originServer, isResponse, sequence, words] = DecodePacket(packet)
+        [originServer, isResponse, sequence, words] = packet
         self.getLogger().info("handle_packet(%s)" % repr([originServer, isResponse, sequence, words]))
         if not isResponse:
             # acknowledge the server
@@ -331,7 +262,7 @@ class FrostbiteDispatcher(asyncore.dispatcher_with_send):
                 self.handle_frostbite_command_response(sequence, words)
             else:
                 self.getLogger().warn("received a bad packet from frosbite server pretending "
-                                      "being a request from us: %s" % repr(DecodePacket(packet)))
+                                      "being a request from us: %s" % repr(packet))
 
     def handle_frostbite_event(self, words):
         self.getLogger().debug("received a game event from frosbite server: %s" % repr(words))
@@ -345,28 +276,25 @@ class FrostbiteDispatcher(asyncore.dispatcher_with_send):
             self._frostbite_command_response_handler(command_id, words)
 
 
-class FrostbiteServer(threading.Thread):
+class FrostbiteServer(object):
     """
-    Thread opening a connection to a Frostbite game server and providing
-    means of observing Frostbite events and sending commands
+    Open a connection to a Frostbite game server and provide means of observing Frostbite events and sending commands.
+    The connection is served by the network core thread: observers are called from that thread.
     """
 
-    def __init__(self, host, port, password=None, command_timeout=5.0):
-        threading.Thread.__init__(self, name="FrosbiteServerThread")
-        self.daemon = True
+    def __init__(self, host, port, password=None, command_timeout=5.0, connect_timeout=1.5):
         self.test_connectivity(host, port)
-        self.frostbite_dispatcher = FrostbiteDispatcher(host, port)
         self._stopEvent = threading.Event()
         self.password = password
         self.command_timeout = command_timeout
-        self.frostbite_dispatcher.set_frostbite_event_hander(self._on_event)
-        self.frostbite_dispatcher.set_frostbite_command_response_handler(self._on_command_response)
         self.pending_commands = {}
-        self.__command_reply_event = threading.Event()
+        self._pending_commands_lock = threading.Lock()
         self.observers = set()
-        # ok start working
-        self.start()
-        time.sleep(1.5)
+        self.frostbite_dispatcher = FrostbiteDispatcher(host, port)
+        self.frostbite_dispatcher.set_frostbite_event_hander(self._on_event)
+        self.frostbite_dispatcher.set_frostbite_command_response_handler(self._on_command_response)
+        self.frostbite_dispatcher.set_frostbite_close_handler(self._on_close)
+        self.frostbite_dispatcher.wait_connected(connect_timeout)
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -392,26 +320,53 @@ class FrostbiteServer(threading.Thread):
         Calling this method will block until we receive the reply packet from the
         game server or until we reach the timeout.
         """
+        if command is None:
+            return None
+        return self._wait_for_response(self.command_async(*command))
+
+    def command_async(self, *command):
+        """
+        Send command to the Frostbite server without waiting for the reply.
+        Many commands can be in flight at the same time over the connection: each reply is matched
+        with its command using the packet sequence number.
+        :return: A concurrent.futures.Future resolving to the reply words (without the 'OK' status word) or
+                 raising the CommandError matching the reply status
+        """
         if not self.connected:
             raise NetworkError("not connected")
 
         self.getLogger().info("command : %s " % repr(command))
-        if command is None:
-            return None
-
-        command_id = self.frostbite_dispatcher.send_command(*command)
-        self.pending_commands[command_id] = None
+        future = Future()
+        # hold the lock while sending so that the reply cannot be handled before the command is registered
+        with self._pending_commands_lock:
+            command_id = self.frostbite_dispatcher.send_command(*command)
+            future.command_id = command_id
+            self.pending_commands[command_id] = future
         self.getLogger().debug("command #%i sent. %s " % (command_id, repr(command)))
+        return future
 
-        response = self._wait_for_response(command_id)
-        if response[0] in ('CommandDisallowedOnRanked', 'CommandDisallowedOnOfficial'):
-            raise CommandDisallowedError(response)
-        elif response[0] == 'UnknownCommand':
-            raise CommandUnknownCommandError(response)
-        elif response[0] != "OK":
-            raise CommandFailedError(response)
-        else:
-            return response[1:]
+    def command_batch(self, commands, return_exceptions=False):
+        """
+        Send many commands to the Frostbite server at once and wait for all the replies.
+        :param commands: A sequence of commands (each one being a string or a tuple of words)
+        :param return_exceptions: Whether to return errors in place of the failed commands results
+                                  instead of raising the first one
+        :return: A list of replies, in the same order as the commands
+        """
+        futures = [self.command_async(*(x if isinstance(x, tuple) else (x,))) for x in commands]
+        expire_time = time.time() + self.command_timeout
+        results = []
+        for future in futures:
+            try:
+                results.append(self._wait_for_response(future, max(0, expire_time - time.time())))
+            except FrostbiteError as err:
+                results.append(err)
+
+        if not return_exceptions:
+            for result in results:
+                if isinstance(result, FrostbiteError):
+                    raise result
+        return results
 
     def auth(self):
         """
@@ -420,9 +375,9 @@ class FrostbiteServer(threading.Thread):
         self.getLogger().info("starting authentication")
         hash_token = self.command('login.hashed')
         # Given the salt and the password, combine them and compute hash value
-        salt = hash_token[0].decode("hex")
+        salt = bytes.fromhex(hash_token[0])
         passwordHash = generatePasswordHash(salt, self.password)
-        passwordHashHexString = passwordHash.encode("hex").upper()
+        passwordHashHexString = passwordHash.hex().upper()
         # Send password hash to server
         self.command("login.hashed", passwordHashHexString)
         self.getLogger().info("authentication done")
@@ -432,7 +387,8 @@ class FrostbiteServer(threading.Thread):
 
     def stop(self):
         self._stopEvent.set()
-        self.close()
+        self.frostbite_dispatcher.close()
+        self._on_close()
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -457,20 +413,6 @@ class FrostbiteServer(threading.Thread):
     def isStopped(self):
         return self._stopEvent.is_set()
 
-    def run(self):
-        """
-        Threaded code.
-        """
-        self.getLogger().info('start loop')
-        try:
-            while not self.isStopped():
-                asyncore.loop(count=1, timeout=1)
-        except KeyboardInterrupt:
-            pass
-        finally:
-            self.frostbite_dispatcher.close()
-        self.getLogger().info('end loop')
-
     def _on_event(self, words):
         self.getLogger().debug("received Frostbite event : %s" % repr(words))
         for func in self.observers:
@@ -478,34 +420,40 @@ class FrostbiteServer(threading.Thread):
 
     def _on_command_response(self, command_id, words):
         self.getLogger().debug("received Frostbite command #%i response: %s" % (command_id, repr(words)))
-        if command_id not in self.pending_commands:
+        with self._pending_commands_lock:
+            future = self.pending_commands.pop(command_id, None)
+        if future is None:
             self.getLogger().warn(
                 "dropping Frostbite command #%i response as we are not waiting for it anymore" % command_id)
+        elif words[0] in ('CommandDisallowedOnRanked', 'CommandDisallowedOnOfficial'):
+            future.set_exception(CommandDisallowedError(words))
+        elif words[0] == 'UnknownCommand':
+            future.set_exception(CommandUnknownCommandError(words))
+        elif words[0] != "OK":
+            future.set_exception(CommandFailedError(words))
         else:
-            self.pending_commands[command_id] = words
-            self.__command_reply_event.set()
+            future.set_result(words[1:])
 
-    def _wait_for_response(self, command_id):
+    def _on_close(self):
         """
-        Block until response to for given command_id has been received or until timeout is reached.
+        Fail all the commands still waiting for a reply when the connection is lost.
+        """
+        with self._pending_commands_lock:
+            futures = list(self.pending_commands.values())
+            self.pending_commands.clear()
+        for future in futures:
+            future.set_exception(NetworkError("Lost connection to Frostbite2 server"))
+
+    def _wait_for_response(self, future, timeout=None):
+        """
+        Block until response to for given command future has been received or until timeout is reached.
         """
-        expire_time = time.time() + self.command_timeout
-        while not self.isStopped() and command_id in self.pending_commands and self.pending_commands[
-            command_id] is None:
-            if not self.connected:
-                raise NetworkError("Lost connection to Frostbite2 server")
-            if time.time() >= expire_time:
-                del self.pending_commands[command_id]
-                raise CommandTimeoutError("did not receive any response for sequence #%i" % command_id)
-            self.getLogger().debug("waiting for some command reply #%i: %r " % (command_id, self.pending_commands))
-            self.__command_reply_event.clear()
-            self.__command_reply_event.wait(self.command_timeout)
         try:
-            response = self.pending_commands[command_id]
-            del self.pending_commands[command_id]
-            return response
-        except KeyError:
-            raise CommandTimeoutError("did not receive any response for sequence #%i" % command_id)
+            return future.result(self.command_timeout if timeout is None else timeout)
+        except TimeoutError:
+            with self._pending_commands_lock:
+                self.pending_commands.pop(future.command_id, None)
+            raise CommandTimeoutError("did not receive any response for sequence #%i" % future.command_id)
 
 ########################################################################################################################
 # EXAMPLE PROGRAM                                                                                                      #
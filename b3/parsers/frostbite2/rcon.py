@@ -19,6 +19,8 @@
 # CHANGELOG
 #
 # 2014/08/05 - 1.1 - Fenix - syntax cleanup
+# 2026/10/18 - 1.2 - agent - added writeAsync() and writeBatch(): commands no longer need to wait for each other
+# 2026/10/18 - 1.3 - agent - writelines() raises the error of the first failed command again
 
 
 """
@@ -32,7 +34,9 @@ Then you can expect this class to work like the other Rcon classes
 """
 
 __author__ = 'Courgette'
-__version__ = '1.1'
+__version__ = '1.3'
+
+from concurrent.futures import Future
 
 
 class Rcon(object):
@@ -52,9 +56,11 @@ class Rcon(object):
         """
         Write multiple RCON commands to the Frostbite2 server.
         :param lines: A list of commands to send
+        :raise CommandError: The error of the first command which failed
         """
-        for line in lines:
-            self.write(line)
+        for response in self.writeBatch(lines):
+            if isinstance(response, Exception):
+                raise response
 
     def write(self, cmd, *args, **kwargs):
         """
@@ -68,6 +74,32 @@ class Rcon(object):
         self.console.verbose(u'RCON response:\t %s' % repr(response))
         return response
 
+    def writeAsync(self, cmd, *args, **kwargs):
+        """
+        Write an RCON command to the Frostbite2 server without waiting for the reply.
+        :param cmd: The command to send
+        :return: A Future resolving to the command response
+        """
+        if not self.frostbite_server:
+            future = Future()
+            future.set_result(None)
+            return future
+        self.console.verbose(u'RCON :\t %s' % repr(cmd))
+        return self.frostbite_server.command_async(cmd)
+
+    def writeBatch(self, cmds):
+        """
+        Write many RCON commands to the Frostbite2 server at once and wait for all the replies.
+        :param cmds: A list of commands to send
+        :return: The list of responses, failed commands being replaced by the raised error
+        """
+        if not self.frostbite_server:
+            return [None] * len(cmds)
+        self.console.verbose(u'RCON batch :\t %s' % repr(cmds))
+        responses = self.frostbite_server.command_batch(cmds, return_exceptions=True)
+        self.console.verbose(u'RCON batch response:\t %s' % repr(responses))
+        return responses
+
     def flush(self):
         pass
 
@@ -25,13 +25,14 @@
 # 2012/01/21 - 1.2 - Courgette - add a append() method to BanlistContent and MapListBlock classes
 # 2012/01/21 - 1.3 - Courgette - add method get_by_name_gamemode_and_rounds() to class MapListBlock
 # 2014/08/05 - 1.4 - Fenix     - syntax cleanup
+# 2026/10/18 - 1.5 - agent     - ported to python 3
 
 """
 This module provides different utilities specific to the Frostbite2 engine
 """
 
 __author__ = 'Courgette'
-__version__ = '1.4'
+__version__ = '1.5'
 
 
 class BanlistContentError(Exception):
@@ -95,7 +96,7 @@ class BanlistContent(object):
 
         # append data
         self.bansData += data
-        self.numOfBans += len(data) / 6
+        self.numOfBans += len(data) // 6
 
     def __len__(self):
         return int(self.numOfBans)
@@ -312,12 +313,12 @@ class MapListBlock(object):
 
         try:
             num_maps = int(data[0])
-        except ValueError, err:
+        except ValueError as err:
             raise MapListBlockError("invalid data: first element should be a integer, got %r" % data[0], err)
 
         try:
             num_words = int(data[1])
-        except ValueError, err:
+        except ValueError as err:
             raise MapListBlockError("invalid data: second element should be a integer, got %r" % data[1], err)
 
         if len(data) != (2 + (num_maps * num_words)):
@@ -156,10 +156,9 @@ __author__ = 'xlr8or, Courgette, Fenix'
 __version__ = '1.28'
 
 import re
-import string
 import time
 
-import thread
+import _thread
 
 import b311
 import b311.clients
@@ -534,13 +533,7 @@ class Iourt41Parser(AbstractParser):
         Parse a log line returning extracted tokens.
         :param line: The line to be parsed
         """
-        line = re.sub(self._lineClear, '', line, 1)
-        m = None
-        for f in self._lineFormats:
-            m = re.match(f, line)
-            if m:
-                break
-
+        m, line = self.matchLine(line)
         if m is not None:
             client = None
             target = None
@@ -550,7 +543,7 @@ class Iourt41Parser(AbstractParser):
                 data = None
             return m, m.group('action').lower(), data, client, target
         elif '------' not in line:
-            self.verbose('Line did not match format: %s' % line)
+            self.verbose('Line did not match format: %s', line)
 
     def parseUserInfo(self, info):
         """
@@ -559,7 +552,7 @@ class Iourt41Parser(AbstractParser):
         """
         # 2 \ip\145.99.135.227:27960\challenge\-232198920\qport\2781\protocol\68\battleye\1\name\[SNT]^1XLR^78or...
         # 7 n\[SNT]^1XLR^78or\t\3\r\2\tl\0\f0\\f1\\f2\\a0\0\a1\0\a2\0
-        player_id, info = string.split(info, ' ', 1)
+        player_id, info = info.split(' ', 1)
 
         if info[:1] != '\\':
             info = '\\' + info
@@ -612,7 +605,7 @@ class Iourt41Parser(AbstractParser):
 
         # split port from ip field
         if 'ip' in bclient:
-            ip_port_data = string.split(bclient['ip'], ':', 1)
+            ip_port_data = bclient['ip'].split(':', 1)
             bclient['ip'] = ip_port_data[0]
             if len(ip_port_data) > 1:
                 bclient['port'] = ip_port_data[1]
@@ -629,7 +622,7 @@ class Iourt41Parser(AbstractParser):
             client = self.clients.getByCID(bclient['cid'])
             if client:
                 # update existing client
-                for k, v in bclient.iteritems():
+                for k, v in bclient.items():
                     if hasattr(client, 'gear') and k == 'gear' and client.gear != v:
                         self.queueEvent(b311.events.Event(self.getEventID('EVT_CLIENT_GEAR_CHANGE'), v, client))
                     if not k.startswith('_') and k not in ('login', 'password', 'groupBits', 'maskLevel',
@@ -918,7 +911,7 @@ class Iourt41Parser(AbstractParser):
     def OnItem(self, action, data, match=None):
         # Item: 3 ut_item_helmet
         # Item: 0 team_CTF_redflag
-        cid, item = string.split(data, ' ', 1)
+        cid, item = data.split(' ', 1)
         client = self.getByCidOrJoinPlayer(cid)
         if client:
             # correct flag/bomb-pickups
@@ -1063,7 +1056,7 @@ class Iourt41Parser(AbstractParser):
         self.verbose('...self.console.game.gameType: %s' % self.game.gameType)
         self.game.startMap()
         self.game.rounds = 0
-        thread.start_new_thread(self.clients.sync, ())
+        _thread.start_new_thread(self.clients.sync, ())
         return self.getEvent('EVT_GAME_ROUND_START', data=self.game)
 
     def OnWarmup(self, action, data=None, match=None):
@@ -1092,7 +1085,7 @@ class Iourt41Parser(AbstractParser):
         self.verbose('...self.console.game.gameType: %s' % self.game.gameType)
         self.game.startMap()
         self.game.rounds = 0
-        thread.start_new_thread(self.clients.sync, ())
+        _thread.start_new_thread(self.clients.sync, ())
         return self.getEvent('EVT_GAME_ROUND_START', data=self.game)
 
     ####################################################################################################################
@@ -1225,7 +1218,7 @@ class Iourt41Parser(AbstractParser):
         plist = self.getPlayerList(maxRetries=4)
         mlist = dict()
 
-        for cid, c in plist.iteritems():
+        for cid, c in plist.items():
             client = self.getByCidOrJoinPlayer(cid)
             if client:
                 # Disconnect the zombies first
@@ -1266,7 +1259,7 @@ class Iourt41Parser(AbstractParser):
         Load a given map/level.
         """
         rv = self.getMapsSoundingLike(map_name)
-        if isinstance(rv, basestring):
+        if isinstance(rv, str):
             self.say('^7Changing map to %s' % rv)
             time.sleep(1)
             self.write('map %s' % rv)
@@ -1597,7 +1590,7 @@ class Iourt41Parser(AbstractParser):
             points = self.damage[weapon][int(hitloc)]
             self.debug("_getDamagePoints(%s, %s) -> %s" % (weapon, hitloc, points))
             return points
-        except KeyError, err:
+        except KeyError as err:
             self.warning("_getDamagePoints(%s, %s) cannot find value : %s" % (weapon, hitloc, err))
             return 15
 
@@ -1608,7 +1601,7 @@ class Iourt41Parser(AbstractParser):
         """
         try:
             return self.hitweapon2killweapon[int(hitweapon_id)]
-        except KeyError, err:
+        except KeyError as err:
             self.warning("Unknown weapon ID on Hit line: %s", err)
             return None
 
@@ -100,15 +100,13 @@
 
 import re
 import time
-
-import new
+import types
 
 import b311
 from b311.clients import Client
 from b311.events import Event
 from b311.functions import time2minutes
 from b311.parsers.iourt41 import Iourt41Parser
-from b311.plugins.spamcontrol import SpamcontrolPlugin
 
 __author__ = 'Courgette, Fenix'
 __version__ = '1.35'
@@ -123,7 +121,7 @@ class Iourt42Client(Client):
         self.console.debug("Auth by guid: %r", self.guid)
         try:
             return self.console.storage.getClient(self)
-        except KeyError, msg:
+        except KeyError as msg:
             self.console.debug('User not found %s: %s', self.guid, msg)
             return False
 
@@ -708,7 +706,7 @@ class Iourt42Parser(Iourt41Parser):
         if self.config.has_option('server', 'permban_with_frozensand'):
             try:
                 self._permban_with_frozensand = self.config.getboolean('server', 'permban_with_frozensand')
-            except ValueError, err:
+            except ValueError as err:
                 self.warning(err)
 
         self.info("Send permbans to Frozen Sand : %s" % ('yes' if self._permban_with_frozensand else 'no'))
@@ -721,7 +719,7 @@ class Iourt42Parser(Iourt41Parser):
         if self.config.has_option('server', 'tempban_with_frozensand'):
             try:
                 self._tempban_with_frozensand = self.config.getboolean('server', 'tempban_with_frozensand')
-            except ValueError, err:
+            except ValueError as err:
                 self.warning(err)
 
         self.info("Send temporary bans to Frozen Sand : %s" % ('yes' if self._tempban_with_frozensand else 'no'))
@@ -734,7 +732,7 @@ class Iourt42Parser(Iourt41Parser):
         if self.config.has_option('server', 'allow_userinfo_overflow'):
             try:
                 self._allow_userinfo_overflow = self.config.getboolean('server', 'allow_userinfo_overflow')
-            except ValueError, err:
+            except ValueError as err:
                 self.warning(err)
 
         self.info("Allow userinfo string overflow : %s" % ('yes' if self._allow_userinfo_overflow else 'no'))
@@ -788,7 +786,7 @@ class Iourt42Parser(Iourt41Parser):
 
             if client:
                 # update existing client
-                for k, v in bclient.iteritems():
+                for k, v in bclient.items():
                     if hasattr(client, 'gear') and k == 'gear' and client.gear != v:
                         self.queueEvent(b311.events.Event(self.getEventID('EVT_CLIENT_GEAR_CHANGE'), v, client))
                     if not k.startswith('_') and k not in (
@@ -1394,7 +1392,7 @@ class Iourt42Parser(Iourt41Parser):
             points = self.damage[weapon][int(hitloc) - 1]
             self.debug("_getDamagePoints(%s, %s) -> %d" % (weapon, hitloc, points))
             return points
-        except (KeyError, IndexError), err:
+        except (KeyError, IndexError) as err:
             self.warning("_getDamagePoints(%s, %s) cannot find value : %s" % (weapon, hitloc, err))
             return 15
 
@@ -1408,7 +1406,7 @@ class Iourt42Parser(Iourt41Parser):
             new_event = Event(type=event.type, client=event.client, target=event.target, data=repr(event.data))
             this.onChat(new_event)
 
-        self.spamcontrolPlugin.onRadio = new.instancemethod(onRadio, self.spamcontrolPlugin, SpamcontrolPlugin)
+        self.spamcontrolPlugin.onRadio = types.MethodType(onRadio, self.spamcontrolPlugin)
         self.spamcontrolPlugin.registerEvent('EVT_CLIENT_RADIO', self.spamcontrolPlugin.onRadio)
 
     @staticmethod
@@ -1420,7 +1418,6 @@ class Iourt42Parser(Iourt41Parser):
             """
             client = Iourt42Client(console=self.console, cid=cid, timeAdd=self.console.time(), **kwargs)
             self[client.cid] = client
-            self.resetIndex()
 
             self.console.debug('Urt42 Client Connected: [%s] %s - %s (%s)', self[client.cid].cid, self[client.cid].name,
                                self[client.cid].guid, self[client.cid].data)
@@ -22,6 +22,7 @@
 # 2014/08/06 - 0.3 - Fenix - make use of self.getEvent when creating events
 # 2014/09/02 - 0.4 - Fenix - syntax cleanup
 # 2015/04/16 - 0.5 - Fenix - uniform class variables (dict -> variable)
+# 2026/10/18 - 0.6 - agent - ported to python 3
 
 
 import sys
@@ -35,7 +36,7 @@ from b311.parsers.frostbite2.util import MapListBlockError
 from b311.parsers.frostbite2.util import PlayerInfoBlock
 
 __author__ = 'Freelander'
-__version__ = '0.5'
+__version__ = '0.6'
 
 MOHW_REQUIRED_VERSION = 323174
 
@@ -181,7 +182,7 @@ class MohwParser(AbstractParser):
         AbstractParser.pluginsStarted(self)
         self.info('Connecting all players...')
         plist = self.getPlayerList()
-        for cid, p in plist.iteritems():
+        for cid, p in plist.items():
             client = self.clients.getByCID(cid)
             if not client:
                 self.debug('Client %s found on the server' % cid)
@@ -399,7 +400,7 @@ class MohwParser(AbstractParser):
         Return a list of supported levels for the current game mod.
         """
         # TODO : remove this method once the method on from AbstractParser is working
-        return MAP_NAME_BY_ID.keys()
+        return list(MAP_NAME_BY_ID.keys())
 
     def getSupportedGameModesByMapId(self, map_id):
         """
@@ -589,12 +590,12 @@ class NewMapListBlock(b311.parsers.frostbite2.util.MapListBlock):
 
         try:
             num_maps = int(data[0])
-        except ValueError, err:
+        except ValueError as err:
             raise MapListBlockError("invalid data: first element should be a integer, got %r" % data[0], err)
 
         try:
             num_words = int(data[2])
-        except ValueError, err:
+        except ValueError as err:
             raise MapListBlockError("invalid data: second element should be a integer, got %r" % data[1], err)
 
         if len(data) != (3 + (num_maps * num_words)):
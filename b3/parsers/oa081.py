@@ -332,13 +332,7 @@ class Oa081Parser(AbstractParser):
         Parse a log line returning extracted tokens.
         :param line: The line to be parsed
         """
-        line = re.sub(self._lineClear, '', line, 1)
-        m = None
-        for f in self._lineFormats:
-            m = re.match(f, line)
-            if m:
-                self.debug('XLR--------> line matched %s' % f.pattern)
-                break
+        m, line = self.matchLine(line)
         if m:
             client = None
             target = None
@@ -351,7 +345,7 @@ class Oa081Parser(AbstractParser):
             return m, action, m.group('data').strip(), client, target
 
         elif '------' not in line:
-            self.verbose('XLR--------> line did not match format: %s' % line)
+            self.verbose('XLR--------> line did not match format: %s', line)
 
     def parseUserInfo(self, info):
         """
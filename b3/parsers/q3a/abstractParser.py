@@ -18,6 +18,9 @@
 #
 # CHANGELOG
 #
+# 2026/10/18 - 1.9   - agent          - match log lines only with the log line formats their action keyword can match
+#                                     - cache the action handlers resolved by parseLine()
+# 2026/10/18 - 1.8.3 - agent          - authorizeClients() authorizes all the clients at once
 # 2015/05/18 - 1.8.2 - Fenix          - set g_logsync to continuous logging upon startup
 # 2015/04/16 - 1.8.1 - Fenix          - uniform class variables (dict -> variable)
 #                                     - implement missing abstract class methods
@@ -67,12 +70,18 @@
 # 23/07/2005 - 1.0.1 - ThorN          - added log message for when ban() decides to do a tempban
 
 __author__ = 'ThorN, xlr8or'
-__version__ = '1.8.1'
+__version__ = '1.9'
 
 import re
 import string
 import time
 
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    # python < 3.11
+    import sre_parse
+
 import b311
 import b311.clients
 import b311.cvar
@@ -83,6 +92,32 @@ from b311.functions import prefixText
 from b311.parsers.punkbuster import PunkBuster
 from b311.parsers.q3a import rcon
 
+# the action keyword a log line starts with
+_reLineKeyword = re.compile(r'[a-zA-Z]*')
+
+
+def getLineFormatKeyword(pattern):
+    """
+    Return the (lowercase) letters every log line matched by the given log line format starts with: a log line can
+    only match the format if its action keyword starts with them. Formats which don't start with letters (i.e. the
+    generic '(?P<action>[a-z]+):' ones) return an empty string: they can match any action keyword.
+    :param pattern: A compiled log line format
+    """
+    keyword = []
+    items = list(sre_parse.parse(pattern.pattern, pattern.flags))
+    while items:
+        op, av = items.pop(0)
+        if op is sre_parse.AT:
+            continue
+        elif op is sre_parse.SUBPATTERN:
+            # the group content followed by the rest of the pattern
+            items = list(av[-1]) + items
+        elif op is sre_parse.LITERAL and chr(av) in string.ascii_letters:
+            keyword.append(chr(av).lower())
+        else:
+            break
+    return ''.join(keyword)
+
 
 class AbstractParser(b311.parser.Parser):
     """
@@ -97,6 +132,10 @@ class AbstractParser(b311.parser.Parser):
     _clientConnectID = None
     _logSync = 2
 
+    # log line formats by action keyword and action handlers by action: see matchLine() and getLineHandler()
+    _lineFormatsIndex = None
+    _lineHandlers = None
+
     _commands = {
         'ban': 'banid %(cid)s %(reason)s',
         'kick': 'clientkick %(cid)s %(reason)s',
@@ -219,24 +258,63 @@ class AbstractParser(b311.parser.Parser):
     #                                                                                                                  #
     ####################################################################################################################
 
+    def matchLine(self, line):
+        """
+        Remove the time off of a log line and match it with the log line formats.
+        The action keyword is peeled off the line and only the formats which can match it are tried, in the
+        _lineFormats order: the first format matching the line is the same as when trying every format in turn.
+        :param line: The line to be parsed
+        :return: A (match, line without the time) tuple: match is None if no format matches the line
+        """
+        line = self._lineClear.sub('', line, 1)
+        keyword = _reLineKeyword.match(line).group().lower()
+        index = self._lineFormatsIndex
+        if index is None or index[0] is not self._lineFormats:
+            # _lineFormats changed (or first line)
+            index = self._lineFormatsIndex = (self._lineFormats, [], {})
+            for f in self._lineFormats:
+                f = re.compile(f)
+                index[1].append((getLineFormatKeyword(f), f))
+        try:
+            formats = index[2][keyword]
+        except KeyError:
+            formats = tuple(f for prefix, f in index[1] if keyword.startswith(prefix))
+            if len(index[2]) < 1000:
+                index[2][keyword] = formats
+        for f in formats:
+            m = f.match(line)
+            if m:
+                return m, line
+        return None, line
+
+    def getLineHandler(self, action):
+        """
+        Return the method handling the given action (i.e: action "flag return" is handled by the OnFlagReturn method).
+        :param action: The action parsed from a log line
+        :return: The bound method or None if the parser doesn't handle the action
+        """
+        try:
+            return self._lineHandlers[action]
+        except KeyError:
+            pass
+        except TypeError:
+            self._lineHandlers = {}
+        func = getattr(self, 'On%s' % string.capwords(action).replace(' ', ''), None)
+        self._lineHandlers[action] = func
+        return func
+
     def getLineParts(self, line):
         """
         Parse a log line returning extracted tokens.
         :param line: The line to be parsed
         """
-        line = re.sub(self._lineClear, '', line, 1)
-        m = None
-        for f in self._lineFormats:
-            m = re.match(f, line)
-            if m:
-                # self.debug('line matched %s' % f.pattern)
-                break
+        m, line = self.matchLine(line)
         if m:
             client = None
             target = None
             return m, m.group('action').lower(), m.group('data').strip(), client, target
         elif '------' not in line:
-            self.verbose('Line did not match format: %s' % line)
+            self.verbose('Line did not match format: %s', line)
 
     def parseLine(self, line):
         """
@@ -248,10 +326,9 @@ class AbstractParser(b311.parser.Parser):
             return False
 
         match, action, data, client, target = m
-        func = 'On%s' % string.capwords(action).replace(' ', '')
+        func = self.getLineHandler(action)
 
-        if hasattr(self, func):
-            func = getattr(self, func)
+        if func:
             event = func(action, data, match)
             if event:
                 self.queueEvent(event)
@@ -885,12 +962,13 @@ class AbstractParser(b311.parser.Parser):
     def authorizeClients(self):
         """
         For all connected players, fill the client object with properties allowing to find
-        the user in the database (usualy guid, or punkbuster id, ip) and call the
-        Client.auth() method.
+        the user in the database (usualy guid, or punkbuster id, ip) and authorize them
+        all at once with the Clients.authClients() method.
         """
         players = self.getPlayerList(maxRetries=4)
         self.verbose('authorizeClients() = %s' % players)
 
+        clients = []
         for cid, p in players.iteritems():
             sp = self.clients.getByCID(cid)
             if sp:
@@ -899,7 +977,10 @@ class AbstractParser(b311.parser.Parser):
                 sp.pbid = p.get('pbid', sp.pbid)
                 sp.guid = p.get('guid', sp.guid)
                 sp.data = p
-                sp.auth()
+                clients.append(sp)
+
+        # lookup all the clients in the storage at once
+        self.clients.authClients(clients)
 
     ####################################################################################################################
     #                                                                                                                  #
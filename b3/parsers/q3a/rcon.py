@@ -1,28 +1,88 @@
 __author__ = 'ThorN'
-__version__ = '1.11'
+__version__ = '1.15'
 
+import asyncio
 import re
 import socket
-import threading
 import time
-
-import _queue
-import select
 import _thread
+from concurrent.futures import Future
+
+from b311.netcore import DatagramConnection
+from b311.netcore import core
+
+
+class RconRequest(object):
+    """
+    A command waiting in the RCON pipeline.
+    """
+
+    def __init__(self, cmd, expectReply=True, maxRetries=None, socketTimeout=None, query=False):
+        """
+        Object constructor.
+        :param cmd: The RCON command
+        :param expectReply: Whether we need the reply of the command or we can fire and forget it
+        :param maxRetries: How many times we have to retry the sending upon failure
+        :param socketTimeout: The socket timeout value
+        :param query: Whether the command is a connectionless query (getstatus, getinfo) instead of an RCON command
+        """
+        self.cmd = cmd
+        self.expectReply = expectReply
+        self.maxRetries = maxRetries
+        self.socketTimeout = socketTimeout
+        self.query = query
+        self.future = Future()
+
+
+class RconConnection(DatagramConnection):
+    """
+    UDP connection to the game server, served by the network core: received datagrams (and network errors) are
+    queued until the command they reply to reads them.
+    """
+
+    def __init__(self, host, port):
+        self.datagrams = asyncio.Queue()
+        DatagramConnection.__init__(self, host, port)
+
+    def handle_datagram(self, data):
+        self.datagrams.put_nowait(data)
+
+    def handle_error(self, err):
+        self.datagrams.put_nowait(err)
 
 
 class Rcon(object):
     host = ()
     password = None
     lock = _thread.allocate_lock()
-    socket = None
-    queue = None
+    connection = None
+    netcore = core
     console = None
     socket_timeout = 0.80
     rconsendstring = '\377\377\377\377rcon "%s" %s\n'
     rconreplystring = '\377\377\377\377print\n'
     qserversendstring = '\377\377\377\377%s\n'
 
+    # how read() decides that a reply is complete:
+    #   - 'timeout' : keep reading until no more data arrive within socket_timeout (legacy behavior)
+    #   - 'gap'     : wait socket_timeout for the first datagram, then only reply_gap for the following ones. The
+    #                 game server writes the whole output of a command within the same server frame, so the
+    #                 datagrams of a reply arrive back to back. Replies of commands matching _reSinglePacket
+    #                 always fit in one datagram: for them we return as soon as the first datagram arrives.
+    reply_framing = 'gap'
+    reply_gap = 0.05
+
+    _replyFramingModes = ('timeout', 'gap')
+
+    # maximum amount of commands per second sent to the game server (0 = no limit): keeps B3 below the server
+    # flood protection threshold when many commands are pipelined
+    rate_limit = 0
+    _lastSend = 0
+    _unacked = 0  # amount of fire-and-forget commands whose reply datagram has not been received yet
+    _reSinglePacket = re.compile(r'^(say|sayteam|tell|bigtext|kick|clientkick|kickbyfullname|banclient|'
+                                 r'tempbanclient|unbanuser|set[asu]?|map_restart|forceteam|slap|nuke|mute|'
+                                 r'veto|swapteams|shuffleteams|cyclemap|g_\w+\s+\S)\b', re.IGNORECASE)
+
     # default expiretime for the status cache in seconds and cache type
     status_cache_expire_time = 2
     status_cache = False
@@ -37,7 +97,6 @@ class Rcon(object):
         :param password: The RCON password
         """
         self.console = console
-        self.queue = _queue.Queue()
 
         if self.console.config.has_option('caching', 'status_cache_type'):
             status_cache_type = self.console.config.get('caching', 'status_cache_type').lower()
@@ -49,19 +108,35 @@ class Rcon(object):
             if self.status_cache_expire_time > 5:
                 self.status_cache_expire_time = 5
         # set the cacche expire time to now, so the first status request will retrieve a status from the server
-        status_cache_expired = time.time()
+        self.status_cache_expired = time.time()
+
+        if self.console.config.has_option('server', 'rcon_reply_framing'):
+            reply_framing = self.console.config.get('server', 'rcon_reply_framing').strip().lower()
+            if reply_framing in self._replyFramingModes:
+                self.reply_framing = reply_framing
+            else:
+                self.console.warning('Unknown rcon reply framing: %s' % reply_framing)
+
+        if self.console.config.has_option('server', 'rcon_reply_gap'):
+            self.reply_gap = abs(self.console.config.getfloat('server', 'rcon_reply_gap'))
+
+        self.console.bot('Rcon reply framing: [%s] gap: [%0.3f sec]' % (self.reply_framing, self.reply_gap))
+
+        if self.console.config.has_option('server', 'rcon_rate_limit'):
+            self.rate_limit = abs(self.console.config.getfloat('server', 'rcon_rate_limit'))
+            self.console.bot('Rcon rate limit: [%s commands/sec]' % (self.rate_limit or 'unlimited'))
 
         self.console.bot('Rcon status cache expire time: [%s sec] Type: [%s]' % (self.status_cache_expire_time,
                                                                                  self.status_cache))
         self.console.bot('Game name is: %s' % self.console.gameName)
-        self.socket = socket.socket(type=socket.SOCK_DGRAM)
         self.host = host
         self.password = password
-        self.socket.settimeout(2)
-        self.socket.connect(self.host)
-
-        self._stopEvent = threading.Event()
-        _thread.start_new_thread(self._writelines, ())
+        self.lock = _thread.allocate_lock()
+        # commands are sent and their replies read by the network core thread, one command at a time
+        self._pipeline = asyncio.Lock()
+        self.connection = RconConnection(host[0], host[1])
+        if not self.connection.wait_connected(2):
+            self.console.warning('RCON: could not open the connection to %s:%s', host[0], host[1])
 
     def encode_data(self, data, source):
         """
@@ -70,151 +145,242 @@ class Rcon(object):
         :param source: Who requested the encoding
         """
         try:
-            if isinstance(data, str):
-                data = unicode(data, errors='ignore')
-            data = data.encode(self.console.encoding, 'replace')
+            if isinstance(data, bytes):
+                data = data.decode(self.console.encoding, 'ignore')
+            data = data.encode(self.console.encoding or 'latin-1', 'replace')
         except Exception as msg:
             self.console.warning('%s: error encoding data: %r', source, msg)
-            data = 'Encoding error'
+            data = b'Encoding error'
 
         return data
 
-    def send(self, data, maxRetries=None, socketTimeout=None):
+    def decode_data(self, data):
         """
-        Send data over the socket.
-        :param data: The string to be sent
-        :param maxRetries: How many times we have to retry the sending upon failure
-        :param socketTimeout: The socket timeout value
+        Strip the reply header from a received datagram and decode it.
+        :param data: The raw datagram
         """
-        if socketTimeout is None:
-            socketTimeout = self.socket_timeout
-        if maxRetries is None:
-            maxRetries = 2
+        data = data.replace(self.rconreplystring.encode('latin-1'), b'')
+        return data.decode(self.console.encoding or 'latin-1', 'replace')
 
-        data = data.strip()
-        # encode the data
-        if self.console.encoding:
-            data = self.encode_data(data, 'QSERVER')
+    def packet(self, template, *args):
+        """
+        Build a datagram out of a send string template.
+        :param template: The send string template (rconsendstring, qserversendstring)
+        :param args: Encoded values for the template placeholders
+        """
+        return template.encode('latin-1') % args
 
-        self.console.verbose('QSERVER sending (%s:%s) %r', self.host[0], self.host[1], data)
-        start_time = time.time()
+    async def drain(self, timeout=0):
+        """
+        Discard datagrams already received, such as late replies of a previous command,
+        so they do not get mixed with the reply of the next command.
+        :param timeout: How long to wait for the replies of fire-and-forget commands still in flight
+        """
+        datagrams = self.connection.datagrams
+        deadline = time.time() + timeout
+        while True:
+            if datagrams.empty():
+                wait = max(0, deadline - time.time()) if self._unacked else 0
+                if not wait:
+                    break
+                try:
+                    d = await asyncio.wait_for(datagrams.get(), wait)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                d = datagrams.get_nowait()
+            if isinstance(d, Exception):
+                break
+            self._unacked = max(0, self._unacked - 1)
+            self.console.verbose2('RCON: discarding late data %r', d)
+        self._unacked = 0
 
+    async def throttle(self):
+        """
+        Wait until we are allowed to send the next command according to the configured rate limit.
+        """
+        if self.rate_limit:
+            wait = self._lastSend + 1.0 / self.rate_limit - time.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        self._lastSend = time.time()
+
+    async def exchange(self, source, packet, cmd, maxRetries, socketTimeout, retry=True):
+        """
+        Send a datagram and read the reply, retrying upon failure.
+        :param source: Who requested the exchange (RCON, QSERVER)
+        :param packet: The datagram to send
+        :param cmd: The command being sent (used to detect the end of the reply)
+        :param maxRetries: How many times we have to retry the sending upon failure
+        :param socketTimeout: The socket timeout value
+        :param retry: Whether to retry when the reply could not be read
+        """
+        start_time = time.time()
         retries = 0
         while time.time() - start_time < 5:
-            readables, writeables, errors = select.select([], [self.socket], [self.socket], socketTimeout)
-            if len(errors) > 0:
-                self.console.warning('QSERVER: %r', errors)
-            elif len(writeables) > 0:
+            try:
+                if not self.connection.connected:
+                    raise socket.error('not connected')
+                await self.drain(socketTimeout)
+                await self.throttle()
+                self.connection.send(packet)
+            except Exception as msg:
+                self.console.warning('%s: error sending: %r', source, msg)
+            else:
                 try:
-                    writeables[0].send(self.qserversendstring % data)
+                    reply = await self.read(socketTimeout=socketTimeout, cmd=cmd)
+                    self.console.verbose2('%s: received %r', source, reply)
+                    return reply
                 except Exception as msg:
-                    self.console.warning('QSERVER: error sending: %r', msg)
-                else:
-                    try:
-                        data = self.readSocket(self.socket, socketTimeout=socketTimeout)
-                        self.console.verbose2('QSERVER: received %r' % data)
-                        return data
-                    except Exception as msg:
-                        self.console.warning('QSERVER: error reading: %r', msg)
-            else:
-                self.console.verbose('QSERVER: no writeable socket')
+                    self.console.warning('%s: error reading: %r', source, msg)
 
-            time.sleep(0.05)
+                if not retry:
+                    self.console.verbose2('%s: no retry for %r', source, cmd)
+                    return ''
+
+            await asyncio.sleep(0.05)
             retries += 1
 
             if retries >= maxRetries:
-                self.console.error('QSERVER: too many tries: aborting (%r)', data.strip())
+                self.console.error('%s: too many tries: aborting (%r)', source, cmd)
                 break
 
-            self.console.verbose('QSERVER: retry sending %r (%s/%s)...', data.strip(), retries, maxRetries)
+            self.console.verbose('%s: retry sending %r (%s/%s)...', source, cmd, retries, maxRetries)
 
-        self.console.debug('QSERVER: did not send any data')
+        self.console.debug('%s: did not send any data', source)
         return ''
 
-    def sendRcon(self, data, maxRetries=None, socketTimeout=None):
+    async def query(self, data, maxRetries=None, socketTimeout=None):
         """
-        Send an RCON command.
-        :param data: The string to be sent
-        :param maxRetries: How many times we have to retry the sending upon failure
-        :param socketTimeout: The socket timeout value
+        Send a connectionless query (getstatus, getinfo) and read the reply.
         """
-        if socketTimeout is None:
-            socketTimeout = self.socket_timeout
-        if maxRetries is None:
-            maxRetries = 2
-
         data = data.strip()
+        cmd = data
         # encode the data
-        if self.console.encoding:
-            data = self.encode_data(data, 'RCON')
+        data = self.encode_data(data, 'QSERVER')
+        self.console.verbose('QSERVER sending (%s:%s) %r', self.host[0], self.host[1], data)
+        return await self.exchange('QSERVER', self.packet(self.qserversendstring, data), cmd,
+                                   2 if maxRetries is None else maxRetries,
+                                   self.socket_timeout if socketTimeout is None else socketTimeout)
 
+    async def rcon(self, data, maxRetries=None, socketTimeout=None):
+        """
+        Send an RCON command and read the reply.
+        """
+        data = data.strip()
+        cmd = data
+        # encode the data
+        data = self.encode_data(data, 'RCON')
         self.console.verbose('RCON sending (%s:%s) %r', self.host[0], self.host[1], data)
-        start_time = time.time()
-
-        retries = 0
-        while time.time() - start_time < 5:
-            readables, writeables, errors = select.select([], [self.socket], [self.socket], socketTimeout)
-
-            if len(errors) > 0:
-                self.console.warning('RCON: %s', str(errors))
-            elif len(writeables) > 0:
-                try:
-                    writeables[0].send(self.rconsendstring % (self.password, data))
-                except Exception as msg:
-                    self.console.warning('RCON: error sending: %r', msg)
+        # do not retry quits and map changes since they prevent the server from responding
+        return await self.exchange('RCON', self.packet(self.rconsendstring, self.encode_data(self.password, 'RCON'),
+                                                       data), cmd,
+                                   2 if maxRetries is None else maxRetries,
+                                   self.socket_timeout if socketTimeout is None else socketTimeout,
+                                   retry=not re.match(r'^quit|map(_rotate)?.*', cmd))
+
+    async def rconNoReply(self, data):
+        """
+        Send an RCON command without waiting for its reply.
+        The reply datagram is accounted for and discarded before the next command expecting a reply is sent.
+        """
+        cmd = data.strip()
+        data = self.encode_data(cmd, 'RCON')
+        self.console.verbose('RCON sending (%s:%s) %r (no reply)', self.host[0], self.host[1], data)
+        await self.throttle()
+        if not self.connection.connected:
+            self.console.warning('RCON: error sending: not connected')
+            return False
+        self.connection.send(self.packet(self.rconsendstring, self.encode_data(self.password, 'RCON'), data))
+        self._unacked += 1
+        return True
+
+    async def pipelined(self, request):
+        """
+        Process a command of the RCON pipeline.
+        Commands which do not need a reply are sent back to back (honoring the rate limit), while a command
+        expecting a reply is sent only once the replies of the previous ones have been received, so that
+        replies can be matched with commands by the order they arrive in.
+        """
+        async with self._pipeline:
+            if not request.future.set_running_or_notify_cancel():
+                return
+            try:
+                if request.query:
+                    result = await self.query(request.cmd, request.maxRetries, request.socketTimeout)
+                elif request.expectReply:
+                    result = await self.rcon(request.cmd, request.maxRetries, request.socketTimeout)
                 else:
-                    try:
-                        data = self.readSocket(self.socket, socketTimeout=socketTimeout)
-                        self.console.verbose2('RCON: received %r' % data)
-                        return data
-                    except Exception as msg:
-                        self.console.warning('RCON: error reading: %r', msg)
-
-                if re.match(r'^quit|map(_rotate)?.*', data):
-                    # do not retry quits and map changes since they prevent the server from responding
-                    self.console.verbose2('RCON: no retry for %r', data)
-                    return ''
-
+                    result = await self.rconNoReply(request.cmd) and ''
+            except Exception as e:
+                request.future.set_exception(e)
             else:
-                self.console.verbose('RCON: no writeable socket')
-
-            time.sleep(0.05)
+                request.future.set_result(result if result else '')
 
-            retries += 1
+    def send(self, data, maxRetries=None, socketTimeout=None):
+        """
+        Send a connectionless query and wait for the reply.
+        :param data: The string to be sent
+        :param maxRetries: How many times we have to retry the sending upon failure
+        :param socketTimeout: The socket timeout value
+        """
+        return self.wait(RconRequest(data, maxRetries=maxRetries, socketTimeout=socketTimeout, query=True))
 
-            if retries >= maxRetries:
-                self.console.error('RCON: too many tries: aborting (%r)', data.strip())
-                break
+    def sendRcon(self, data, maxRetries=None, socketTimeout=None):
+        """
+        Send an RCON command and wait for the reply.
+        :param data: The string to be sent
+        :param maxRetries: How many times we have to retry the sending upon failure
+        :param socketTimeout: The socket timeout value
+        """
+        return self.wait(RconRequest(data, maxRetries=maxRetries, socketTimeout=socketTimeout))
 
-            self.console.verbose('RCON: retry sending %r (%s/%s)...', data.strip(), retries, maxRetries)
+    def stop(self):
+        """
+        Stop the rcon pipeline and close the connection.
+        """
+        self.connection.close()
 
-        self.console.debug('RCON: did not send any data')
-        return ''
+    def enqueue(self, request):
+        """
+        Enqueue a request in the RCON pipeline, processed by the network core thread.
+        :return: The request future
+        """
+        self.netcore.submit(self.pipelined(request))
+        return request.future
 
-    def stop(self):
+    def wait(self, request):
         """
-        Stop the rcon writelines queue.
+        Enqueue a request in the RCON pipeline and wait for its result.
+        :raise RuntimeError: If called from the network core thread, which would never process the request
         """
-        self._stopEvent.set()
+        if self.netcore.inLoopThread():
+            raise RuntimeError('cannot wait for RCON command %r from the network core thread' % request.cmd)
+        return self.enqueue(request).result()
 
-    def _writelines(self):
+    def writeAsync(self, cmd, expectReply=None, maxRetries=None, socketTimeout=None):
         """
-        Write multiple RCON commands on the socket.
+        Enqueue a RCON command in the pipeline.
+        :param cmd: The string to be sent
+        :param expectReply: Whether the reply is needed: if not specified, commands whose reply always fits in a
+                            single datagram (say, tell, kick...) are fired and forgotten
+        :param maxRetries: How many times we have to retry the sending upon failure
+        :param socketTimeout: The socket timeout value
+        :return: A concurrent.futures.Future resolving to the command reply ('' for fire-and-forget commands)
         """
-        while not self._stopEvent.isSet():
-            lines = self.queue.get(True)
-            for cmd in lines:
-                if not cmd:
-                    continue
-                with self.lock:
-                    self.sendRcon(cmd, maxRetries=1)
+        if expectReply is None:
+            expectReply = not self._reSinglePacket.match(cmd.strip())
+        return self.enqueue(RconRequest(cmd, expectReply=expectReply, maxRetries=maxRetries,
+                                        socketTimeout=socketTimeout))
 
     def writelines(self, lines):
         """
         Enqueue multiple RCON commands for later processing.
         :param lines: A list of RCON commands.
         """
-        self.queue.put(lines)
+        for cmd in lines:
+            if cmd:
+                self.writeAsync(cmd, maxRetries=1)
 
     def write(self, cmd, maxRetries=None, socketTimeout=None):
         """
@@ -226,7 +392,7 @@ class Rcon(object):
         # intercept status request for caching construct
         if (cmd == 'status' or cmd == 'PB_SV_PList') and self.status_cache:
             if time.time() < self.status_cache_expired:
-                self.console.verbose2('Using Status: Cached %s' % cmd)
+                self.console.verbose2('Using Status: Cached %s', cmd)
                 return self.status_cache_data
             else:
                 with self.lock:
@@ -234,7 +400,7 @@ class Rcon(object):
                     if data:
                         self.status_cache_data = data
                         self.status_cache_expired = time.time() + self.status_cache_expire_time
-                        self.console.verbose2('Using Status: Fresh %s' % cmd)
+                        self.console.verbose2('Using Status: Fresh %s', cmd)
                     else:
                         # if no data returned set the cached status to empty, but don't update the expired timer so next attempt will try 
                         # to read a new value
@@ -248,61 +414,57 @@ class Rcon(object):
     def flush(self):
         pass
 
-    def readNonBlocking(self, sock):
+    def isSinglePacketReply(self, cmd):
         """
-        Read data from the socket (non blocking).
-        :param sock: The socket from where to read data
+        Tell whether the reply to the given command is complete as soon as its first datagram is received.
+        :param cmd: The command which has been sent
         """
-        sock.settimeout(2)
-        start_time = time.time()
-        data = ''
-        while time.time() - start_time < 1:
-            try:
-                d = str(sock.recv(4096))
-            except socket.error as detail:
-                self.console.debug('RCON: error reading: %s' % detail)
-                break
-            else:
-                if d:
-                    # remove rcon header
-                    data += d.replace(self.rconreplystring, '')
-                elif len(data) > 0 and ord(data[-1:]) == 10:
-                    break
+        return self.reply_framing != 'timeout' and cmd is not None and self._reSinglePacket.match(cmd) is not None
 
-        return data.strip()
-
-    def readSocket(self, sock, size=4096, socketTimeout=None):
+    async def read(self, socketTimeout=None, cmd=None):
         """
-        Read data from the socket.
-        :param sock: The socket from where to read data
-        :param size: The read size
+        Read the reply of a command.
         :param socketTimeout: The socket timeout value
+        :param cmd: The command we are reading the reply of (used to detect the end of the reply)
         """
         if socketTimeout is None:
             socketTimeout = self.socket_timeout
 
-        data = ''
-        readables, writeables, errors = select.select([sock], [], [sock], socketTimeout)
-
-        if not len(readables):
+        datagrams = self.connection.datagrams
+        try:
+            d = await asyncio.wait_for(datagrams.get(), socketTimeout)
+        except asyncio.TimeoutError:
             self.console.verbose('No readable socket')
             return ''
 
-        while len(readables):
-            d = str(sock.recv(size))
+        gap = socketTimeout
+        if self.reply_framing == 'gap':
+            gap = min(self.reply_gap, socketTimeout)
 
-            if d:
-                # remove rcon header
-                data += d.replace(self.rconreplystring, '')
+        data = ''
+        while True:
+            if isinstance(d, Exception):
+                raise d
 
-            readables, writeables, errors = select.select([sock], [], [sock], socketTimeout)
-            if len(readables):
-                self.console.verbose('RCON: more data to read in socket')
+            # remove rcon header
+            data += self.decode_data(d)
+
+            if self.isSinglePacketReply(cmd):
+                break
+
+            try:
+                d = await asyncio.wait_for(datagrams.get(), gap)
+            except asyncio.TimeoutError:
+                break
+            self.console.verbose('RCON: more data to read in socket')
 
         return data
 
     def close(self):
-        pass
+        """
+        Close the connection.
+        """
+        self.connection.close()
 
     def getRules(self):
         self.lock.acquire()
@@ -38,6 +38,8 @@
 # 1.8  - 2014-08-15 - produce EVT_CLIENT_KICK when a player gets kicked from the server
 # 1.9  - 2014-08-29 - syntax cleanup
 # 1.10 - 2015-04-16 - uniform class variables (dict -> variable)
+# 1.11 - 2026-10-18 - handle_game_event() drops the event when the event queue is full instead of blocking the
+#                     network core
 
 import logging
 import re
@@ -68,7 +70,7 @@ from b311.parsers.ravaged.ravaged_rcon import RavagedServerNetworkError
 from b311.parsers.ravaged.rcon import Rcon as RavagedRcon
 
 __author__ = 'Courgette'
-__version__ = '1.10'
+__version__ = '1.11'
 
 ger = GameEventRouter()
 
@@ -829,7 +831,8 @@ class RavagedParser(Parser):
             self.verbose("Dropping Ravaged event %r" % ravaged_event)
         self.console(ravaged_event)
         try:
-            self.game_event_queue.put((self.time(), self.time() + 10, ravaged_event), timeout=2)
+            # called from the network core thread: waiting for room in the queue would hold every connection
+            self.game_event_queue.put_nowait((self.time(), self.time() + 10, ravaged_event))
         except Full:
             self.error("Ravaged event queue full, dropping event %r" % ravaged_event)
 
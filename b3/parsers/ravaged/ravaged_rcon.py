@@ -22,23 +22,20 @@
 # 2012/09/29 - 1.1 - updated for RavagedServer beta build [201209271447]
 # 2012/10/17 - 1.2 - updated for RavagedServer beta build [201210140713]
 # 2014/08/12 - 1.3 - Fenix - syntax cleanup
+# 2026/10/18 - 1.4 - agent - the connection is served by the shared network core (b311.netcore): packets are
+#                            handled in the network core thread instead of the server loop and packet handler threads
 
-import asyncore
 import logging
 import re
 import time
 from hashlib import sha1
-from socket import AF_INET
-from socket import SOCK_STREAM
 from threading import Event
 from threading import Lock
-from threading import Thread
 
-from Queue import Empty
-from Queue import Queue
+from b311.netcore import StreamConnection
 
 __author__ = 'Thomas LEVEIL'
-__version__ = '1.3'
+__version__ = '1.4'
 
 
 class RavagedServerError(Exception):
@@ -61,34 +58,28 @@ class RavagedServerCommandTimeout(RavagedServerCommandError):
     pass
 
 
-class RavagedServer(Thread):
+class RavagedServer(object):
     """
-    Thread opening a connection to a Ravaged game server and providing
-    means of observing messages received and sending commands
+    Open a connection to a Ravaged game server and provide means of observing messages received and sending commands.
+    The connection is served by the network core thread: observers are called from that thread.
     """
 
-    def __init__(self, host, port=13550, password='', user=None, command_timeout=1.0):
-        Thread.__init__(self, name="RavagedServerThread")
+    def __init__(self, host, port=13550, password='', user=None, command_timeout=1.0, connect_timeout=1.0):
         self.password = password
         self.command_timeout = command_timeout
         self.user = user if user else 'Admin'
 
-        self._stopEvent = Event()  # used to notify the thread to stop
+        self._stopEvent = Event()  # used to notify the threads waiting for a command response to stop
         self.__command_reply_event = Event()  # used to notify when we received a command response
         self.__command_lock = Lock()  # used to make sure no 2nd command is sent while waiting
         # for the response of a 1st command
 
-        self._received_packets = Queue(maxsize=500)
         self.command_response = None  # future command response to be received
         self.observers = set()
         self.log = logging.getLogger("RavagedServer")
 
-        self.dispatcher = RavagedDispatcher(host, port, self._received_packets)
-        self.packet_handler_thread = RavagedServerPacketHandler(self.log, self._received_packets,
-                                                                self._on_event, self._on_command_response)
-
-        self.start()
-        time.sleep(.2)
+        self.dispatcher = RavagedDispatcher(host, port, self.handle_packet)
+        self.dispatcher.wait_connected(connect_timeout)
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -117,7 +108,7 @@ class RavagedServer(Thread):
                 raise RavagedServerBlacklisted(response)
         except RavagedServerCommandTimeout:
             pass
-        response = self.command("PASS=" + sha1(self.password).hexdigest().upper())
+        response = self.command("PASS=" + sha1(self.password.encode('UTF-8')).hexdigest().upper())
         if response.startswith('Login success as '):
             self.log.info(response)
             # test we can send commands
@@ -172,21 +163,23 @@ class RavagedServer(Thread):
     def isStopped(self):
         return self._stopEvent.is_set()
 
-    def run(self):
+    def handle_packet(self, packet):
         """
-        Threaded code.
+        Called when a full packet has been received: call the event handler or the command response handler
+        depending on the nature of the packet.
         """
-        self.packet_handler_thread.start()
-        self.log.info('start server loop')
-        try:
-            while not self.isStopped():
-                asyncore.loop(count=1, timeout=1)
-        except KeyboardInterrupt:
-            pass
-        finally:
-            self.dispatcher.close()
-        self.log.info('end server loop')
-        self.packet_handler_thread.stop()
+        if packet[0] == '(' and packet[-1] == ')':
+            self._on_event(packet)
+        elif packet.startswith('RCon:('):
+            self._on_event(packet)
+        elif packet == 'You must be a superuser to run this command.':
+            self._on_command_response(None, packet)
+        else:
+            m = re.match(RE_COMMAND_RESPONSE, packet)
+            if not m:
+                self._on_event(packet)
+            else:
+                self._on_command_response(m.group('command'), m.group('response'))
 
     def _on_event(self, message):
         self.log.debug("received server event : %r" % message)
@@ -229,91 +222,22 @@ class RavagedServer(Thread):
                 return response
 
 
-class RavagedServerPacketHandler(Thread):
-    """
-    Thread that handles received packets found in received_packets_queue and call the event_handler or
-    command_response_handler depending on the nature of the packets.
-    """
-
-    def __init__(self, logger, received_packets_queue, event_handler, command_response_handler):
-        Thread.__init__(self, name="RavagedServerPacketHandlerThread")
-        self.log = logger
-        self._stopEvent = Event()  # used to notify the thread to stop
-        self._received_packets = received_packets_queue
-        self.__event_handler = event_handler
-        self.__command_response_handler = command_response_handler
-        self.__stop_token = object()
-
-    def run(self):
-        """
-        Threaded code.
-        """
-        self.log.info('start server packet handler loop')
-        try:
-            while not self.isStopped():
-                try:
-                    packet = self._received_packets.get(timeout=10)
-                    if packet is self.__stop_token:
-                        break
-                    self.handle_packet(packet)
-                    self._received_packets.task_done()
-                except Empty:
-                    pass
-        finally:
-            pass
-        self.log.info('end server packet handler loop')
-
-    def stop(self):
-        self._stopEvent.set()
-        self._received_packets.put(self.__stop_token)
-
-    def isStopped(self):
-        return self._stopEvent.is_set()
-
-    def handle_packet(self, packet):
-        """
-        Called when a full packet has been received.
-        """
-        if packet[0] == '(' and packet[-1] == ')':
-            self.handle_event(packet)
-        elif packet.startswith('RCon:('):
-            self.handle_event(packet)
-        elif packet == 'You must be a superuser to run this command.':
-            self.handle_command_response(None, packet)
-        else:
-            m = re.match(RE_COMMAND_RESPONSE, packet)
-            if not m:
-                self.handle_event(packet)
-            else:
-                self.handle_command_response(m.group('command'), m.group('response'))
-
-    def handle_event(self, message):
-        if self.__event_handler is not None:
-            self.__event_handler(message)
-
-    def handle_command_response(self, command, response):
-        if self.__command_response_handler is not None:
-            self.__command_response_handler(command, response)
-
-
 MIN_MESSAGE_LENGTH = 4  # minimal response is "(1):"
 RE_COMMAND_RESPONSE = re.compile(r'''^(?P<command>[\S^:]+):(?P<response>.*)$''', re.DOTALL)
 
 
-class RavagedDispatcher(asyncore.dispatcher_with_send):
+class RavagedDispatcher(StreamConnection):
     """
-    This asyncore dispatcher provides the send_command method to write to the socket
-    and exposes a Queue.Queue that stores the received full packets.
+    This connection provides the send_command method to write to the socket and passes the received full packets
+    to the packet handler, from the network core thread.
     """
 
-    def __init__(self, host, port, packet_queue=None):
-        asyncore.dispatcher_with_send.__init__(self)
+    def __init__(self, host, port, packet_handler=None):
         self.log = logging.getLogger("RavagedDispatcher")
-        self._buffer_in = ''
-        self.packet_queue = packet_queue if packet_queue else Queue()
+        self._buffer_in = b''
+        self.packet_handler = packet_handler
         self.log.info("connecting")
-        self.create_socket(AF_INET, SOCK_STREAM)
-        self.connect((host, port))
+        StreamConnection.__init__(self, host, port)
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -326,14 +250,11 @@ class RavagedDispatcher(asyncore.dispatcher_with_send):
         Send a command to the server.
         """
         self.log.debug("send_command : %s " % repr(command))
-        self.send(unicode(command + "\n").encode('UTF-8'))
-
-    def get_packet_queue(self):
-        return self.packet_queue
+        self.send((command + "\n").encode('UTF-8'))
 
     ####################################################################################################################
     #                                                                                                                  #
-    #   ASYNCORE HANDLERS (LOW LEVEL)                                                                                  #
+    #   CONNECTION HANDLERS (LOW LEVEL)                                                                                #
     #                                                                                                                  #
     ####################################################################################################################
 
@@ -345,25 +266,24 @@ class RavagedDispatcher(asyncore.dispatcher_with_send):
         Called when the socket is closed.
         """
         self.log.debug("handle_close")
-        self.close()
 
-    def handle_read(self):
+    def handle_data(self, data):
         """
-        Called when the asynchronous loop detects that a read() call on the channel's socket will succeed.
+        Called with the raw data received from the server.
         """
-        # received raw data
-        data = self.recv(8192)
         self._buffer_in += data
         self.log.debug('read %s char from server' % len(data))
         # cook meaningful packets
-        map(self.handle_packet, self.full_packets())
+        for packet in self.full_packets():
+            self.handle_packet(packet)
 
     def handle_packet(self, packet):
         """
         Called when a full packet has been received.
         """
         self.log.debug("handle_packet(%r)" % packet)
-        self.packet_queue.put(packet)
+        if self.packet_handler is not None:
+            self.packet_handler(packet)
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -382,7 +302,7 @@ class RavagedDispatcher(asyncore.dispatcher_with_send):
         while len(self._buffer_in) >= MIN_MESSAGE_LENGTH:
             # read the size of this packet
             # 1st byte should be '('
-            start_header_index = self._buffer_in.find('(')
+            start_header_index = self._buffer_in.find(b'(')
             if start_header_index == -1:
                 return
 
@@ -390,7 +310,7 @@ class RavagedDispatcher(asyncore.dispatcher_with_send):
             self._buffer_in = self._buffer_in[start_header_index:]
 
             # packet header ends with ')'
-            end_header_index = self._buffer_in.find(')')
+            end_header_index = self._buffer_in.find(b')')
             if end_header_index == -1:
                 # we don't have a full header yet
                 return
@@ -195,18 +195,13 @@ class WopParser(AbstractParser):
         Parse a log line returning extracted tokens.
         :param line: The line to be parsed
         """
-        line = re.sub(self._lineClear, '', line, 1)
-        m = None
-        for f in self._lineFormats:
-            m = re.match(f, line)
-            if m:
-                break
+        m, line = self.matchLine(line)
         if m:
             client = None
             target = None
             return m, m.group('action').lower(), m.group('data').strip(), client, target
         else:
-            self.verbose('Line did not match format: %s' % line)
+            self.verbose('Line did not match format: %s', line)
 
     def parseUserInfo(self, info):
         """
@@ -68,6 +68,25 @@ class Plugin(object):
     loadAfterPlugins = []
     """:type: list"""
 
+    # Whether events must be dispatched to this plugin from the main event handler thread, even when B3 is running
+    # in 'parallel' event dispatch mode. Plugins raising VetoEvent to stop other plugins from handling an event MUST
+    # set this to True, since vetoes raised from asynchronous handlers are ignored.
+    synchronousDispatch = False
+    """:type: bool"""
+
+    # Amount of lanes used to deliver events to this plugin in 'parallel' event dispatch mode. With a single lane
+    # the plugin receives all the events in order. With more lanes, events are sharded by client: the events of a
+    # given client are still delivered in order, but events of different clients may be handled concurrently.
+    dispatchShards = 1
+    """:type: int"""
+
+    # Whether this plugin accepts summarized damage events when B3 is coalescing damage events ('damage_coalescing'
+    # option). The data of a summarized damage event is a b311.coalescer.DamageSummary: the total amount of damage
+    # points of the merged events followed by the rest of the data of the first one, with the amount of merged events
+    # in its 'hits' attribute. Plugins needing every single hit in order must leave this to False.
+    coalesceDamage = False
+    """:type: bool"""
+
     # Default messages which can be retrieved using the getMessage method: this dict will be
     # used in place of a missing 'messages' configuration file section.
     _default_messages = {}
@@ -75,6 +94,7 @@ class Plugin(object):
 
     ################################## PLUGIN DEVELOPERS: END PLUGIN CUSTOMIZATION #####################################
 
+    _clientVars = None
     _enabled = True
     _messages = {}
 
@@ -95,7 +115,7 @@ class Plugin(object):
         self.console = console
         self.eventmanager = b311.events.eventManager
         self.eventmap = dict()
-        if isinstance(config, b311.config.XmlConfigParser) or isinstance(config, b311.config.CfgConfigParser):
+        if isinstance(config, b311.config.Xmlconfigparser) or isinstance(config, b311.config.Cfgconfigparser):
             # this will be used by default from the Parser class since B3 1.10dev
             self.config = config
         else:
@@ -419,6 +439,23 @@ class Plugin(object):
         if event.type == self.console.getEventID('EVT_EXIT') or event.type == self.console.getEventID('EVT_STOP'):
             self.working = False
 
+    ####################################################################################################################
+    #                                                                                                                  #
+    #   CLIENT VARIABLES                                                                                               #
+    #                                                                                                                  #
+    ####################################################################################################################
+
+    def registerClientVars(self, **defaults):
+        """
+        Declare the variables this plugin stores in client objects, with their default values.
+        Every client gets a compact record holding them, and Client.var/setvar/isvar/delvar calls on these
+        variables use the record: this should be called before storing any of them (i.e: in onStartup).
+        :param defaults: The default value of every variable
+        :return: The b311.clients.ClientVarSchema giving access to the client records
+        """
+        self._clientVars = b311.clients.ClientVarSchema(self, defaults)
+        return self._clientVars
+
     ####################################################################################################################
     #                                                                                                                  #
     #   LOGGING METHODS                                                                                                #
@@ -15,7 +15,7 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
-__version__ = '1.35'
+__version__ = '1.36'
 __author__ = 'ThorN, xlr8or, Courgette, Ozon, Fenix'
 
 import copy
@@ -1757,8 +1757,17 @@ class AdminPlugin(b311.plugin.Plugin):
         """
         - report status of bot
         """
-        if self.console.storage.status():
+        status = self.console.storage.status(metrics=True)
+        if status['connected']:
             cmd.sayLoudOrPM(client, '^7Database appears to be ^2UP')
+            if 'size' in status:
+                cmd.sayLoudOrPM(client, '^7Database connections: %(active)s/%(size)s in use, %(waits)s '
+                                        'waits (%(wait_time)ss)' % status)
+            if 'write_behind' in status:
+                cmd.sayLoudOrPM(client, '^7Database writes: %(pending)s pending, %(avg_batch)s rows per batch, '
+                                        '%(avg_flush_time)ss per batch' % status['write_behind'])
+            cmd.sayLoudOrPM(client, '^7Client cache: %(hits)s hits, %(misses)s misses (%(hit_ratio)s)'
+                                    % self.console.clients.cacheStats())
         else:
             cmd.sayLoudOrPM(client, '^7Database appears to be ^1DOWN')
 
@@ -16,21 +16,21 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
-__version__ = '2.8'
+__version__ = '2.9'
 __author__ = 'Courgette'
 
-import codecs
+import _thread
 import gzip
+import hashlib
+import io
 import os
 import random
 import re
-import string
+import threading
 import time
+import urllib.request as urllib2
 
-import StringIO
-import thread
-import urllib2
-from ConfigParser import NoOptionError
+from configparser import NoOptionError
 
 import b311
 import b311.cron
@@ -40,6 +40,13 @@ from b311.functions import getCmd
 
 user_agent = "B3 Banlist plugin/%s" % __version__
 
+# ip (or CIDR network) found at the beginning of a line of an ip banlist
+_re_ip_entry = re.compile(r'''^(?P<ip>(\d{1,3})\.(\d{1,3})\.(\d{1,3})\.(\d{1,3}))(?:/(?P<prefix>\d{1,2}))?(?!\d)''')
+# word found at the beginning of a line of a guid or pbid banlist
+_re_id_entry = re.compile(r'''^\s*(\w+)''')
+# guid found in the rules of combat banlist
+_re_roc_entry = re.compile(r'''BannedID="([^"]*)"''')
+
 
 class BanlistPlugin(b311.plugin.Plugin):
     _adminPlugin = None
@@ -181,7 +188,7 @@ class BanlistPlugin(b311.plugin.Plugin):
         Handle EVT_CLIENT_AUTH.
         """
         if self._banlists:
-            thread.start_new_thread(self.checkClient, (event.client,))
+            _thread.start_new_thread(self.checkClient, (event.client,))
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -245,9 +252,9 @@ class BanlistPlugin(b311.plugin.Plugin):
                 client.message('^7[^4%s^7] ^2updated' % banlist.name)
             else:
                 client.message('^7[^4%s^7] update ^1failed^7: %s' % (banlist.name, result))
-        except BanlistException, e:
-            self.warning("%s" % e.message)
-            client.message('^7[^4%s^7] update ^1failed^7: %s' % (banlist.name, e.message))
+        except BanlistException as e:
+            self.warning("%s" % e.parameter)
+            client.message('^7[^4%s^7] update ^1failed^7: %s' % (banlist.name, e.parameter))
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -303,11 +310,11 @@ class BanlistPlugin(b311.plugin.Plugin):
 
         for banlist in self._banlists:
             if banlist.url is not None:
-                thread.start_new_thread(self._verboseUpdateBanListFromUrl, (client, banlist))
+                _thread.start_new_thread(self._verboseUpdateBanListFromUrl, (client, banlist))
 
         for banlist in self._whitelists:
             if banlist.url is not None:
-                thread.start_new_thread(self._verboseUpdateBanListFromUrl, (client, banlist))
+                _thread.start_new_thread(self._verboseUpdateBanListFromUrl, (client, banlist))
 
     def cmd_banlistcheck(self, data=None, client=None, cmd=None):
         """
@@ -336,9 +343,12 @@ class Banlist(object):
         :param config: the banlist plugin configuration file instance
         """
         self.plugin = plugin
-        self.file_content = ""  # the banlist file content
         self.cache = {}  # used to cache isBanned results. Must be cleared after banlist file change/update
         self.cache_time = 0  # holds the modifed time of the banlist file used to fill that cache
+        self._indexed_size = 0  # size of the banlist file content found in the index
+        self._indexed_digest = None  # digest of the banlist file content found in the index
+        self._lock = threading.RLock()  # clients are checked by many threads while the index may be updated
+        self.clearIndex()
 
         node = config.find('name')
         if node is None or node.text is None or node.text == '':
@@ -393,8 +403,15 @@ class Banlist(object):
                                                                                  self.file, self.url, self.message))
 
     def clear_cache(self):
+        """
+        Empty the isBanned() results cache and the banlist entries index: the whole banlist file
+        is indexed again by the next refreshBanlistContent() call.
+        """
+        self.clearIndex()
         self.cache = {}
-        self.cache_time = self.getModifiedTime()
+        self.cache_time = 0
+        self._indexed_size = 0
+        self._indexed_digest = None
 
     def _checkFileExists(self):
         if not os.path.isfile(self.file):
@@ -414,8 +431,8 @@ class Banlist(object):
             if result is not True:
                 raise BanlistException("failed to update '%s' from %s. (%s)" % (self.file, self.url, result))
             self.plugin.checkConnectedPlayers()
-        except BanlistException, e:
-            self.plugin.warning("%s" % e.message)
+        except BanlistException as e:
+            self.plugin.warning("%s" % e.parameter)
 
     def updateFromUrl(self):
         """
@@ -438,18 +455,18 @@ class Banlist(object):
             result = webFile.read()
             webFile.close()
             if webFile.headers.get('content-encoding', '') == 'gzip':
-                result = StringIO.StringIO(result)
+                result = io.BytesIO(result)
                 gzipper = gzip.GzipFile(fileobj=result)
                 result = gzipper.read()
             self.remote_lastmodified = webFile.headers.get('Last-Modified')
             self.remote_etag = webFile.headers.get('ETag')
             self.plugin.debug('received headers : %s', webFile.info())
             self.plugin.debug("received %s bytes", len(result))
-            localFile = open(self.file, 'w')
+            localFile = open(self.file, 'wb')
             localFile.write(result)
             localFile.close()
             return True
-        except urllib2.HTTPError, err:
+        except urllib2.HTTPError as err:
             if err.code == 304:
                 self.plugin.info("remote banlist unchanged since last update")
                 return True
@@ -457,10 +474,10 @@ class Banlist(object):
                 self.remote_etag = self.remote_lastmodified = None
                 self.plugin.error("%r", err)
                 return "%s" % err
-        except urllib2.URLError, err:
+        except urllib2.URLError as err:
             self.remote_etag = self.remote_lastmodified = None
             return "%s" % err
-        except IOError, e:
+        except IOError as e:
             self.remote_etag = self.remote_lastmodified = None
             if hasattr(e, 'reason'):
                 return "%s" % e.reason
@@ -470,7 +487,7 @@ class Banlist(object):
             return "%s" % e
 
     def autoUpdateFromUrl(self):
-        thread.start_new_thread(self._updateFromUrlAndCheckAll, ())
+        _thread.start_new_thread(self._updateFromUrlAndCheckAll, ())
 
     def getMessage(self, client):
         """
@@ -492,14 +509,51 @@ class Banlist(object):
         return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.getModifiedTime()))
 
     def refreshBanlistContent(self):
+        """
+        Index the banlist file content if the file changed since it was last indexed. When lines were only added at
+        the end of the file, only those lines are indexed.
+        """
         if not self._checkFileExists():
-            return ""
+            return
+
+        modified_time = self.getModifiedTime()
+        if self.cache_time == modified_time:
+            return
+
+        with open(self.file, 'rb') as f:
+            content = f.read()
+
+        size = self._indexed_size
+        if 0 < size <= len(content) and content[size - 1:size] == b'\n' and \
+                hashlib.md5(content[:size]).digest() == self._indexed_digest:
+            self.plugin.verbose("indexing %s bytes added to %s" % (len(content) - size, self.file))
+            added = content[size:]
+        else:
+            self.plugin.verbose("indexing %s content from %s" % (self, self.file))
+            self.clearIndex()
+            added = content
+
+        for line in added.decode('iso-8859-1').split('\n'):
+            line = line.rstrip()
+            if line:
+                self.indexLine(line)
+
+        self._indexed_size = len(content)
+        self._indexed_digest = hashlib.md5(content).digest()
+        self.cache = {}
+        self.cache_time = modified_time
 
-        if self.cache_time != self.getModifiedTime():
-            with open(self.file) as f:
-                self.plugin.verbose("updating %s content cache from %s" % (self, self.file))
-                self.file_content = f.read()
-            self.clear_cache()
+    def clearIndex(self):
+        """
+        Empty the banlist entries index.
+        """
+        pass
+
+    def indexLine(self, line):
+        """
+        Add a line of the banlist file to the banlist entries index.
+        """
+        pass
 
 
 class IpBanlist(Banlist):
@@ -514,12 +568,42 @@ class IpBanlist(Banlist):
         Banlist.__init__(self, plugin, config)
         # set specific settings
         node = config.find('force_ip_range')
-        if node is not None and string.upper(node.text) in ('YES', '1', 'ON', 'TRUE'):
+        if node is not None and node.text.upper() in ('YES', '1', 'ON', 'TRUE'):
             self._forceRange = True
         else:
             self._forceRange = False
         self.plugin.debug("%s [%s] force IP range : %s" % (self.__class__.__name__, self.name, self._forceRange))
 
+    def clearIndex(self):
+        """
+        Empty the banlist entries index.
+        """
+        self._ips = {}  # ip -> entry
+        self._ranges = {3: {}, 2: {}, 1: {}}  # number of octets -> {first octets of entries ending with .0 -> entry}
+        self._networks = {}  # CIDR prefix length -> {network address -> entry}
+        self._forced_ranges = {}  # first 3 octets -> entry
+
+    def indexLine(self, line):
+        """
+        Add a line of the banlist file to the banlist entries index.
+        """
+        m = _re_ip_entry.match(line)
+        if not m:
+            return
+
+        octets = m.group(2, 3, 4, 5)
+        self._ips.setdefault(m.group('ip'), line)
+        if self._forceRange:
+            self._forced_ranges.setdefault('.'.join(octets[:3]), line)
+        for n in (3, 2, 1):
+            if any(x != '0' for x in octets[n:]):
+                break
+            self._ranges[n].setdefault('.'.join(octets[:n]), line)
+
+        if m.group('prefix') is not None and int(m.group('prefix')) <= 32:
+            prefix = int(m.group('prefix'))
+            self._networks.setdefault(prefix, {}).setdefault(_ip_to_int(octets) >> (32 - prefix), line)
+
     def isBanned(self, client):
         """
         Check whether a client is banned
@@ -527,12 +611,12 @@ class IpBanlist(Banlist):
         if not client.ip:
             return False
 
-        self.refreshBanlistContent()
+        with self._lock:
+            self.refreshBanlistContent()
+            if client.ip not in self.cache:
+                self.cache[client.ip] = self.isIpInBanlist(client.ip)
+            rv, msg = self.cache[client.ip]
 
-        if client.ip not in self.cache:
-            self.cache[client.ip] = self.isIpInBanlist(client.ip)
-
-        rv, msg = self.cache[client.ip]
         if rv:
             self.plugin.info(msg)
         else:
@@ -541,49 +625,82 @@ class IpBanlist(Banlist):
 
     def isIpInBanlist(self, ip):
         # search the exact ip
-        rStrict = re.compile(r'''^(?P<entry>%s(?:[^\d\n\r].*)?)$''' % re.escape(ip), re.MULTILINE)
-        m = rStrict.search(self.file_content)
-        if m:
+        entry = self._ips.get(ip)
+        if entry is not None:
             return ip, "ip '%s' matches banlist entry %r (%s %s)" % (
-            ip, m.group('entry').strip(), self.name, self.getHumanModifiedTime())
-
-        # search the ip with .0 at the end
-        rRange = re.compile(r'''^(?P<entry>%s\.0(?:[^\d\n\r].*)?)$''' % re.escape('.'.join(ip.split('.')[0:3])),
-                            re.MULTILINE)
-        m = rRange.search(self.file_content)
-        if m:
-            return ip, "ip '%s' matches (by range) banlist entry %r (%s %s)" % (
-            ip, m.group('entry').strip(), self.name, self.getHumanModifiedTime())
-
-        # search the ip with .0.0 at the end
-        rRange = re.compile(r'''^(?P<entry>%s\.0\.0(?:[^\d\n\r].*)?)$''' % re.escape('.'.join(ip.split('.')[0:2])),
-                            re.MULTILINE)
-        m = rRange.search(self.file_content)
-        if m:
-            return ip, "ip '%s' matches (by range) banlist entry %r (%s %s)" % (
-            ip, m.group('entry').strip(), self.name, self.getHumanModifiedTime())
-
-        # search the ip with .0.0.0 at the end
-        rRange = re.compile(r'''^(?P<entry>%s\.0\.0\.0(?:[^\d\n\r].*)?)$''' % re.escape('.'.join(ip.split('.')[0:1])),
-                            re.MULTILINE)
-        m = rRange.search(self.file_content)
-        if m:
-            return ip, "ip '%s' matches (by range) banlist entry %r (%s %s)" % (
-            ip, m.group('entry').strip(), self.name, self.getHumanModifiedTime())
+            ip, entry.strip(), self.name, self.getHumanModifiedTime())
+
+        # search the ip with .0, .0.0 and .0.0.0 at the end
+        octets = ip.split('.')
+        for n in (3, 2, 1):
+            entry = self._ranges[n].get('.'.join(octets[:n]))
+            if entry is not None:
+                return ip, "ip '%s' matches (by range) banlist entry %r (%s %s)" % (
+                ip, entry.strip(), self.name, self.getHumanModifiedTime())
+
+        # search the networks given in CIDR notation, the smallest first
+        if self._networks and len(octets) == 4 and all(x.isdigit() for x in octets):
+            address = _ip_to_int(octets)
+            for prefix in sorted(self._networks, reverse=True):
+                entry = self._networks[prefix].get(address >> (32 - prefix))
+                if entry is not None:
+                    return ip, "ip '%s' matches (by range) banlist entry %r (%s %s)" % (
+                    ip, entry.strip(), self.name, self.getHumanModifiedTime())
 
         # if force range is set, enforce search by range even if banlist ip are not ending with ".0"
         if self._forceRange:
-            rForceRange = re.compile(
-                r'''^(?P<entry>%s\.\d{1,3}(?:[^\d\n\r].*)?)$''' % re.escape('.'.join(ip.split('.')[0:3])), re.MULTILINE)
-            m = rForceRange.search(self.file_content)
-            if m:
+            entry = self._forced_ranges.get('.'.join(octets[:3]))
+            if entry is not None:
                 return ip, "ip '%s' matches (by forced range) banlist entry %r (%s %s)" % (
-                ip, m.group('entry').strip(), self.name, self.getHumanModifiedTime())
+                ip, entry.strip(), self.name, self.getHumanModifiedTime())
 
         return False, "ip '%s' not found in banlist (%s %s)" % (ip, self.name, self.getHumanModifiedTime())
 
 
-class GuidBanlist(Banlist):
+class IdBanlist(Banlist):
+    """
+    Base class for the banlists of ids (guid, pbid) found at the beginning of the lines.
+    """
+    def clearIndex(self):
+        """
+        Empty the banlist entries index.
+        """
+        self._ids = {}  # lowercase word starting the entry -> entry (or list of entries when there are many)
+
+    def indexLine(self, line):
+        """
+        Add a line of the banlist file to the banlist entries index.
+        """
+        m = _re_id_entry.match(line)
+        if m:
+            key = m.group(1).lower()
+            entries = self._ids.get(key)
+            if entries is None:
+                self._ids[key] = line
+            elif isinstance(entries, list):
+                entries.append(line)
+            else:
+                self._ids[key] = [entries, line]
+
+    def findEntry(self, value):
+        """
+        Return the first banlist entry starting with the given id or None if there is no such entry.
+        """
+        m = _re_id_entry.match(value)
+        if not m:
+            return None
+        entries = self._ids.get(m.group(1).lower())
+        if entries is not None:
+            if not isinstance(entries, list):
+                entries = [entries]
+            re_entry = re.compile(r'''\s*%s\b''' % re.escape(value), re.IGNORECASE)
+            for entry in entries:
+                if re_entry.match(entry):
+                    return entry
+        return None
+
+
+class GuidBanlist(IdBanlist):
 
     def isBanned(self, client):
         """
@@ -592,12 +709,12 @@ class GuidBanlist(Banlist):
         if not client.guid:
             return False
 
-        self.refreshBanlistContent()
+        with self._lock:
+            self.refreshBanlistContent()
+            if client.guid not in self.cache:
+                self.cache[client.guid] = self.isGuidInBanlist(client.guid)
+            rv, msg = self.cache[client.guid]
 
-        if client.guid not in self.cache:
-            self.cache[client.guid] = self.isGuidInBanlist(client.guid)
-
-        rv, msg = self.cache[client.guid]
         if rv:
             self.plugin.info(msg)
         else:
@@ -605,15 +722,14 @@ class GuidBanlist(Banlist):
         return rv
 
     def isGuidInBanlist(self, guid):
-        re_guid = re.compile(r'''^(?P<entry>\s*%s\b.*)$''' % re.escape(guid), re.IGNORECASE | re.MULTILINE)
-        m = re_guid.search(self.file_content)
-        if m:
+        entry = self.findEntry(guid)
+        if entry is not None:
             return guid, "guid '%s' matches banlist entry %r (%s %s)" % (
-            guid, m.group('entry'), self.name, self.getHumanModifiedTime())
+            guid, entry, self.name, self.getHumanModifiedTime())
         return False, "guid '%s' not found in banlist (%s %s)" % (guid, self.name, self.getHumanModifiedTime())
 
 
-class PbidBanlist(Banlist):
+class PbidBanlist(IdBanlist):
 
     def isBanned(self, client):
         """
@@ -622,12 +738,12 @@ class PbidBanlist(Banlist):
         if not client.pbid:
             return False
 
-        self.refreshBanlistContent()
+        with self._lock:
+            self.refreshBanlistContent()
+            if client.pbid not in self.cache:
+                self.cache[client.pbid] = self.isPbidInBanlist(client.pbid)
+            rv, msg = self.cache[client.pbid]
 
-        if client.pbid not in self.cache:
-            self.cache[client.pbid] = self.isPbidInBanlist(client.pbid)
-
-        rv, msg = self.cache[client.pbid]
         if rv:
             self.plugin.info(msg)
         else:
@@ -635,16 +751,27 @@ class PbidBanlist(Banlist):
         return rv
 
     def isPbidInBanlist(self, pbid):
-        re_guid = re.compile(r'''^(?P<entry>\s*%s\b.*)$''' % re.escape(pbid), re.IGNORECASE | re.MULTILINE)
-        m = re_guid.search(self.file_content)
-        if m:
+        entry = self.findEntry(pbid)
+        if entry is not None:
             return pbid, "PBid '%s' matches banlist entry %r (%s %s)" % (
-            pbid, m.group('entry'), self.name, self.getHumanModifiedTime())
+            pbid, entry, self.name, self.getHumanModifiedTime())
         return False, "PBid '%s' not found in banlist (%s %s)" % (pbid, self.name, self.getHumanModifiedTime())
 
 
 class RocBanlist(Banlist):
 
+    def clearIndex(self):
+        """
+        Empty the banlist entries index.
+        """
+        self._ids = set()
+
+    def indexLine(self, line):
+        """
+        Add a line of the banlist file to the banlist entries index.
+        """
+        self._ids.update(_re_roc_entry.findall(line))
+
     def isBanned(self, client):
         """
         Check whether a client is banned
@@ -652,20 +779,25 @@ class RocBanlist(Banlist):
         if not client.guid:
             return False
 
-        if not self._checkFileExists():
-            return False
+        with self._lock:
+            self.refreshBanlistContent()
+            self.plugin.debug("checking %s" % client.guid)
+            if client.guid in self._ids:
+                return client.guid
 
-        f = codecs.open(self.file, "r", "iso-8859-1")
-        banlist = f.read()
-        self.plugin.debug(u"checking %s" % client.guid)
-        if u'BannedID="%s"' % client.guid in banlist:
-            f.close()
-            return client.guid
-
-        f.close()
         return False
 
 
+def _ip_to_int(octets):
+    """
+    Return the integer value of an IPv4 address given as a list of octets.
+    """
+    value = 0
+    for octet in octets:
+        value = value << 8 | int(octet)
+    return value
+
+
 class BanlistException(Exception):
     def __init__(self, value):
         self.parameter = value
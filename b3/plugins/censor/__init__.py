@@ -16,20 +16,26 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
 __author__ = 'ThorN, xlr8or, Bravo17, Courgette'
-__version__ = '3.3'
+__version__ = '3.5.1'
 
 import re
 import sys
 import threading
 import traceback
 
-from ConfigParser import NoOptionError
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    # python < 3.11
+    import sre_parse
+
+from configparser import NoOptionError
 
 import b311
 import b311.events
 import b311.plugin
 from b311 import functions
-from b311.config import XmlConfigParser
+from b311.config import Xmlconfigparser
 
 
 class PenaltyData:
@@ -39,7 +45,7 @@ class PenaltyData:
     duration = 0
 
     def __init__(self, **kwargs):
-        for k, v in kwargs.iteritems():
+        for k, v in kwargs.items():
             setattr(self, k, v)
 
     def __repr__(self):
@@ -55,15 +61,161 @@ class CensorData:
     name = None
     penalty = None
     regexp = None
+    word = None  # lowercase word for rules matching a single plain word
 
     def __init__(self, **kwargs):
-        for k, v in kwargs.iteritems():
+        for k, v in kwargs.items():
             setattr(self, k, v)
 
     def __repr__(self):
         return """CensorData(name=%r, penalty=%r, regexp=%r)""" % (self.name, self.penalty, self.regexp)
 
 
+class CensorMatcher(object):
+    """
+    Search many censor rules at once. Rules matching a single plain word are looked up by word. The other rules are
+    indexed by a literal string (or a few variants of it) found in every text they match, so that only the rules
+    whose literal appears in a text are searched. Rules are all searched one by one when a text holds non ASCII
+    characters (case insensitive matching can't be reproduced by lowering such texts) and rules which can't be indexed
+    (no literal to look for) are always searched. The rule found is the first one of the list matching a text, as if
+    all the rules were searched one by one.
+    """
+    _maxVariants = 16  # max number of variants of the literal used to index a rule
+    _maxKeyLength = 3  # max length of the substring of the literal used as index key
+
+    def __init__(self, rules):
+        """
+        Object constructor.
+        :param rules: The list of CensorData to search
+        """
+        self.rules = rules
+        self._words = {}  # word -> index of the first rule matching it
+        self._literals = {}  # key -> list of (rule index, literal)
+        self._keyLengths = set()
+        self._single = []  # indexes of the rules which have to be searched anyway
+        for i, rule in enumerate(rules):
+            if rule.word is not None and self._isAscii(rule.word):
+                self._words.setdefault(rule.word, i)
+                continue
+            literals = self._getLiterals(rule.regexp.pattern)
+            if not literals:
+                self._single.append(i)
+                continue
+            for literal in literals:
+                key = literal[:self._maxKeyLength]
+                self._keyLengths.add(len(key))
+                self._literals.setdefault(key, []).append((i, literal))
+
+    @staticmethod
+    def _isAscii(text):
+        try:
+            text.encode('ascii')
+            return True
+        except UnicodeError:
+            return False
+
+    def _getLiterals(self, pattern):
+        """
+        Return the variants of a literal string found (lowercased) in any text matched by the given regular
+        expression, or None if there is no such literal.
+        """
+        try:
+            return self._getSequenceLiterals(sre_parse.parse(pattern).data)
+        except Exception:
+            return None
+
+    def _getSequenceLiterals(self, items):
+        best = None
+        run = ['']
+        for op, av in list(items) + [(None, None)]:
+            if op is sre_parse.AT:
+                # zero width assertion: the characters around it are still next to each other
+                continue
+            chars, repeated = self._getChars(op, av)
+            if chars is not None and len(run) * len(chars) <= self._maxVariants:
+                run = sorted(set([x + c for x in run for c in chars]))
+                if not repeated:
+                    continue
+            if run[0] and (best is None or (len(run[0]), -len(run)) > (len(best[0]), -len(best))):
+                best = run
+            run = ['']
+
+        if best is None:
+            # a single group or alternation (i.e: 'foo|bar'): look into it
+            items = [x for x in items if x[0] is not sre_parse.AT]
+            if len(items) == 1 and items[0][0] is sre_parse.SUBPATTERN:
+                return self._getSequenceLiterals(items[0][1][-1].data)
+            if len(items) == 1 and items[0][0] is sre_parse.BRANCH:
+                literals = []
+                for branch in items[0][1][1]:
+                    found = self._getSequenceLiterals(branch.data)
+                    if not found:
+                        return None
+                    literals.extend(found)
+                return literals
+        return best
+
+    def _getChars(self, op, av):
+        """
+        Return a (characters, repeated) tuple for a regular expression item matching one character out of a few ones
+        (characters is None for any other item).
+        """
+        if op is sre_parse.LITERAL:
+            chars = [chr(av)]
+        elif op is sre_parse.IN:
+            chars = []
+            for x, y in av:
+                if x is sre_parse.LITERAL:
+                    chars.append(chr(y))
+                elif x is sre_parse.RANGE and y[1] - y[0] < self._maxVariants:
+                    chars.extend([chr(c) for c in range(y[0], y[1] + 1)])
+                else:
+                    return None, False
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1 and len(av[2].data) == 1:
+            # the repeated character is found at least once but the next item may not follow it
+            return self._getChars(*av[2].data[0])[0], True
+        else:
+            return None, False
+
+        chars = set([c.lower() for c in chars])
+        if not self._isAscii(''.join(chars)):
+            return None, False
+        return chars, False
+
+    def search(self, *texts):
+        """
+        Search the given texts.
+        :return: A (rule, text) tuple for the first rule matching one of the texts or None if no rule matches
+        """
+        if not all(self._isAscii(x) for x in texts):
+            for rule in self.rules:
+                for text in texts:
+                    if rule.regexp.search(text):
+                        return rule, text
+            return None
+
+        candidates = set(self._single)
+        for text in texts:
+            lowered = text.lower()
+            for word in lowered.split():
+                i = self._words.get(word)
+                if i is not None:
+                    # the regexp still has to match: texts are not split into words the way the rule expects
+                    candidates.add(i)
+            for n in self._keyLengths:
+                for key in set([lowered[x:x + n] for x in range(len(lowered) - n + 1)]):
+                    for i, literal in self._literals.get(key, ()):
+                        if literal in lowered:
+                            candidates.add(i)
+
+        for i in sorted(candidates):
+            rule = self.rules[i]
+            for text in texts:
+                if rule.regexp.search(text):
+                    return rule, text
+        return None
+
+
 class CensorPlugin(b311.plugin.Plugin):
     _adminPlugin = None
     _reClean = re.compile(r'[^0-9a-z ]+', re.I)
@@ -73,8 +225,11 @@ class CensorPlugin(b311.plugin.Plugin):
     _ignoreLength = 3
     _badWords = None
     _badNames = None
+    _badWordsMatcher = None
+    _badNamesMatcher = None
 
     loadAfterPlugins = ['chatlogger']
+    synchronousDispatch = True  # we veto chat events containing bad words
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -97,7 +252,7 @@ class CensorPlugin(b311.plugin.Plugin):
         """
         Load plugin configuration.
         """
-        assert isinstance(self.config, XmlConfigParser)
+        assert isinstance(self.config, Xmlconfigparser)
 
         try:
             self._maxLevel = self.config.getint('settings', 'max_level')
@@ -105,7 +260,7 @@ class CensorPlugin(b311.plugin.Plugin):
         except NoOptionError:
             self.warning('could not find settings/max_level in config file, '
                          'using default: %s' % self._maxLevel)
-        except ValueError, e:
+        except ValueError as e:
             self.error('could not load settings/max_level config value: %s' % e)
             self.debug('using default value (%s) for settings/max_level' % self._maxLevel)
 
@@ -115,7 +270,7 @@ class CensorPlugin(b311.plugin.Plugin):
         except NoOptionError:
             self.warning('could not find settings/ignore_length in config file, '
                          'using default: %s' % self._ignoreLength)
-        except ValueError, e:
+        except ValueError as e:
             self.error('could not load settings/ignore_length config value: %s' % e)
             self.debug('using default value (%s) for settings/ignore_length' % self._ignoreLength)
 
@@ -178,11 +333,13 @@ class CensorPlugin(b311.plugin.Plugin):
         elif regexp is not None:
             # has a regular expression
             self._badWords.append(self._get_censor_data(rulename, regexp.strip(), penalty, self._defaultBadWordPenalty))
+            self._badWordsMatcher = None
             self.debug("badword rule '%s' loaded" % rulename)
         elif word is not None:
             # has a plain word
             self._badWords.append(self._get_censor_data(rulename, '\\s' + word.strip() + '\\s',
-                                                        penalty, self._defaultBadWordPenalty))
+                                                        penalty, self._defaultBadWordPenalty, word.strip()))
+            self._badWordsMatcher = None
             self.debug("badword rule '%s' loaded" % rulename)
 
     def _add_bad_name(self, rulename, penalty=None, word=None, regexp=None):
@@ -200,14 +357,16 @@ class CensorPlugin(b311.plugin.Plugin):
         elif regexp is not None:
             # has a regular expression
             self._badNames.append(self._get_censor_data(rulename, regexp.strip(), penalty, self._defaultBadNamePenalty))
+            self._badNamesMatcher = None
             self.debug("badname rule '%s' loaded" % rulename)
         elif word is not None:
             # has a plain word
             self._badNames.append(self._get_censor_data(rulename, '\\s' + word.strip() + '\\s',
-                                                        penalty, self._defaultBadNamePenalty))
+                                                        penalty, self._defaultBadNamePenalty, word.strip()))
+            self._badNamesMatcher = None
             self.debug("badname rule '%s' loaded" % rulename)
 
-    def _get_censor_data(self, name, regexp, penalty, default):
+    def _get_censor_data(self, name, regexp, penalty, default, word=None):
         try:
             regexp = re.compile(regexp, re.IGNORECASE)
         except re.error:
@@ -222,7 +381,11 @@ class CensorPlugin(b311.plugin.Plugin):
         else:
             pd = default
 
-        return CensorData(name=name, penalty=pd, regexp=regexp)
+        if word is not None and not re.match(r'^\w+$', word, re.UNICODE):
+            # not a plain word: it can only be searched with the regular expression
+            word = None
+
+        return CensorData(name=name, penalty=pd, regexp=regexp, word=word.lower() if word is not None else None)
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -291,21 +454,18 @@ class CensorPlugin(b311.plugin.Plugin):
         cleaned_name = ' ' + self.clean(client.exactName) + ' '
         self.info("checking '%s'=>'%s' for badname" % (client.exactName, cleaned_name))
 
-        was_penalized = False
-        for w in self._badNames:
-            if w.regexp.search(client.exactName):
-                self.debug("badname rule [%s] matches '%s'" % (w.name, client.exactName))
-                self.penalizeClientBadname(w.penalty, client, '%s (rule %s)' % (client.exactName, w.name))
-                was_penalized = True
-                break
-            if w.regexp.search(cleaned_name):
+        if self._badNamesMatcher is None or self._badNamesMatcher.rules is not self._badNames:
+            self._badNamesMatcher = CensorMatcher(self._badNames)
+
+        match = self._badNamesMatcher.search(client.exactName, cleaned_name)
+        if match:
+            w, matched = match
+            if matched is cleaned_name:
                 self.debug("badname rule [%s] matches cleaned name '%s' for player '%s'" % (
                 w.name, cleaned_name, client.exactName))
-                self.penalizeClientBadname(w.penalty, client, '%s (rule %s)' % (client.exactName, w.name))
-                was_penalized = True
-                break
-
-        if was_penalized:
+            else:
+                self.debug("badname rule [%s] matches '%s'" % (w.name, client.exactName))
+            self.penalizeClientBadname(w.penalty, client, '%s (rule %s)' % (client.exactName, w.name))
             # check again in 1 minute
             t = threading.Timer(60, self.checkBadName, (client,))
             t.start()
@@ -320,15 +480,19 @@ class CensorPlugin(b311.plugin.Plugin):
         cleaned = ' ' + self.clean(text) + ' '
         text = ' ' + text + ' '
         self.debug("cleaned text: [%s]" % cleaned)
-        for w in self._badWords:
-            if w.regexp.search(text):
+        if self._badWordsMatcher is None or self._badWordsMatcher.rules is not self._badWords:
+            self._badWordsMatcher = CensorMatcher(self._badWords)
+
+        match = self._badWordsMatcher.search(text, cleaned)
+        if match:
+            w, matched = match
+            if matched is text:
                 self.debug("badword rule [%s] matches '%s'" % (w.name, text))
                 self.penalizeClient(w.penalty, client, text)
-                raise b311.events.VetoEvent
-            if w.regexp.search(cleaned):
+            else:
                 self.debug("badword rule [%s] matches cleaned text '%s'" % (w.name, cleaned))
                 self.penalizeClient(w.penalty, client, '%s => %s' % (text, cleaned))
-                raise b311.events.VetoEvent
+            raise b311.events.VetoEvent
 
     def clean(self, data):
         return re.sub(self._reClean, ' ', self.console.stripColors(data.lower()))
@@ -15,7 +15,7 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
-__version__ = '1.7'
+__version__ = '1.8'
 __author__ = 'guwashi / xlr8or'
 
 import b311
@@ -25,6 +25,7 @@ import b311.plugin
 
 class CountryfilterPlugin(b311.plugin.Plugin):
     requiresPlugins = ['geolocation']
+    synchronousDispatch = True  # we veto EVT_CLIENT_AUTH for rejected players
 
     cf_announce_accept = True
     cf_announce_reject = True
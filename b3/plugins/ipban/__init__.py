@@ -15,12 +15,14 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
-__version__ = '1.3.0'
+__version__ = '1.4.0'
 __author__ = 'xlr8or'
 
-from time import time
+import heapq
+import threading
 
 import b311
+import b311.cron
 import b311.events
 import b311.lib
 import b311.plugin
@@ -28,7 +30,22 @@ import b311.plugin
 
 class IpbanPlugin(b311.plugin.Plugin):
     _adminPlugin = None
+    _cronTab = None
     _maxLevel = 1
+    _reconcileInterval = 5
+
+    def __init__(self, console, config=None):
+        """
+        Object constructor.
+        :param console: The console instance
+        :param config: The plugin configuration
+        """
+        b311.plugin.Plugin.__init__(self, console, config)
+        self._lock = threading.RLock()
+        self._bans = {}  # client id -> (ip, time_expire) of its active bans, time_expire being -1 for permanent bans
+        self._banned = {}  # ip -> set of banned client ids
+        self._expiry = []  # heap of (time_expire, client id) of the tempbans
+        self._signature = None  # (count, last edit time) of the active bans when the bans were loaded
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -54,8 +71,21 @@ class IpbanPlugin(b311.plugin.Plugin):
             # don't use EVT_CLIENT_CONNECT since we need the client group for level exclusion
             self.registerEvent('EVT_CLIENT_AUTH', self.onPlayerConnect)
 
+        # keep the banned ips up to date without querying the storage
+        self.registerEvent('EVT_CLIENT_BAN', self.onBan)
+        self.registerEvent('EVT_CLIENT_BAN_TEMP', self.onTempBan)
+        self.registerEvent('EVT_CLIENT_UNBAN', self.onUnban)
+
+        self.loadBans()
         self.debug('banned ips: %s' % self.getBanIps())
         self.debug('banned ips: %s' % self.getTempBanIps())
+
+        if self._cronTab:
+            self.console.cron - self._cronTab
+        if self._reconcileInterval:
+            self._cronTab = b311.cron.PluginCronTab(self, self.reconcile, 0, '*/%s' % self._reconcileInterval)
+            self.console.cron + self._cronTab
+
         self.debug('plugin started')
 
     def onLoadConfig(self):
@@ -63,6 +93,14 @@ class IpbanPlugin(b311.plugin.Plugin):
         Load plugin configuration
         """
         self._maxLevel = self.getSetting('settings', 'maxlevel', b311.LEVEL, self._maxLevel)
+        self._reconcileInterval = self.getSetting('settings', 'reconcile_interval', b311.INT, self._reconcileInterval,
+                                                  lambda x: min(max(x, 0), 59))
+
+    def onEnable(self):
+        """
+        Catch up with the bans issued while the plugin was disabled.
+        """
+        self.reconcile()
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -81,49 +119,167 @@ class IpbanPlugin(b311.plugin.Plugin):
         else:
             self.debug('checking player: <cid:%s,name:%s,ip:%s>' % (client.cid, client.name, client.ip))
             # check for active bans and tempbans
-            if client.ip in self.getBanIps():
+            ban_type = self.getBanType(client)
+            if ban_type == 'Ban':
                 self.debug('client refused: <cid:%s,name:%s,ip:%s>' % (client.cid, client.name, client.ip))
                 client.kick('IPBan: client refused: %s (%s) has an active Ban' % (client.ip, client.name))
-            elif client.ip in self.getTempBanIps():
+            elif ban_type == 'TempBan':
                 self.debug('client refused: <cid:%s,name:%s,ip:%s>' % (client.cid, client.name, client.ip))
                 client.kick('IPBan: client refused: %s (%s) has an active TempBan' % (client.ip, client.name))
             else:
                 self.debug('client accepted (no active Ban/TempBan found): <cid:%s,name:%s,ip:%s>' % (
                 client.cid, client.name, client.ip))
 
+    def onBan(self, event):
+        """
+        Handle EVT_CLIENT_BAN.
+        """
+        client = event.client
+        if client and client.id:
+            with self._lock:
+                self._addBan(client.id, client.ip, -1)
+
+    def onTempBan(self, event):
+        """
+        Handle EVT_CLIENT_BAN_TEMP.
+        """
+        client = event.client
+        if client and client.id:
+            try:
+                time_expire = int(self.console.time() + float(event.data['duration']) * 60)
+            except (KeyError, TypeError, ValueError):
+                # can't tell when the tempban expires: catch up at the next check of the stored bans
+                self._signature = None
+                return
+            with self._lock:
+                self._addBan(client.id, client.ip, time_expire)
+
+    def onUnban(self, event):
+        """
+        Handle EVT_CLIENT_UNBAN.
+        """
+        client = event.client
+        if client and client.id:
+            with self._lock:
+                self._removeBan(client.id)
+
     ####################################################################################################################
     #                                                                                                                  #
     #   OTHER METHODS                                                                                                  #
     #                                                                                                                  #
     ####################################################################################################################
 
+    def _addBan(self, client_id, ip, time_expire):
+        """
+        Add a ban to the banned ips (the longest ban of a client is kept). The ban of a client without ip is kept
+        but no ip is banned until the client is seen with one.
+        """
+        current = self._bans.get(client_id)
+        if current is not None:
+            self._removeBan(client_id)
+            if current[1] == -1 or (time_expire != -1 and current[1] > time_expire):
+                time_expire = current[1]
+        self._bans[client_id] = (ip, time_expire)
+        if ip:
+            self._banned.setdefault(ip, set()).add(client_id)
+        if time_expire != -1:
+            heapq.heappush(self._expiry, (time_expire, client_id))
+
+    def _removeBan(self, client_id):
+        """
+        Remove the bans of a client from the banned ips (its entry in the expiry heap is dropped when it's popped).
+        """
+        ban = self._bans.pop(client_id, None)
+        if ban is not None and ban[0] in self._banned:
+            ids = self._banned[ban[0]]
+            ids.discard(client_id)
+            if not ids:
+                del self._banned[ban[0]]
+
+    def _expireBans(self):
+        """
+        Remove the expired tempbans from the banned ips.
+        """
+        now = int(self.console.time())
+        while self._expiry and self._expiry[0][0] <= now:
+            time_expire, client_id = heapq.heappop(self._expiry)
+            ban = self._bans.get(client_id)
+            if ban is not None and ban[1] == time_expire:
+                self._removeBan(client_id)
+
+    def getBanType(self, client):
+        """
+        Return the type of the active ban ('Ban' or 'TempBan') found for the ip of the given client or None.
+        """
+        with self._lock:
+            self._expireBans()
+            ban = self._bans.get(client.id)
+            if ban is not None and client.ip and ban[0] != client.ip:
+                # a banned client connecting from a new ip: the new ip is the one which will be stored
+                self._addBan(client.id, client.ip, ban[1])
+            ids = self._banned.get(client.ip) if client.ip else None
+            if not ids:
+                return None
+            if any(self._bans[x][1] == -1 for x in ids):
+                return 'Ban'
+            return 'TempBan'
+
     def getBanIps(self):
         """
         Returns a list of banned IPs
         """
-        banned = []
-        cursor = self.console.storage.query("SELECT clients.ip AS target_ip FROM penalties INNER JOIN clients ON "
-                                            "penalties.client_id = clients.id WHERE penalties.type = 'Ban' AND "
-                                            "penalties.inactive = 0 AND penalties.time_expire = -1 GROUP BY clients.ip")
-        if cursor:
-            while not cursor.EOF:
-                banned.append(cursor.getValue('target_ip'))
-                cursor.moveNext()
-        cursor.close()
-        return banned
+        with self._lock:
+            return [ip for ip, ids in self._banned.items() if any(self._bans[x][1] == -1 for x in ids)]
 
     def getTempBanIps(self):
         """
         Returns a list of TempBanned IPs
         """
-        banned = []
-        cursor = self.console.storage.query("SELECT clients.ip AS target_ip FROM penalties INNER JOIN clients ON "
-                                            "penalties.client_id = clients.id WHERE penalties.type = 'TempBan' AND "
-                                            "penalties.inactive = 0 AND penalties.time_expire > %s "
-                                            "GROUP BY clients.ip" % int(time()))
-        if cursor:
-            while not cursor.EOF:
-                banned.append(cursor.getValue('target_ip'))
-                cursor.moveNext()
+        with self._lock:
+            self._expireBans()
+            return [ip for ip, ids in self._banned.items() if all(self._bans[x][1] != -1 for x in ids)]
+
+    def getSignature(self):
+        """
+        Return the (count, last edit time) of the active bans stored, which changes whenever bans are added, edited
+        or removed.
+        """
+        cursor = self.console.storage.query("SELECT COUNT(id) AS total, MAX(time_edit) AS last_edit FROM penalties "
+                                            "WHERE type IN ('Ban', 'TempBan') AND inactive = 0")
+        row = cursor.getOneRow({})
         cursor.close()
-        return banned
+        return row.get('total'), row.get('last_edit')
+
+    def loadBans(self):
+        """
+        Load the active bans and tempbans from the storage.
+        """
+        signature = self.getSignature()
+        cursor = self.console.storage.query("SELECT penalties.client_id AS client_id, clients.ip AS target_ip, "
+                                            "penalties.time_expire AS time_expire FROM penalties INNER JOIN clients "
+                                            "ON penalties.client_id = clients.id WHERE penalties.inactive = 0 AND "
+                                            "((penalties.type = 'Ban' AND penalties.time_expire = -1) OR "
+                                            "(penalties.type = 'TempBan' AND penalties.time_expire > %s))" %
+                                            int(self.console.time()))
+        rows = [(row.client_id, row.target_ip, row.time_expire) for row in cursor]
+        cursor.close()
+
+        with self._lock:
+            self._bans = {}
+            self._banned = {}
+            self._expiry = []
+            for client_id, ip, time_expire in rows:
+                self._addBan(client_id, ip, time_expire)
+            self._signature = signature
+        self.debug('%s active bans loaded for %s ips' % (len(rows), len(self._banned)))
+
+    def reconcile(self):
+        """
+        Reload the bans if they changed in the storage since they were loaded (bans added from outside of B3).
+        """
+        try:
+            if self.getSignature() != self._signature:
+                self.debug('stored bans changed: reloading them')
+                self.loadBans()
+        except Exception as e:
+            self.error('could not check the stored bans: %s' % e)
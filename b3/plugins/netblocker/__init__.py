@@ -19,9 +19,11 @@
 # netblocker module provided by siebenmann: https://github.com/siebenmann/python-netblock
 
 
-__version__ = '1.0.2beta'
+__version__ = '1.1.0beta'
 __author__ = 'xlr8or'
 
+import re
+
 import b311
 import b311.events
 import b311.plugin
@@ -31,6 +33,9 @@ import b311.plugins.netblocker.netblock as netblock
 class NetblockerPlugin(b311.plugin.Plugin):
     _adminPlugin = None
     _blocks = []
+    _files = []
+    _ipv4 = None
+    _ipv6 = None
     _maxLevel = 1
 
     ####################################################################################################################
@@ -59,8 +64,11 @@ class NetblockerPlugin(b311.plugin.Plugin):
         """
         Load plugin configuration
         """
-        self._blocks = self.getSetting('settings', 'netblock', b311.LIST, [])
+        self._blocks = splitBlocks(self.getSetting('settings', 'netblock', b311.STRING, ''))
+        self._files = [b311.getAbsolutePath(x, decode=True) for x in
+                       re.split(r'\s*,\s*', self.getSetting('settings', 'netblock_files', b311.STRING, '')) if x]
         self._maxLevel = self.getSetting('settings', 'maxlevel', b311.LEVEL, self._maxLevel)
+        self.loadBlocks()
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -79,15 +87,74 @@ class NetblockerPlugin(b311.plugin.Plugin):
         # check the level of the connecting client before applying the filters
         if client.maxLevel > self._maxLevel:
             self.debug('%s is a higher level user, and allowed to connect', client.name)
-        else:
-            # transform ip address
-            ip = netblock.convert(client.ip)
-            # cycle through our blocks
-            for block in self._blocks:
-                # convert each block
-                b = netblock.convert(block)
-                # check if clients ip is in the disallowed range
-                if b[0] <= ip[0] <= b[1]:
-                    # client not allowed to connect
-                    self.debug('client refused: %s (%s)', client.ip, client.name)
-                    client.kick("Netblocker: Client %s refused!" % client.name)
+        elif self.isBlocked(client.ip):
+            # client not allowed to connect
+            self.debug('client refused: %s (%s)', client.ip, client.name)
+            client.kick("Netblocker: Client %s refused!" % client.name)
+
+    ####################################################################################################################
+    #                                                                                                                  #
+    #    OTHER METHODS                                                                                                 #
+    #                                                                                                                  #
+    ####################################################################################################################
+
+    def loadBlocks(self):
+        """
+        Convert the blocks found in the configuration file and in the list files into sorted and merged IPv4 and
+        IPv6 address ranges.
+        """
+        blocks = list(self._blocks)
+        for path in self._files:
+            try:
+                with open(path) as f:
+                    found = splitBlocks(f.read())
+                self.debug('%s blocks found in %s', len(found), path)
+                blocks.extend(found)
+            except IOError as e:
+                self.error('could not read netblock file %s: %s', path, e)
+
+        ipv4 = []
+        ipv6 = []
+        for block in blocks:
+            try:
+                (low, high) = netblock.convert(block)
+            except (netblock.NBError, IndexError) as e:
+                self.warning('invalid netblock %r: %s', block, e)
+                continue
+            (ipv6 if netblock.isip6(block) else ipv4).append((low, high))
+
+        self._ipv4 = netblock.IPRanges()
+        self._ipv4.addlist(ipv4)
+        self._ipv6 = netblock.IP6Ranges()
+        self._ipv6.addlist(ipv6)
+        self.info('%s netblocks loaded: %s IPv4 and %s IPv6 ranges once merged', len(ipv4) + len(ipv6),
+                  len(self._ipv4._l), len(self._ipv6._l))
+
+    def isBlocked(self, ip):
+        """
+        Tell whether the given ip address belongs to one of the blocks.
+        """
+        if not ip:
+            return False
+        try:
+            if netblock.isip6(ip):
+                mapped = ip.rpartition(':')[2]
+                if ip.lower().startswith('::ffff:') and '.' in mapped:
+                    # IPv4 address mapped to an IPv6 address
+                    return netblock.strtoip(mapped) in self._ipv4
+                return netblock.strtoip6(ip) in self._ipv6
+            return netblock.strtoip(ip) in self._ipv4
+        except netblock.NBError as e:
+            self.debug('could not check ip %r: %s', ip, e)
+            return False
+
+
+def splitBlocks(text):
+    """
+    Return the blocks found in the given text: blocks are separated by commas or blanks, lines of list files can
+    end with a comment starting with #.
+    """
+    blocks = []
+    for line in text.splitlines():
+        blocks.extend(x for x in re.split(r'[\s,]+', line.split('#', 1)[0]) if x)
+    return blocks
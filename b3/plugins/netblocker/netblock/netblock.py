@@ -1,17 +1,16 @@
 #
 # Sets of IP address ranges.
 # We support IP addresses, CIDR notation, and LOWIP-HIGHIP ranges, and
-# produce output generally as CIDR ranges.
+# produce output generally as CIDR ranges. IPv6 addresses are numbers
+# of 128 bits kept in their own sets (IP6Ranges).
+import ipaddress
 
-# NOTEZ BIEN: use of long integers is deliberate, because it insures that
-# various comparisons work right (eg 'low < high', when low has the high
-# bit clear and high has it set).
 from b311.plugins.netblocker.netblock import ranges
 
 __doc__ = """This module implements sets of IP address ranges,
 supporting various notation for them and various routines for
 dealing with them. The primary data structure is IPRanges, the
-actual IP address ranges.
+actual IP address ranges (IP6Ranges for IPv6 addresses).
 
 Ranges can generally be specified as IP addresses, in CIDR notation,
 or as ranges written 'LOWIP-HIGHIP'."""
@@ -28,7 +27,7 @@ class BadCIDRError(NBError):
 
 
 # mask off 32 bits.
-B32M = 0xffffffffL
+B32M = 0xffffffff
 
 
 def m32(n):
@@ -36,26 +35,32 @@ def m32(n):
     return n & B32M
 
 
-def lenmask(len):
-    """Return the mask for a given network length."""
-    return m32(-(1L << (32 - len)))
+def lenmask(len, bits=32):
+    """Return the mask for a given network length (of addresses of
+    the given number of bits)."""
+    return -(1 << (bits - len)) & ((1 << bits) - 1)
 
 
-def cidrrange(addr, length):
+def cidrrange(addr, length, bits=32):
     """Given an IP address and a network size, return the low and
     high addresses in it."""
-    m = lenmask(length)
+    m = lenmask(length, bits)
     # the low end is addr & mask (to make sure no funny business is going
     # on)
     l = addr & m
     # the high end is the low end plus the maximum span of the mask.
     # the maximum span is found by inverting the mask.
-    h = l + m32(~0 ^ m)
+    h = l + (((1 << bits) - 1) ^ m)
     # this is essentially the same as the previous, time-wise.
-    # h = l + (1L<<(32-length))-1
+    # h = l + (1<<(bits-length))-1
     return (l, h)
 
 
+def isip6(s):
+    """Is s (an IP address, CIDR or range string) an IPv6 one?"""
+    return ':' in s
+
+
 # This accepts 'short' IPs to enable, for example, '127.0/16'.
 # However, we only accept them in the CIDR context, not in others.
 # Normally specified IP addresses must have all four octets.
@@ -63,13 +68,13 @@ def strtoip(ipstr, min=4):
     """Convert an IP address in string form to numeric form (an unsigned
     32-bit integer in host byte order). min is the number of octets that
     the IP address string must have."""
-    res = 0L
+    res = 0
     n = ipstr.split('.')
     ln = len(n)
     if ln > 4 or ln < min:
         raise NBError("Invalid number of IP octets")
     for i in n:
-        res = res << 8L
+        res = res << 8
         try:
             ot = int(i)
         except ValueError:
@@ -78,14 +83,31 @@ def strtoip(ipstr, min=4):
             raise NBError("invalid IP octet")
         res = res + ot
     # Now fix up for omitted trailing octets.
-    res = res << (8L * (4 - ln))
+    res = res << (8 * (4 - ln))
     return res
 
 
+def strtoip6(ipstr):
+    """Convert an IPv6 address in string form to numeric form (an
+    unsigned 128-bit integer)."""
+    try:
+        return int(ipaddress.IPv6Address(ipstr))
+    except ValueError:
+        raise NBError("invalid IPv6 address")
+
+
+def anytoip(ipstr, min=4):
+    """Convert an IPv4 or IPv6 address in string form to numeric
+    form. Returns a (number, bits) tuple, bits being 32 or 128."""
+    if isip6(ipstr):
+        return strtoip6(ipstr), 128
+    return strtoip(ipstr, min), 32
+
+
 def convip(s):
     """Returns the start and end range of a single IP address, ie
     (ipnum,ipnum)."""
-    res = strtoip(s)
+    res = anytoip(s)[0]
     return (res, res)
 
 
@@ -93,14 +115,14 @@ def convcidr(cstr, strict=1):
     """Returns the start and end IPs of a CIDR from a string. strict
     is whether the CIDR must be a proper one."""
     pos = cstr.find('/')
-    ip = strtoip(cstr[:pos], min=1)
+    ip, bits = anytoip(cstr[:pos], min=1)
     try:
         size = int(cstr[pos + 1:])
     except ValueError:
         raise NBError("invalid CIDR size")
-    if size < 0 or size > 32:
-        raise NBError("CIDR size not in 0 to 32")
-    res = cidrrange(ip, size)
+    if size < 0 or size > bits:
+        raise NBError("CIDR size not in 0 to %d" % bits)
+    res = cidrrange(ip, size, bits)
     # For a strict check, the start IP must be the low IP of the
     # CIDR range.
     if strict and res[0] != ip:
@@ -111,8 +133,10 @@ def convcidr(cstr, strict=1):
 def convrange(s):
     """Returns the start and end IPs from a string range."""
     pos = s.find('-')
-    low = strtoip(s[:pos])
-    high = strtoip(s[pos + 1:])
+    low, bits = anytoip(s[:pos])
+    high, hbits = anytoip(s[pos + 1:])
+    if bits != hbits:
+        raise NBError("IP range mixes IPv4 and IPv6 addresses.")
     if low > high:
         raise NBError("IP range has start larger than end.")
     return (low, high)
@@ -130,8 +154,8 @@ def convtcpwr(s):
 
 # Convert an incoming string to an IP address range. An incoming
 # string is either an IP address, a CIDR netblock, or a string
-# range ('IP-IP'). In all cases, the conversion result is a tuple
-# of low-high. 'Strict' is whether the CIDR should insist that it
+# range ('IP-IP'), IPv4 or IPv6 (see isip6() to tell them apart).
+# In all cases, the conversion result is a tuple of low-high. 'Strict' is whether the CIDR should insist that it
 # start on its boundary, and defaults to yes.
 def convert(s, strict=1):
     """Return a (low,high) IP number tuple for s, regardless of
@@ -160,27 +184,33 @@ def ipstr(ip):
     return '%d.%d.%d.%d' % (o1, o2, o3, o4)
 
 
-def cidrtostr(ip, len):
+def ip6str(ip):
+    """Convert an IPv6 address in numeric form to string form."""
+    return str(ipaddress.IPv6Address(ip))
+
+
+def cidrtostr(ip, len, bits=32):
     """Convert an IP number and a length to CIDR string, or to a simple
-    IP address string if len is 32."""
-    if len == 32:
-        return ipstr(ip)
+    IP address string if len is 32 (128 for IPv6)."""
+    tostr = ip6str if bits == 128 else ipstr
+    if len == bits:
+        return tostr(ip)
     else:
-        return '%s/%d' % (ipstr(ip), len)
+        return '%s/%d' % (tostr(ip), len)
 
 
 # This finds the largest CIDR length that can start with the IP address,
 # based on what the first bit set is.
-def fmaxlen(ip):
-    # Range excludes the high, so use 0,33 so we go 0 .. 32.
-    for i in range(0, 33):
-        if ip & (1L << i):
-            return 32 - i
+def fmaxlen(ip, bits=32):
+    # Range excludes the high, so use 0,bits+1 so we go 0 .. bits.
+    for i in range(0, bits + 1):
+        if ip & (1 << i):
+            return bits - i
     return 0
 
 
 # For internal use, we append the results to a list.
-def lhcidrs(lip, hip, lst):
+def lhcidrs(lip, hip, lst, bits=32):
     """Convert a range from lowip to highip to a list of CIDR
     address/length values that are appended to lst."""
     while lip <= hip:
@@ -190,13 +220,13 @@ def lhcidrs(lip, hip, lst):
         # the list, set lip to one plus its end, keep going.
         # we must insure that the chosen mask has lip as its proper
         # lower end, and doesn't go lower.
-        lb = fmaxlen(lip)
-        while lb <= 32:
-            (lt, ht) = cidrrange(lip, lb)
+        lb = fmaxlen(lip, bits)
+        while lb <= bits:
+            (lt, ht) = cidrrange(lip, lb, bits)
             if lt == lip and ht <= hip:
                 break
             lb = lb + 1
-        assert (0 <= lb <= 32) and (lt == lip and ht <= hip), \
+        assert (0 <= lb <= bits) and (lt == lip and ht <= hip), \
             "failed to generate a valid, fitting CIDR"
         lst.append((lip, lb))
         lip = ht + 1
@@ -220,6 +250,9 @@ class IPRanges(ranges.Ranges):
 
     This is built on top of ranges.Ranges; see there for more things."""
 
+    # The number of bits of the addresses.
+    bits = 32
+
     def __init__(self, ival=None):
         """Optional ival is the initial IP address (range); it is
         passed to .add()."""
@@ -235,6 +268,16 @@ class IPRanges(ranges.Ranges):
     def __str__(self):
         return "<IPRanges: %s>" % (" ".join(map(self._rrange, self._l)),)
 
+    # Refuse the addresses of the other IP version, which would be
+    # taken for numbers of our own address space.
+    def _convert(self, val, strict=1):
+        if isip6(val) != (self.bits == 128):
+            raise NBError("not an IPv%d address range: %s" % (self.bits == 128 and 6 or 4, val))
+        return convert(val, strict)
+
+    def _toip(self, val):
+        return strtoip(val)
+
     # This is the all-purpose interface.
     # Since the three forms of addresses we accept cannot be confused
     # for each other, we accept all three equally and just parse them
@@ -242,26 +285,26 @@ class IPRanges(ranges.Ranges):
     def add(self, val):
         """Add any form of IP address that we accept to this set
         of IP address ranges."""
-        (low, high) = convert(val)
+        (low, high) = self._convert(val)
         self.addrange(low, high)
 
     # This allows 'odd' CIDRs, which are rejected by 'add'.
     def addoddcidr(self, val):
         """Add an improper 'odd' CIDR (one with an IP address that
         is not its lower boundary) to this set of IP address ranges."""
-        (low, high) = convert(val, 0)
+        (low, high) = self._convert(val, 0)
         self.addrange(low, high)
 
     # Remove works similarly.
     def remove(self, val):
         """Remove any form of IP address that we accept from this
         set of IP address ranges."""
-        (low, high) = convert(val)
+        (low, high) = self._convert(val)
         self.delrange(low, high)
 
     def removeoddcidr(self, val):
         """Remove an odd CIDR from this set of IP address ranges."""
-        (low, high) = convert(val, 0)
+        (low, high) = self._convert(val, 0)
         self.delrange(low, high)
 
     # Our implementation of 'in' takes an IP address string, not a number,
@@ -272,10 +315,10 @@ class IPRanges(ranges.Ranges):
         """Our argument (the first argument to 'in') is taken as
         a string, not an IPRanges object. Use .subset() if you want
         to know if one IPRanges is a subset of another."""
-        if isinstance(val, (int, long, float)):
+        if isinstance(val, (int, float)):
             return ranges.Ranges.__contains__(self, val)
         else:
-            return ranges.Ranges.__contains__(self, strtoip(val))
+            return ranges.Ranges.__contains__(self, self._toip(val))
 
     # Convert ourselves to a list of strings of CIDR netblocks.
     def tocidr(self):
@@ -283,5 +326,24 @@ class IPRanges(ranges.Ranges):
         this set of IP address ranges."""
         r = []
         for irng in self._l:
-            lhcidrs(irng[0], irng[1], r)
-        return [cidrtostr(x[0], x[1]) for x in r]
+            lhcidrs(irng[0], irng[1], r, self.bits)
+        return [cidrtostr(x[0], x[1], self.bits) for x in r]
+
+
+class IP6Ranges(IPRanges):
+    """Sets of IPv6 address ranges (or single IPs, or both).
+
+    This works like IPRanges, for IPv6 addresses, CIDRs and
+    LOWIP-HIGHIP ranges (there are no tcpwrapper style prefixes
+    or short CIDRs)."""
+
+    bits = 128
+
+    def _rel(self, val):
+        return ip6str(val)
+
+    def __str__(self):
+        return "<IP6Ranges: %s>" % (" ".join(map(self._rrange, self._l)),)
+
+    def _toip(self, val):
+        return strtoip6(val)
@@ -8,8 +8,15 @@ This module exports the Ranges class and the BadRange exception."""
 # Since we still have Red Hat 7.3 machines (at least for a bit longer...)
 from __future__ import generators
 
+import bisect
+
+from functools import reduce
+
 __all__ = ['BadRange', 'Ranges']
 
+# larger than any number, for bisect() searches of [START,END] lists.
+_INF = float('inf')
+
 
 class BadRange(Exception):
     """Raised if there is some problem with ranges.
@@ -159,10 +166,28 @@ class Ranges:
             else:
                 r[0] = end + 1
 
+    # Adding ranges one by one costs a list insertion each, which is
+    # a lot for long lists. Instead we sort them all together with
+    # what we have and merge them in a single pass.
     def addlist(self, l):
         """Add a list of [start,end] ranges to the set."""
+        new = []
         for s, e in l:
-            self.addrange(s, e)
+            self._good(s, e)
+            new.append([s, e])
+        if not new:
+            return
+        new.extend(self._l)
+        new.sort()
+        merged = [new[0]]
+        for r in new[1:]:
+            ro = merged[-1]
+            # adjacent or overlapping: extend the previous entry.
+            if r[0] - 1 <= ro[1]:
+                ro[1] = max(r[1], ro[1])
+            else:
+                merged.append(r)
+        self._l = merged
 
     def dellist(self, l):
         """Remove a list of [start,end] ranges from the set."""
@@ -185,24 +210,10 @@ class Ranges:
     # this.
     def __contains__(self, val):
         """Is VAL a point in the set of ranges?"""
-        if len(self._l) <= 4:
-            for r in self._l:
-                if r[0] <= val <= r[1]:
-                    return 1
-            return 0
-
-        # It's worth using binary search now.
-        p = self._find(val)
-        pm = p - 1
-        # This complicated expression checks for a valid
-        # range element at p and then if val is inside it,
-        # and then for a valid range element one back and
-        # if val is inside *that*.
-        return ((p < len(self._l) and \
-                 (self._l[p][0] <= val <= self._l[p][1])) \
-                or (pm >= 0 and \
-                    (self._l[pm][0] <= val <= self._l[pm][1])))
-        return 0
+        # the last range starting at or before val is the only one
+        # which may contain it.
+        i = bisect.bisect_right(self._l, [val, _INF]) - 1
+        return i >= 0 and val <= self._l[i][1]
 
     # This is a hideously inefficient implementation. Don't use it
     # unless you have to!
@@ -228,7 +239,7 @@ class Ranges:
     def __eq__(self, other):
         if len(other._l) != len(self._l):
             return 0
-        for i in xrange(0, len(self._l)):
+        for i in range(0, len(self._l)):
             if self._l[i] != other._l[i]:
                 return 0
         return 1
@@ -307,9 +318,11 @@ class Ranges:
         use Ranges.len() instead of len(Ranges)."""
         return int(self.len())
 
-    def __nonzero__(self):
+    def __bool__(self):
         return len(self._l) > 0
 
+    __nonzero__ = __bool__
+
     def __cmp__(self, other):
         """Any comparison between Ranges other than for inequality or
         equality has undefined results."""
@@ -120,6 +120,44 @@ class basicTests(unittest.TestCase):
         self.assertEqual(str(n), '<IPRanges: 127.0.1.0-127.0.1.255>')
 
 
+class ipv6Tests(unittest.TestCase):
+    knownIP6RStrs = (
+        ('::1', "<IP6Ranges: ::1>"),
+        ('2001:db8::/32', "<IP6Ranges: 2001:db8::-2001:db8:ffff:ffff:ffff:ffff:ffff:ffff>"),
+        ('2001:db8::10-2001:db8::20', "<IP6Ranges: 2001:db8::10-2001:db8::20>"),
+        ('::/0', "<IP6Ranges: ::-ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff>"),
+    )
+
+    def testStrResults(self):
+        "Test the result of str() of IP6Ranges on known values."
+        for i, res in self.knownIP6RStrs:
+            r = netblock.IP6Ranges(i)
+            self.assertEqual(str(r), res)
+            r.remove(i)
+            self.assertEqual(r.len(), 0)
+
+    def testInOperator(self):
+        """Test the 'in' operator for IP6Ranges."""
+        r = netblock.IP6Ranges('2001:db8::/32')
+        self.assertEqual('2001:db8:1::1' in r, 1)
+        self.assertEqual('2001:db9::' in r, 0)
+        self.assertEqual(netblock.strtoip6('2001:db8::') in r, 1)
+
+    def testCIDROutput(self):
+        "Test IP6Ranges.tocidr on basic input."
+        self.assertEqual(netblock.IP6Ranges('2001:db8::-2001:db8::1:ffff').tocidr(),
+                         ['2001:db8::/111'])
+        self.assertEqual(netblock.IP6Ranges('::1').tocidr(), ['::1'])
+
+    def testMixedVersions(self):
+        "Test that addresses of the other IP version are refused."
+        self.assertRaises(netblock.NBError, netblock.IPRanges, '2001:db8::/32')
+        self.assertRaises(netblock.NBError, netblock.IP6Ranges, '127.0.0.0/8')
+        self.assertRaises(netblock.NBError, netblock.IP6Ranges, '::1-127.0.0.1')
+        self.assertRaises(netblock.NBError, netblock.IP6Ranges, '2001:db8::/129')
+        self.assertRaises(netblock.BadCIDRError, netblock.IP6Ranges, '2001:db8::1/32')
+
+
 class failureTests(unittest.TestCase):
     knownBadInitArgs = (
         # Runt and perverse IP addresses.
@@ -1,4 +1,5 @@
 #
+import random
 import unittest
 
 from b311.plugins.netblocker.netblock import ranges
@@ -32,10 +33,10 @@ class basicTests(unittest.TestCase):
         (((1, 2), (7, 8), (4, 5), (10, 11)),
          [[1, 2], [4, 5], [7, 8], [10, 11]]),
         # Test things involving LONG integers.
-        (((3000000000L, 3000000099L), (3000001000L, 3000001099L)),
-         [[3000000000L, 3000000099L], [3000001000L, 3000001099L]]),
-        (((3000000000L, 3000000099L), (3000000090L, 3000000200L)),
-         [[3000000000L, 3000000200L]]),
+        (((3000000000, 3000000099), (3000001000, 3000001099)),
+         [[3000000000, 3000000099], [3000001000, 3000001099]]),
+        (((3000000000, 3000000099), (3000000090, 3000000200)),
+         [[3000000000, 3000000200]]),
         # test duplicate/subset adds
         (((1, 10), (20, 30), (40, 50), (20, 25)),
          [[1, 10], [20, 30], [40, 50]]),
@@ -69,6 +70,22 @@ class basicTests(unittest.TestCase):
             r.addlist(elist)
             self.assertEqual(r._l, rval)
 
+    def testAddlistMerge(self):
+        "Test that adding a list at once gives the same ranges as adding them one by one."
+        rnd = random.Random(1)
+        elist = []
+        for i in range(500):
+            start = rnd.randint(0, 5000)
+            elist.append((start, start + rnd.randint(0, 20)))
+        r1 = ranges.Ranges(4000, 4100)
+        r1.addlist(elist)
+        r2 = ranges.Ranges(4000, 4100)
+        for s, e in elist:
+            r2.addrange(s, e)
+        self.assertEqual(r1._l, r2._l)
+        for i in range(-1, 5030):
+            self.assertEqual(i in r1, i in r2)
+
     # This will fail if the iteration support is broken.
     def testInOperator(self):
         """Test the 'in' operator of Ranges."""
@@ -99,8 +116,8 @@ class basicTests(unittest.TestCase):
         (((1, 3),), (1, 2, 3)),
         (((1, 3), (6, 8)), (1, 2, 3, 6, 7, 8)),
         (((1, 2), (6, 8), (10, 11)), (1, 2, 6, 7, 8, 10, 11)),
-        (((3000000000L, 3000000003L),),
-         (3000000000L, 3000000001L, 3000000002L, 3000000003L)),
+        (((3000000000, 3000000003),),
+         (3000000000, 3000000001, 3000000002, 3000000003)),
     )
 
     def testIterOperation(self):
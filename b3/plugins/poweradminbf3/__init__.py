@@ -17,7 +17,7 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
-__version__ = '1.8'
+__version__ = '1.10'
 __author__ = 'Courgette, 82ndab-Bravo17, ozon, Mario'
 
 import os
@@ -25,9 +25,10 @@ import random
 import re
 import time
 
-import ConfigParser
-import thread
-from ConfigParser import NoOptionError
+import configparser
+import _thread
+from configparser import NoOptionError
+from functools import reduce
 
 import b311
 import b311.cron
@@ -103,12 +104,12 @@ class Scrambler:
                 if clients and len(clients) > 0:
                     allClients.remove(clients[0])
                     sortedClients.append(clients[0])
-            self.debug('sorted clients A : %r' % map(lambda x: x.cid, sortedClients))
+            self.debug('sorted clients A : %r' % [x.cid for x in sortedClients])
             random.shuffle(allClients)
             for client in allClients:
                 # add remaining clients (they had no score ?)
                 sortedClients.append(client)
-            self.debug('sorted clients B : %r' % map(lambda x: x.cid, sortedClients))
+            self.debug('sorted clients B : %r' % [x.cid for x in sortedClients])
             return sortedClients
 
     def debug(self, msg):
@@ -128,7 +129,7 @@ class vip_commands_mixin(object):
 
             if data:
                 filter_txt = data.lower()
-                filtered_vips = filter(lambda x: filter_txt in x.lower(), vips)
+                filtered_vips = [x for x in vips if filter_txt in x.lower()]
                 if not len(filtered_vips):
                     client.message("no VIP matching '%s' found over the %s existing VIPs" % (filter_txt, len(vips)))
                     return
@@ -161,8 +162,7 @@ class vip_commands_mixin(object):
         if not len(vips):
             client.message("No VIP connected")
         else:
-            from operator import attrgetter
-            connected_players = map(attrgetter('cid'), self.console.clients.getList())
+            connected_players = [x.cid for x in self.console.clients.getList()]
             connected_vips = [x for x in vips if x in connected_players]
             if not len(connected_vips):
                 client.message("No VIP connected")
@@ -191,7 +191,7 @@ class vip_commands_mixin(object):
 
             try:
                 self.console.write(('reservedSlotsList.add', name))
-            except CommandFailedError, err:
+            except CommandFailedError as err:
                 client.message('Error: %s' % err.message)
             else:
                 client.message('%s is now a VIP' % name)
@@ -233,7 +233,7 @@ class vip_commands_mixin(object):
                     return
             try:
                 self.console.write(('reservedSlotsList.remove', name))
-            except CommandFailedError, err:
+            except CommandFailedError as err:
                 if err.message[0] == 'PlayerNotInList':
                     client.message("There is no VIP named '%s'" % name)
                 else:
@@ -247,7 +247,7 @@ class vip_commands_mixin(object):
         """
         try:
             self.console.write(('reservedSlotsList.clear',))
-        except CommandFailedError, err:
+        except CommandFailedError as err:
             client.message('Error: %s' % err.message[0])
         else:
             client.message('VIP list is now empty')
@@ -259,7 +259,7 @@ class vip_commands_mixin(object):
         try:
             self.console.write(('reservedSlotsList.load',))
             vips = self.getFullreservedSlotsList()
-        except CommandFailedError, err:
+        except CommandFailedError as err:
             client.message('Error: %s' % err.message[0])
         else:
             client.message('VIP list loaded from disk (%s name%s loaded)' % (len(vips), 's' if len(vips) else ''))
@@ -271,7 +271,7 @@ class vip_commands_mixin(object):
         try:
             vips = self.getFullreservedSlotsList()
             self.console.write(('reservedSlotsList.save',))
-        except CommandFailedError, err:
+        except CommandFailedError as err:
             client.message('Error: %s' % err.message[0])
         else:
             client.message('VIP list saved to disk (%s name%s written)' % (len(vips), 's' if len(vips) else ''))
@@ -466,7 +466,7 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
         time.sleep(1)
         try:
             self.console.write(('mapList.runNextRound',))
-        except CommandFailedError, err:
+        except CommandFailedError as err:
             client.message('Error: %s' % err.message)
 
     def cmd_serverreboot(self, data, client, cmd=None):
@@ -478,7 +478,7 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
             self.console.say('Reboot the Gameserver')
             time.sleep(1)
             self.console.write(('admin.shutDown',))
-        except CommandFailedError, err:
+        except CommandFailedError as err:
             client.message('Error: %s' % err.message[0])
 
     def cmd_endround(self, data, client, cmd=None):
@@ -500,7 +500,7 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
                 self.console.say('End current round')
                 time.sleep(1)
                 self.console.write(('mapList.endRound', winnerTeamID))
-            except CommandFailedError, err:
+            except CommandFailedError as err:
                 client.message('Error: %s' % err.message[0])
 
     def cmd_roundrestart(self, data, client, cmd=None):
@@ -511,7 +511,7 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
         time.sleep(1)
         try:
             self.console.write(('mapList.restartRound',))
-        except CommandFailedError, err:
+        except CommandFailedError as err:
             client.message('Error: %s' % err.message)
 
     def cmd_kill(self, data, client, cmd=None):
@@ -539,7 +539,7 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
                         sclient.message("Kill reason: %s" % reason)
                     else:
                         sclient.message("Killed by admin")
-                except CommandFailedError, err:
+                except CommandFailedError as err:
                     if err.message[0] == "SoldierNotAlive":
                         client.message("%s is already dead" % sclient.name)
                     else:
@@ -575,7 +575,7 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
                         self.console.write(('admin.movePlayer', sclient.cid, newteam, 0, 'true'))
                         cmd.sayLoudOrPM(client,
                                         '%s forced from team %s to team %s' % (sclient.cid, original_team, newteam))
-                    except CommandFailedError, err:
+                    except CommandFailedError as err:
                         client.message('Error, server replied %s' % err)
 
     def cmd_swap(self, data, client, cmd=None):
@@ -651,7 +651,7 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
                 self._movePlayer(sclientA, teamB, squadB)
 
             cmd.sayLoudOrPM(client, 'swapped player %s with %s' % (sclientA.cid, sclientB.cid))
-        except CommandFailedError, e:
+        except CommandFailedError as e:
             client.message("Error while trying to swap %s with %s. (%s)" % (sclientA.cid, sclientB.cid, e.message[0]))
 
         self._autoassign = temp_autoassign
@@ -668,13 +668,13 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
                 if isPbActive and len(isPbActive) and isPbActive[0] == 'false':
                     client.message('Punkbuster is not active')
                     return
-            except CommandFailedError, err:
+            except CommandFailedError as err:
                 self.error(err)
 
             self.debug('Executing punkbuster command = [%s]', data)
             try:
                 self.console.write(('punkBuster.pb_sv_command', '%s' % data))
-            except CommandFailedError, err:
+            except CommandFailedError as err:
                 self.error(err)
                 client.message('Error: %s' % err.message)
 
@@ -707,10 +707,10 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
                 self.console.write(('mapList.setNextMapIndex', next_map_index))
             elif len(matching_maps) == 1:
                 # easy case, just set the nextLevelIndex to the index found
-                self.console.write(('mapList.setNextMapIndex', matching_maps.keys()[0]))
+                self.console.write(('mapList.setNextMapIndex', list(matching_maps.keys())[0]))
             else:
                 # multiple matches :s
-                matching_indices = matching_maps.keys()
+                matching_indices = list(matching_maps.keys())
                 # try to find the next indice after the index of the current map
                 indices_after_current = [x for x in matching_indices if x > current_map_index]
                 if len(indices_after_current):
@@ -854,7 +854,7 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
             new_value = 'true' if data.lower() == 'on' else 'false'
             try:
                 self.console.setCvar('vehicleSpawnAllowed', new_value)
-            except CommandFailedError, err:
+            except CommandFailedError as err:
                 client.message("could not change vehicle spawn mode : %s" % err.message)
             else:
                 self.console.game['vehicleSpawnAllowed'] = new_value
@@ -924,7 +924,7 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
 
             try:
                 self.console.setCvar('idleTimeout', new_value)
-            except CommandFailedError, err:
+            except CommandFailedError as err:
                 client.message("could not change idle timeout : %s" % err.message)
             else:
                 self.console.game['idleTimeout'] = str(new_value)
@@ -1062,29 +1062,26 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
             if reason:
                 self.console.say("Nuke reason : %s" % reason)
 
-            def kill(sclient, reason="Nuked by admin"):
-                try:
-                    self.console.write(('admin.killPlayer', sclient.cid))
-                    if reason:
-                        sclient.message("Nuke reason: %s" % reason)
-                    else:
-                        sclient.message("Nuked by admin")
-                except CommandFailedError, err:
-                    if err.message[0] == "SoldierNotAlive":
-                        client.message("%s is already dead" % sclient.name)
-                    else:
-                        client.message('Error: %s' % err.message)
-
             players = self.console.clients.getList()
-            if clean_team_name == 'all':
-                for player in players:
-                    kill(player, reason)
-            elif clean_team_name == 'us':
-                for player in [x for x in players if x.teamId == 1]:
-                    kill(player, reason)
+            if clean_team_name == 'us':
+                players = [x for x in players if x.teamId == 1]
             elif clean_team_name == 'ru':
-                for player in [x for x in players if x.teamId == 2]:
-                    kill(player, reason)
+                players = [x for x in players if x.teamId == 2]
+
+            # kill everyone at once instead of waiting for each reply in turn
+            results = self.console.writeBatch([('admin.killPlayer', x.cid) for x in players])
+            for sclient, result in zip(players, results):
+                if isinstance(result, CommandFailedError):
+                    if result.args[0][0] == "SoldierNotAlive":
+                        client.message("%s is already dead" % sclient.name)
+                    else:
+                        client.message('Error: %s' % result.args[0])
+                elif isinstance(result, Exception):
+                    client.message('Error: %s' % result)
+                elif reason:
+                    sclient.message("Nuke reason: %s" % reason)
+                else:
+                    sclient.message("Nuked by admin")
 
     def cmd_gunmaster(self, data, client, cmd=None):
         """
@@ -1166,7 +1163,7 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
                     self.warning(
                         r"option 'srambler\gamemodes_blacklist' in your config file has invalid gamemode(s) : %s" % ', '.join(
                             invalid_gamemodes))
-            except ConfigParser.NoOptionError:
+            except configparser.NoOptionError:
                 self.warning(r"cannot find option 'srambler\gamemodes_blacklist' in your config file")
 
         except Exception as err:
@@ -1223,7 +1220,7 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
             self._autoassign = self.config.getboolean('preferences', 'autoassign')
         except NoOptionError:
             self.info('No config option \"preferences\\autoassign\" found. Using default value : %s' % self._autoassign)
-        except ValueError, err:
+        except ValueError as err:
             self.debug(err)
             self.warning(
                 'Could not read level value from config option \"preferences\\autoassign\". Using default value \"%s\" instead. (%s)' % (
@@ -1237,7 +1234,7 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
         except NoOptionError:
             self.info(
                 'No config option \"preferences\\autobalance\" found. Using default value : %s' % self._autobalance)
-        except ValueError, err:
+        except ValueError as err:
             self.debug(err)
             self.warning(
                 'Could not read level value from config option \"preferences\\autobalance\". Using default value \"%s\" instead. (%s)' % (
@@ -1256,7 +1253,7 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
         except NoOptionError:
             self.info(
                 'No config option \"preferences\\autobalance_timer\" found. Using default value : %s' % self._autobalance_timer)
-        except ValueError, err:
+        except ValueError as err:
             self.debug(err)
             self.warning(
                 'Could not read level value from config option \"preferences\\autobalance_timer\". Using default value \"%s\" instead. (%s)' % (
@@ -1276,7 +1273,7 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
         except NoOptionError:
             self.info(
                 r'No config option "preferences\team_swap_threshold" found. Using default value : %s' % self._team_swap_threshold)
-        except ValueError, err:
+        except ValueError as err:
             self.debug(err)
             self.warning(
                 r'Could not read level value from config option "preferences\team_swap_threshold". Using default value "%s" instead. (%s)' % (
@@ -1292,7 +1289,7 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
         except NoOptionError:
             self.info(
                 'No config option \"preferences\\team_swap_threshold_prop\" found. Using default value : %s' % self._team_swap_threshold_prop)
-        except ValueError, err:
+        except ValueError as err:
             self.debug(err)
             self.warning(
                 'Could not read level value from config option \"preferences\\team_swap_threshold_prop\". Using default value \"%s\" instead. (%s)' % (
@@ -1322,7 +1319,7 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
         except NoOptionError:
             self.info(
                 r'No config option "preferences\yell_duration" found. Using default value : %s' % self._yell_duration)
-        except ValueError, err:
+        except ValueError as err:
             self.debug(err)
             self.warning(
                 r'Could not read value from config option "preferences\yell_duration". Using default value "%s" instead. (%s)' % (
@@ -1343,12 +1340,12 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
         Loads a preset config file to send to the server
         """
         self.info('Loading %s' % file_path)
-        with file(file_path, 'r') as f:
+        with open(file_path, 'r') as f:
             lines = f.readlines()
         # self.verbose(repr(lines))
         if threaded:
             # delegate communication with the server to a new thread
-            thread.start_new_thread(self.load_server_config, (client, config_name, lines))
+            _thread.start_new_thread(self.load_server_config, (client, config_name, lines))
         else:
             self.load_server_config(client, config_name, lines)
 
@@ -1381,7 +1378,7 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
                 # set cvar
                 try:
                     self.console.write((m.group('cvar'), m.group('value')))
-                except CommandFailedError, err:
+                except CommandFailedError as err:
                     self._sendMessage(client, 'Error "%s" received at line %s when sending "%s" to server' % (
                     err.message, line_index, line))
             else:
@@ -1390,7 +1387,7 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
                     result = self.console.write((m.group('cvar'),))
                     if len(result):
                         self._sendMessage(client, ("%s is \"%s\"" % (m.group('cvar'), result[0])))
-                except CommandFailedError, err:
+                except CommandFailedError as err:
                     self._sendMessage(client, 'Error "%s" received at line %s when sending "%s" to server' % (
                     err.message, line_index, m.group('cvar')))
 
@@ -1399,14 +1396,14 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
             for line_index, line, m in map_item_matches:
                 try:
                     self.console.write(('mapList.add', m.group('map_id'), m.group('gamemode'), m.group('num_rounds')))
-                except CommandFailedError, err:
+                except CommandFailedError as err:
                     self._sendMessage(client,
                                       "Error adding map \"%s\" on line %s : %s" % (line, line_index, err.message))
             try:
                 self.console.write((
                                    'mapList.save',))  # write current in-memory map list to server config file so if the server restarts our list is recovered.
                 self._sendMessage(client, "New map rotation list written to disk.")
-            except CommandFailedError, err:
+            except CommandFailedError as err:
                 self._sendMessage(client, "Error writing map rotation list to disk. %s" % err.message)
 
         self._sendMessage(client, ("config \"%s\" loaded" % config_name))
@@ -1681,7 +1678,7 @@ class Poweradminbf3Plugin(Plugin, vip_commands_mixin):
         self.debug(self._joined_order)
         try:
             self._joined_order.remove(client_name)
-        except ValueError, err:
+        except ValueError as err:
             self.debug(err)
             self.warning('Client %s was not in joined list' % client_name)
 
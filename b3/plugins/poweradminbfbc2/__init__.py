@@ -357,9 +357,8 @@ class Poweradminbfbc2Plugin(b311.plugin.Plugin):
         if not data:
             client.message('missing data, try !help payellteam')
         else:
-            for c in self.console.clients.getList():
-                if c.team == client.team:
-                    c.message(data)
+            for c in self.console.clients.getClientsByTeam(client.team):
+                c.message(data)
 
     def cmd_payellsquad(self, data, client, cmd=None):
         """
@@ -24,12 +24,14 @@ from b311.functions import clamp
 from b311.functions import getCmd
 
 __author__ = 'ThorN, Courgette'
-__version__ = '1.4.4'
+__version__ = '1.5'
 
 
 class SpamcontrolPlugin(b311.plugin.Plugin):
     _adminPlugin = None
 
+    synchronousDispatch = True  # we veto chat events of spamming players
+
     _maxSpamins = 10
     _modLevel = 20
     _falloffRate = 6.5
@@ -53,6 +55,8 @@ class SpamcontrolPlugin(b311.plugin.Plugin):
         """
         Initialize the plugin.
         """
+        self.registerClientVars(spamins=0, last_message=None, last_message_time=None, ignore_till=0)
+
         # register the events needed
         self.registerEvent('EVT_CLIENT_SAY', self.onChat)
         self.registerEvent('EVT_CLIENT_TEAM_SAY', self.onChat)
@@ -90,17 +94,17 @@ class SpamcontrolPlugin(b311.plugin.Plugin):
         Add spam points to the given client.
         """
         now = self.getTime()
-        if client.var(self, 'ignore_till', now).value > now:
+        spam = self._clientVars.get(client)
+        if spam.ignore_till > now:
             # ignore the user
             raise b311.events.VetoEvent
 
-        last_message_time = client.var(self, 'last_message_time', now).value
-        gap = now - last_message_time
+        gap = now - spam.last_message_time if spam.last_message_time is not None else 0
 
         if gap < 2:
             points += 1
 
-        spamins = client.var(self, 'spamins', 0).value + points
+        spamins = spam.spamins + points
 
         # apply natural points decrease due to time
         spamins -= int(gap / self._falloffRate)
@@ -109,16 +113,15 @@ class SpamcontrolPlugin(b311.plugin.Plugin):
             spamins = 0
 
         # set new values
-        client.setvar(self, 'spamins', spamins)
-        client.setvar(self, 'last_message_time', now)
-        client.setvar(self, 'last_message', text)
+        spam.spamins = spamins
+        spam.last_message_time = now
+        spam.last_message = text
 
         # should we warn ?
         if spamins >= self._maxSpamins:
-            client.setvar(self, 'ignore_till', now + 2)
+            spam.ignore_till = now + 2
             self._adminPlugin.warnClient(client, 'spam')
-            spamins = int(spamins / 1.5)
-            client.setvar(self, 'spamins', spamins)
+            spam.spamins = int(spamins / 1.5)
             raise b311.events.VetoEvent
 
     ####################################################################################################################
@@ -137,7 +140,7 @@ class SpamcontrolPlugin(b311.plugin.Plugin):
         points = 0
         client = event.client
         text = event.data
-        last_message = client.var(self, 'last_message').value
+        last_message = self._clientVars.get(client).last_message
         color = re.match(r'\^[0-9]', event.data)
         if color and text == last_message:
             points += 5
@@ -176,10 +179,10 @@ class SpamcontrolPlugin(b311.plugin.Plugin):
             cmd.sayLoudOrPM(client, '%s ^7is too cool to spam' % sclient.exactName)
         else:
             now = self.getTime()
-            last_message_time = sclient.var(self, 'last_message_time', now).value
-            gap = now - last_message_time
+            spam = self._clientVars.get(sclient)
+            gap = now - spam.last_message_time if spam.last_message_time is not None else 0
 
-            msmin = smin = sclient.var(self, 'spamins', 0).value
+            msmin = smin = spam.spamins
             smin -= int(gap / self._falloffRate)
 
             if smin < 1:
@@ -15,9 +15,7 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
-import string
-
-from ConfigParser import NoOptionError
+from configparser import NoOptionError
 
 import b311
 import b311.events
@@ -25,12 +23,14 @@ import b311.plugin
 from b311.functions import getCmd
 
 __author__ = 'ThorN, GrosBedo'
-__version__ = '1.5.1'
+__version__ = '1.7'
 
 
 class StatsPlugin(b311.plugin.Plugin):
     _adminPlugin = None
 
+    coalesceDamage = True
+
     ####################################################################################################################
     #                                                                                                                  #
     #    STARTUP                                                                                                       #
@@ -119,7 +119,7 @@ class StatsPlugin(b311.plugin.Plugin):
         except NoOptionError:
             self.warning('could not find settings/startPoints in config file, '
                          'using default: %s' % self.startPoints)
-        except ValueError, e:
+        except ValueError as e:
             self.error('could not load settings/startPoints config value: %s' % e)
             self.debug('using default value (%s) for settings/startPoints' % self.startPoints)
 
@@ -129,7 +129,7 @@ class StatsPlugin(b311.plugin.Plugin):
         except NoOptionError:
             self.warning('could not find settings/resetscore in config file, '
                          'using default: %s' % self.resetscore)
-        except ValueError, e:
+        except ValueError as e:
             self.error('could not load settings/resetscore config value: %s' % e)
             self.debug('using default value (%s) for settings/resetscore' % self.resetscore)
 
@@ -139,7 +139,7 @@ class StatsPlugin(b311.plugin.Plugin):
         except NoOptionError:
             self.warning('could not find settings/resetxp in config file, '
                          'using default: %s' % self.resetxp)
-        except ValueError, e:
+        except ValueError as e:
             self.error('could not load settings/resetxp config value: %s' % e)
             self.debug('using default value (%s) for settings/resetxp' % self.resetxp)
 
@@ -149,7 +149,7 @@ class StatsPlugin(b311.plugin.Plugin):
         except NoOptionError:
             self.warning('could not find settings/show_awards in config file, '
                          'using default: %s' % self.show_awards)
-        except ValueError, e:
+        except ValueError as e:
             self.error('could not load settings/show_awards config value: %s' % e)
             self.debug('using default value (%s) for settings/show_awards' % self.show_awards)
 
@@ -159,7 +159,7 @@ class StatsPlugin(b311.plugin.Plugin):
         except NoOptionError:
             self.warning('could not find settings/show_awards_xp in config file, '
                          'using default: %s' % self.show_awards_xp)
-        except ValueError, e:
+        except ValueError as e:
             self.error('could not load settings/show_awards_xp config value: %s' % e)
             self.debug('using default value (%s) for settings/show_awards_xp' % self.show_awards_xp)
 
@@ -168,6 +168,9 @@ class StatsPlugin(b311.plugin.Plugin):
         Initialize the plugin.
         """
         self._adminPlugin = self.console.getPlugin('admin')
+        self.registerClientVars(shotsTeamHit=0, damageTeamHit=0, shotsHit=0, damageHit=0, shotsGot=0, damageGot=0,
+                                teamKills=0, kills=0, deaths=0, pointsLost=0, pointsWon=0, points=self.startPoints,
+                                experience=0, oldexperience=0)
 
         # register our commands
         if 'commands' in self.config.sections():
@@ -211,85 +214,76 @@ class StatsPlugin(b311.plugin.Plugin):
         self.debug('Map Start: clearing stats')
         for cid, c in self.console.clients.items():
             if c.maxLevel >= self.mapstatslevel:
-                try:
-                    c.setvar(self, 'shotsTeamHit', 0)
-                    c.setvar(self, 'damageTeamHit', 0)
-                    c.setvar(self, 'shotsHit', 0)
-                    c.setvar(self, 'damageHit', 0)
-                    c.setvar(self, 'shotsGot', 0)
-                    c.setvar(self, 'damageGot', 0)
-                    c.setvar(self, 'teamKills', 0)
-                    c.setvar(self, 'kills', 0)
-                    c.setvar(self, 'deaths', 0)
-
-                    if self.resetscore:
-                        # skill points are reset at the beginning of each map
-                        c.setvar(self, 'pointsLost', 0)
-                        c.setvar(self, 'pointsWon', 0)
-                        c.setvar(self, 'points', self.startPoints)
-                    if self.resetxp:
-                        c.setvar(self, 'experience', 0)
-                    else:
-                        c.var(self, 'oldexperience', 0).value += c.var(self, 'experience', 0).value
-                        c.setvar(self, 'experience', 0)
-                except Exception as e:
-                    self.error(e)
+                stats = self._clientVars.get(c)
+                stats.shotsTeamHit = stats.damageTeamHit = 0
+                stats.shotsHit = stats.damageHit = 0
+                stats.shotsGot = stats.damageGot = 0
+                stats.teamKills = stats.kills = stats.deaths = 0
+
+                if self.resetscore:
+                    # skill points are reset at the beginning of each map
+                    stats.pointsLost = stats.pointsWon = 0
+                    stats.points = self.startPoints
+                if not self.resetxp:
+                    stats.oldexperience += stats.experience
+                stats.experience = 0
+
+    def getDamage(self, event):
+        """
+        Return the amount of hits and of damage points (at most 100 per hit) of a damage event.
+        """
+        hits = getattr(event.data, 'hits', 1)  # summarized damage events merge several hits
+        return hits, min(int(event.data[0]), 100 * hits)
 
     def onDamage(self, event):
         """
         Handle EVT_CLIENT_DAMAGE
         """
-        killer = event.client
-        victim = event.target
-        points = int(event.data[0])
-
-        if points > 100:
-            points = 100
+        killer = self._clientVars.get(event.client)
+        victim = self._clientVars.get(event.target)
+        hits, points = self.getDamage(event)
 
-        killer.var(self, 'shotsHit', 0).value += 1
-        killer.var(self, 'damageHit', 0).value += points
-        victim.var(self, 'shotsGot', 0).value += 1
-        victim.var(self, 'damageGot', 0).value += points
+        killer.shotsHit += hits
+        killer.damageHit += points
+        victim.shotsGot += hits
+        victim.damageGot += points
 
     def onDamageTeam(self, event):
         """
         Handle EVT_CLIENT_DAMAGE_TEAM
         """
-        killer = event.client
-        points = int(event.data[0])
-
-        if points > 100:
-            points = 100
+        killer = self._clientVars.get(event.client)
+        hits, points = self.getDamage(event)
 
-        killer.var(self, 'shotsTeamHit', 0).value += 1
-        killer.var(self, 'damageTeamHit', 0).value += points
+        killer.shotsTeamHit += hits
+        killer.damageTeamHit += points
 
     def onKill(self, event):
         """
         Handle EVT_CLIENT_KILL
         """
-        killer = event.client
-        victim = event.target
+        killer = self._clientVars.get(event.client)
+        victim = self._clientVars.get(event.target)
         points = int(event.data[0])
 
         if points > 100:
             points = 100
 
-        killer.var(self, 'shotsHit', 0).value += 1
-        killer.var(self, 'damageHit', 0).value += points
+        killer.shotsHit += 1
+        killer.damageHit += points
 
-        victim.var(self, 'shotsGot', 0).value += 1
-        victim.var(self, 'damageGot', 0).value += points
+        victim.shotsGot += 1
+        victim.damageGot += points
 
-        killer.var(self, 'kills', 0).value += 1
-        victim.var(self, 'deaths', 0).value += 1
+        killer.kills += 1
+        victim.deaths += 1
 
-        val = self.score(killer, victim)
-        killer.var(self, 'points', self.startPoints).value += val
-        killer.var(self, 'pointsWon', 0).value += val
+        val = self.score(event.client, event.target)
+        killer.points += val
+        killer.pointsWon += val
 
-        victim.var(self, 'points', self.startPoints).value -= val
-        victim.var(self, 'pointsLost', 0).value += val
+        victim.points -= val
+        victim.pointsLost += val
 
         self.updateXP(killer)
         self.updateXP(victim)
@@ -298,42 +292,42 @@ class StatsPlugin(b311.plugin.Plugin):
         """
         Handle EVT_CLIENT_KILL_TEAM
         """
-        killer = event.client
-        victim = event.target
+        killer = self._clientVars.get(event.client)
+        victim = self._clientVars.get(event.target)
         points = int(event.data[0])
 
         if points > 100:
             points = 100
 
-        killer.var(self, 'shotsTeamHit', 0).value += 1
-        killer.var(self, 'damageTeamHit', 0).value += points
+        killer.shotsTeamHit += 1
+        killer.damageTeamHit += points
 
-        killer.var(self, 'teamKills', 0).value += 1
+        killer.teamKills += 1
 
-        val = self.score(killer, victim)
-        killer.var(self, 'points', self.startPoints).value -= val
-        killer.var(self, 'pointsLost', 0).value += val
+        val = self.score(event.client, event.target)
+        killer.points -= val
+        killer.pointsLost += val
 
         self.updateXP(killer)
         self.updateXP(victim)
 
-    def updateXP(self, sclient):
+    def updateXP(self, stats):
         """
         Update client XP.
+        :param stats: The client stats record
         """
-        realpoints = sclient.var(self, 'pointsWon', 0).value - sclient.var(self, 'pointsLost', 0).value
-        if sclient.var(self, 'deaths', 0).value != 0:
-            experience = (sclient.var(self, 'kills', 0).value * realpoints) / sclient.var(self, 'deaths', 0).value
+        realpoints = stats.pointsWon - stats.pointsLost
+        if stats.deaths != 0:
+            stats.experience = (stats.kills * realpoints) / stats.deaths
         else:
-            experience = sclient.var(self, 'kills', 0).value * realpoints
-        sclient.var(self, 'experience', 0).value = experience
+            stats.experience = stats.kills * realpoints
 
     def score(self, killer, victim):
         """
         Return the amount of points the killer scored for killing the victim.
         """
-        k = int(killer.var(self, 'points', self.startPoints).value)
-        v = int(victim.var(self, 'points', self.startPoints).value)
+        k = int(self._clientVars.get(killer).points)
+        v = int(self._clientVars.get(victim).points)
 
         if k < 1:
             k = 1.00
@@ -367,11 +361,10 @@ class StatsPlugin(b311.plugin.Plugin):
         else:
             sclient = client
 
+        stats = self._clientVars.get(sclient)
         message = '^3Stats ^7[ %s ^7] K ^2%s ^7D ^3%s ^7TK ^1%s ^7Dmg ^5%s ^7Skill ^3%1.02f ^7XP ^6%s' % \
-                  (sclient.exactName, sclient.var(self, 'kills', 0).value, sclient.var(self, 'deaths', 0).value,
-                   sclient.var(self, 'teamKills', 0).value, sclient.var(self, 'damageHit', 0).value,
-                   round(sclient.var(self, 'points', self.startPoints).value, 2),
-                   round(sclient.var(self, 'oldexperience', 0).value + sclient.var(self, 'experience', 0).value, 2))
+                  (sclient.exactName, stats.kills, stats.deaths, stats.teamKills, stats.damageHit,
+                   round(stats.points, 2), round(stats.oldexperience + stats.experience, 2))
 
         cmd.sayLoudOrPM(client, message)
 
@@ -420,9 +413,9 @@ class StatsPlugin(b311.plugin.Plugin):
                 results.append('^3#%s^7 %s ^7[^3%s^7]' % (i, name, score))
 
             if client:
-                client.message('^3Top Stats:^7 %s' % string.join(results, ', '))
+                client.message('^3Top Stats:^7 %s' % ', '.join(results))
             else:
-                self.console.say('^3Top Stats:^7 %s' % string.join(results, ', '))
+                self.console.say('^3Top Stats:^7 %s' % ', '.join(results))
         else:
             client.message('^3Stats: ^7No top players')
 
@@ -451,8 +444,8 @@ class StatsPlugin(b311.plugin.Plugin):
                 results.append('^3#%s^7 %s ^7[^3%s^7]' % (i, name, score))
 
             if client:
-                client.message('^3Top Experienced Players:^7 %s' % string.join(results, ', '))
+                client.message('^3Top Experienced Players:^7 %s' % ', '.join(results))
             else:
-                self.console.say('^3Top Experienced Players:^7 %s' % string.join(results, ', '))
+                self.console.say('^3Top Experienced Players:^7 %s' % ', '.join(results))
         else:
             client.message('^3Stats: ^7No top experienced players')
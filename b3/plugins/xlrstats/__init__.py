@@ -18,7 +18,7 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
 __author__ = 'xlr8or & ttlogic'
-__version__ = '3.0.0-beta.17'
+__version__ = '3.0.0-beta.18'
 
 import datetime
 import os
@@ -26,9 +26,9 @@ import re
 import threading
 import time
 
-import thread
-import urllib2
-from ConfigParser import NoOptionError
+import _thread
+import urllib.request
+from configparser import NoOptionError
 
 import b311
 import b311.cron
@@ -65,6 +65,7 @@ class XlrstatsPlugin(b311.plugin.Plugin):
     _cronTabWeek = None
     _cronTabMonth = None
     _cronTabKillBonus = None
+    _cronTabFlush = None
 
     # webfront variables
     webfront_version = 2  # maintain backward compatibility
@@ -96,6 +97,7 @@ class XlrstatsPlugin(b311.plugin.Plugin):
     announce = False  # announces points gained/lost to players after confrontations
     keep_history = True
     keep_time = True
+    flush_interval = 10  # seconds between two writes of the statistics kept in memory (0 = write every change at once)
     min_players = 2  # minimum number of players to collect stats
     _xlrstats_active = False  # parsing events based on min_players?
     _current_nr_players = 0  # current number of players present
@@ -156,6 +158,7 @@ class XlrstatsPlugin(b311.plugin.Plugin):
         self._ctimePlugin = None
         self._xlrstatstables = []  # will contain a list of the xlrstats database tables
         self._cronTabCorrectStats = None
+        self._stats = None  # StatsAccumulator instance (None when statistics are written at once)
         self.query = None  # shortcut to the storage.query function
         b311.plugin.Plugin.__init__(self, console, config)
 
@@ -197,14 +200,22 @@ class XlrstatsPlugin(b311.plugin.Plugin):
         ActionStats._table = self.actionstats_table
         PlayerActions._table = self.playeractions_table
 
+        # keep the statistics in memory and write them in batches
+        if self.flush_interval:
+            self._stats = StatsAccumulator(self)
+            self._cronTabFlush = b311.cron.PluginCronTab(self, self.flushStats, '*/%s' % self.flush_interval)
+            self.console.cron + self._cronTabFlush
+
         # register the events we're interested in.
         self.registerEvent('EVT_CLIENT_JOIN', self.onJoin)
         self.registerEvent('EVT_CLIENT_KILL', self.onKill)
         self.registerEvent('EVT_CLIENT_KILL_TEAM', self.onTeamKill)
         self.registerEvent('EVT_CLIENT_SUICIDE', self.onSuicide)
         self.registerEvent('EVT_GAME_ROUND_START', self.onRoundStart)
+        self.registerEvent('EVT_GAME_ROUND_END', self.onRoundEnd)
         self.registerEvent('EVT_CLIENT_ACTION', self.onAction)  # for game-events/actions
         self.registerEvent('EVT_CLIENT_DAMAGE', self.onDamage)  # for assist recognition
+        self.registerEvent('EVT_CLIENT_DISCONNECT', self.onDisconnect)
 
         # get the Client.id for the bot itself (guid: WORLD or Server(bfbc2/moh/hf))
         sclient = self.console.clients.getByGUID("WORLD")
@@ -238,7 +249,8 @@ class XlrstatsPlugin(b311.plugin.Plugin):
 
             self.verbose('starting subplugin XLRstats History')
             self._xlrstatsHistoryPlugin = XlrstatshistoryPlugin(self.console, self.history_weekly_table,
-                                                                self.history_monthly_table, self.playerstats_table)
+                                                                self.history_monthly_table, self.playerstats_table,
+                                                                self.flushStats)
             self._xlrstatsHistoryPlugin.onStartup()
 
         # let's try and get some variables from our webfront installation
@@ -323,6 +335,8 @@ class XlrstatsPlugin(b311.plugin.Plugin):
         self.prematch_maxtime = self.getSetting('settings', 'prematch_maxtime', b311.INT, self.prematch_maxtime)
         self.announce = self.getSetting('settings', 'announce', b311.BOOL, self.announce)
         self.keep_time = self.getSetting('settings', 'keep_time', b311.BOOL, self.keep_time)
+        self.flush_interval = self.getSetting('settings', 'flush_interval', b311.INT, self.flush_interval,
+                                              lambda x: int(min(max(x, 0), 59)))
 
         # load custom table names
         self.load_config_tables()
@@ -393,7 +407,7 @@ class XlrstatsPlugin(b311.plugin.Plugin):
                     raise ValueError("invalid table name for %s: %r" % (setting_option, table_name))
                 setattr(self, property_to_set, table_name)
                 self._defaultTableNames = False
-            except NoOptionError, err:
+            except NoOptionError as err:
                 self.debug(err)
             except Exception as err:
                 self.error(err)
@@ -465,6 +479,12 @@ class XlrstatsPlugin(b311.plugin.Plugin):
         self.checkMinPlayers(_roundstart=True)
         self.roundstart()
 
+    def onRoundEnd(self, _):
+        """
+        Handle EVT_GAME_ROUND_END
+        """
+        self.flushStats()
+
     def onAction(self, event):
         """
         Handle EVT_CLIENT_ACTION
@@ -472,6 +492,32 @@ class XlrstatsPlugin(b311.plugin.Plugin):
         if self._xlrstats_active:
             self.action(event.client, event.data)
 
+    def onDisconnect(self, event):
+        """
+        Handle EVT_CLIENT_DISCONNECT
+        """
+        if self._stats is not None and event.client:
+            self.flushStats()
+            self._stats.evictPlayer(event.client.id)
+
+    def onDisable(self):
+        """
+        Called when the plugin is disabled.
+        """
+        self.flushStats()
+
+    def onStop(self, event):
+        """
+        Handle EVT_STOP
+        """
+        self.flushStats()
+
+    def onExit(self, event):
+        """
+        Handle EVT_EXIT
+        """
+        self.flushStats()
+
     ####################################################################################################################
     #                                                                                                                  #
     #    OTHER METHODS                                                                                                 #
@@ -487,8 +533,8 @@ class XlrstatsPlugin(b311.plugin.Plugin):
         else:
             req = str(self.webfront_url.rstrip('/')) + '/' + str(self.webfront_config_nr) + '/pluginreq/index'
         try:
-            f = urllib2.urlopen(req)
-            res = f.readline().split(',')
+            f = urllib.request.urlopen(req)
+            res = f.readline().decode('utf-8', 'replace').split(',')
             # Our webfront will present us 3 values ie.: 200,20,30 -> minKills,minRounds,maxDays
             if len(res) == 3:
                 # Force the collected strings to their final type. If an error occurs they will fail the try statement.
@@ -529,6 +575,30 @@ class XlrstatsPlugin(b311.plugin.Plugin):
     def win_prob(self, player_skill, opponent_skill):
         return 1 / (10 ** ((opponent_skill - player_skill) / self.steepness) + 1)
 
+    def getCachedStat(self, cls, *key):
+        """
+        Return a copy of the statistics row kept in memory matching the given key (None if not available).
+        """
+        if self._stats is None:
+            return None
+        return self._stats.get(cls, key)
+
+    def cacheStat(self, stat, *key):
+        """
+        Keep in memory a statistics row which has just been read from the database.
+        :return: The statistics row to use
+        """
+        if self._stats is None:
+            return stat
+        return self._stats.add(stat, key)
+
+    def flushStats(self):
+        """
+        Write the statistics kept in memory which changed since the last flush.
+        """
+        if self._stats is not None:
+            self._stats.flush()
+
     def get_PlayerStats(self, client=None):
         """
         Retrieves an existing stats record for given client or makes a new one IFF client's level is high enough
@@ -539,6 +609,12 @@ class XlrstatsPlugin(b311.plugin.Plugin):
         else:
             client_id = client.id
 
+        s = self.getCachedStat(PlayerStats, client_id)
+        if s:
+            # the K-factor depends on the amount of confrontations
+            s.Kfactor = self.Kfactor_low if (s.kills + s.deaths) > self.Kswitch_confrontations else self.Kfactor_high
+            return s
+
         q = """SELECT * from %s WHERE client_id = %s LIMIT 1""" % (self.playerstats_table, client_id)
         cursor = self.query(q)
         if cursor and not cursor.EOF:
@@ -547,11 +623,11 @@ class XlrstatsPlugin(b311.plugin.Plugin):
             s.id = r['id']
             s.client_id = r['client_id']
             s.kills = r['kills']
+            s.deaths = r['deaths']
             if (s.kills + s.deaths) > self.Kswitch_confrontations:
                 s.Kfactor = self.Kfactor_low
             else:
                 s.Kfactor = self.Kfactor_high
-            s.deaths = r['deaths']
             s.teamkills = r['teamkills']
             s.teamdeaths = r['teamdeaths']
             s.suicides = r['suicides']
@@ -566,7 +642,7 @@ class XlrstatsPlugin(b311.plugin.Plugin):
             s.hide = r['hide']
             s.fixed_name = r['fixed_name']
             s.id_token = r['id_token']
-            return s
+            return self.cacheStat(s, client_id)
         elif (client is None) or (client.maxLevel >= self.minlevel):
             s = PlayerStats()
             s._new = True
@@ -581,6 +657,10 @@ class XlrstatsPlugin(b311.plugin.Plugin):
         return self.get_PlayerStats(None)
 
     def get_WeaponStats(self, name):
+        s = self.getCachedStat(WeaponStats, name)
+        if s:
+            return s
+
         s = WeaponStats()
         q = """SELECT * from %s WHERE name = '%s' LIMIT 1""" % (self.weaponstats_table, name)
         cursor = self.query(q)
@@ -591,13 +671,17 @@ class XlrstatsPlugin(b311.plugin.Plugin):
             s.kills = r['kills']
             s.suicides = r['suicides']
             s.teamkills = r['teamkills']
-            return s
+            return self.cacheStat(s, name)
         else:
             s._new = True
             s.name = name
             return s
 
     def get_Bodypart(self, name):
+        s = self.getCachedStat(Bodyparts, name)
+        if s:
+            return s
+
         s = Bodyparts()
         q = """SELECT * from %s WHERE name = '%s' LIMIT 1""" % (self.bodyparts_table, name)
         cursor = self.query(q)
@@ -608,7 +692,7 @@ class XlrstatsPlugin(b311.plugin.Plugin):
             s.kills = r['kills']
             s.suicides = r['suicides']
             s.teamkills = r['teamkills']
-            return s
+            return self.cacheStat(s, name)
         else:
             s._new = True
             s.name = name
@@ -616,6 +700,10 @@ class XlrstatsPlugin(b311.plugin.Plugin):
 
     def get_MapStats(self, name):
         assert name is not None
+        s = self.getCachedStat(MapStats, name)
+        if s:
+            return s
+
         s = MapStats()
         q = """SELECT * from %s WHERE name = '%s' LIMIT 1""" % (self.mapstats_table, name)
         cursor = self.query(q)
@@ -627,13 +715,17 @@ class XlrstatsPlugin(b311.plugin.Plugin):
             s.suicides = r['suicides']
             s.teamkills = r['teamkills']
             s.rounds = r['rounds']
-            return s
+            return self.cacheStat(s, name)
         else:
             s._new = True
             s.name = name
             return s
 
     def get_WeaponUsage(self, weaponid, playerid):
+        s = self.getCachedStat(WeaponUsage, playerid, weaponid)
+        if s:
+            return s
+
         s = WeaponUsage()
         q = """SELECT * from %s WHERE weapon_id = %s AND player_id = %s LIMIT 1""" % (
         self.weaponusage_table, weaponid, playerid)
@@ -648,7 +740,7 @@ class XlrstatsPlugin(b311.plugin.Plugin):
             s.suicides = r['suicides']
             s.teamkills = r['teamkills']
             s.teamdeaths = r['teamdeaths']
-            return s
+            return self.cacheStat(s, playerid, weaponid)
         else:
             s._new = True
             s.player_id = playerid
@@ -656,6 +748,10 @@ class XlrstatsPlugin(b311.plugin.Plugin):
             return s
 
     def get_Opponent(self, killerid, targetid):
+        s = self.getCachedStat(Opponents, killerid, targetid)
+        if s:
+            return s
+
         s = Opponents()
         q = """SELECT * from %s WHERE killer_id = %s AND target_id = %s LIMIT 1""" % (
         self.opponents_table, killerid, targetid)
@@ -667,7 +763,7 @@ class XlrstatsPlugin(b311.plugin.Plugin):
             s.target_id = r['target_id']
             s.kills = r['kills']
             s.retals = r['retals']
-            return s
+            return self.cacheStat(s, killerid, targetid)
         else:
             s._new = True
             s.killer_id = killerid
@@ -675,6 +771,10 @@ class XlrstatsPlugin(b311.plugin.Plugin):
             return s
 
     def get_PlayerBody(self, playerid, bodypartid):
+        s = self.getCachedStat(PlayerBody, playerid, bodypartid)
+        if s:
+            return s
+
         s = PlayerBody()
         q = """SELECT * from %s WHERE bodypart_id = %s AND player_id = %s LIMIT 1""" % (
         self.playerbody_table, bodypartid, playerid)
@@ -689,7 +789,7 @@ class XlrstatsPlugin(b311.plugin.Plugin):
             s.suicides = r['suicides']
             s.teamkills = r['teamkills']
             s.teamdeaths = r['teamdeaths']
-            return s
+            return self.cacheStat(s, playerid, bodypartid)
         else:
             s._new = True
             s.player_id = playerid
@@ -709,6 +809,10 @@ class XlrstatsPlugin(b311.plugin.Plugin):
             else:
                 return None
 
+        s = self.getCachedStat(PlayerMaps, playerid, mapid)
+        if s:
+            return s
+
         s = PlayerMaps()
         q = """SELECT * from %s WHERE map_id = %s AND player_id = %s LIMIT 1""" % (
         self.playermaps_table, mapid, playerid)
@@ -724,7 +828,7 @@ class XlrstatsPlugin(b311.plugin.Plugin):
             s.teamkills = r['teamkills']
             s.teamdeaths = r['teamdeaths']
             s.rounds = r['rounds']
-            return s
+            return self.cacheStat(s, playerid, mapid)
         else:
             s._new = True
             s.player_id = playerid
@@ -732,6 +836,10 @@ class XlrstatsPlugin(b311.plugin.Plugin):
             return s
 
     def get_ActionStats(self, name):
+        s = self.getCachedStat(ActionStats, name)
+        if s:
+            return s
+
         s = ActionStats()
         q = """SELECT * from %s WHERE name = '%s' LIMIT 1""" % (self.actionstats_table, name)
         cursor = self.query(q)
@@ -740,13 +848,17 @@ class XlrstatsPlugin(b311.plugin.Plugin):
             s.id = r['id']
             s.name = r['name']
             s.count = r['count']
-            return s
+            return self.cacheStat(s, name)
         else:
             s._new = True
             s.name = name
             return s
 
     def get_PlayerActions(self, playerid, actionid):
+        s = self.getCachedStat(PlayerActions, playerid, actionid)
+        if s:
+            return s
+
         s = PlayerActions()
         q = """SELECT * from %s WHERE action_id = %s AND player_id = %s LIMIT 1""" % (
         self.playeractions_table, actionid, playerid)
@@ -757,7 +869,7 @@ class XlrstatsPlugin(b311.plugin.Plugin):
             s.player_id = r['player_id']
             s.action_id = r['action_id']
             s.count = r['count']
-            return s
+            return self.cacheStat(s, playerid, actionid)
         else:
             s._new = True
             s.player_id = playerid
@@ -774,6 +886,11 @@ class XlrstatsPlugin(b311.plugin.Plugin):
             if cursor.rowcount > 0:
                 stat.id = cursor.lastrowid
                 delattr(stat, '_new')
+                if self._stats is not None:
+                    self._stats.add(stat, stat._key())
+        elif self._stats is not None and self._stats.save(stat):
+            # written on the next flush
+            pass
         else:
             q = stat._updatequery()
             # self.debug('Updating using: %r', q)
@@ -799,7 +916,7 @@ class XlrstatsPlugin(b311.plugin.Plugin):
             target._attackers = {}
             ainfo = target._attackers
 
-        for k, v in ainfo.iteritems():
+        for k, v in ainfo.items():
             if k == client.cid:
                 # don't award the killer for the assist aswell
                 continue
@@ -1494,7 +1611,7 @@ class XlrstatsPlugin(b311.plugin.Plugin):
     def optimizeTables(self, t=None):
         if not t:
             t = self.showTables()
-        if isinstance(t, basestring):
+        if isinstance(t, str):
             _tables = str(t)
         else:
             _tables = ', '.join(t)
@@ -1509,7 +1626,7 @@ class XlrstatsPlugin(b311.plugin.Plugin):
     def repairTables(self, t=None):
         if not t:
             t = self.showTables()
-        if isinstance(t, basestring):
+        if isinstance(t, str):
             _tables = str(t)
         else:
             _tables = ', '.join(t)
@@ -1522,6 +1639,7 @@ class XlrstatsPlugin(b311.plugin.Plugin):
 
     def calculateKillBonus(self):
         self.debug('calculating kill_bonus')
+        self.flushStats()
         # make sure _max and _diff are floating numbers (may be redundant)
         _oldkillbonus = self.kill_bonus
 
@@ -1555,6 +1673,7 @@ class XlrstatsPlugin(b311.plugin.Plugin):
 
     def correctStats(self):
         self.debug('gathering XLRstats statistics')
+        self.flushStats()
         _seconds = self._auto_correct_ignore_days * 86400
         q = """SELECT MAX(%s.skill) AS max_skill, MIN(%s.skill) AS min_skill, SUM(%s.skill) AS sum_skill,
                AVG(%s.skill) AS avg_skill , COUNT(%s.id) AS cnt
@@ -1615,12 +1734,15 @@ class XlrstatsPlugin(b311.plugin.Plugin):
             self.debug('correcting overall skill with factor %s...' % round(_correction_factor, _factor_decimals))
             self.query("""UPDATE %s SET skill=(SELECT skill * %s ) WHERE %s.client_id <> %s""" % (
                 self.playerstats_table, _correction_factor, self.playerstats_table, self._world_clientid))
+            if self._stats is not None:
+                self._stats.clear(PlayerStats)
 
     def purgePlayers(self):
         if not self.auto_purge:
             return None
 
         self.debug('purgin players who haven\'t been online for %s days...', self._purge_player_days)
+        self.flushStats()
 
         # find players who haven't been online for a long time
         _seconds = self._purge_player_days * 86400
@@ -1643,6 +1765,9 @@ class XlrstatsPlugin(b311.plugin.Plugin):
                 self.purgeAssociated(self.weaponusage_table, r['player_id'])
                 cursor.moveNext()
 
+        if self._stats is not None:
+            self._stats.clear()
+
     def purgePlayerStats(self, _id):
         self.query("""DELETE FROM %s WHERE id = %s""" % (self.playerstats_table, _id))
 
@@ -1723,7 +1848,7 @@ class XlrstatsPlugin(b311.plugin.Plugin):
         """
         [<#>] - list the top # players of the last 14 days.
         """
-        thread.start_new_thread(self.doTopList, (data, client, cmd, ext))
+        _thread.start_new_thread(self.doTopList, (data, client, cmd, ext))
 
     def doTopList(self, data, client, cmd=None, ext=False):
         """
@@ -1867,6 +1992,10 @@ class XlrstatsPlugin(b311.plugin.Plugin):
         client.message('^3auto_correct: %s, auto_purge: %s, k_b: %s, as_b: %s, ac_b: %s' %
                        (self.auto_correct, self.auto_purge, self.kill_bonus, self.assist_bonus, self.action_bonus))
 
+        if self._stats is not None:
+            client.message('^3stats in memory: %(rows)s rows, %(pending)s to write, %(hits)s hits, '
+                           '%(misses)s misses' % self._stats.stats())
+
     def cmd_xlrinit(self, data, client, cmd=None):
         """
         - initialize XLRstats database schema (!!!will remove all the collected stats!!!)
@@ -1874,6 +2003,10 @@ class XlrstatsPlugin(b311.plugin.Plugin):
         xlr_tables = [getattr(self, x) for x in dir(self) if x.endswith('_table')]
         current_tables = self.console.storage.getTables()
 
+        # forget the statistics kept in memory
+        if self._stats is not None:
+            self._stats.clear(dirty=True)
+
         # truncate database tables
         for table in xlr_tables:
             if table in current_tables:
@@ -1909,9 +2042,12 @@ class XlrstatsPlugin(b311.plugin.Plugin):
             client.message('^3%s ^1Not Found XLR Data!' % sclient.exactName)
 
     def dataReset(self, pid):
+        self.flushStats()
         q = """UPDATE xlr_playerstats SET kills=0, deaths=0, teamkills=0, teamdeaths=0, suicides=0, ratio=0, skill=0, assists=0, assistskill=0, curstreak=0, winstreak=0, losestreak=0, rounds=0, hide=0, fixed_name='', id_token='' WHERE id= %s""" % (
             pid)
         self.query(q)
+        if self._stats is not None:
+            self._stats.clear(PlayerStats)
 
 
 ########################################################################################################################
@@ -1999,18 +2135,20 @@ class XlrstatshistoryPlugin(b311.plugin.Plugin):
     #                                                                                                                  #
     ####################################################################################################################
 
-    def __init__(self, console, weeklyTable, monthlyTable, playerstatsTable):
+    def __init__(self, console, weeklyTable, monthlyTable, playerstatsTable, flushStats=None):
         """
         Object constructor.
         :param console: The console instance
         :param weeklyTable: The history weekly database table name
         :param monthlyTable: The history monthly database table name
         :param playerstatsTable: The playerstats database table name
+        :param flushStats: A function writing the player stats kept in memory (called before taking snapshots)
         """
         b311.plugin.Plugin.__init__(self, console)
         self.history_weekly_table = weeklyTable
         self.history_monthly_table = monthlyTable
         self.playerstats_table = playerstatsTable
+        self._flushStats = flushStats
         # empty message cache
         self._messages = {}
         # define a shortcut to the storage.query function
@@ -2070,6 +2208,8 @@ class XlrstatshistoryPlugin(b311.plugin.Plugin):
                  assistskill, winstreak, losestreak, rounds, YEAR(NOW()), MONTH(NOW()), WEEK(NOW(),3), DAY(NOW())
                  FROM %s""" % (self.history_monthly_table, self.playerstats_table)
         try:
+            if self._flushStats:
+                self._flushStats()
             self.query(sql)
             self.verbose('monthly XLRstats snapshot created')
         except Exception as msg:
@@ -2085,6 +2225,8 @@ class XlrstatshistoryPlugin(b311.plugin.Plugin):
                  assistskill, winstreak, losestreak, rounds, YEAR(NOW()), MONTH(NOW()), WEEK(NOW(),3), DAY(NOW())
                  FROM %s""" % (self.history_weekly_table, self.playerstats_table)
         try:
+            if self._flushStats:
+                self._flushStats()
             self.query(sql)
             self.verbose('weekly XLRstats snapshot created')
         except Exception as msg:
@@ -2365,6 +2507,187 @@ class BattlestatsPlugin(b311.plugin.Plugin):
         self.clientsLog = {}
 
 
+########################################################################################################################
+#                                                                                                                      #
+#   STATS ACCUMULATOR - KEEPS THE LIVE STATISTICS ROWS IN MEMORY AND WRITES THEM IN BATCHES                            #
+#                                                                                                                      #
+########################################################################################################################
+
+class StatsAccumulator(object):
+    """
+    Keep the statistics rows used by the plugin in memory. Rows read from the database are served from memory
+    afterwards, saved rows are only marked as dirty and written every few seconds with one multi-row upsert per
+    table. New rows are still inserted straight away since their id is needed by the rows referencing them.
+    Rows are handed out as copies: changes which are not saved are discarded, as they were when every row was read
+    from the database. Rows are written with their absolute values so a batch which failed can be written again
+    without counting anything twice: dirty rows are kept in memory until they are written.
+    """
+
+    def __init__(self, plugin):
+        """
+        Object constructor.
+        :param plugin: The XlrstatsPlugin instance
+        """
+        self._plugin = plugin
+        self._lock = threading.RLock()
+        self._flushLock = threading.Lock()
+        self._index = {}  # (class, key) -> row id
+        self._rows = {}  # (class, row id) -> StatObject
+        self._dirty = set()  # (class, row id)
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+        self.errors = 0
+        self.rows = 0
+        self.lastFlushTime = 0.0
+
+    @property
+    def pending(self):
+        """
+        The number of rows waiting to be written.
+        """
+        return len(self._dirty)
+
+    def get(self, cls, key):
+        """
+        Return a copy of the row of the given class matching the given key or None if it's not in memory.
+        """
+        with self._lock:
+            rowid = self._index.get((cls, key))
+            stat = self._rows.get((cls, rowid)) if rowid is not None else None
+            if stat is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return stat._copy()
+
+    def add(self, stat, key):
+        """
+        Keep in memory a row which has just been read from the database or inserted.
+        :return: The row to use: a copy of the row already in memory if any (it may hold changes not written yet)
+        """
+        if stat.id is None or None in key:
+            return stat
+        with self._lock:
+            current = self._rows.get((stat.__class__, stat.id))
+            self._index[(stat.__class__, key)] = stat.id
+            if current is not None:
+                return current._copy()
+            self._index[(stat.__class__, stat._key())] = stat.id
+            self._rows[(stat.__class__, stat.id)] = stat._copy()
+        return stat
+
+    def save(self, stat):
+        """
+        Replace the row in memory with the given one and mark it as dirty.
+        :return: False if the row is not kept in memory (it must then be written by the caller)
+        """
+        with self._lock:
+            k = (stat.__class__, stat.id)
+            if k not in self._rows:
+                return False
+            self._rows[k] = stat._copy()
+            self._dirty.add(k)
+        return True
+
+    def flush(self):
+        """
+        Write all the dirty rows, with one upsert per table.
+        :return: The number of rows written
+        """
+        with self._flushLock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+                tables = {}
+                for k in dirty:
+                    tables.setdefault(k[0], []).append(self._rows[k])
+
+            if not tables:
+                return 0
+
+            started = time.time()
+            written = 0
+            storage = self._plugin.console.storage
+            for cls, stats in tables.items():
+                fields = ('id',) + cls._fields
+                try:
+                    storage.upsert(cls._table, fields, [x._values() for x in stats], ('id',))
+                    written += len(stats)
+                    continue
+                except Exception as e:
+                    self.errors += 1
+                    self._plugin.error('could not write %s rows in table %s: %s', len(stats), cls._table, e)
+
+                # write the rows one by one so a broken row does not hold back the other ones
+                failed = []
+                for stat in stats:
+                    try:
+                        storage.upsert(cls._table, fields, [stat._values()], ('id',))
+                        written += 1
+                    except Exception:
+                        failed.append(stat)
+
+                if failed and not storage.status():
+                    # database not reachable: write them on the next flush
+                    with self._lock:
+                        for stat in failed:
+                            self._dirty.add((cls, stat.id))
+                elif failed:
+                    self._plugin.error('dropped %s rows which could not be written in table %s: %r', len(failed),
+                                       cls._table, [x._values() for x in failed])
+
+            self.lastFlushTime = time.time() - started
+            if written:
+                self.flushes += 1
+                self.rows += written
+            return written
+
+    def evictPlayer(self, clientId):
+        """
+        Remove from memory the rows of the given client (its player stats and every row referencing them).
+        Dirty rows are kept until they are written.
+        """
+        with self._lock:
+            playerid = self._index.get((PlayerStats, (clientId,)))
+            if playerid is not None:
+                self._evict(lambda x: x.id == playerid if isinstance(x, PlayerStats) else
+                            playerid in (getattr(x, 'player_id', None), getattr(x, 'killer_id', None),
+                                         getattr(x, 'target_id', None)))
+
+    def clear(self, cls=None, dirty=False):
+        """
+        Remove rows from memory.
+        :param cls: The class of the rows to remove (all of them if not given)
+        :param dirty: Whether to drop the rows not written yet too
+        """
+        with self._lock:
+            if dirty:
+                self._dirty = set(k for k in self._dirty if cls is not None and k[0] is not cls)
+            self._evict(lambda x: cls is None or isinstance(x, cls))
+
+    def _evict(self, match):
+        removed = set(k for k, v in self._rows.items() if k not in self._dirty and match(v))
+        if removed:
+            for k in removed:
+                del self._rows[k]
+            self._index = dict((k, v) for k, v in self._index.items() if (k[0], v) not in removed)
+
+    def stats(self):
+        """
+        Return the accumulator metrics.
+        """
+        return {
+            'rows': len(self._rows),
+            'pending': self.pending,
+            'hits': self.hits,
+            'misses': self.misses,
+            'flushes': self.flushes,
+            'written': self.rows,
+            'errors': self.errors,
+            'last_flush_time': round(self.lastFlushTime, 3),
+        }
+
+
 ########################################################################################################################
 #                                                                                                                      #
 #   ABSTRACT CLASSES TO AID XLRSTATS PLUGIN CLASS                                                                      #
@@ -2374,6 +2697,8 @@ class BattlestatsPlugin(b311.plugin.Plugin):
 
 class StatObject(object):
     _table = None
+    _keys = ()  # fields identifying a row of the table (besides its id)
+    _fields = ()  # fields written when the row is flushed by the stats accumulator (besides its id)
 
     def _insertquery(self):
         return None
@@ -2381,10 +2706,24 @@ class StatObject(object):
     def _updatequery(self):
         return None
 
+    def _key(self):
+        return tuple(getattr(self, x) for x in self._keys)
+
+    def _values(self):
+        return [self.id] + [getattr(self, x) for x in self._fields]
+
+    def _copy(self):
+        s = object.__new__(self.__class__)
+        s.__dict__.update(self.__dict__)
+        return s
+
 
 class PlayerStats(StatObject):
     # default name of the table for this data object
     _table = 'playerstats'
+    _keys = ('client_id',)
+    _fields = ('client_id', 'kills', 'deaths', 'teamkills', 'teamdeaths', 'suicides', 'ratio', 'skill', 'assists',
+               'assistskill', 'curstreak', 'winstreak', 'losestreak', 'rounds', 'hide', 'fixed_name', 'id_token')
 
     # fields of the table
     id = None
@@ -2437,6 +2776,8 @@ class PlayerStats(StatObject):
 class WeaponStats(StatObject):
     # default name of the table for this data object
     _table = 'weaponstats'
+    _keys = ('name',)
+    _fields = ('name', 'kills', 'suicides', 'teamkills')
 
     # fields of the table
     id = None
@@ -2459,6 +2800,8 @@ class WeaponStats(StatObject):
 class WeaponUsage(StatObject):
     # default name of the table for this data object
     _table = 'weaponusage'
+    _keys = ('player_id', 'weapon_id')
+    _fields = ('player_id', 'weapon_id', 'kills', 'deaths', 'suicides', 'teamkills', 'teamdeaths')
 
     # fields of the table
     id = None
@@ -2486,6 +2829,8 @@ class WeaponUsage(StatObject):
 class Bodyparts(StatObject):
     # default name of the table for this data object
     _table = 'bodyparts'
+    _keys = ('name',)
+    _fields = ('name', 'kills', 'suicides', 'teamkills')
 
     # fields of the table
     id = None
@@ -2508,6 +2853,8 @@ class Bodyparts(StatObject):
 class MapStats(StatObject):
     # default name of the table for this data object
     _table = 'mapstats'
+    _keys = ('name',)
+    _fields = ('name', 'kills', 'suicides', 'teamkills', 'rounds')
 
     # fields of the table
     id = None
@@ -2531,6 +2878,8 @@ class MapStats(StatObject):
 class PlayerBody(StatObject):
     # default name of the table for this data object
     _table = 'playerbody'
+    _keys = ('player_id', 'bodypart_id')
+    _fields = ('player_id', 'bodypart_id', 'kills', 'deaths', 'suicides', 'teamkills', 'teamdeaths')
 
     # fields of the table
     id = None
@@ -2559,6 +2908,8 @@ class PlayerBody(StatObject):
 class PlayerMaps(StatObject):
     # default name of the table for this data object
     _table = 'playermaps'
+    _keys = ('player_id', 'map_id')
+    _fields = ('player_id', 'map_id', 'kills', 'deaths', 'suicides', 'teamkills', 'teamdeaths', 'rounds')
 
     # fields of the table
     id = 0
@@ -2589,6 +2940,8 @@ class PlayerMaps(StatObject):
 class Opponents(StatObject):
     # default name of the table for this data object
     _table = 'opponents'
+    _keys = ('killer_id', 'target_id')
+    _fields = ('killer_id', 'target_id', 'kills', 'retals')
 
     # fields of the table
     id = None
@@ -2611,6 +2964,8 @@ class Opponents(StatObject):
 class ActionStats(StatObject):
     # default name of the table for this data object
     _table = 'actionstats'
+    _keys = ('name',)
+    _fields = ('name', 'count')
 
     # fields of the table
     id = None
@@ -2630,6 +2985,8 @@ class ActionStats(StatObject):
 class PlayerActions(StatObject):
     # default name of the table for this data object
     _table = 'playeractions'
+    _keys = ('player_id', 'action_id')
+    _fields = ('player_id', 'action_id', 'count')
 
     # fields of the table
     id = None
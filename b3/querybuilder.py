@@ -23,19 +23,36 @@
 # 2011-05-31 - 1.1.0         - Courgette - sqlite compatible
 # 2014-07-25 - 1.2.0         - Fenix     - syntax cleanup
 # 2014-12-28 - 1.3.0         - Fenix     - postgresql support
+# 2026-10-18 - 1.4.0         - agent     - added SelectStatement, UpdateStatement and InsertStatement: parameterised
+#                                          statements, built once per statement shape and cached
 
 __author__ = 'ThorN'
-__version__ = '1.3.0'
+__version__ = '1.4.0'
+
+import re
 
 
 class QueryBuilder(object):
 
-    def __init__(self, db=None):
+    # placeholder style of the parameterised statements: 'format' (%s) or 'qmark' (?)
+    paramstyle = 'format'
+
+    # statement cache: statement shape -> SQL text (shared by all the instances)
+    _statements = {}
+    _statementsLimit = 1024
+
+    _reFormat = re.compile(r'%(s|%)')
+    _reOperator = re.compile(r'^(?P<pre>[%&|]?)\s*(?P<field>.*?)\s*(?P<post>>=|<=|<|>|=|%)?$')
+
+    def __init__(self, db=None, paramstyle=None):
         """
         Object constructor.
         :param db: The current database connection.
+        :param paramstyle: The placeholder style of the parameterised statements ('format' or 'qmark').
         """
         self.db = db
+        if paramstyle:
+            self.paramstyle = paramstyle
 
     def escape(self, word):
         """
@@ -282,3 +299,130 @@ class QueryBuilder(object):
         sql += "(" + self.fieldStr(keys) + ") VALUES (" + ", ".join(values) + ")"
 
         return sql
+
+    ####################################################################################################################
+    #                                                                                                                  #
+    #   PARAMETERISED STATEMENTS                                                                                       #
+    #                                                                                                                  #
+    ####################################################################################################################
+
+    def SelectStatement(self, fields, table, where=None, orderby='', limit=0, condition=None):
+        """
+        Construct a parameterised SQL select statement.
+        :param fields: A list of fields to select or an SQL expression (i.e: 'COUNT(id) total').
+        :param table: The table from where to fetch data.
+        :param where: A dict of field/value pairs (same syntax as FieldClause keys) or a WHERE clause string.
+        :param orderby: The ORDER BY clause for this select statement.
+        :param limit: The amount of data data to collect.
+        :param condition: An additional condition given as a tuple (SQL using %s placeholders, list of values).
+        :return: A tuple (SQL statement, list of values to bind).
+        """
+        shape, params = self._whereShape(where, condition)
+        key = ('SELECT', self.paramstyle, tuple(fields) if isinstance(fields, (list, tuple)) else fields,
+               table, shape, orderby, limit)
+        sql = self._statements.get(key)
+        if sql is None:
+            expression = isinstance(fields, str) and '(' in fields
+            sql = 'SELECT %s FROM %s' % (fields if expression else self.fieldStr(fields), table)
+            if shape:
+                sql += ' WHERE ' + self._whereSql(shape)
+            if orderby:
+                sql += ' ORDER BY %s' % orderby
+            if limit:
+                sql += ' LIMIT %s' % int(limit)
+            sql = self._cache(key, sql)
+        return sql, params
+
+    def UpdateStatement(self, data, table, where):
+        """
+        Construct a parameterised SQL update statement.
+        :param data: A dictionary of key-value pairs for the update.
+        :param table: The table to update.
+        :param where: A dict of field/value pairs (same syntax as FieldClause keys).
+        :return: A tuple (SQL statement, list of values to bind).
+        """
+        keys = tuple(sorted(data.keys()))
+        shape, params = self._whereShape(where)
+        key = ('UPDATE', self.paramstyle, table, keys, shape)
+        sql = self._statements.get(key)
+        if sql is None:
+            sql = 'UPDATE %s SET %s WHERE %s' % (table, ', '.join(['`%s` = %%s' % k for k in keys]),
+                                                 self._whereSql(shape))
+            sql = self._cache(key, sql)
+        return sql, [data[k] for k in keys] + params
+
+    def InsertStatement(self, data, table):
+        """
+        Construct a parameterised SQL insert statement.
+        :param data: A dictionary of key-value pairs to insert.
+        :param table: The table where to insert data.
+        :return: A tuple (SQL statement, list of values to bind).
+        """
+        keys = tuple(sorted(data.keys()))
+        key = ('INSERT', self.paramstyle, table, keys)
+        sql = self._statements.get(key)
+        if sql is None:
+            sql = 'INSERT INTO %s(%s) VALUES (%s)' % (table, self.fieldStr(keys), ', '.join(['%s'] * len(keys)))
+            sql = self._cache(key, sql)
+        return sql, [data[k] for k in keys]
+
+    def _whereShape(self, where, condition=None):
+        """
+        Split a WHERE clause into its shape (what the SQL text depends on) and the values to bind.
+        """
+        params = []
+        if not where:
+            shape = ()
+        elif isinstance(where, dict):
+            shape = []
+            for k in sorted(where.keys()):
+                v = where[k]
+                m = self._reOperator.match(k.strip())
+                pre, field, post = m.group('pre'), m.group('field'), m.group('post') or ''
+                if isinstance(v, (list, tuple)):
+                    shape.append((field, 'IN', len(v)))
+                    params.extend(v)
+                elif pre == '%' or post == '%':
+                    # LIKE clause: the wildcards go in the bound value
+                    shape.append((field, 'LIKE', None))
+                    params.append('%s%s%s' % ('%' if pre == '%' else '', '' if v is None else v,
+                                              '%' if post == '%' else ''))
+                else:
+                    shape.append((field, pre or post or '=', None))
+                    params.append('' if v is None else v)
+            shape = tuple(shape)
+        else:
+            # WHERE clause given as string: nothing to bind
+            shape = (self.WhereClause(where).replace('%', '%%'),)
+        if condition:
+            shape += (('', condition[0], None),)
+            params.extend(condition[1])
+        return shape, params
+
+    @staticmethod
+    def _whereSql(shape):
+        """
+        Return the SQL text of a WHERE clause shape.
+        """
+        clauses = []
+        for item in shape:
+            if not isinstance(item, tuple):
+                clauses.append(item)
+            elif not item[0]:
+                clauses.append(item[1])
+            elif item[1] == 'IN':
+                clauses.append('`%s` IN(%s)' % (item[0], ', '.join(['%s'] * item[2])))
+            else:
+                clauses.append('`%s` %s %%s' % (item[0], item[1]))
+        return ' and '.join(clauses)
+
+    def _cache(self, key, sql):
+        """
+        Convert the placeholders of a statement to the current paramstyle and store it in the statement cache.
+        """
+        if self.paramstyle == 'qmark':
+            sql = self._reFormat.sub(lambda m: '?' if m.group(1) == 's' else '%', sql)
+        if len(self._statements) >= self._statementsLimit:
+            self._statements.clear()
+        self._statements[key] = sql
+        return sql
@@ -17,7 +17,7 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
 __author__ = 'Courgette'
-__version__ = '1.2'
+__version__ = '1.3'
 
 PROTOCOLS = ('mysql', 'sqlite', 'postgresql')
 
@@ -44,12 +44,24 @@ class Storage(object):
     def getClientsMatching(self, match):
         raise NotImplementedError
 
+    def getClientsByGuid(self, clients):
+        raise NotImplementedError
+
     def setClient(self, client):
         raise NotImplementedError
 
     def setClientAlias(self, alias):
         raise NotImplementedError
 
+    def queueClient(self, client):
+        raise NotImplementedError
+
+    def queueClientAlias(self, alias):
+        raise NotImplementedError
+
+    def queueClientIpAddress(self, ipalias):
+        raise NotImplementedError
+
     def getClientAlias(self, alias):
         raise NotImplementedError
 
@@ -80,6 +92,9 @@ class Storage(object):
     def getClientLastPenalty(self, client, type='Ban'):
         raise NotImplementedError
 
+    def getClientsPenalties(self, clients, type='Ban'):
+        raise NotImplementedError
+
     def getClientFirstPenalty(self, client, type='Ban'):
         raise NotImplementedError
 
@@ -101,7 +116,7 @@ class Storage(object):
     def truncateTable(self, table):
         raise NotImplementedError
 
-    def status(self):
+    def status(self, metrics=False):
         raise NotImplementedError
 
 
@@ -19,6 +19,21 @@
 # CHANGELOG
 #
 # 26/12/2014 - Fenix - moved into separate module
+# 18/10/2026 - agent - queries run on connections checked out from a ConnectionPool instead of a single locked
+#                      connection: added 'database_pool_size' setting and pool metrics in status()
+# 18/10/2026 - agent - added write-behind queue for clients, aliases and ip aliases ('database_write_delay' and
+#                      'database_write_batch' settings) written with multi-row upserts: see upsert()
+# 18/10/2026 - agent - added getClientsByGuid() and getClientsLastPenalty() to authorize many clients at once
+# 18/10/2026 - agent - storage queries are parameterised statements (QueryBuilder.*Statement) with values bound by the
+#                      database driver instead of being escaped in the SQL text
+# 18/10/2026 - agent - replaced getClientsLastPenalty() with getClientsPenalties(): penalty changes are notified to
+#                      the clients penalty summary cache
+# 18/10/2026 - agent - result sets are read by iterating the cursor (Row tuples fetched in batches) and getVar()
+#                      caches the field -> variable name conversions
+# 18/10/2026 - agent - clients, penalties, aliases, ip aliases and groups are loaded by the row mappers of
+#                      b311.storage.mapper, without calling the property setters
+# 18/10/2026 - agent - result sets are read at once when the connection is checked out from the pool: the connection
+#                      may be used by another thread before the cursor is read
 
 import _thread
 import os
@@ -28,28 +43,35 @@ from contextlib import contextmanager
 from time import time
 
 import b311
-from b311.clients import Client
-from b311.clients import ClientBan
-from b311.clients import ClientKick
-from b311.clients import ClientNotice
-from b311.clients import ClientTempBan
-from b311.clients import ClientWarning
-from b311.clients import Penalty
 from b311.querybuilder import QueryBuilder
 from b311.storage import Storage
 from b311.storage.cursor import Cursor as DBCursor
+from b311.storage.mapper import aliasMapper
+from b311.storage.mapper import clientMapper
+from b311.storage.mapper import groupMapper
+from b311.storage.mapper import ipAliasMapper
+from b311.storage.mapper import penaltyMapper
+from b311.storage.pool import ConnectionPool
+from b311.storage.writebehind import WriteBehind
 
 
 class DatabaseStorage(Storage):
     _lock = None
+    _pool = None
+    _poolSize = 5
+    _poolTimeout = 30
+    _upsertBatchSize = 100
+    _paramstyle = 'format'
     _lastConnectAttempt = 0
     _consoleNotice = True
     _reName = re.compile(r'([A-Z])')
     _reVar = re.compile(r'_([a-z])')
+    _vars = {}
 
     db = None
     dsn = None
     dsnDict = None
+    writeBehind = None
 
     def __init__(self, dsn, dsnDict, console):
         """
@@ -63,6 +85,27 @@ class DatabaseStorage(Storage):
         self.console = console
         self.db = None
         self._lock = _thread.allocate_lock()
+        if console.config.has_option('b311', 'database_pool_size'):
+            try:
+                self._poolSize = max(1, console.config.getint('b311', 'database_pool_size'))
+            except ValueError as e:
+                console.warning('could not read database_pool_size setting: using default (%s): %s',
+                                self._poolSize, e)
+
+        delay = 2.0
+        threshold = 100
+        if console.config.has_option('b311', 'database_write_delay'):
+            try:
+                delay = console.config.getfloat('b311', 'database_write_delay')
+            except ValueError as e:
+                console.warning('could not read database_write_delay setting: using default (%s): %s', delay, e)
+        if console.config.has_option('b311', 'database_write_batch'):
+            try:
+                threshold = console.config.getint('b311', 'database_write_batch')
+            except ValueError as e:
+                console.warning('could not read database_write_batch setting: using default (%s): %s', threshold, e)
+        if delay > 0:
+            self.writeBehind = WriteBehind(self, delay=delay, threshold=threshold)
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -82,7 +125,9 @@ class DatabaseStorage(Storage):
         Return the database connection. If the connection has not been established yet, will establish a new one.
         :return The connection instance, or None if no connection can be established.
         """
-        raise NotImplementedError
+        if self._pool is not None and self._pool.lastError is None and self.db is not None:
+            return self.db
+        return self.connect()
 
     def shutdown(self):
         """
@@ -90,6 +135,105 @@ class DatabaseStorage(Storage):
         """
         raise NotImplementedError
 
+    def _createConnection(self):
+        """
+        Create a new connection with the storage layer (used by the connection pool).
+        :raise Exception: If the connection cannot be established.
+        """
+        raise NotImplementedError
+
+    def _isAlive(self, connection):
+        """
+        Tell whether the given connection is still open (must not query the database).
+        """
+        return connection is not None
+
+    def _closeConnection(self, connection):
+        """
+        Close the given connection.
+        """
+        connection.close()
+
+    def _pingConnection(self, connection):
+        """
+        Make sure the given connection still works: used on connections which stayed idle for a while.
+        :raise Exception: If the connection is broken.
+        """
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+            cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def _openPool(self, size=None):
+        """
+        Create the connection pool and establish its first connection.
+        :param size: The maximum number of connections (defaults to the 'database_pool_size' setting)
+        :raise Exception: If the connection cannot be established.
+        """
+        self._pool = ConnectionPool(self._createConnection, self._isAlive, self._closeConnection,
+                                    size=size or self._poolSize, timeout=self._poolTimeout,
+                                    ping=self._pingConnection)
+        try:
+            with self._pool.connection() as connection:
+                self.db = connection
+        except Exception:
+            self._closePool()
+            raise
+        return self.db
+
+    def _closePool(self):
+        """
+        Close all the connections of the connection pool.
+        """
+        if self._pool is not None:
+            self._pool.close()
+        self._pool = None
+        self.db = None
+
+    @contextmanager
+    def _connection(self, query=None):
+        """
+        Check out a connection for the current thread for the time needed to run a query.
+        :param query: The query which will be run on the connection.
+        """
+        if self._pool is None:
+            # no pool (storage created without connect()): share the main connection
+            with self._lock:
+                yield self.db
+        else:
+            with self._pool.connection() as connection:
+                self.db = connection
+                yield connection
+
+    def _cursor(self, connection):
+        """
+        Return a new cursor on the given connection. The connection is given back to the pool before the cursor is
+        read: in that case the result set is read at once when the Cursor is created (see _query()).
+        """
+        return connection.cursor()
+
+    def _flushWriteBehind(self):
+        """
+        Stop the write-behind thread and write the pending rows while the connections are still usable.
+        """
+        if self.writeBehind is not None and self._pool is not None and self._pool.lastError is None:
+            self.writeBehind.close()
+
+    def _builder(self):
+        """
+        Return a QueryBuilder producing statements with the placeholder style of the database driver.
+        """
+        return QueryBuilder(self.db, self._paramstyle)
+
+    @staticmethod
+    def _notExpired():
+        """
+        Return the condition matching the penalties which are not expired (for QueryBuilder.SelectStatement).
+        """
+        return '(time_expire = -1 OR time_expire > %s)', [int(time())]
+
     def closeConnection(self):
         """
         Just an alias for shutdown (backwards compatibility).
@@ -112,12 +256,9 @@ class DatabaseStorage(Storage):
             counts['clients'] = int(cursor.getValue('total'))
 
         cursor = self.query("""SELECT COUNT(id) total, type FROM penalties GROUP BY type""")
-        while not cursor.EOF:
-            r = cursor.getRow()
+        for r in cursor:
             counts[r['type'] + 's'] = int(r['total'])
-            cursor.moveNext()
 
-        cursor.close()
         return counts
 
     def getClient(self, client):
@@ -130,20 +271,8 @@ class DatabaseStorage(Storage):
 
         try:
 
-            cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'clients', where, None, 1))
-            if not cursor.rowcount:
-                raise KeyError('no client matching guid %s' % client.guid)
-
-            found = False
-            for k, v in cursor.getRow().items():
-                # if hasattr(client, k) and getattr(client, k):
-                #    # don't set already set items
-                #    continue
-                setattr(client, self.getVar(k), v)
-                found = True
-
-            cursor.close()
-            if not found:
+            cursor = self.query(*self._builder().SelectStatement('*', 'clients', where, None, 1))
+            if not cursor.rowcount or clientMapper.first(cursor, client) is None:
                 raise KeyError('no client matching guid %s' % client.guid)
 
             return client
@@ -161,25 +290,40 @@ class DatabaseStorage(Storage):
             else:
                 raise KeyError('no client matching guid %s in admins_cache' % client.guid)
 
+    def getClientsByGuid(self, clients):
+        """
+        Fill many client objects with data fetched from the storage with a single query (clients are matched by guid).
+        :param clients: The client objects to fill with fetch data.
+        :return: The list of the clients found in the storage.
+        """
+        byGuid = {}
+        for client in clients:
+            if client.guid:
+                byGuid.setdefault(client.guid, []).append(client)
+        if not byGuid:
+            return []
+
+        self.console.debug('Storage: getClientsByGuid %s' % list(byGuid.keys()))
+        cursor = self.query(*self._builder().SelectStatement('*', 'clients', {'guid': list(byGuid.keys())}))
+
+        found = []
+        columns = cursor.columns
+        plan = clientMapper.compile(columns)
+        for row in cursor:
+            for client in byGuid.pop(row['guid'], []):
+                found.append(clientMapper.load(client, columns, row, plan))
+
+        return found
+
     def getClientsMatching(self, match):
         """
         Return a list of clients matching the given data:
         :param match: The data to match clients against.
         """
         self.console.debug('Storage: getClientsMatching %s' % match)
-        cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'clients', match, 'time_edit DESC', 5))
-
-        clients = []
-        while not cursor.EOF:
-            g = cursor.getRow()
-            client = Client()
-            for k, v in g.items():
-                setattr(client, self.getVar(k), v)
-            clients.append(client)
-            cursor.moveNext()
+        cursor = self.query(*self._builder().SelectStatement('*', 'clients', match, 'time_edit DESC', 5))
 
-        cursor.close()
-        return clients
+        return clientMapper.all(cursor)
 
     def setClient(self, client):
         """
@@ -195,14 +339,15 @@ class DatabaseStorage(Storage):
         data = {'id': client.id} if client.id > 0 else {}
 
         for f in fields:
-            if hasattr(client, self.getVar(f)):
+            # None values are not bound as NULL: the column keeps its current/default value
+            if getattr(client, self.getVar(f), None) is not None:
                 data[f] = getattr(client, self.getVar(f))
 
         self.console.debug('Storage: setClient data %s' % data)
         if client.id > 0:
-            self.query(QueryBuilder(self.db).UpdateQuery(data, 'clients', {'id': client.id}))
+            self.query(*self._builder().UpdateStatement(data, 'clients', {'id': client.id}))
         else:
-            cursor = self.query(QueryBuilder(self.db).InsertQuery(data, 'clients'))
+            cursor = self.query(*self._builder().InsertStatement(data, 'clients'))
             client.id = cursor.lastrowid
             cursor.close()
 
@@ -219,19 +364,66 @@ class DatabaseStorage(Storage):
         data = {'id': alias.id} if alias.id else {}
 
         for f in fields:
-            if hasattr(alias, self.getVar(f)):
+            # None values are not bound as NULL: the column keeps its current/default value
+            if getattr(alias, self.getVar(f), None) is not None:
                 data[f] = getattr(alias, self.getVar(f))
 
         self.console.debug('Storage: setClientAlias data %s' % data)
         if alias.id:
-            self.query(QueryBuilder(self.db).UpdateQuery(data, 'aliases', {'id': alias.id}))
+            self.query(*self._builder().UpdateStatement(data, 'aliases', {'id': alias.id}))
         else:
-            cursor = self.query(QueryBuilder(self.db).InsertQuery(data, 'aliases'))
+            cursor = self.query(*self._builder().InsertStatement(data, 'aliases'))
             alias.id = cursor.lastrowid
             cursor.close()
 
         return alias.id
 
+    def queueClient(self, client):
+        """
+        Update a client in the storage through the write-behind queue. Clients not stored yet are inserted
+        right away since their ID is needed.
+        :param client: The client to be saved.
+        :return: The ID of the client stored into the database.
+        """
+        if self.writeBehind is None or not client.id > 0:
+            return self.setClient(client)
+        self.writeBehind.addClient(client)
+        return client.id
+
+    def queueClientAlias(self, alias):
+        """
+        Count one more use of an alias through the write-behind queue (the alias is created if needed).
+        :param alias: The alias (clientId, alias and timeEdit are used).
+        """
+        if self.writeBehind is None:
+            return self._useClientAlias(alias, self.getClientAlias, self.setClientAlias)
+        self.writeBehind.addAlias(alias.clientId, alias.alias, alias.timeEdit)
+
+    def queueClientIpAddress(self, ipalias):
+        """
+        Count one more use of an ip alias through the write-behind queue (the ip alias is created if needed).
+        :param ipalias: The ip alias (clientId, ip and timeEdit are used).
+        """
+        if self.writeBehind is None:
+            return self._useClientAlias(ipalias, self.getClientIpAddress, self.setClientIpAddress)
+        self.writeBehind.addIpAlias(ipalias.clientId, ipalias.ip, ipalias.timeEdit)
+
+    @staticmethod
+    def _useClientAlias(alias, getter, setter):
+        """
+        Count one more use of an alias/ip alias, reading it first from the storage.
+        """
+        timestamp = alias.timeEdit
+        try:
+            alias = getter(alias)
+        except KeyError:
+            alias.numUsed = 1
+            alias.timeAdd = timestamp
+        else:
+            alias.numUsed = alias.numUsed + 1 if alias.numUsed > 0 else 1
+        alias.timeEdit = timestamp
+        return setter(alias)
+
     def getClientAlias(self, alias):
         """
         Return an alias object fetching data from the storage.
@@ -240,26 +432,16 @@ class DatabaseStorage(Storage):
         """
         self.console.debug('Storage: getClientAlias %s' % alias)
         if hasattr(alias, 'id') and alias.id > 0:
-            query = QueryBuilder(self.db).SelectQuery('*', 'aliases', {'id': alias.id}, None, 1)
+            query = self._builder().SelectStatement('*', 'aliases', {'id': alias.id}, None, 1)
         elif hasattr(alias, 'alias') and hasattr(alias, 'clientId'):
-            query = QueryBuilder(self.db).SelectQuery('*', 'aliases',
-                                                      {'alias': alias.alias, 'client_id': alias.clientId}, None, 1)
+            query = self._builder().SelectStatement('*', 'aliases',
+                                                    {'alias': alias.alias, 'client_id': alias.clientId}, None, 1)
         else:
             raise KeyError('no alias found matching %s' % alias)
 
-        cursor = self.query(query)
-        if cursor.EOF:
-            cursor.close()
+        if aliasMapper.first(self.query(*query), alias) is None:
             raise KeyError('no alias found matching %s' % alias)
 
-        row = cursor.getOneRow()
-        alias.id = int(row['id'])
-        alias.alias = row['alias']
-        alias.timeAdd = int(row['time_add'])
-        alias.timeEdit = int(row['time_edit'])
-        alias.clientId = int(row['client_id'])
-        alias.numUsed = int(row['num_used'])
-
         return alias
 
     def getClientAliases(self, client):
@@ -269,23 +451,8 @@ class DatabaseStorage(Storage):
         :return: List of b311.clients.Alias instances.
         """
         self.console.debug('Storage: getClientAliases %s' % client)
-        cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'aliases', {'client_id': client.id}, 'id'))
-
-        aliases = []
-        while not cursor.EOF:
-            g = cursor.getRow()
-            alias = b311.clients.Alias()
-            alias.id = int(g['id'])
-            alias.alias = g['alias']
-            alias.timeAdd = int(g['time_add'])
-            alias.timeEdit = int(g['time_edit'])
-            alias.clientId = int(g['client_id'])
-            alias.numUsed = int(g['num_used'])
-            aliases.append(alias)
-            cursor.moveNext()
-
-        cursor.close()
-        return aliases
+        cursor = self.query(*self._builder().SelectStatement('*', 'aliases', {'client_id': client.id}, 'id'))
+        return aliasMapper.all(cursor)
 
     def setClientIpAddress(self, ipalias):
         """
@@ -297,14 +464,15 @@ class DatabaseStorage(Storage):
         data = {'id': ipalias.id} if ipalias.id else {}
 
         for f in fields:
-            if hasattr(ipalias, self.getVar(f)):
+            # None values are not bound as NULL: the column keeps its current/default value
+            if getattr(ipalias, self.getVar(f), None) is not None:
                 data[f] = getattr(ipalias, self.getVar(f))
 
         self.console.debug('Storage: setClientIpAddress data %s' % data)
         if ipalias.id:
-            self.query(QueryBuilder(self.db).UpdateQuery(data, 'ipaliases', {'id': ipalias.id}))
+            self.query(*self._builder().UpdateStatement(data, 'ipaliases', {'id': ipalias.id}))
         else:
-            cursor = self.query(QueryBuilder(self.db).InsertQuery(data, 'ipaliases'))
+            cursor = self.query(*self._builder().InsertStatement(data, 'ipaliases'))
             ipalias.id = cursor.lastrowid
             cursor.close()
 
@@ -318,26 +486,16 @@ class DatabaseStorage(Storage):
         """
         self.console.debug('Storage: getClientIpAddress %s' % ipalias)
         if hasattr(ipalias, 'id') and ipalias.id > 0:
-            query = QueryBuilder(self.db).SelectQuery('*', 'ipaliases', {'id': ipalias.id}, None, 1)
+            query = self._builder().SelectStatement('*', 'ipaliases', {'id': ipalias.id}, None, 1)
         elif hasattr(ipalias, 'ip') and hasattr(ipalias, 'clientId'):
-            query = QueryBuilder(self.db).SelectQuery('*', 'ipaliases', {'ip': ipalias.ip,
-                                                                         'client_id': ipalias.clientId}, None, 1)
+            query = self._builder().SelectStatement('*', 'ipaliases', {'ip': ipalias.ip,
+                                                                       'client_id': ipalias.clientId}, None, 1)
         else:
             raise KeyError('no ip found matching %s' % ipalias)
 
-        cursor = self.query(query)
-        if cursor.EOF:
-            cursor.close()
+        if ipAliasMapper.first(self.query(*query), ipalias) is None:
             raise KeyError('no ip found matching %s' % ipalias)
 
-        row = cursor.getOneRow()
-        ipalias.id = int(row['id'])
-        ipalias.ip = row['ip']
-        ipalias.timeAdd = int(row['time_add'])
-        ipalias.timeEdit = int(row['time_edit'])
-        ipalias.clientId = int(row['client_id'])
-        ipalias.numUsed = int(row['num_used'])
-
         return ipalias
 
     def getClientIpAddresses(self, client):
@@ -347,23 +505,8 @@ class DatabaseStorage(Storage):
         :return: List of b311.clients.IpAlias instances
         """
         self.console.debug('Storage: getClientIpAddresses %s' % client)
-        cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'ipaliases', {'client_id': client.id}, 'id'))
-
-        aliases = []
-        while not cursor.EOF:
-            row = cursor.getRow()
-            ip = b311.clients.IpAlias()
-            ip.id = int(row['id'])
-            ip.ip = row['ip']
-            ip.timeAdd = int(row['time_add'])
-            ip.timeEdit = int(row['time_edit'])
-            ip.clientId = int(row['client_id'])
-            ip.numUsed = int(row['num_used'])
-            aliases.append(ip)
-            cursor.moveNext()
-
-        cursor.close()
-        return aliases
+        cursor = self.query(*self._builder().SelectStatement('*', 'ipaliases', {'client_id': client.id}, 'id'))
+        return ipAliasMapper.all(cursor)
 
     def getLastPenalties(self, types='Ban', num=5):
         """
@@ -371,17 +514,9 @@ class DatabaseStorage(Storage):
         :param types: The penalties type.
         :param num: The amount of penalties to retrieve.
         """
-        penalties = []
-        where = QueryBuilder(self.db).WhereClause({'type': types, 'inactive': 0})
-        where += ' AND (time_expire = -1 OR time_expire > %s)' % int(time())
-        cursor = self.query(QueryBuilder(self.db).SelectQuery(fields='*', table='penalties', where=where,
-                                                              orderby='time_add DESC, id DESC', limit=num))
-        while not cursor.EOF and len(penalties) < num:
-            penalties.append(self._createPenaltyFromRow(cursor.getRow()))
-            cursor.moveNext()
-
-        cursor.close()
-        return penalties
+        cursor = self.query(*self._builder().SelectStatement('*', 'penalties', {'type': types, 'inactive': 0},
+                                                             'time_add DESC, id DESC', num, self._notExpired()))
+        return penaltyMapper.all(cursor)[:num]
 
     def setClientPenalty(self, penalty):
         """
@@ -410,18 +545,20 @@ class DatabaseStorage(Storage):
                     self.console.warning('ERROR: encoding reason: %r', msg)
 
         for f in fields:
-            if hasattr(penalty, self.getVar(f)):
+            # None values are not bound as NULL: the column keeps its current/default value
+            if getattr(penalty, self.getVar(f), None) is not None:
                 data[f] = getattr(penalty, self.getVar(f))
 
         self.console.debug('Storage: setClientPenalty data %s' % data)
 
         if penalty.id:
-            self.query(QueryBuilder(self.db).UpdateQuery(data, 'penalties', {'id': penalty.id}))
+            self.query(*self._builder().UpdateStatement(data, 'penalties', {'id': penalty.id}))
         else:
-            cursor = self.query(QueryBuilder(self.db).InsertQuery(data, 'penalties'))
+            cursor = self.query(*self._builder().InsertStatement(data, 'penalties'))
             penalty.id = cursor.lastrowid
             cursor.close()
 
+        self._penaltiesChanged(penalty.clientId)
         return penalty.id
 
     def getClientPenalty(self, penalty):
@@ -431,12 +568,11 @@ class DatabaseStorage(Storage):
         :return: The penalty given as input with all the fields set.
         """
         self.console.debug('Storage: getClientPenalty %s' % penalty)
-        cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'penalties', {'id': penalty.id}, None, 1))
-        if cursor.EOF:
-            cursor.close()
+        cursor = self.query(*self._builder().SelectStatement('*', 'penalties', {'id': penalty.id}, None, 1))
+        found = penaltyMapper.first(cursor)
+        if found is None:
             raise KeyError('no penalty matching id %s' % penalty.id)
-        row = cursor.getOneRow()
-        return self._createPenaltyFromRow(row)
+        return found
 
     def getClientPenalties(self, client, type='Ban'):
         """
@@ -446,17 +582,11 @@ class DatabaseStorage(Storage):
         :return: List of penalties
         """
         self.console.debug('Storage: getClientPenalties %s' % client)
-        where = QueryBuilder(self.db).WhereClause({'type': type, 'client_id': client.id, 'inactive': 0})
-        where += ' AND (time_expire = -1 OR time_expire > %s)' % int(time())
-        cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'penalties', where, 'time_add DESC'))
+        where = {'type': type, 'client_id': client.id, 'inactive': 0}
+        cursor = self.query(*self._builder().SelectStatement('*', 'penalties', where, 'time_add DESC',
+                                                             condition=self._notExpired()))
 
-        penalties = []
-        while not cursor.EOF:
-            penalties.append(self._createPenaltyFromRow(cursor.getRow()))
-            cursor.moveNext()
-
-        cursor.close()
-        return penalties
+        return penaltyMapper.all(cursor)
 
     def getClientLastPenalty(self, client, type='Ban'):
         """
@@ -465,15 +595,31 @@ class DatabaseStorage(Storage):
         :param type: The type of the penalty we want to retrieve.
         :return: The last penalty added for the given client
         """
-        where = QueryBuilder(self.db).WhereClause({'type': type, 'client_id': client.id, 'inactive': 0})
-        where += ' AND (time_expire = -1 OR time_expire > %s)' % int(time())
-        cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'penalties', where, 'time_add DESC', 1))
+        where = {'type': type, 'client_id': client.id, 'inactive': 0}
+        cursor = self.query(*self._builder().SelectStatement('*', 'penalties', where, 'time_add DESC', 1,
+                                                             self._notExpired()))
+        return penaltyMapper.first(cursor)
 
-        row = cursor.getOneRow()
-        if not row:
-            return None
+    def getClientsPenalties(self, clients, type='Ban'):
+        """
+        Return the active penalties of each of the given clients, using a single query.
+        :param clients: The clients whose penalties we want to retrieve.
+        :param type: The type of the penalties we want to retrieve.
+        :return: A dict client id -> list of penalties, most recent first (clients without penalty are not in the dict).
+        """
+        ids = [client.id for client in clients if client.id]
+        if not ids:
+            return {}
+
+        where = {'type': type, 'client_id': ids, 'inactive': 0}
+        cursor = self.query(*self._builder().SelectStatement('*', 'penalties', where, 'time_add DESC, id DESC',
+                                                             condition=self._notExpired()))
+
+        penalties = {}
+        for penalty in penaltyMapper.all(cursor):
+            penalties.setdefault(penalty.clientId, []).append(penalty)
 
-        return self._createPenaltyFromRow(row)
+        return penalties
 
     def getClientFirstPenalty(self, client, type='Ban'):
         """
@@ -482,15 +628,10 @@ class DatabaseStorage(Storage):
         :param type: The type of the penalty we want to retrieve.
         :return: The first penalty added for the given client.
         """
-        where = QueryBuilder(self.db).WhereClause({'type': type, 'client_id': client.id, 'inactive': 0})
-        where += ' AND (time_expire = -1 OR time_expire > %s)' % int(time())
-        cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'penalties', where,
-                                                              'time_expire DESC, time_add ASC', 1))
-        row = cursor.getOneRow()
-        if not row:
-            return None
-
-        return self._createPenaltyFromRow(row)
+        where = {'type': type, 'client_id': client.id, 'inactive': 0}
+        cursor = self.query(*self._builder().SelectStatement('*', 'penalties', where,
+                                                             'time_expire DESC, time_add ASC', 1, self._notExpired()))
+        return penaltyMapper.first(cursor)
 
     def disableClientPenalties(self, client, type='Ban'):
         """
@@ -498,8 +639,18 @@ class DatabaseStorage(Storage):
         :param client: The client whose penalties we want to disable.
         :param type: The type of the penalties we want to disable.
         """
-        self.query(QueryBuilder(self.db).UpdateQuery({'inactive': 1}, 'penalties',
-                                                     {'type': type, 'client_id': client.id, 'inactive': 0}))
+        self.query(*self._builder().UpdateStatement({'inactive': 1}, 'penalties',
+                                                    {'type': type, 'client_id': client.id, 'inactive': 0}))
+        self._penaltiesChanged(client.id)
+
+    def _penaltiesChanged(self, clientId):
+        """
+        Drop the cached penalty summary of a client whose penalties have been changed.
+        :param clientId: The id of the client
+        """
+        clients = getattr(self.console, 'clients', None)
+        if clients is not None and clientId:
+            clients.invalidatePenaltySummary(clientId)
 
     def numPenalties(self, client, type='Ban'):
         """
@@ -508,9 +659,9 @@ class DatabaseStorage(Storage):
         :param type: The penalties type.
         :return The number of penalties.
         """
-        where = QueryBuilder(self.db).WhereClause({'type': type, 'client_id': client.id, 'inactive': 0})
-        where += ' AND (time_expire = -1 OR time_expire > %s)' % int(time())
-        cursor = self.query("""SELECT COUNT(id) total FROM penalties WHERE %s""" % where)
+        where = {'type': type, 'client_id': client.id, 'inactive': 0}
+        cursor = self.query(*self._builder().SelectStatement('COUNT(id) total', 'penalties', where,
+                                                             condition=self._notExpired()))
         value = int(cursor.getValue('total', 0))
         cursor.close()
         return value
@@ -522,20 +673,8 @@ class DatabaseStorage(Storage):
         Return a list of available client groups.
         """
         if not self._groups:
-            cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'groups', None, 'level'))
-            self._groups = []
-            while not cursor.EOF:
-                row = cursor.getRow()
-                group = b311.clients.Group()
-                group.id = int(row['id'])
-                group.name = row['name']
-                group.keyword = row['keyword']
-                group.level = int(row['level'])
-                group.timeAdd = int(row['time_add'])
-                group.timeEdit = int(row['time_edit'])
-                self._groups.append(group)
-                cursor.moveNext()
-            cursor.close()
+            cursor = self.query(*self._builder().SelectStatement('*', 'groups', None, 'level'))
+            self._groups = groupMapper.all(cursor)
 
         return self._groups
 
@@ -546,30 +685,19 @@ class DatabaseStorage(Storage):
         :return: The group instance given in input with all the fields set.
         """
         if hasattr(group, 'keyword') and group.keyword:
-            query = QueryBuilder(self.db).SelectQuery('*', 'groups', dict(keyword=group.keyword), None, 1)
+            query = self._builder().SelectStatement('*', 'groups', dict(keyword=group.keyword), None, 1)
             self.console.verbose2(query)
-            cursor = self.query(query)
-            row = cursor.getOneRow()
-            if not row:
+            if groupMapper.first(self.query(*query), group) is None:
                 raise KeyError('no group matching keyword: %s' % group.keyword)
 
         elif hasattr(group, 'level') and group.level >= 0:
-            query = QueryBuilder(self.db).SelectQuery('*', 'groups', dict(level=group.level), None, 1)
+            query = self._builder().SelectStatement('*', 'groups', dict(level=group.level), None, 1)
             self.console.verbose2(query)
-            cursor = self.query(query)
-            row = cursor.getOneRow()
-            if not row:
+            if groupMapper.first(self.query(*query), group) is None:
                 raise KeyError('no group matching level: %s' % group.level)
         else:
             raise KeyError("cannot find Group as no keyword/level provided")
 
-        group.id = int(row['id'])
-        group.name = row['name']
-        group.keyword = row['keyword']
-        group.level = int(row['level'])
-        group.timeAdd = int(row['time_add'])
-        group.timeEdit = int(row['time_edit'])
-
         return group
 
     def truncateTable(self, table):
@@ -600,17 +728,13 @@ class DatabaseStorage(Storage):
         :param bindata: Data to bind to the given query.
         :raise Exception: If the query cannot be evaluated.
         """
-        self._lock.acquire()
-        try:
-            cursor = self.db.cursor()
+        with self._connection(query) as connection:
+            cursor = self._cursor(connection)
             if bindata is None:
                 cursor.execute(query)
             else:
                 cursor.execute(query, bindata)
-            dbcursor = DBCursor(cursor, self.db)
-        finally:
-            self._lock.release()
-        return dbcursor
+            return DBCursor(cursor, connection, buffered=self._pool is not None)
 
     def query(self, query, bindata=None):
         """
@@ -632,6 +756,39 @@ class DatabaseStorage(Storage):
             self.console.error('Query failed [%s] %r: %s', query, bindata, e)
             raise e
 
+    def upsert(self, table, fields, rows, keys, increment=(), keep=()):
+        """
+        Insert many rows at once, updating the rows which already exist.
+        :param table: The database table.
+        :param fields: The names of the fields, in the order of the values of each row.
+        :param rows: A list of rows, each row being a list of values.
+        :param keys: The fields of the PRIMARY/UNIQUE key telling whether a row already exists.
+        :param increment: The fields whose value is added to the value of the existing row.
+        :param keep: The fields whose value is not updated on existing rows.
+        """
+        placeholders = '(%s)' % ', '.join(['?' if self._paramstyle == 'qmark' else '%s'] * len(fields))
+        for i in range(0, len(rows), self._upsertBatchSize):
+            batch = rows[i:i + self._upsertBatchSize]
+            bindata = [v for row in batch for v in row]
+            self.query(self._upsertQuery(table, fields, [placeholders] * len(batch), keys, increment, keep),
+                       bindata).close()
+
+    def _upsertQuery(self, table, fields, values, keys, increment, keep):
+        """
+        Return a multi-row upsert query (INSERT ... ON CONFLICT: SQLite and PostgreSQL syntax).
+        :param values: The placeholders of the rows values, one '(...)' group per row.
+        """
+        sets = []
+        for f in fields:
+            if f in keys or f in keep:
+                continue
+            if f in increment:
+                sets.append('%s = %s.%s + excluded.%s' % (f, table, f, f))
+            else:
+                sets.append('%s = excluded.%s' % (f, f))
+        return 'INSERT INTO %s (%s) VALUES %s ON CONFLICT (%s) DO UPDATE SET %s' % (
+            table, ', '.join(fields), ', '.join(values), ', '.join(keys), ', '.join(sets))
+
     @contextmanager
     def query2(self, query, bindata=None):
         """
@@ -696,12 +853,21 @@ class DatabaseStorage(Storage):
     #                                                                                                                  #
     ####################################################################################################################
 
-    def status(self):
+    def status(self, metrics=False):
         """
         Check whether the connection with the storage layer is active or not.
-        :return True if the connection is active, False otherwise.
-        """
-        raise NotImplementedError
+        :param metrics: Whether to return the connection pool metrics instead of a boolean.
+        :return True if the connection is active, False otherwise. When metrics are requested, a dict containing
+                the connection pool metrics, the 'connected' key and the write-behind metrics ('write_behind' key).
+        """
+        connected = self._pool is not None and self._pool.lastError is None and self._isAlive(self.db)
+        if not metrics:
+            return connected
+        data = self._pool.stats() if self._pool is not None else {}
+        data['connected'] = connected
+        if self.writeBehind is not None:
+            data['write_behind'] = self.writeBehind.stats()
+        return data
 
     def getField(self, name):
         """
@@ -715,7 +881,10 @@ class DatabaseStorage(Storage):
         Return a variable name given the correspondent database field name.
         :param name: The database field name.
         """
-        return self._reVar.sub(lambda m: m.group(1).upper(), name)
+        var = self._vars.get(name)
+        if var is None:
+            var = self._vars[name] = self._reVar.sub(lambda m: m.group(1).upper(), name)
+        return var
 
     @staticmethod
     def getQueriesFromFile(sqlfile):
@@ -726,37 +895,3 @@ class DatabaseStorage(Storage):
         """
         lines = [x.strip() for x in sqlfile if x and not x.startswith('#') and not x.startswith('--')]
         return [x.strip() for x in ' '.join(lines).split(';') if x]
-
-    @staticmethod
-    def _createPenaltyFromRow(row):
-        """
-        Create a Penalty object given a result set row.
-        :param row: The result set row
-        """
-        constructors = {
-            'Warning': ClientWarning,
-            'TempBan': ClientTempBan,
-            'Kick': ClientKick,
-            'Ban': ClientBan,
-            'Notice': ClientNotice
-        }
-
-        try:
-            constructor = constructors[row['type']]
-            penalty = constructor()
-        except KeyError:
-            penalty = Penalty()
-
-        penalty.id = int(row['id'])
-        penalty.type = row['type']
-        penalty.keyword = row['keyword']
-        penalty.reason = row['reason']
-        penalty.data = row['data']
-        penalty.inactive = int(row['inactive'])
-        penalty.timeAdd = int(row['time_add'])
-        penalty.timeEdit = int(row['time_edit'])
-        penalty.timeExpire = int(row['time_expire'])
-        penalty.clientId = int(row['client_id'])
-        penalty.adminId = int(row['admin_id'])
-        penalty.duration = int(row['duration'])
-        return penalty
@@ -19,28 +19,109 @@
 # CHANGELOG
 #
 # 26/12/2014 - Fenix - moved into separate module
+# 18/10/2026 - agent - rows are fetched in batches (fetchmany) and can be iterated as lightweight Row tuples
+#                      (for row in cursor: ...): EOF/moveNext/getRow are kept for backward compatibility
+# 18/10/2026 - agent - added 'buffered' parameter: the whole result set is read before the connection goes back to
+#                      the connection pool
+
+import re
+from collections import deque
+from operator import itemgetter
+
+
+class Row(tuple):
+    """
+    A result set row: a tuple whose values can also be read by column name (row['name'] or row.name).
+    A subclass is created for each set of columns (see rowType()): columns named like a tuple/Row method
+    (i.e: 'count', 'index', 'keys') can only be read with row['name'].
+    """
+    __slots__ = ()
+    _columns = ()
+    _index = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, slice)):
+            return tuple.__getitem__(self, key)
+        return tuple.__getitem__(self, self._index[key])
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def get(self, key, default=None):
+        """
+        Return the value of the given column or default if there is no such column.
+        """
+        try:
+            return tuple.__getitem__(self, self._index[key])
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(self._columns)
+
+    def items(self):
+        return list(zip(self._columns, self))
+
+    def asDict(self):
+        """
+        Return the row as a dict (same as Cursor.getRow()).
+        """
+        return dict(zip(self._columns, self))
+
+
+_rowTypes = {}
+_reIdentifier = re.compile(r'^[a-zA-Z][a-zA-Z0-9_]*$')
+
+
+def rowType(columns):
+    """
+    Return the Row subclass for the given column names.
+    :param columns: A tuple of column names
+    """
+    cls = _rowTypes.get(columns)
+    if cls is None:
+        index = dict((name, i) for i, name in enumerate(columns))
+        attributes = {'__slots__': (), '_columns': columns, '_index': index}
+        for name, i in index.items():
+            if _reIdentifier.match(name) and not hasattr(Row, name):
+                attributes[name] = property(itemgetter(i))
+        cls = _rowTypes[columns] = type('Row', (Row,), attributes)
+    return cls
 
 
 class Cursor(object):
     _cursor = None
     _conn = None
+    _rows = None
 
+    batchSize = 100
+    buffered = False
+    columns = ()
     fields = None
     lastrowid = 0
     rowcount = 0
 
     EOF = False
 
-    def __init__(self, cursor, conn):
+    def __init__(self, cursor, conn, buffered=False):
         """
         Object constructor.
         :param cursor: The opened result cursor.
         :param conn: The database connection instance.
+        :param buffered: Whether to read the whole result set now (the connection is about to be used by another
+                         thread): otherwise records are fetched in batches as they are read.
         """
         self._cursor = cursor
         self._conn = conn
+        self._rows = deque()
         self.rowcount = self._cursor.rowcount
         self.lastrowid = self._cursor.lastrowid
+        if self._cursor.description:
+            self.columns = tuple(x[0] for x in self._cursor.description)
+            if buffered:
+                self._rows.extend(self._cursor.fetchall())
+                self._cursor.close()
+                self.buffered = True
 
         try:
             self.EOF = self.moveNext()
@@ -48,18 +129,59 @@ class Cursor(object):
             # not a select statement
             self.EOF = not self.fields or self.rowcount <= 0 or not self._cursor
 
+    def _fetch(self):
+        """
+        Return the next record of the result set (None when there are no more records).
+        Records are fetched from the database driver in batches of 'batchSize' records.
+        """
+        if not self._rows:
+            if not self._cursor or self.buffered:
+                return None
+            self._rows.extend(self._cursor.fetchmany(self.batchSize))
+            if not self._rows:
+                return None
+        return self._rows.popleft()
+
     def moveNext(self):
         """
         Move the cursor to the next available record.
         :return True if there is one more record, False otherwise.
         """
         if not self.EOF:
-            self.fields = self._cursor.fetchone()
+            self.fields = self._fetch()
             self.EOF = not self.fields or not self._cursor
             if self.EOF:
                 self.close()
         return self.EOF
 
+    def rows(self):
+        """
+        Iterate over the remaining records of the result set (starting from the current one) as Row tuples.
+        The cursor is closed once all the records have been read.
+        """
+        if self.EOF:
+            return
+        factory = rowType(self.columns)
+        try:
+            yield factory(self.fields)
+            while self._cursor:
+                if self._rows:
+                    batch = list(self._rows)
+                    self._rows.clear()
+                elif self.buffered:
+                    break
+                else:
+                    batch = self._cursor.fetchmany(self.batchSize)
+                    if not batch:
+                        break
+                for fields in batch:
+                    self.fields = fields
+                    yield factory(fields)
+        finally:
+            self.close()
+
+    __iter__ = rows
+
     def getOneRow(self, default=None):
         """
         Return a row from the current result set and close it.
@@ -78,11 +200,7 @@ class Cursor(object):
         """
         if self.EOF:
             return dict()
-        d = dict()
-        desc = self._cursor.description
-        for i in xrange(0, len(self.fields)):
-            d[desc[i][0]] = self.fields[i]
-        return d
+        return dict(zip(self.columns, self.fields))
 
     def getValue(self, key, default=None):
         """
@@ -101,4 +219,5 @@ class Cursor(object):
         if self._cursor:
             self._cursor.close()
         self._cursor = None
+        self._rows.clear()
         self.EOF = True
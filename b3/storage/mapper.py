@@ -0,0 +1,243 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+import re
+from operator import itemgetter
+
+from b311.clients import Alias
+from b311.clients import Client
+from b311.clients import ClientBan
+from b311.clients import ClientKick
+from b311.clients import ClientNotice
+from b311.clients import ClientTempBan
+from b311.clients import ClientWarning
+from b311.clients import Group
+from b311.clients import IpAlias
+from b311.clients import Penalty
+
+_reVar = re.compile(r'_([a-z])')
+
+
+def toInt(value):
+    return int(value) if value else 0
+
+
+def loadClientName(client, name):
+    client._name = client.console.stripColors(name) if client.console else name.strip()
+    client._exactName = name + '^7'
+
+
+def loadClientGroupBits(client, bits):
+    client._groupBits = toInt(bits)
+    client.refreshLevel()
+
+
+def loadClientMaskLevel(client, level):
+    client._maskLevel = toInt(level)
+    client._maskGroup = None
+
+
+class RowMapper(object):
+    """
+    Create objects from result set rows, or fill existing ones.
+
+    Column values are written into the attributes backing the object properties, following a plan compiled once per
+    set of columns: property setters are not called, so loading an object from the storage has no side effects
+    (i.e: setting Client.name creates an alias). Columns missing from the mapping are set with setattr, under their
+    camelCase name (see DatabaseStorage.getVar()).
+    """
+
+    def __init__(self, cls, fields, classColumn=None, classes=None):
+        """
+        Object constructor.
+        :param cls: The class of the objects to create
+        :param fields: A dict mapping column names to an attribute name, an (attribute name, converter) tuple or a
+                       function called with the object and the column value
+        :param classColumn: The column whose value selects the class of the objects to create
+        :param classes: A dict mapping the values of classColumn to classes (cls is used for other values)
+        """
+        self.cls = cls
+        self.fields = fields
+        self.classColumn = classColumn
+        self.classes = classes or {}
+        self._plans = {}
+
+    def compile(self, columns):
+        """
+        Return the plan used to load rows having the given columns.
+        :param columns: A tuple of column names
+        :return: A tuple (plain attributes, getter of their values, converted attributes, loaders, class column index)
+        """
+        try:
+            return self._plans[columns]
+        except KeyError:
+            pass
+
+        plain = []
+        converted = []
+        loaders = []
+        for index, column in enumerate(columns):
+            field = self.fields.get(column)
+            if field is None:
+                attribute = _reVar.sub(lambda m: m.group(1).upper(), column)
+                loaders.append((index, lambda obj, value, attribute=attribute: setattr(obj, attribute, value)))
+            elif callable(field):
+                loaders.append((index, field))
+            elif isinstance(field, tuple):
+                converted.append((index, field[0], field[1]))
+            else:
+                plain.append((index, field))
+
+        indexes = [x[0] for x in plain]
+        if len(indexes) == 1:
+            getter = lambda values, index=indexes[0]: (values[index],)
+        elif indexes:
+            getter = itemgetter(*indexes)
+        else:
+            getter = None
+
+        plan = (tuple(x[1] for x in plain), getter, tuple(converted), tuple(loaders),
+                columns.index(self.classColumn) if self.classColumn in columns else None)
+        self._plans[columns] = plan
+        return plan
+
+    def load(self, obj, columns, values, plan=None):
+        """
+        Fill an object with the values of a row.
+        :param obj: The object to fill
+        :param columns: The column names of the row
+        :param values: The row values (a tuple)
+        :param plan: The plan compiled for the columns
+        :return: The object
+        """
+        plain, getter, converted, loaders, _ = plan or self.compile(columns)
+        if type(values) is not tuple:
+            values = tuple(values)
+        attributes = obj.__dict__
+        if getter is not None:
+            attributes.update(zip(plain, getter(values)))
+        for index, attribute, convert in converted:
+            attributes[attribute] = convert(values[index])
+        for index, loader in loaders:
+            loader(obj, values[index])
+        return obj
+
+    def create(self, columns, values):
+        """
+        Create an object from a row.
+        """
+        plan = self.compile(columns)
+        cls = self.cls if plan[4] is None else self.classes.get(values[plan[4]], self.cls)
+        return self.load(cls(), columns, values, plan)
+
+    def all(self, cursor):
+        """
+        Create an object from every row of the given cursor.
+        :return: A list of objects
+        """
+        if cursor.EOF:
+            return []
+        columns = cursor.columns
+        plan = self.compile(columns)
+        classIndex = plan[4]
+        objects = []
+        for row in cursor:
+            row = tuple(row)
+            cls = self.cls if classIndex is None else self.classes.get(row[classIndex], self.cls)
+            objects.append(self.load(cls(), columns, row, plan))
+        return objects
+
+    def first(self, cursor, obj=None):
+        """
+        Load the current row of the given cursor, and close it.
+        :param obj: The object to fill (a new object is created if not given)
+        :return: The object or None if the cursor has no row
+        """
+        if cursor.EOF:
+            return None
+        columns, values = cursor.columns, cursor.fields
+        cursor.close()
+        if obj is None:
+            return self.create(columns, values)
+        return self.load(obj, columns, values)
+
+
+clientMapper = RowMapper(Client, {
+    'id': ('_id', toInt),
+    'ip': '_ip',
+    'connections': ('_connections', toInt),
+    'guid': '_guid',
+    'pbid': '_pbid',
+    'name': loadClientName,
+    'auto_login': '_autoLogin',
+    'mask_level': loadClientMaskLevel,
+    'group_bits': loadClientGroupBits,
+    'greeting': '_greeting',
+    'time_add': ('_timeAdd', toInt),
+    'time_edit': ('_timeEdit', toInt),
+    'password': '_password',
+    'login': '_login',
+})
+
+penaltyMapper = RowMapper(Penalty, {
+    'id': ('_id', toInt),
+    'type': 'type',
+    'client_id': ('_clientId', toInt),
+    'admin_id': ('_adminId', toInt),
+    'duration': ('_duration', toInt),
+    'inactive': ('inactive', toInt),
+    'keyword': 'keyword',
+    'reason': 'reason',
+    'data': 'data',
+    'time_add': ('_timeAdd', toInt),
+    'time_edit': ('_timeEdit', toInt),
+    'time_expire': ('_timeExpire', toInt),
+}, classColumn='type', classes={
+    'Warning': ClientWarning,
+    'TempBan': ClientTempBan,
+    'Kick': ClientKick,
+    'Ban': ClientBan,
+    'Notice': ClientNotice,
+})
+
+aliasMapper = RowMapper(Alias, {
+    'id': ('_id', toInt),
+    'alias': '_alias',
+    'client_id': ('_clientId', toInt),
+    'num_used': ('_numUsed', toInt),
+    'time_add': ('_timeAdd', toInt),
+    'time_edit': ('_timeEdit', toInt),
+})
+
+ipAliasMapper = RowMapper(IpAlias, {
+    'id': ('_id', toInt),
+    'ip': '_ip',
+    'client_id': ('_clientId', toInt),
+    'num_used': ('_numUsed', toInt),
+    'time_add': ('_timeAdd', toInt),
+    'time_edit': ('_timeEdit', toInt),
+})
+
+groupMapper = RowMapper(Group, {
+    'id': ('_id', toInt),
+    'name': '_name',
+    'keyword': '_keyword',
+    'level': ('_level', toInt),
+    'time_add': ('_timeAdd', toInt),
+    'time_edit': ('_timeEdit', toInt),
+})
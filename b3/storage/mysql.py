@@ -27,39 +27,19 @@ class PymysqlStorage(DatabaseStorage):
     #                                                                                                                  #
     ####################################################################################################################
 
-    def getConnection(self):
+    def _isAlive(self, connection):
         """
-        Return the database connection. If the connection has not been established yet, will establish a new one.
-        :return The connection instance, or None if no connection can be established.
+        Tell whether the given connection is still open.
         """
-        if self.db and self.db.open:
-            return self.db
-        return self.connect()
+        return connection is not None and connection.open
 
-    def shutdown(self):
+    def _closeConnection(self, connection):
         """
-        Close the current active database connection.
+        Close the given connection.
         """
-        if self.db and self.db.open:
+        if connection.open:
             # checking 'open' will prevent exception raising
-            self.console.bot('Closing connection with MySQL database...')
-            self.db.close()
-        self.db = None
-
-    ####################################################################################################################
-    #                                                                                                                  #
-    #   UTILITY METHODS                                                                                                #
-    #                                                                                                                  #
-    ####################################################################################################################
-
-    def status(self):
-        """
-        Check whether the connection with the storage layer is active or not.
-        :return True if the connection is active, False otherwise.
-        """
-        if self.db and self.db.open:
-            return True
-        return False
+            connection.close()
 
 
 class MysqlConnectorStorage(DatabaseStorage):
@@ -83,39 +63,24 @@ class MysqlConnectorStorage(DatabaseStorage):
     #                                                                                                                  #
     ####################################################################################################################
 
-    def getConnection(self):
+    def _isAlive(self, connection):
         """
-        Return the database connection. If the connection has not been established yet, will establish a new one.
-        :return The connection instance, or None if no connection can be established.
+        Tell whether the given connection is still open.
         """
-        if self.db and self.db._socket is not None:
-            return self.db
-        return self.connect()
+        return connection is not None and connection._socket is not None
 
-    def shutdown(self):
+    def _closeConnection(self, connection):
         """
-        Close the current active database connection.
+        Close the given connection.
         """
-        if self.db and self.db._socket is not None:
-            # the shutdown method is already exception safe
-            self.console.bot('Closing connection with MySQL database...')
-            self.db.shutdown()
-        self.db = None
-
-    ####################################################################################################################
-    #                                                                                                                  #
-    #   UTILITY METHODS                                                                                                #
-    #                                                                                                                  #
-    ####################################################################################################################
+        # the shutdown method is already exception safe
+        connection.shutdown()
 
-    def status(self):
+    def _cursor(self, connection):
         """
-        Check whether the connection with the storage layer is active or not.
-        :return True if the connection is active, False otherwise.
+        Return a new buffered cursor on the given connection (mysql.connector cursors are not buffered by default).
         """
-        if self.db and self.db._socket is not None:
-            return True
-        return False
+        return connection.cursor(buffered=True)
 
 
 class MySQLdbStorage(DatabaseStorage):
@@ -139,39 +104,19 @@ class MySQLdbStorage(DatabaseStorage):
     #                                                                                                                  #
     ####################################################################################################################
 
-    def getConnection(self):
+    def _isAlive(self, connection):
         """
-        Return the database connection. If the connection has not been established yet, will establish a new one.
-        :return The connection instance, or None if no connection can be established.
+        Tell whether the given connection is still open.
         """
-        if self.db and self.db.open:
-            return self.db
-        return self.connect()
+        return connection is not None and connection.open
 
-    def shutdown(self):
+    def _closeConnection(self, connection):
         """
-        Close the current active database connection.
+        Close the given connection.
         """
-        if self.db and self.db.open:
+        if connection.open:
             # checking 'open' will prevent exception raising
-            self.console.bot('Closing connection with MySQL database...')
-            self.db.close()
-        self.db = None
-
-    ####################################################################################################################
-    #                                                                                                                  #
-    #   UTILITY METHODS                                                                                                #
-    #                                                                                                                  #
-    ####################################################################################################################
-
-    def status(self):
-        """
-        Check whether the connection with the storage layer is active or not.
-        :return True if the connection is active, False otherwise.
-        """
-        if self.db and self.db.open:
-            return True
-        return False
+            connection.close()
 
 
 class MysqlStorage(DatabaseStorage):
@@ -261,13 +206,8 @@ class MysqlStorage(DatabaseStorage):
                 self.dsnDict)
 
             try:
-                # create the connection instance using the specified connector
-                self.db = self.__driver.connect(host=self.dsnDict['host'],
-                                                port=self.dsnDict['port'],
-                                                user=self.dsnDict['user'],
-                                                passwd=self.dsnDict['password'],
-                                                db=self.dsnDict['path'][1:],
-                                                charset="utf8")
+                # create the connection pool and its first connection using the specified connector
+                self._openPool()
 
                 self.console.bot('Successfully established a connection with MySQL database')
                 self._lastConnectAttempt = 0
@@ -296,7 +236,7 @@ class MysqlStorage(DatabaseStorage):
             except Exception as e:
                 self.console.error('Database connection failed: working in remote mode: %s - %s', e,
                                    extract_tb(sys.exc_info()[2]))
-                self.db = None
+                self._closePool()
                 self._lastConnectAttempt = time()
                 if self._consoleNotice:
                     self.console.screen.write('Connecting to DB : FAILED!\n')
@@ -304,12 +244,49 @@ class MysqlStorage(DatabaseStorage):
 
         return self.db
 
+    def _createConnection(self):
+        """
+        Create a new connection with the MySQL database (used by the connection pool).
+        :raise Exception: If the connection cannot be established.
+        """
+        return self.__driver.connect(host=self.dsnDict['host'],
+                                     port=self.dsnDict['port'],
+                                     user=self.dsnDict['user'],
+                                     passwd=self.dsnDict['password'],
+                                     db=self.dsnDict['path'][1:],
+                                     charset="utf8")
+
+    def shutdown(self):
+        """
+        Close the current active database connections.
+        """
+        if self._pool is not None:
+            self.console.bot('Closing connection with MySQL database...')
+        self._flushWriteBehind()
+        self._closePool()
+
     ####################################################################################################################
     #                                                                                                                  #
     #   STORAGE INTERFACE                                                                                              #
     #                                                                                                                  #
     ####################################################################################################################
 
+    def _upsertQuery(self, table, fields, values, keys, increment, keep):
+        """
+        Return a multi-row upsert query (MySQL syntax: INSERT ... ON DUPLICATE KEY UPDATE).
+        :param values: The placeholders of the rows values, one '(...)' group per row.
+        """
+        sets = []
+        for f in fields:
+            if f in keys or f in keep:
+                continue
+            if f in increment:
+                sets.append('%s = %s + VALUES(%s)' % (f, f, f))
+            else:
+                sets.append('%s = VALUES(%s)' % (f, f))
+        return 'INSERT INTO %s (%s) VALUES %s ON DUPLICATE KEY UPDATE %s' % (
+            table, ', '.join(fields), ', '.join(values), ', '.join(sets))
+
     def getTables(self):
         """
         List the tables of the current database.
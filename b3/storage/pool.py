@@ -0,0 +1,238 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+import threading
+from contextlib import contextmanager
+from time import time
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class ConnectionPool(object):
+    """
+    Bounded pool of database connections.
+    A thread checks out a connection for the time needed to run a query and gives it back afterwards: a thread
+    which already holds a connection gets that same connection back (nested checkouts). Connections are
+    created on demand up to the pool size; past that, threads wait for a connection to be given back.
+    """
+
+    def __init__(self, connect, isAlive, close, size=5, timeout=30, ping=None, pingInterval=60):
+        """
+        Object constructor.
+        :param connect: Callable creating a new connection (may raise)
+        :param isAlive: Callable telling (cheaply) whether a connection is still usable
+        :param close: Callable closing a connection
+        :param size: The maximum number of connections
+        :param timeout: Seconds to wait for a connection before raising PoolTimeoutError
+        :param ping: Callable raising if a connection is broken, used on connections left idle for too long
+        :param pingInterval: Seconds a connection can stay idle before being pinged on checkout
+        """
+        self._connect = connect
+        self._isAlive = isAlive
+        self._close = close
+        self._ping = ping
+        self._pingInterval = pingInterval
+        self._size = max(1, size)
+        self._timeout = timeout
+        self._cond = threading.Condition()
+        self._idle = []  # (connection, time it was given back)
+        self._open = 0
+        self._closed = False
+        self._local = threading.local()
+        self.lastConnection = None
+        self.lastError = None
+        self.checkouts = 0
+        self.waits = 0
+        self.waitTime = 0.0
+        self.maxWaitTime = 0.0
+        self.created = 0
+        self.discarded = 0
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def active(self):
+        """
+        The number of connections currently checked out.
+        """
+        return self._open - len(self._idle)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def checkout(self):
+        """
+        Return a connection for the current thread.
+        :raise PoolTimeoutError: If no connection has been given back before the timeout.
+        """
+        held = getattr(self._local, 'held', None)
+        if held is not None:
+            self._local.depth += 1
+            return held
+
+        conn = None
+        create = False
+        with self._cond:
+            if self._closed:
+                raise PoolTimeoutError('connection pool is closed')
+            self.checkouts += 1
+            if not self._idle and self._open >= self._size:
+                started = time()
+                self.waits += 1
+                while not self._idle and self._open >= self._size and not self._closed:
+                    remaining = self._timeout - (time() - started)
+                    if remaining <= 0:
+                        raise PoolTimeoutError('no database connection available after %ss' % self._timeout)
+                    self._cond.wait(remaining)
+                waited = time() - started
+                self.waitTime += waited
+                self.maxWaitTime = max(self.maxWaitTime, waited)
+                if self._closed:
+                    raise PoolTimeoutError('connection pool is closed')
+            if self._idle:
+                conn, since = self._idle.pop()
+            else:
+                # reserve the slot now, the connection is created outside of the lock
+                self._open += 1
+                create = True
+
+        if create:
+            conn = self._create()
+        elif not self._check(conn, since):
+            # replace the broken connection keeping its slot
+            self._closeQuietly(conn)
+            with self._cond:
+                self.discarded += 1
+            conn = self._create()
+
+        self._local.held = conn
+        self._local.depth = 1
+        return conn
+
+    def checkin(self, conn, discard=False):
+        """
+        Give back a connection obtained through checkout().
+        :param conn: The connection
+        :param discard: Whether the connection is broken and should be closed
+        """
+        if getattr(self._local, 'held', None) is not conn:
+            return
+        self._local.depth -= 1
+        if self._local.depth > 0 and not discard:
+            return
+        self._local.held = None
+        if discard or self._closed or not self._isAlive(conn):
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager checking out a connection and giving it back when leaving the block. The connection is
+        discarded if an exception is raised and the connection is not usable anymore.
+        """
+        conn = self.checkout()
+        try:
+            yield conn
+        except Exception:
+            self.checkin(conn, discard=not self._isAlive(conn))
+            raise
+        else:
+            self.checkin(conn)
+
+    def close(self):
+        """
+        Close all the idle connections: connections currently checked out are closed when given back.
+        """
+        with self._cond:
+            self._closed = True
+            idle = [x[0] for x in self._idle]
+            self._open -= len(self._idle)
+            self._idle = []
+            self._cond.notify_all()
+        for conn in idle:
+            self._closeQuietly(conn)
+        self.lastConnection = None
+
+    def stats(self):
+        """
+        Return the pool metrics.
+        """
+        with self._cond:
+            return {
+                'size': self._size,
+                'open': self._open,
+                'active': self._open - len(self._idle),
+                'idle': len(self._idle),
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'wait_time': round(self.waitTime, 3),
+                'max_wait_time': round(self.maxWaitTime, 3),
+                'created': self.created,
+                'discarded': self.discarded,
+            }
+
+    def _create(self):
+        try:
+            conn = self._connect()
+        except Exception as e:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            self.lastError = e
+            raise
+        self.created += 1
+        self.lastConnection = conn
+        self.lastError = None
+        return conn
+
+    def _check(self, conn, since):
+        """
+        Tell whether an idle connection can be reused, pinging it if it has been idle for long.
+        """
+        if not self._isAlive(conn):
+            return False
+        if self._ping is not None and time() - since > self._pingInterval:
+            try:
+                self._ping(conn)
+            except Exception:
+                return False
+        return True
+
+    def _discard(self, conn):
+        self._closeQuietly(conn)
+        with self._cond:
+            self._open -= 1
+            self.discarded += 1
+            self._cond.notify()
+        if self.lastConnection is conn:
+            self.lastConnection = None
+
+    def _closeQuietly(self, conn):
+        try:
+            self._close(conn)
+        except Exception:
+            pass
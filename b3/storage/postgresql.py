@@ -22,6 +22,10 @@
 # 29/12/2014 - Fenix - overridden _query() method in order to correctly compute lastrowid value in INSERT queries
 #                    - patch QueryBuilder.escape in order to have a valid escape for postgresql
 # 05/01/2015 - Fenix - added truncateTable() method: empty a database table (or multiple tables) and reset identity
+# 18/10/2026 - agent - use a pool of connections
+# 18/10/2026 - agent - parameterised queries are run as server-side prepared statements (PREPARE/EXECUTE), prepared
+#                      once per connection
+# 18/10/2026 - agent - result sets are read at once: the connection goes back to the pool before the cursor is read
 
 import re
 import sys
@@ -36,6 +40,8 @@ from b311.storage.cursor import Cursor as DBCursor
 class PostgresqlStorage(DatabaseStorage):
     _reconnectDelay = 60
     _reInsert = re.compile(r'''^INSERT''', re.IGNORECASE)
+    _rePlaceholder = re.compile(r'''%s''')
+    _preparedLimit = 256
 
     protocol = 'postgresql'
 
@@ -71,6 +77,9 @@ class PostgresqlStorage(DatabaseStorage):
             raise AttributeError(
                 "missing PostgreSQL database name in %(protocol)s://%(user)s:******@%(host)s:%(port)s%(path)s" % self.dsnDict)
 
+        # connection id -> {query: prepared statement name}
+        self._prepared = {}
+
         # patch the QueryBuilder class
         patch_query_builder(self.console)
 
@@ -101,16 +110,8 @@ class PostgresqlStorage(DatabaseStorage):
                 self.dsnDict)
 
             try:
-
-                import psycopg2
-                self.db = psycopg2.connect(host=self.dsnDict['host'],
-                                           port=self.dsnDict['port'],
-                                           user=self.dsnDict['user'],
-                                           password=self.dsnDict['password'],
-                                           database=self.dsnDict['path'][1:])
-
-                self.db.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
-                self.db.set_client_encoding("UTF8")
+                # create the connection pool and its first connection
+                self._openPool()
 
                 self.console.bot('Successfully established a connection with PostgreSQL database')
                 self._lastConnectAttempt = 0
@@ -140,7 +141,7 @@ class PostgresqlStorage(DatabaseStorage):
             except Exception as e:
                 self.console.error('Database connection failed: working in remote mode: %s - %s', e,
                                    extract_tb(sys.exc_info()[2]))
-                self.db = None
+                self._closePool()
                 self._lastConnectAttempt = time()
                 if self._consoleNotice:
                     self.console.screen.write('Connecting to DB : FAILED!\n')
@@ -148,23 +149,44 @@ class PostgresqlStorage(DatabaseStorage):
 
         return self.db
 
-    def getConnection(self):
+    def _createConnection(self):
+        """
+        Create a new connection with the PostgreSQL database (used by the connection pool).
+        :raise Exception: If the connection cannot be established.
+        """
+        import psycopg2
+        connection = psycopg2.connect(host=self.dsnDict['host'],
+                                      port=self.dsnDict['port'],
+                                      user=self.dsnDict['user'],
+                                      password=self.dsnDict['password'],
+                                      database=self.dsnDict['path'][1:])
+
+        connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        connection.set_client_encoding("UTF8")
+        return connection
+
+    def _isAlive(self, connection):
         """
-        Return the database connection. If the connection has not been established yet, will establish a new one.
-        :return The connection instance, or None if no connection can be established.
+        Tell whether the given connection is still open.
         """
-        if self.db and not self.db.closed:
-            return self.db
-        return self.connect()
+        return connection is not None and not connection.closed
+
+    def _closeConnection(self, connection):
+        """
+        Close the given connection.
+        """
+        self._prepared.pop(id(connection), None)
+        if not connection.closed:
+            connection.close()
 
     def shutdown(self):
         """
-        Close the current active database connection.
+        Close the current active database connections.
         """
-        if self.db and not self.db.closed:
+        if self._pool is not None:
             self.console.bot('Closing connection with PostgreSQL database...')
-            self.db.close()
-        self.db = None
+        self._flushWriteBehind()
+        self._closePool()
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -217,21 +239,28 @@ class PostgresqlStorage(DatabaseStorage):
         :param bindata: Data to bind to the given query.
         :raise Exception: If the query cannot be evaluated.
         """
-        self._lock.acquire()
-
-        try:
-            # postgresql doesn't support backticks: the query will be logged with backticks since
-            # logging is handled in 'query()' but we will strip them out before executing the query.
-            newquery = query.replace('`', '').strip()
+        # postgresql doesn't support backticks: the query will be logged with backticks since
+        # logging is handled in 'query()' but we will strip them out before executing the query.
+        newquery = query.replace('`', '').strip()
 
-            cursor = self.db.cursor()
+        # LASTVAL() must run on the same connection as the INSERT statement
+        with self._connection(newquery) as connection:
+            cursor = connection.cursor()
             if bindata is None:
                 cursor.execute(newquery)
             else:
-                cursor.execute(newquery, bindata)
+                name = self._prepare(connection, newquery)
+                if name is None:
+                    cursor.execute(newquery, bindata)
+                else:
+                    bindata = list(bindata)
+                    if bindata:
+                        cursor.execute('EXECUTE %s (%s)' % (name, ', '.join(['%s'] * len(bindata))), bindata)
+                    else:
+                        cursor.execute('EXECUTE %s' % name)
 
             # create our cursor instance
-            dbcursor = DBCursor(cursor, self.db)
+            dbcursor = DBCursor(cursor, connection, buffered=self._pool is not None)
 
             if self._reInsert.match(newquery):
                 # if this is an insert query try to get the last insert id:
@@ -239,7 +268,7 @@ class PostgresqlStorage(DatabaseStorage):
                 # adding 'RETURNING id' to the INSERT statement but then we would have added
                 # a constraint on the name of the PRIMARY KEY for each table
                 try:
-                    cursor = self.db.cursor()
+                    cursor = connection.cursor()
                     cursor.execute("SELECT LASTVAL();")
                     dbcursor.lastrowid = cursor.fetchone()[0]
                     dbcursor._cursor.lastrowid = dbcursor.lastrowid
@@ -248,25 +277,40 @@ class PostgresqlStorage(DatabaseStorage):
                     # can't recover in any case
                     pass
 
-        finally:
-            self._lock.release()
-
         return dbcursor
 
-    ####################################################################################################################
-    #                                                                                                                  #
-    #   UTILITY METHODS                                                                                                #
-    #                                                                                                                  #
-    ####################################################################################################################
-
-    def status(self):
+    def _prepare(self, connection, query):
         """
-        Check whether the connection with the storage layer is active or not.
-        :return True if the connection is active, False otherwise.
+        Prepare a parameterised query on the given connection (once per connection).
+        :param connection: The connection the query will be run on.
+        :param query: The query using '%s' placeholders.
+        :return: The name of the prepared statement or None if the query must be run as is.
         """
-        if self.db and not self.db.closed:
-            return True
-        return False
+        if '%%' in query:
+            # literal percent signs: the query can't be converted to $n placeholders reliably
+            return None
+        statements = self._prepared.setdefault(id(connection), {})
+        name = statements.get(query)
+        if name is None and query not in statements and len(statements) < self._preparedLimit:
+            # statement names only need to be unique within their connection
+            name = 'b3_%s' % len(statements)
+            counter = [0]
+
+            def placeholder(match):
+                counter[0] += 1
+                return '$%s' % counter[0]
+
+            cursor = connection.cursor()
+            try:
+                cursor.execute('PREPARE %s AS %s' % (name, self._rePlaceholder.sub(placeholder, query)))
+            except Exception as e:
+                # the server could not infer the parameter types: don't try again on this connection
+                self.console.verbose2('Could not prepare query [%s]: %s', query, e)
+                name = None
+            finally:
+                cursor.close()
+            statements[query] = name
+        return name
 
 
 ########################################################################################################################
@@ -22,14 +22,25 @@
 # 05/01/2015 - Fenix - added truncateTable() method: empty a database table (or multiple tables) and reset identity
 # 18/05/2015 - Fenix - make use of b311.getWritableFilePath when computing sqlite database file path
 # 23/05/2015 - Fenix - print in console SQLite connection initialization status
+# 18/10/2026 - agent - use a pool of connections on database files opened in WAL mode: SELECT queries run
+#                      concurrently while other statements are still run one at a time
+#                    - fixed status() reporting the connection as down when it is up
+# 18/10/2026 - agent - storage queries use '?' placeholders: every connection keeps the compiled statements
 
 import os
+import re
+from contextlib import contextmanager
 
 import b311
 from b311.storage.common import DatabaseStorage
 
 
 class SqliteStorage(DatabaseStorage):
+    _reRead = re.compile(r'''^\s*(SELECT|PRAGMA)\b''', re.IGNORECASE)
+    _path = None
+    _paramstyle = 'qmark'
+    _cachedStatements = 256
+
     protocol = 'sqlite'
 
     def __init__(self, dsn, dsnDict, console):
@@ -54,14 +65,14 @@ class SqliteStorage(DatabaseStorage):
         :return The connection instance if established successfully, otherwise None.
         """
         try:
-            import sqlite3
             path = b311.getWritableFilePath(self.dsn[9:])
             self.console.bot("Using database file: %s" % path)
             is_new_database = not os.path.isfile(path)
-            self.db = sqlite3.connect(path, check_same_thread=False)
-            self.db.isolation_level = None  # set autocommit mode
+            self._path = path
+            # an in-memory database only exists within its connection: it can't be shared by many connections
+            self._openPool(size=1 if path == ':memory:' else None)
         except Exception as e:
-            self.db = None
+            self._closePool()
             self.console.error('Database connection failed: %s', e)
             if self._consoleNotice:
                 self.console.screen.write('Connecting to DB : FAILED\n')
@@ -78,24 +89,43 @@ class SqliteStorage(DatabaseStorage):
         finally:
             return self.db
 
-    def getConnection(self):
+    def _createConnection(self):
         """
-        Return the database connection. If the connection has not been established yet, will establish a new one.
-        :return The connection instance, or None if no connection can be established.
+        Create a new connection with the SQLite database (used by the connection pool).
+        :raise Exception: If the connection cannot be established.
         """
-        if self.db:
-            return self.db
-        return self.connect()
+        import sqlite3
+        # parameterised statements are compiled once and reused from the connection statement cache
+        connection = sqlite3.connect(self._path, check_same_thread=False, cached_statements=self._cachedStatements)
+        connection.isolation_level = None  # set autocommit mode
+        if self._path != ':memory:':
+            # WAL mode lets readers run while a statement is being written
+            connection.execute('PRAGMA journal_mode=WAL')
+        return connection
 
     def shutdown(self):
         """
-        Close the current active database connection.
+        Close the current active database connections.
         """
-        if self.db:
-            # checking 'open' will prevent exception raising
+        if self._pool is not None:
             self.console.bot('Closing connection with SQLite database...')
-            self.db.close()
-        self.db = None
+        self._flushWriteBehind()
+        self._closePool()
+
+    @contextmanager
+    def _connection(self, query=None):
+        """
+        Check out a connection for the current thread for the time needed to run a query.
+        SQLite allows a single writer at a time: statements other than SELECT are run one at a time.
+        :param query: The query which will be run on the connection.
+        """
+        if query is not None and not self._reRead.match(query) and self._pool is not None and self._pool.size > 1:
+            with self._lock:
+                with super(SqliteStorage, self)._connection(query) as connection:
+                    yield connection
+        else:
+            with super(SqliteStorage, self)._connection(query) as connection:
+                yield connection
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -109,11 +139,11 @@ class SqliteStorage(DatabaseStorage):
         :return: List of strings.
         """
         tables = []
-        cursor = self.query("SELECT * FROM sqlite_master WHERE type='table'")
+        cursor = self.query("SELECT name FROM sqlite_master WHERE type='table'")
         if cursor and not cursor.EOF:
             while not cursor.EOF:
                 row = cursor.getRow()
-                tables.append(row.values()[0])
+                tables.append(row['name'])
                 cursor.moveNext()
         cursor.close()
         return tables
@@ -136,16 +166,3 @@ class SqliteStorage(DatabaseStorage):
                 raise KeyError("could not find table '%s' in the database" % table)
             self.query("DELETE FROM %s;" % table)
             self.query("DELETE FROM sqlite_sequence WHERE name='%s';" % table)
-
-    ####################################################################################################################
-    #                                                                                                                  #
-    #   UTILITY METHODS                                                                                                #
-    #                                                                                                                  #
-    ####################################################################################################################
-
-    def status(self):
-        """
-        Check whether the connection with the storage layer is active or not.
-        :return True if the connection is active, False otherwise.
-        """
-        return self.db is None
@@ -0,0 +1,236 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+import threading
+from time import time
+
+
+class WriteBehind(object):
+    """
+    Write-behind queue for clients, aliases and ip aliases.
+    Updates are coalesced in memory (a client saved many times is written once with its latest data, an alias
+    used many times is written once with the number of uses added up) and written by a background thread with
+    multi-row upserts, every 'delay' seconds or as soon as 'threshold' rows are pending.
+    """
+
+    _clientFields = ('ip', 'greeting', 'connections', 'time_edit', 'guid', 'pbid', 'name', 'time_add',
+                     'auto_login', 'mask_level', 'group_bits', 'login', 'password')
+
+    def __init__(self, storage, delay=2.0, threshold=100):
+        """
+        Object constructor.
+        :param storage: The DatabaseStorage instance used to write the rows
+        :param delay: Seconds between two flushes
+        :param threshold: Number of pending rows triggering a flush before the delay expires
+        """
+        self._storage = storage
+        self._delay = delay
+        self._threshold = max(1, threshold)
+        self._lock = threading.Lock()
+        self._flushLock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+        self._clients = {}  # client id -> Client
+        self._aliases = {}  # (client id, alias) -> [num used, time add, time edit]
+        self._ipaliases = {}  # (client id, ip) -> [num used, time add, time edit]
+        self.flushes = 0
+        self.errors = 0
+        self.rows = 0
+        self.lastBatch = 0
+        self.maxBatch = 0
+        self.flushTime = 0.0
+        self.lastFlushTime = 0.0
+        self.maxFlushTime = 0.0
+
+    @property
+    def pending(self):
+        """
+        The number of rows waiting to be written.
+        """
+        return len(self._clients) + len(self._aliases) + len(self._ipaliases)
+
+    def addClient(self, client):
+        """
+        Queue the update of a client already stored (the client must have an id).
+        """
+        with self._lock:
+            self._clients[client.id] = client
+        self._queued()
+
+    def addAlias(self, clientId, alias, timestamp):
+        """
+        Queue one more use of an alias (the alias is created if it doesn't exist yet).
+        """
+        with self._lock:
+            self._use(self._aliases, (clientId, alias), 1, timestamp, timestamp)
+        self._queued()
+
+    def addIpAlias(self, clientId, ip, timestamp):
+        """
+        Queue one more use of an ip alias (the ip alias is created if it doesn't exist yet).
+        """
+        with self._lock:
+            self._use(self._ipaliases, (clientId, ip), 1, timestamp, timestamp)
+        self._queued()
+
+    @staticmethod
+    def _use(table, key, numUsed, timeAdd, timeEdit):
+        row = table.get(key)
+        if row is None:
+            table[key] = [numUsed, timeAdd, timeEdit]
+        else:
+            row[0] += numUsed
+            row[1] = min(row[1], timeAdd)
+            row[2] = max(row[2], timeEdit)
+
+    def _queued(self):
+        """
+        Start the flushing thread if needed and wake it up if enough rows are pending.
+        """
+        if not self._running:
+            with self._lock:
+                if not self._running:
+                    self._running = True
+                    self._wakeup.clear()
+                    self._thread = threading.Thread(target=self._run, name='storage-writebehind')
+                    self._thread.daemon = True
+                    self._thread.start()
+        if self.pending >= self._threshold:
+            self._wakeup.set()
+
+    def _run(self):
+        while self._running:
+            self._wakeup.wait(self._delay)
+            self._wakeup.clear()
+            if self._running and self.pending:
+                self.flush()
+
+    def flush(self):
+        """
+        Write all the pending rows. The rows of a batch which fails are written one by one: the rows which can't
+        be written are queued again if the connection with the storage is lost, dropped otherwise.
+        :return: The number of rows written
+        """
+        with self._flushLock:
+            with self._lock:
+                clients, self._clients = self._clients, {}
+                aliases, self._aliases = self._aliases, {}
+                ipaliases, self._ipaliases = self._ipaliases, {}
+
+            batch = len(clients) + len(aliases) + len(ipaliases)
+            if not batch:
+                return 0
+
+            started = time()
+            written = 0
+            if clients:
+                rows = [[client.id] + [getattr(client, self._storage.getVar(f), None) for f in self._clientFields]
+                        for client in clients.values()]
+                failed = self._write(rows, 'clients', ('id',) + self._clientFields, ('id',))
+                written += len(rows) - len(failed)
+                if self._keep('clients', failed):
+                    with self._lock:
+                        for row in failed:
+                            self._clients.setdefault(row[0], clients[row[0]])
+            for table, field, pending, queue in (('aliases', 'alias', aliases, self._aliases),
+                                                 ('ipaliases', 'ip', ipaliases, self._ipaliases)):
+                if not pending:
+                    continue
+                rows = [list(k) + v for k, v in pending.items()]
+                failed = self._write(rows, table, ('client_id', field, 'num_used', 'time_add', 'time_edit'),
+                                     (field, 'client_id'), increment=('num_used',), keep=('time_add',))
+                written += len(rows) - len(failed)
+                if self._keep(table, failed):
+                    with self._lock:
+                        for row in failed:
+                            self._use(queue, (row[0], row[1]), *row[2:])
+
+            elapsed = time() - started
+            if written:
+                self.flushes += 1
+                self.rows += written
+                self.lastBatch = written
+                self.maxBatch = max(self.maxBatch, written)
+                self.flushTime += elapsed
+                self.lastFlushTime = elapsed
+                self.maxFlushTime = max(self.maxFlushTime, elapsed)
+            return written
+
+    def _write(self, rows, table, fields, keys, **kwargs):
+        """
+        Upsert the given rows.
+        :return: The list of rows which could not be written
+        """
+        try:
+            self._storage.upsert(table, fields, rows, keys, **kwargs)
+            return []
+        except Exception as e:
+            self.errors += 1
+            self._storage.console.error('Storage: could not write %s rows in table %s: %s', len(rows), table, e)
+            if len(rows) == 1:
+                return rows
+
+        failed = []
+        for row in rows:
+            try:
+                self._storage.upsert(table, fields, [row], keys, **kwargs)
+            except Exception:
+                failed.append(row)
+        return failed
+
+    def _keep(self, table, failed):
+        """
+        Tell whether rows which could not be written must be queued again (when the storage is not reachable).
+        """
+        if not failed:
+            return False
+        if not self._storage.status():
+            return True
+        self._storage.console.error('Storage: dropped %s rows which could not be written in table %s: %r',
+                                    len(failed), table, failed)
+        return False
+
+    def close(self):
+        """
+        Stop the flushing thread and write the pending rows (the thread is started again if more rows are queued).
+        """
+        self._running = False
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(self._delay + 5)
+        self._thread = None
+        return self.flush()
+
+    def stats(self):
+        """
+        Return the write-behind metrics (times are in seconds).
+        """
+        return {
+            'pending': self.pending,
+            'flushes': self.flushes,
+            'errors': self.errors,
+            'rows': self.rows,
+            'last_batch': self.lastBatch,
+            'max_batch': self.maxBatch,
+            'avg_batch': round(float(self.rows) / self.flushes, 1) if self.flushes else 0,
+            'last_flush_time': round(self.lastFlushTime, 3),
+            'max_flush_time': round(self.maxFlushTime, 3),
+            'avg_flush_time': round(self.flushTime / self.flushes, 3) if self.flushes else 0,
+        }
@@ -0,0 +1,202 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Standalone benchmarks for B3 hot paths.
+
+Every module in this package can be run from the command line, i.e:
+
+    python -m b311.tools.benchmark.eventdispatch games_mp.log --parser iourt42
+
+Benchmarks never connect to a real game server or database: they build a console instance which is not started,
+backed by an in-memory SQLite storage and an RCON output which does not send anything.
+"""
+
+__version__ = '1.0'
+
+import configparser
+import logging
+import os
+import queue
+import time
+
+import b311.clients
+import b311.events
+import b311.game
+import b311.output
+import b311.parser
+from b311.functions import meanstdv
+from b311.functions import percentile
+from b311.functions import splitDSN
+
+
+class NullConfig(object):
+    """
+    Configuration which does not have any section.
+    """
+
+    def has_section(self, section):
+        return False
+
+    def has_option(self, section, option):
+        return False
+
+    def get(self, section, option, *args, **kwargs):
+        raise configparser.NoSectionError(section)
+
+    getint = getfloat = getboolean = get
+
+
+class NullOutput(object):
+    """
+    RCON output which does not send anything to the game server.
+    """
+    socket_timeout = 0
+
+    def write(self, *args, **kwargs):
+        return ''
+
+    def writelines(self, *args, **kwargs):
+        return ''
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def loadParserClasses(names):
+    """
+    Load the parser classes matching the given names, skipping the ones which can't be imported.
+    :param names: A list of parser names
+    :return: A list of (name, parser class) tuples
+    """
+    classes = []
+    for name in names:
+        try:
+            classes.append((name, getParserClass(name)))
+        except Exception as e:
+            print('skipping parser %s: %s' % (name, e))
+    return classes
+
+
+def getParserClass(name=None):
+    """
+    Return the parser class matching the given name.
+    :param name: The parser name (i.e: iourt42): if not given the base parser class is returned
+    """
+    if not name:
+        return b311.parser.Parser
+    from b311 import loadParser
+    return loadParser(name)
+
+
+def createConsole(parser_class=None, queuesize=50, storage=True):
+    """
+    Create a console instance which can be used to replay game log lines without a game server.
+    :param parser_class: The parser class to instantiate (default to the base parser)
+    :param queuesize: The size of the event queue
+    :param storage: Whether to setup an in-memory SQLite storage
+    """
+    parser_class = parser_class or b311.parser.Parser
+    console = object.__new__(parser_class)
+    console._timeStart = console.time()
+    console.log = logging.getLogger('benchmark')
+    console.log.setLevel(logging.ERROR)
+    console.config = NullConfig()
+    console.Events = b311.events.eventManager
+    console._eventsStats = b311.events.EventsStats(console, max_samples=100000)
+    console._handlers = {}
+    console._plugins = {}
+    console.queue = queue.Queue(queuesize)
+    console.output = NullOutput()
+    console.working = True
+    console.loadEvents()
+
+    if storage:
+        from b311.storage.sqlite import SqliteStorage
+        console.storage = SqliteStorage('sqlite://:memory:', splitDSN('sqlite://:memory:'), console)
+        console.storage.connect()
+        if 'clients' not in console.storage.getTables():
+            # the storage looks for the schema under the package name: load it from the source tree
+            console.storage.queryFromFile(os.path.join(os.path.dirname(b311.__file__), 'sql', 'sqlite', 'b3.sql'))
+
+    console.clients = b311.clients.Clients(console)
+    # there is no game server to synchronize with: the clients list is the one built from the replayed lines
+    console.clients.sync = lambda: None
+    console.game = b311.game.Game(console, console.gameName)
+    return console
+
+
+def readLines(path):
+    """
+    Read a recorded game log file.
+    :param path: The game log file path
+    :return: A list of non empty lines
+    """
+    with open(path, 'r', encoding='latin-1') as f:
+        return [x.strip() for x in f if x.strip()]
+
+
+class Timer(object):
+    """
+    Measure wall time spent in a block of code.
+    """
+    elapsed = 0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.elapsed = time.perf_counter() - self._start
+
+
+def summarize(samples):
+    """
+    Summarize a collection of timings.
+    :param samples: A collection of numeric samples
+    :return: A dict with min, max, mean, stddev, p50, p95 and p99 keys
+    """
+    mean, stdv = meanstdv(samples)
+    return {
+        'min': min(samples) if samples else 0,
+        'max': max(samples) if samples else 0,
+        'mean': mean,
+        'stddev': stdv,
+        'p50': percentile(samples, 50),
+        'p95': percentile(samples, 95),
+        'p99': percentile(samples, 99),
+    }
+
+
+def report(title, rows):
+    """
+    Print a benchmark result table.
+    :param title: The benchmark title
+    :param rows: A list of (label, value) tuples
+    """
+    print(title)
+    print('-' * len(title))
+    width = max([len(label) for label, _ in rows] + [0])
+    for label, value in rows:
+        if isinstance(value, float):
+            value = '%0.3f' % value
+        print('  %s : %s' % (label.ljust(width), value))
+    print('')
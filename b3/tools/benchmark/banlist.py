@@ -0,0 +1,208 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Check random ips and guids against generated ip and guid banlist files, searching the whole file content with
+regular expressions (the way the banlist plugin did before indexing the banlists) and with the banlist index, and
+report the amount of lookups per second, the time spent indexing the files and the memory used.
+
+    python -m b311.tools.benchmark.banlist --entries 50000 --lookups 2000 --added 100
+"""
+
+__version__ = '1.0'
+
+import argparse
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+from xml.etree import ElementTree
+
+from b311.plugins.banlist import BanlistPlugin
+from b311.plugins.banlist import GuidBanlist
+from b311.plugins.banlist import IpBanlist
+from b311.tools.benchmark import Timer
+from b311.tools.benchmark import createConsole
+from b311.tools.benchmark import report
+
+
+def randomIp(rnd):
+    return '%s.%s.%s.%s' % (rnd.randint(1, 254), rnd.randint(0, 255), rnd.randint(0, 255), rnd.randint(1, 254))
+
+
+def randomGuid(rnd):
+    return '%032X' % rnd.getrandbits(128)
+
+
+def createIpLines(entries, cidr, rnd):
+    """
+    Generate ip banlist lines: mostly single ips, some ranges ending with .0 or .0.0 and the given share of CIDR
+    networks, most of them followed by a comment.
+    """
+    lines = []
+    for n in range(entries):
+        ip = randomIp(rnd).split('.')
+        kind = rnd.random()
+        if kind < cidr:
+            entry = '%s/%s' % ('.'.join(ip), rnd.choice((16, 20, 24, 28)))
+        elif kind < cidr + 0.1:
+            entry = '.'.join(ip[:3] + ['0'])
+        elif kind < cidr + 0.12:
+            entry = '.'.join(ip[:2] + ['0', '0'])
+        else:
+            entry = '.'.join(ip)
+        lines.append(entry if rnd.random() < 0.2 else '%s // banned for cheating #%s' % (entry, n))
+    return lines
+
+
+def createGuidLines(entries, rnd):
+    return ['%s player%s' % (randomGuid(rnd), n) for n in range(entries)]
+
+
+def searchIp(content, ip, force_range):
+    """
+    Search the banlist file content (the way the banlist plugin did before indexing the banlists).
+    """
+    m = re.search(r'''^(?P<entry>%s(?:[^\d\n\r].*)?)$''' % re.escape(ip), content, re.MULTILINE)
+    if m:
+        return m.group('entry').strip()
+    for n, suffix in ((3, r'\.0'), (2, r'\.0\.0'), (1, r'\.0\.0\.0')):
+        m = re.search(r'''^(?P<entry>%s%s(?:[^\d\n\r].*)?)$''' % (re.escape('.'.join(ip.split('.')[0:n])), suffix),
+                      content, re.MULTILINE)
+        if m:
+            return m.group('entry').strip()
+    if force_range:
+        m = re.search(r'''^(?P<entry>%s\.\d{1,3}(?:[^\d\n\r].*)?)$''' % re.escape('.'.join(ip.split('.')[0:3])),
+                      content, re.MULTILINE)
+        if m:
+            return m.group('entry').strip()
+    return None
+
+
+def searchGuid(content, guid):
+    m = re.search(r'''^(?P<entry>\s*%s\b.*)$''' % re.escape(guid), content, re.IGNORECASE | re.MULTILINE)
+    return m.group('entry').strip() if m else None
+
+
+def getEntry(msg):
+    """
+    Return the banlist entry found in a lookup result message.
+    """
+    m = re.search(r"entry '(.*)' \(", msg)
+    return m.group(1) if m else None
+
+
+def createBanlist(cls, plugin, path, force_range=False):
+    config = ElementTree.fromstring('<banlist><name>%s</name><file>%s</file><force_ip_range>%s</force_ip_range>'
+                                    '</banlist>' % (cls.__name__, path, 'yes' if force_range else 'no'))
+    return cls(plugin, config)
+
+
+def indexFile(banlist, path, lines):
+    """
+    Write the given lines to the banlist file and index it.
+    :return: A (seconds spent indexing, bytes allocated) tuple
+    """
+    with open(path, 'a') as f:
+        f.write(''.join('%s\n' % x for x in lines))
+    os.utime(path, (banlist.cache_time + 1, banlist.cache_time + 1))
+    tracemalloc.start()
+    with Timer() as timer:
+        banlist.refreshBanlistContent()
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return timer.elapsed, allocated
+
+
+def run(entries, lookups, cidr, added, seed):
+    """
+    :return: A list of (title, rows) tuples
+    """
+    rnd = random.Random(seed)
+    console = createConsole(storage=False)
+    plugin = BanlistPlugin(console)
+    plugin._auto_update = False
+    tmpdir = tempfile.mkdtemp()
+    try:
+        results = []
+        for label, cls, lines, values in (
+            ('ip banlist', IpBanlist, createIpLines(entries, cidr, rnd), [randomIp(rnd) for _ in range(lookups)]),
+            ('guid banlist', GuidBanlist, createGuidLines(entries, rnd), [randomGuid(rnd) for _ in range(lookups)])
+        ):
+            # half of the lookups are for banned values
+            for n in range(0, lookups, 2):
+                values[n] = re.match(r'[\w.]+', rnd.choice(lines)).group().lower()
+
+            path = os.path.join(tmpdir, '%s.txt' % cls.__name__)
+            open(path, 'w').close()
+            banlist = createBanlist(cls, plugin, path, force_range=True)
+            index_time, index_memory = indexFile(banlist, path, lines)
+            added_time, _ = indexFile(banlist, path, createIpLines(added, cidr, rnd) if cls is IpBanlist
+                                      else createGuidLines(added, rnd))
+            with open(path) as f:
+                content = f.read()
+
+            if cls is IpBanlist:
+                search = lambda x: searchIp(content, x, True)
+                lookup = lambda x: getEntry(banlist.isIpInBanlist(x)[1])
+            else:
+                search = lambda x: searchGuid(content, x)
+                lookup = lambda x: getEntry(banlist.isGuidInBanlist(x)[1])
+
+            with Timer() as search_timer:
+                expected = [search(x) for x in values]
+            with Timer() as lookup_timer:
+                found = [lookup(x) for x in values]
+
+            results.append(('%s: %s entries, %s lookups' % (label, entries, lookups), [
+                ('file search: lookups per second', lookups / search_timer.elapsed),
+                ('file search: banned', len([x for x in expected if x])),
+                ('file search: memory (KB)', sys.getsizeof(content) / 1024.0),
+                ('index: lookups per second', lookups / lookup_timer.elapsed),
+                ('index: banned', len([x for x in found if x])),
+                ('index: memory (KB)', index_memory / 1024.0),
+                ('index: full build (ms)', index_time * 1000),
+                ('index: %s lines added (ms)' % added, added_time * 1000),
+                # CIDR networks are only matched by the index
+                ('index: same entries as file search', all(x == y or (y is not None and '/' in y)
+                                                            for x, y in zip(expected, found))),
+            ]))
+        return results
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--entries', type=int, default=50000, help='lines of the banlist files')
+    p.add_argument('--lookups', type=int, default=2000, help='ips and guids to check (half of them banned)')
+    p.add_argument('--cidr', type=float, default=0.05, help='share of the ip banlist lines being CIDR networks')
+    p.add_argument('--added', type=int, default=100, help='lines added to the banlist files after they are indexed')
+    p.add_argument('--seed', type=int, default=311, help='random seed of the generated banlists')
+    options = p.parse_args()
+
+    for title, rows in run(options.entries, options.lookups, options.cidr, options.added, options.seed):
+        report(title, rows)
+
+
+if __name__ == '__main__':
+    main()
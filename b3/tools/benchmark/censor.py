@@ -0,0 +1,130 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Check random chat lines against a generated list of censor rules, searching the rules one by one and with the
+CensorMatcher used by the censor plugin, and report the amount of lines checked per second.
+
+    python -m b311.tools.benchmark.censor --rules 2000 --lines 5000 --bad 0.05
+"""
+
+__version__ = '1.0'
+
+import argparse
+import random
+import string
+
+from b311.plugins.censor import CensorMatcher
+from b311.plugins.censor import CensorPlugin
+from b311.tools.benchmark import Timer
+from b311.tools.benchmark import createConsole
+from b311.tools.benchmark import report
+
+LEET = {'a': '[a@4]', 'e': '[e3]', 'i': '[i!1]', 'o': '[o0]', 's': '[s$5]'}
+
+
+def randomWord(rnd, size):
+    return ''.join(rnd.choice(string.ascii_lowercase) for _ in range(size))
+
+
+def createRules(plugin, rules, regexps, rnd):
+    """
+    Load the given amount of badword rules in the plugin, the given share of them being regular expressions.
+    :return: The list of bad words used to build the rules
+    """
+    plugin._badWords = []
+    words = []
+    for n in range(rules):
+        word = randomWord(rnd, rnd.randint(4, 8))
+        words.append(word)
+        if rnd.random() < regexps:
+            plugin._add_bad_word('rule%s' % n, regexp=''.join(LEET.get(x, x) for x in word) + '+')
+        else:
+            plugin._add_bad_word('rule%s' % n, word=word)
+    return words
+
+
+def createLines(words, lines, bad, rnd):
+    vocabulary = [randomWord(rnd, rnd.randint(2, 7)) for _ in range(500)]
+    result = []
+    for _ in range(lines):
+        line = [rnd.choice(vocabulary) for _ in range(rnd.randint(3, 12))]
+        if rnd.random() < bad:
+            line.insert(rnd.randrange(len(line)), rnd.choice(words).upper())
+        result.append(' '.join(line))
+    return result
+
+
+def searchOneByOne(rules, texts):
+    """
+    Search the rules one by one (the way the censor plugin did before using a CensorMatcher).
+    """
+    for rule in rules:
+        for text in texts:
+            if rule.regexp.search(text):
+                return rule, text
+    return None
+
+
+def run(rules, lines, regexps, bad, seed):
+    """
+    :return: A list of (label, value) for every search method
+    """
+    rnd = random.Random(seed)
+    console = createConsole(storage=False)
+    plugin = CensorPlugin(console)
+    words = createRules(plugin, rules, regexps, rnd)
+    texts = [(' %s ' % x, ' %s ' % plugin.clean(x)) for x in createLines(words, lines, bad, rnd)]
+
+    with Timer() as build:
+        matcher = CensorMatcher(plugin._badWords)
+
+    results = {}
+    for label, search in (('one by one', lambda x: searchOneByOne(plugin._badWords, x)),
+                          ('CensorMatcher', lambda x: matcher.search(*x))):
+        with Timer() as timer:
+            found = [search(x) for x in texts]
+        results[label] = (timer.elapsed, found)
+
+    expected = results['one by one'][1]
+    rows = []
+    for label, (elapsed, found) in results.items():
+        rows.append(('%s: lines per second' % label, lines / elapsed))
+        rows.append(('%s: lines censored' % label, len([x for x in found if x])))
+        rows.append(('%s: same rules as one by one' % label,
+                     all((x and x[0]) is (y and y[0]) for x, y in zip(found, expected))))
+    rows.append(('CensorMatcher build (ms)', build.elapsed * 1000))
+    return rows
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--rules', type=int, default=2000, help='badword rules')
+    p.add_argument('--regexps', type=float, default=0.3, help='share of the rules being regular expressions')
+    p.add_argument('--lines', type=int, default=5000, help='chat lines to check')
+    p.add_argument('--bad', type=float, default=0.05, help='share of the chat lines containing a bad word')
+    p.add_argument('--seed', type=int, default=311, help='random seed of the generated rules and lines')
+    options = p.parse_args()
+
+    report('%s rules (%d%% regular expressions), %s chat lines (%d%% censored)' % (
+           options.rules, options.regexps * 100, options.lines, options.bad * 100),
+           run(options.rules, options.lines, options.regexps, options.bad, options.seed))
+
+
+if __name__ == '__main__':
+    main()
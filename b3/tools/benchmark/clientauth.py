@@ -0,0 +1,128 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Measure the authorization of a full server from a cold start (nothing cached, no client authorized yet):
+every client authorized on its own with Client.auth() and all the clients authorized at once with
+Clients.authClients(). A latency can be added to every query to simulate a database server on the network.
+
+    python -m b311.tools.benchmark.clientauth --players 64 --known 48 --banned 4 --latency 0.001
+"""
+
+__version__ = '1.0'
+
+import argparse
+import time
+
+from b311.tools.benchmark import Timer
+from b311.tools.benchmark import createConsole
+from b311.tools.benchmark import report
+
+
+def seed(storage, players, known, banned):
+    """
+    Store the first 'known' players (the first 'banned' of them with an expired ban and an active warning).
+    """
+    now = int(time.time())
+    for cid in range(known):
+        cursor = storage.query("INSERT INTO clients (ip, connections, guid, pbid, name, auto_login, mask_level, "
+                               "group_bits, greeting, login, password, time_add, time_edit) "
+                               "VALUES (?, 10, ?, '', ?, 1, 0, 1, '', '', '', ?, ?)",
+                               ('10.0.0.%s' % cid, guid(cid), 'Player%s' % cid, now, now))
+        client_id = cursor.lastrowid
+        cursor.close()
+        if cid < banned:
+            for kind, expire in (('TempBan', now - 60), ('Warning', now + 3600)):
+                storage.query("INSERT INTO penalties (type, client_id, admin_id, duration, inactive, keyword, "
+                              "reason, data, time_add, time_edit, time_expire) "
+                              "VALUES (?, ?, 0, 1, 0, '', 'benchmark', '', ?, ?, ?)",
+                              (kind, client_id, now - 120, now - 120, expire)).close()
+
+
+def guid(cid):
+    return '%032X' % (cid + 1)
+
+
+def countQueries(storage, latency):
+    """
+    Wrap the storage query method to count the queries and add the given latency to each of them.
+    :return: A list holding the number of queries run
+    """
+    counter = [0]
+    query = storage._query
+
+    def _query(*args, **kwargs):
+        counter[0] += 1
+        if latency:
+            time.sleep(latency)
+        return query(*args, **kwargs)
+
+    storage._query = _query
+    return counter
+
+
+def run(players, known, banned, latency, bulk):
+    """
+    :return: A list of (label, value)
+    """
+    console = createConsole(queuesize=players * 10)
+    seed(console.storage, players, known, banned)
+    counter = countQueries(console.storage, latency)
+
+    clients = [console.clients.newClient(str(cid), auth=False, guid=guid(cid), name='Player%s' % cid,
+                                         ip='10.0.0.%s' % cid) for cid in range(players)]
+    with Timer() as auth_timer:
+        if bulk:
+            console.clients.authClients(clients)
+        else:
+            for client in clients:
+                client.auth()
+    auth_queries = counter[0]
+
+    # time needed to write the updates queued by the authorizations
+    with Timer() as flush_timer:
+        if console.storage.writeBehind is not None:
+            console.storage.writeBehind.close()
+
+    authed = len([x for x in clients if x.authed])
+    console.storage.shutdown()
+    return [
+        ('authorization (ms)', auth_timer.elapsed * 1000),
+        ('authorization queries', auth_queries),
+        ('authorized clients', authed),
+        ('write-behind flush (ms)', flush_timer.elapsed * 1000),
+        ('write-behind flush queries', counter[0] - auth_queries),
+    ]
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--players', type=int, default=64, help='players to authorize')
+    p.add_argument('--known', type=int, default=48, help='players already in the database')
+    p.add_argument('--banned', type=int, default=4, help='known players with penalties')
+    p.add_argument('--latency', type=float, default=0.001, help='seconds added to every query')
+    options = p.parse_args()
+
+    for label, bulk in (('one by one (Client.auth)', False), ('all at once (Clients.authClients)', True)):
+        report('%s: %s players (%s known), %0.1f ms per query' % (label, options.players, options.known,
+                                                                  options.latency * 1000),
+               run(options.players, min(options.known, options.players), options.banned, options.latency, bulk))
+
+
+if __name__ == '__main__':
+    main()
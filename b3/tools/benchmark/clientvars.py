@@ -0,0 +1,150 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Update the variables of a plugin (the ones of the stats plugin) on every client of a full server, the way
+Client.var/setvar did before plugins could declare their variables, with Client.var/setvar on undeclared and on
+declared variables, and with the ClientVarSchema records, and report the amount of variable updates per second and
+the memory used by the variables of every client.
+
+    python -m b311.tools.benchmark.clientvars --clients 64 --updates 200000
+"""
+
+__version__ = '1.0'
+
+import argparse
+import random
+import tracemalloc
+
+import b311.plugin
+from b311.clients import ClientVar
+from b311.tools.benchmark import Timer
+from b311.tools.benchmark import createConsole
+from b311.tools.benchmark import report
+
+VARIABLES = ('shotsTeamHit', 'damageTeamHit', 'shotsHit', 'damageHit', 'shotsGot', 'damageGot', 'teamKills', 'kills',
+             'deaths', 'pointsLost', 'pointsWon', 'points', 'experience', 'oldexperience')
+
+
+class VarPlugin(b311.plugin.Plugin):
+    requiresConfigFile = False
+
+
+def legacySetvar(client, plugin, key, value=None):
+    """
+    Store a variable (the way Client.setvar did before plugins could declare their variables).
+    """
+    try:
+        client._legacyData[id(plugin)]
+    except Exception:
+        client._legacyData[id(plugin)] = {}
+
+    try:
+        client._legacyData[id(plugin)][key].value = value
+    except Exception:
+        client._legacyData[id(plugin)][key] = ClientVar(value)
+
+    return client._legacyData[id(plugin)][key]
+
+
+def legacyVar(client, plugin, key, default=None):
+    """
+    Return a variable (the way Client.var did before plugins could declare their variables).
+    """
+    try:
+        return client._legacyData[id(plugin)][key]
+    except Exception:
+        return legacySetvar(client, plugin, key, default)
+
+
+def fill(clients, update):
+    """
+    Set every variable of every client.
+    :return: The amount of bytes allocated
+    """
+    tracemalloc.start()
+    for client in clients:
+        for key in VARIABLES:
+            update(client, key)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return allocated
+
+
+def run(num_clients, updates, seed):
+    """
+    :return: A list of (label, value)
+    """
+    rnd = random.Random(seed)
+    console = createConsole(storage=False)
+    clients = [console.clients.newClient(str(cid), auth=False, name='player%s' % cid, guid='%032X' % cid)
+               for cid in range(num_clients)]
+    for client in clients:
+        client._legacyData = {}
+
+    legacy = VarPlugin(console)
+    undeclared = VarPlugin(console)
+    declared = VarPlugin(console)
+    declared.registerClientVars(**dict((x, 0) for x in VARIABLES))
+    schema = VarPlugin(console).registerClientVars(**dict((x, 0) for x in VARIABLES))
+
+    def recordUpdate(client, key):
+        record = schema.get(client)
+        setattr(record, key, getattr(record, key) + 1)
+
+    methods = (
+        ('legacy var', lambda c, k: setattr(legacyVar(c, legacy, k, 0), 'value', legacyVar(c, legacy, k, 0).value + 1)),
+        ('var (undeclared)', lambda c, k: setattr(c.var(undeclared, k, 0), 'value', c.var(undeclared, k, 0).value + 1)),
+        ('var (declared)', lambda c, k: setattr(c.var(declared, k, 0), 'value', c.var(declared, k, 0).value + 1)),
+        ('ClientVarSchema record', recordUpdate),
+    )
+
+    sequence = [(rnd.choice(clients), rnd.choice(VARIABLES)) for _ in range(updates)]
+    rows = [('clients', num_clients), ('variables per client', len(VARIABLES))]
+    for label, update in methods:
+        allocated = fill(clients, update)
+        with Timer() as timer:
+            for client, key in sequence:
+                update(client, key)
+        rows.append(('%s: updates per second' % label, updates / timer.elapsed))
+        rows.append(('%s: bytes per client' % label, allocated // num_clients))
+
+    # the typed access of a plugin which declared its variables
+    def statsUpdate(client, key):
+        schema.get(client).kills += 1
+
+    with Timer() as timer:
+        for client, key in sequence:
+            statsUpdate(client, key)
+    rows.append(('record attribute (record.kills += 1): updates per second', updates / timer.elapsed))
+    return rows
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--clients', type=int, default=64, help='clients connected to the server')
+    p.add_argument('--updates', type=int, default=200000, help='variable updates to perform')
+    p.add_argument('--seed', type=int, default=311, help='random seed of the updates sequence')
+    options = p.parse_args()
+
+    report('%s clients, %s variable updates' % (options.clients, options.updates),
+           run(options.clients, options.updates, options.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Schedule a generated set of crontabs over a simulated period, matching every crontab every second (the way the cron
+scheduler did before keeping the crontabs in a priority queue) and computing the next time every crontab is due,
+and report the time spent scheduling. Then run fast crontabs next to a slow one for a few seconds, one after the
+other in the scheduler thread and on the cron worker threads, and report how late the fast crontabs started.
+
+    python -m b311.tools.benchmark.cron --tabs 200 --hours 6 --seconds 6 --slow 2.5
+"""
+
+__version__ = '1.0'
+
+import argparse
+import heapq
+import random
+import time
+
+from b311.cron import Cron
+from b311.cron import CronTab
+from b311.tools.benchmark import Timer
+from b311.tools.benchmark import createConsole
+from b311.tools.benchmark import report
+
+
+def createTabs(tabs, rnd):
+    """
+    Generate crontabs with the schedules plugins use: every few seconds, every few minutes, hourly and daily.
+    """
+    result = []
+    for _ in range(tabs):
+        kind = rnd.random()
+        if kind < 0.3:
+            tab = CronTab(None, second='*/%s' % rnd.choice((1, 5, 10, 15, 30)))
+        elif kind < 0.7:
+            tab = CronTab(None, second=rnd.randrange(60), minute='*/%s' % rnd.choice((1, 2, 5, 10, 15)))
+        elif kind < 0.9:
+            tab = CronTab(None, second=rnd.randrange(60), minute=rnd.randrange(60))
+        else:
+            tab = CronTab(None, second=0, minute=rnd.randrange(60), hour=rnd.randrange(24))
+        result.append(tab)
+    return result
+
+
+def scheduleEverySecond(tabs, start, seconds):
+    """
+    Match every crontab every second (the way the cron scheduler did before using a priority queue).
+    :return: The amount of runs
+    """
+    runs = 0
+    for t in range(start, start + seconds):
+        tt = time.gmtime(t)
+        for tab in tabs:
+            if tab.match(tt):
+                runs += 1
+    return runs
+
+
+def scheduleNextRun(tabs, start, seconds):
+    """
+    Pop the crontabs from a priority queue ordered by the next time they are due.
+    :return: The amount of runs
+    """
+    runs = 0
+    schedule = [(tab.nextRun(start - 1), n) for n, tab in enumerate(tabs)]
+    heapq.heapify(schedule)
+    while schedule[0][0] < start + seconds:
+        due, n = schedule[0]
+        runs += 1
+        heapq.heapreplace(schedule, (tabs[n].nextRun(due), n))
+    return runs
+
+
+def runSequential(commands, seconds):
+    """
+    Run the commands one after the other in the scheduler thread (the way the cron scheduler did before using
+    worker threads) for the given amount of seconds.
+    :param commands: A list of (CronTab, command) tuples
+    :return: A list of (runs, max lateness in seconds) tuples, in the same order as the commands
+    """
+    lateness = dict((command, []) for _, command in commands)
+    nexttime = int(time.time()) + 1
+    end = nexttime + seconds
+    while nexttime < end:
+        now = time.time()
+        if now < nexttime:
+            time.sleep(nexttime - now)
+        tt = time.gmtime(nexttime)
+        for tab, command in commands:
+            if tab.match(tt):
+                lateness[command].append(time.time() - nexttime)
+                command()
+        nexttime += 1
+    return [(len(lateness[command]), max(lateness[command] + [0])) for _, command in commands]
+
+
+def runWorkers(commands, seconds):
+    """
+    Run the commands with a cron scheduler for the given amount of seconds.
+    :return: A list of (runs, max lateness in seconds) tuples, in the same order as the commands
+    """
+    console = createConsole(storage=False)
+    cron = Cron(console)
+    for tab, _ in commands:
+        cron.add(tab)
+    cron.start()
+    time.sleep(seconds + 1 - time.time() % 1)
+    cron.stop()
+    return [(tab.stats.runs, tab.stats.maxLateness) for tab, _ in commands]
+
+
+def run(tabs, hours, seconds, slow, seed):
+    """
+    :return: A list of (title, rows) tuples
+    """
+    rnd = random.Random(seed)
+    generated = createTabs(tabs, rnd)
+    start = int(time.time()) // 86400 * 86400
+    with Timer() as everySecond:
+        expected = scheduleEverySecond(generated, start, hours * 3600)
+    with Timer() as nextRun:
+        runs = scheduleNextRun(generated, start, hours * 3600)
+    results = [('%s crontabs scheduled over %s hours' % (tabs, hours), [
+        ('runs', runs),
+        ('every second: scheduling time (ms)', everySecond.elapsed * 1000),
+        ('next run: scheduling time (ms)', nextRun.elapsed * 1000),
+        ('next run: same runs as every second', runs == expected),
+    ])]
+
+    rows = []
+    for label, method in (('one after the other', runSequential), ('worker threads', runWorkers)):
+        commands = [(CronTab(None, second='*/3'), lambda: time.sleep(slow))]
+        commands += [(CronTab(None, second='*'), lambda: None) for _ in range(10)]
+        for tab, command in commands:
+            tab.command = command
+        fast = method(commands, seconds)[1:]
+        rows.append(('%s: fast crontab runs' % label, sum(x[0] for x in fast)))
+        rows.append(('%s: fast crontabs max lateness (ms)' % label, max(x[1] for x in fast) * 1000))
+    results.append(('%s seconds, fast crontabs next to a %0.1f seconds one' % (seconds, slow), rows))
+    return results
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--tabs', type=int, default=200, help='crontabs to schedule')
+    p.add_argument('--hours', type=int, default=6, help='simulated hours to schedule the crontabs over')
+    p.add_argument('--seconds', type=int, default=6, help='seconds to run the fast and slow crontabs for')
+    p.add_argument('--slow', type=float, default=2.5, help='seconds spent by the slow crontab')
+    p.add_argument('--seed', type=int, default=311, help='random seed of the generated crontabs')
+    options = p.parse_args()
+
+    for title, rows in run(options.tabs, options.hours, options.seconds, options.slow, options.seed):
+        report(title, rows)
+
+
+if __name__ == '__main__':
+    main()
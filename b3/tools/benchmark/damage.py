@@ -0,0 +1,178 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Queue a generated firefight (bursts of damage events followed by kills) with and without damage coalescing, and
+report the amount of events queued, the events handled per second and the size of the event queue. One plugin
+accepts summarized damage events (like the stats plugin), the others only listen for kills unless told otherwise.
+
+    python -m b311.tools.benchmark.damage --players 32 --hits 100000 --window 250 --workload 0.05
+"""
+
+__version__ = '1.0'
+
+import argparse
+import random
+import threading
+import time
+
+import b311.coalescer
+import b311.plugin
+from b311.tools.benchmark import Timer
+from b311.tools.benchmark import createConsole
+from b311.tools.benchmark import report
+from b311.tools.benchmark import summarize
+
+
+class DamagePlugin(b311.plugin.Plugin):
+    """
+    Plugin adding up hits and damage points, simulating some work on each event.
+    """
+    requiresConfigFile = False
+    workload = 0  # seconds spent handling each event
+    listenDamage = True
+
+    def onStartup(self):
+        self.handled = 0
+        self.hits = 0
+        self.damage = 0
+        if self.listenDamage:
+            self.registerEvent('EVT_CLIENT_DAMAGE', self.onDamage)
+        self.registerEvent('EVT_CLIENT_KILL', self.onKill)
+
+    def work(self):
+        self.handled += 1
+        if self.workload:
+            end = time.perf_counter() + self.workload
+            while time.perf_counter() < end:
+                pass
+
+    def onDamage(self, event):
+        self.work()
+        self.hits += getattr(event.data, 'hits', 1)
+        self.damage += event.data[0]
+
+    def onKill(self, event):
+        self.work()
+
+
+class SummaryPlugin(DamagePlugin):
+    coalesceDamage = True
+
+
+class KillPlugin(DamagePlugin):
+    listenDamage = False
+
+
+def createFirefight(console, players, hits, burst, rnd):
+    """
+    Generate the events of a firefight: bursts of hits of an attacker on a victim, most of them ending with a kill.
+    """
+    clients = [console.clients.newClient(cid, auth=False, name='player%s' % cid, guid='%032X' % cid)
+               for cid in range(players)]
+    events = []
+    while len(events) < hits:
+        attacker, victim = rnd.sample(clients, 2)
+        weapon = rnd.choice(('UT_MOD_M4', 'UT_MOD_LR300', 'UT_MOD_AK103', 'UT_MOD_DEAGLE'))
+        for _ in range(rnd.randint(1, burst)):
+            data = (rnd.randint(10, 40), weapon, rnd.choice(('TORSO', 'TORSO', 'LEGS', 'HEAD')))
+            events.append(console.getEvent('EVT_CLIENT_DAMAGE', data=data, client=attacker, target=victim))
+        if rnd.random() < 0.7:
+            events.append(console.getEvent('EVT_CLIENT_KILL', data=(100, weapon, 'TORSO'),
+                                           client=attacker, target=victim))
+    return events
+
+
+def replay(events, window, plugins, workload, queuesize):
+    """
+    Queue the given events with the lowlatency dispatch mode.
+    :param window: The damage coalescing window in seconds (0 to disable damage coalescing)
+    :return: A list of (label, value)
+    """
+    console = events[0].client.console
+    console.queue.maxsize = queuesize
+    console.eventDispatch = 'lowlatency'
+    console._handlers = {}
+    console._eventsStats._queue_size.clear()
+    console._damageCoalescer = b311.coalescer.DamageCoalescer(console, window) if window else None
+
+    queued = [0]
+    putEvent = console.putEvent
+
+    def countingPutEvent(event, expire=10):
+        queued[0] += 1
+        return putEvent(event, expire)
+
+    console.putEvent = countingPutEvent
+    summary = SummaryPlugin(console)
+    others = [(DamagePlugin if x == 0 and plugins < 0 else KillPlugin)(console) for x in range(abs(plugins))]
+    for plugin in [summary] + others:
+        plugin.workload = workload
+        plugin.onStartup()
+
+    handler = threading.Thread(target=console.handleEvents, name='handleEvents')
+    handler.start()
+    with Timer() as timer:
+        for event in events:
+            console.queueEvent(event)
+        if console._damageCoalescer:
+            console._damageCoalescer.stop()
+            console._damageCoalescer.flush()
+        console.working = True
+        console.queueEvent(console.getEvent('EVT_STOP'))
+        handler.join()
+    console.working = True
+    del console.putEvent
+
+    handled = sum(x.handled for x in [summary] + others)
+    size = summarize(console._eventsStats._queue_size)
+    return [
+        ('events generated', len(events)),
+        ('events queued', queued[0]),
+        ('events handled by plugins', handled),
+        ('elapsed (s)', timer.elapsed),
+        ('events/sec (generated)', len(events) / timer.elapsed),
+        ('queue size mean', size['mean']),
+        ('queue size max', size['max']),
+        ('summary plugin: hits / damage', '%s / %s' % (summary.hits, summary.damage)),
+    ]
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--players', type=int, default=32, help='players in the firefight')
+    p.add_argument('--hits', type=int, default=100000, help='damage events to generate')
+    p.add_argument('--burst', type=int, default=8, help='maximum amount of hits of an attacker on a victim in a row')
+    p.add_argument('--window', type=float, default=250, help='damage coalescing window in milliseconds')
+    p.add_argument('--plugins', type=int, default=3, help='plugins listening for kills only (negative: the first '
+                                                          'one also listens for raw damage events)')
+    p.add_argument('--workload', type=float, default=0.05, help='milliseconds spent by each plugin on each event')
+    p.add_argument('--queue-size', type=int, default=50, help='size of the event queue')
+    p.add_argument('--seed', type=int, default=311, help='random seed of the generated events')
+    options = p.parse_args()
+
+    console = createConsole(queuesize=options.queue_size, storage=False)
+    events = createFirefight(console, options.players, options.hits, options.burst, random.Random(options.seed))
+    for label, window in (('raw damage events', 0), ('damage coalescing (%sms)' % options.window,
+                                                     options.window / 1000.0)):
+        report('%s: %s players, %s events' % (label, options.players, len(events)),
+               replay(events, window, options.plugins, options.workload / 1000.0, options.queue_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Replay a recorded game log through Parser.parseLine -> Parser.queueEvent -> Parser.handleEvents and report the
+amount of events handled per second and the time events spent waiting in the queue, for every event dispatch mode.
+
+    python -m b311.tools.benchmark.eventdispatch games_mp.log --parser iourt42 --plugins 10
+"""
+
+__version__ = '1.0'
+
+import argparse
+import threading
+import time
+
+import b311.dispatcher
+import b311.plugin
+from b311.tools.benchmark import Timer
+from b311.tools.benchmark import createConsole
+from b311.tools.benchmark import getParserClass
+from b311.tools.benchmark import readLines
+from b311.tools.benchmark import report
+from b311.tools.benchmark import summarize
+
+
+class ReplayPlugin(b311.plugin.Plugin):
+    """
+    Plugin listening for every event and simulating some work on each one of them.
+    """
+    requiresConfigFile = False
+    workload = 0  # seconds spent handling each event
+    handled = 0
+
+    def onStartup(self):
+        for event_id in list(self.console.Events.events.values()):
+            self.registerEvent(event_id, self.onAnyEvent)
+
+    def onAnyEvent(self, event):
+        self.handled += 1
+        if self.workload:
+            end = time.perf_counter() + self.workload
+            while time.perf_counter() < end:
+                pass
+
+
+def replay(lines, parser_class, mode, num_plugins, workload, queuesize, lines_per_second):
+    """
+    Replay the given log lines using the given dispatch mode.
+    :return: A tuple (events handled, elapsed seconds, queue wait samples)
+    """
+    console = createConsole(parser_class, queuesize=queuesize)
+    console.eventDispatch = mode
+    if mode == 'parallel':
+        console._dispatcher = b311.dispatcher.EventDispatcher(console)
+    if lines_per_second:
+        console.delay2 = 1.0 / lines_per_second
+
+    plugins = []
+    for i in range(num_plugins):
+        plugin = ReplayPlugin(console)
+        plugin.workload = workload
+        plugin.onStartup()
+        plugins.append(plugin)
+
+    handler = threading.Thread(target=console.handleEvents, name='handleEvents')
+    handler.start()
+
+    with Timer() as timer:
+        for line in lines:
+            try:
+                console.parseLine(line)
+            except Exception as e:
+                console.error('could not parse line %r: %s', line, e)
+            if console.eventDispatch == 'default':
+                time.sleep(console.delay2)
+        console.queueEvent(console.getEvent('EVT_STOP'))
+        handler.join()
+
+    handled = plugins[0].handled if plugins else 0
+    return handled, timer.elapsed, list(console._eventsStats._queue_wait)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('logfile', help='recorded game log file to replay')
+    p.add_argument('--parser', default=None, help='parser to use to parse log lines (default to the base parser)')
+    p.add_argument('--mode', action='append', default=None, help='event dispatch mode to benchmark (repeatable)')
+    p.add_argument('--plugins', type=int, default=10, help='number of plugins listening for events')
+    p.add_argument('--workload', type=float, default=0.0, help='milliseconds spent by each plugin on each event')
+    p.add_argument('--queue-size', type=int, default=50, help='size of the event queue')
+    p.add_argument('--lines-per-second', type=float, default=50, help='lines_per_second setting for default mode')
+    p.add_argument('--limit', type=int, default=0, help='replay only the first N lines')
+    options = p.parse_args()
+
+    lines = readLines(options.logfile)
+    if options.limit:
+        lines = lines[:options.limit]
+
+    parser_class = getParserClass(options.parser)
+    counts = {}
+    for mode in options.mode or parser_class._eventDispatchModes:
+        handled, elapsed, waits = replay(lines, parser_class, mode, options.plugins, options.workload / 1000.0,
+                                         options.queue_size, options.lines_per_second)
+        counts[mode] = handled
+        wait = summarize(waits)
+        report('%s dispatch (%s)' % (mode, parser_class.__name__), [
+            ('log lines', len(lines)),
+            ('events handled', handled),
+            ('elapsed (s)', elapsed),
+            ('events/sec', handled / elapsed if elapsed else 0.0),
+            ('queue wait p50 (ms)', wait['p50']),
+            ('queue wait p95 (ms)', wait['p95']),
+            ('queue wait p99 (ms)', wait['p99']),
+            ('queue wait max (ms)', wait['max']),
+        ])
+
+    # events/sec can only be compared if every mode replayed the same event stream
+    assert len(set(counts.values())) == 1, 'dispatch modes handled different amounts of events: %s' % counts
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Measure Frostbite2 commands throughput against a local TCP stub server: commands sent one at a time,
+commands sent with many in flight over the same connection, and a full banlist retrieval done one page
+at a time and with many pages requested at once.
+
+    python -m b311.tools.benchmark.frostbite --latency 0.02 --commands 200 --bans 1000
+"""
+
+__version__ = '1.0'
+
+import argparse
+
+from b311.parsers.frostbite2.protocol import FrostbiteServer
+from b311.tools.benchmark import Timer
+from b311.tools.benchmark import createConsole
+from b311.tools.benchmark import getParserClass
+from b311.tools.benchmark import report
+from b311.tools.benchmark.stubs import FrostbiteStubServer
+
+
+def throughput(frostbite_server, size):
+    """
+    Send the same command the given amount of times: synchronously, with all the commands in flight at
+    once and through the batch helper.
+    :return: A list of (label, commands per second)
+    """
+    commands = [('admin.listPlayers', 'all')] * size
+
+    with Timer() as sync_timer:
+        for cmd in commands:
+            frostbite_server.command(*cmd)
+
+    with Timer() as async_timer:
+        futures = [frostbite_server.command_async(*cmd) for cmd in commands]
+        for future in futures:
+            future.result()
+
+    with Timer() as batch_timer:
+        frostbite_server.command_batch(commands)
+
+    return [
+        ('synchronous (cmd/s)', size / sync_timer.elapsed),
+        ('in flight (cmd/s)', size / async_timer.elapsed),
+        ('batch (cmd/s)', size / batch_timer.elapsed),
+    ]
+
+
+def banlist(parser_name, frostbite_server, pages_in_flight):
+    """
+    Retrieve the full banlist through the parser, one page at a time and then many pages at once.
+    :return: A list of (label, milliseconds)
+    """
+    parser_class = getParserClass(parser_name)
+    console = createConsole(parser_class, storage=False)
+    console.output = parser_class.OutputClass(console)
+    console.output.set_frostbite_server(frostbite_server)
+
+    rows = []
+    for in_flight in (1, pages_in_flight):
+        console._list_pages_in_flight = in_flight
+        with Timer() as timer:
+            bans = console.getFullBanList()
+        rows.append(('%s page(s) in flight: %s bans (ms)' % (in_flight, len(bans)), timer.elapsed * 1000))
+    return rows
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--parser', default='bf3', help='Frostbite2 parser used to retrieve the banlist')
+    p.add_argument('--latency', type=float, default=0.01, help='seconds the stub server waits before replying')
+    p.add_argument('--players', type=int, default=32, help='players listed by admin.listPlayers')
+    p.add_argument('--commands', type=int, default=100, help='commands sent for the throughput test')
+    p.add_argument('--bans', type=int, default=1000, help='bans listed by banList.list')
+    p.add_argument('--pages-in-flight', type=int, default=4, help='banlist pages requested at once')
+    options = p.parse_args()
+
+    server = FrostbiteStubServer(latency=options.latency, players=options.players, bans=options.bans)
+    server.start()
+    frostbite_server = None
+    try:
+        frostbite_server = FrostbiteServer(server.address[0], server.address[1], 'password')
+        frostbite_server.auth()
+        report('%s commands, %0.0f ms latency' % (options.commands, options.latency * 1000),
+               throughput(frostbite_server, options.commands))
+        report('%s banlist, %s bans' % (options.parser, options.bans),
+               banlist(options.parser, frostbite_server, options.pages_in_flight))
+    finally:
+        if frostbite_server:
+            frostbite_server.stop()
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Compare the Frostbite packet codec (b311.parsers.frostbite2.codec) with the string concatenation based codec it
+replaced: packet encoding, packet decoding and the decoding of a burst of packets received in small reads.
+
+    python -m b311.tools.benchmark.frostbitecodec --players 64 --packets 500
+"""
+
+__version__ = '1.0'
+
+import argparse
+import struct
+
+from b311.parsers.frostbite2.codec import DecodePacket
+from b311.parsers.frostbite2.codec import EncodePacket
+from b311.parsers.frostbite2.codec import PacketBuffer
+from b311.tools.benchmark import Timer
+from b311.tools.benchmark import report
+
+
+########################################################################################################################
+# PREVIOUS CODEC (reference implementation)
+########################################################################################################################
+
+def legacyEncodePacket(isFromServer, isResponse, sequence, words):
+    header = sequence & 0x3fffffff
+    if isFromServer:
+        header += 0x80000000
+    if isResponse:
+        header += 0x40000000
+    size = 0
+    encodedWords = b''
+    for word in words:
+        strWord = str(word).encode('utf-8')
+        encodedWords += struct.pack('<I', len(strWord))
+        encodedWords += strWord
+        encodedWords += b'\x00'
+        size += len(strWord) + 5
+    return struct.pack('<I', header) + struct.pack('<I', size + 12) + struct.pack('<I', len(words)) + encodedWords
+
+
+def legacyDecodePacket(data):
+    header = struct.unpack('<I', data[0:4])[0]
+    size = struct.unpack('<I', data[4:8])[0] - 12
+    data = data[12:]
+    words = []
+    offset = 0
+    while offset < size:
+        wordLen = struct.unpack('<I', data[offset:offset + 4])[0]
+        words.append(data[offset + 4:offset + 4 + wordLen].decode('utf-8', 'replace'))
+        offset += wordLen + 5
+    return [header & 0x80000000, header & 0x40000000, header & 0x3fffffff, words]
+
+
+def legacyReadPackets(chunks):
+    packets = []
+    buf = b''
+    for data in chunks:
+        buf += data
+        while len(buf) >= 8 and len(buf) >= struct.unpack('<I', buf[4:8])[0]:
+            size = struct.unpack('<I', buf[4:8])[0]
+            packet = buf[0:size]
+            buf = buf[size:len(buf)]
+            packets.append(legacyDecodePacket(packet))
+    return packets
+
+
+def readPackets(chunks):
+    packets = []
+    buf = PacketBuffer()
+    for data in chunks:
+        buf.feed(data)
+        packets.extend(buf.packets())
+    return packets
+
+
+########################################################################################################################
+# BENCHMARK
+########################################################################################################################
+
+def listPlayersWords(players):
+    """
+    Return the words of an admin.listPlayers reply.
+    """
+    words = ['OK', '9', 'name', 'guid', 'teamId', 'squadId', 'kills', 'deaths', 'score', 'rank', 'ping',
+             str(players)]
+    for cid in range(players):
+        words += ['Player%s' % cid, 'EA_%032X' % cid, str(cid % 2 + 1), '1', '10', '5', '1500', '42', '60']
+    return words
+
+
+def run(words, packets, read_size):
+    """
+    :return: A list of (label, legacy packets/s, new packets/s)
+    """
+    with Timer() as legacy_encode:
+        for i in range(packets):
+            legacyEncodePacket(False, True, i, words)
+    with Timer() as new_encode:
+        for i in range(packets):
+            EncodePacket(False, True, i, words)
+
+    data = EncodePacket(False, True, 1, words)
+    assert legacyDecodePacket(data) == DecodePacket(data)
+    with Timer() as legacy_decode:
+        for i in range(packets):
+            legacyDecodePacket(data)
+    with Timer() as new_decode:
+        for i in range(packets):
+            DecodePacket(data)
+
+    # the whole burst as it would come out of the socket, read_size bytes at a time
+    stream = b''.join(EncodePacket(True, False, i, words) for i in range(packets))
+    chunks = [stream[i:i + read_size] for i in range(0, len(stream), read_size)]
+    with Timer() as legacy_stream:
+        legacy_packets = legacyReadPackets(chunks)
+    with Timer() as new_stream:
+        new_packets = readPackets(chunks)
+    assert legacy_packets == new_packets
+
+    return [
+        ('encode (packets/s)', packets / legacy_encode.elapsed, packets / new_encode.elapsed),
+        ('decode (packets/s)', packets / legacy_decode.elapsed, packets / new_decode.elapsed),
+        ('burst read (packets/s)', packets / legacy_stream.elapsed, packets / new_stream.elapsed),
+    ]
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--players', type=int, default=64, help='players listed in the admin.listPlayers packets')
+    p.add_argument('--packets', type=int, default=500, help='packets encoded/decoded')
+    p.add_argument('--read-size', type=int, default=8192, help='bytes per socket read for the burst test')
+    options = p.parse_args()
+
+    words = listPlayersWords(options.players)
+    rows = []
+    for label, legacy, new in run(words, options.packets, options.read_size):
+        rows.append(('%s previous codec' % label, legacy))
+        rows.append(('%s new codec' % label, new))
+    report('admin.listPlayers with %s players, %s packets' % (options.players, options.packets), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Load a generated list of netblocks (IPv4 and IPv6 CIDRs, ranges and single addresses) in the netblocker plugin and
+check random ips against them, converting and comparing every block for every ip (the way the plugin did before
+merging the blocks into sorted ranges) and with the merged ranges, and report the amount of ips checked per second.
+
+    python -m b311.tools.benchmark.netblocker --blocks 100000 --ipv6 0.2 --lookups 20000
+"""
+
+__version__ = '1.0'
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+
+import b311.plugins.netblocker.netblock as netblock
+
+from b311.plugins.netblocker import NetblockerPlugin
+from b311.tools.benchmark import Timer
+from b311.tools.benchmark import createConsole
+from b311.tools.benchmark import report
+
+
+def randomIp(rnd):
+    return netblock.ipstr(rnd.getrandbits(32))
+
+
+def randomIp6(rnd):
+    # most of the IPv6 blocks and addresses in a few /16, as real allocations are
+    return netblock.ip6str(rnd.choice((0x2001, 0x2a00, 0x2600)) << 112 | rnd.getrandbits(112))
+
+
+def createBlocks(blocks, ipv6, rnd):
+    """
+    Generate netblocks: mostly CIDRs, some ranges and single addresses.
+    """
+    result = []
+    for _ in range(blocks):
+        kind = rnd.random()
+        if rnd.random() < ipv6:
+            ip, bits, tostr = netblock.strtoip6(randomIp6(rnd)), 128, netblock.ip6str
+            size = rnd.randint(32, 64)
+        else:
+            ip, bits, tostr = rnd.getrandbits(32), 32, netblock.ipstr
+            size = rnd.randint(16, 28)
+        if kind < 0.7:
+            low = netblock.cidrrange(ip, size, bits)[0]
+            result.append('%s/%s' % (tostr(low), size))
+        elif kind < 0.9:
+            result.append('%s-%s' % (tostr(ip), tostr(min(ip + rnd.randint(1, 4096), (1 << bits) - 1))))
+        else:
+            result.append(tostr(ip))
+    return result
+
+
+def checkOneByOne(blocks, ip):
+    """
+    Convert and compare every block (the way the netblocker plugin did before merging the blocks).
+    """
+    ipnum = netblock.convert(ip)[0]
+    ip6 = netblock.isip6(ip)
+    for block in blocks:
+        if netblock.isip6(block) != ip6:
+            continue
+        b = netblock.convert(block)
+        if b[0] <= ipnum <= b[1]:
+            return True
+    return False
+
+
+def run(blocks, ipv6, lookups, oldLookups, seed):
+    """
+    :return: A list of (label, value)
+    """
+    rnd = random.Random(seed)
+    console = createConsole(storage=False)
+    plugin = NetblockerPlugin(console)
+    generated = createBlocks(blocks, ipv6, rnd)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        # half of the blocks in the configuration file, half in a list file
+        path = os.path.join(tmpdir, 'netblocks.txt')
+        with open(path, 'w') as f:
+            f.write('# generated netblocks\n')
+            f.write('\n'.join(generated[blocks // 2:]))
+        plugin._blocks = generated[:blocks // 2]
+        plugin._files = [path]
+        with Timer() as build:
+            plugin.loadBlocks()
+    finally:
+        shutil.rmtree(tmpdir)
+
+    ips = [randomIp6(rnd) if rnd.random() < ipv6 else randomIp(rnd) for _ in range(lookups)]
+    with Timer() as lookup:
+        found = [plugin.isBlocked(x) for x in ips]
+    with Timer() as oneByOne:
+        expected = [checkOneByOne(generated, x) for x in ips[:oldLookups]]
+
+    return [
+        ('blocks', blocks),
+        ('merged ranges (IPv4 / IPv6)', '%s / %s' % (len(plugin._ipv4._l), len(plugin._ipv6._l))),
+        ('load and merge (ms)', build.elapsed * 1000),
+        ('one by one: ips per second', oldLookups / oneByOne.elapsed if oldLookups else 0),
+        ('merged ranges: ips per second', lookups / lookup.elapsed),
+        ('merged ranges: ips blocked', len([x for x in found if x])),
+        ('merged ranges: same results as one by one', found[:oldLookups] == expected),
+    ]
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--blocks', type=int, default=100000, help='netblocks to load')
+    p.add_argument('--ipv6', type=float, default=0.2, help='share of IPv6 blocks and ips')
+    p.add_argument('--lookups', type=int, default=20000, help='ips to check against the merged ranges')
+    p.add_argument('--old-lookups', type=int, default=20, help='ips to check against every block one by one')
+    p.add_argument('--seed', type=int, default=311, help='random seed of the generated blocks and ips')
+    options = p.parse_args()
+
+    report('%s netblocks (%d%% IPv6)' % (options.blocks, options.ipv6 * 100),
+           run(options.blocks, options.ipv6, options.lookups, options.old_lookups, options.seed))
+
+
+if __name__ == '__main__':
+    main()
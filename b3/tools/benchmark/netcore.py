@@ -0,0 +1,132 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Open many q3a RCON and Frostbite2 connections in the same process against local stub servers, and report the amount
+of threads they need (stub server threads excluded) and the commands per second they handle when every connection
+is used at once.
+
+    python -m b311.tools.benchmark.netcore --servers 20 --commands 20 --latency 0.01
+"""
+
+__version__ = '1.0'
+
+import argparse
+import os
+import threading
+
+from b311.parsers.frostbite2.protocol import FrostbiteServer
+from b311.tools.benchmark import Timer
+from b311.tools.benchmark import createConsole
+from b311.tools.benchmark import getParserClass
+from b311.tools.benchmark import report
+from b311.tools.benchmark.stubs import FrostbiteStubServer
+from b311.tools.benchmark.stubs import Q3aStubServer
+
+
+def countThreads():
+    """
+    Count the threads of the process, including the ones not started with the threading module.
+    """
+    try:
+        total = len(os.listdir('/proc/self/task'))
+    except OSError:
+        total = threading.active_count()
+    return total - len([x for x in threading.enumerate() if x.name == 'FrostbiteStubConnection'])
+
+
+def concurrently(connections, func, commands):
+    """
+    Call func the given amount of times with every connection, from one thread per connection.
+    :return: The amount of calls which raised an exception
+    """
+    failed = []
+
+    def work(connection):
+        for _ in range(commands):
+            try:
+                func(connection)
+            except Exception:
+                failed.append(connection)
+
+    workers = [threading.Thread(target=work, args=(x,)) for x in connections]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return len(failed)
+
+
+def run(servers, commands, latency):
+    """
+    :return: A list of (title, rows) tuples
+    """
+    q3a_server = Q3aStubServer(latency=latency)
+    frostbite_server = FrostbiteStubServer(latency=latency)
+    q3a_server.start()
+    frostbite_server.start()
+    rcons = []
+    frostbites = []
+    try:
+        parser_class = getParserClass('iourt42')
+        console = createConsole(parser_class, storage=False)
+        threads = countThreads()
+
+        rcons = [parser_class.OutputClass(console, q3a_server.address, 'password') for _ in range(servers)]
+        q3a_threads = countThreads() - threads
+        with Timer() as q3a_timer:
+            q3a_failed = concurrently(rcons, lambda x: x.write('sv_hostname'), commands)
+
+        frostbites = [FrostbiteServer(frostbite_server.address[0], frostbite_server.address[1], 'password')
+                      for _ in range(servers)]
+        frostbite_threads = countThreads() - threads - q3a_threads
+        with Timer() as frostbite_timer:
+            frostbite_failed = concurrently(frostbites, lambda x: x.command('serverInfo'), commands)
+
+        return [
+            ('%s q3a RCON connections' % servers, [
+                ('threads started', q3a_threads),
+                ('commands per second (all connections)', servers * commands / q3a_timer.elapsed),
+                ('commands failed', q3a_failed),
+            ]),
+            ('%s Frostbite2 connections' % servers, [
+                ('threads started', frostbite_threads),
+                ('commands per second (all connections)', servers * commands / frostbite_timer.elapsed),
+                ('commands failed', frostbite_failed),
+            ]),
+        ]
+    finally:
+        for connection in rcons + frostbites:
+            connection.stop()
+        q3a_server.stop()
+        frostbite_server.stop()
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--servers', type=int, default=20, help='connections opened for each protocol')
+    p.add_argument('--commands', type=int, default=20, help='commands sent over every connection')
+    p.add_argument('--latency', type=float, default=0.01, help='seconds the stub servers wait before replying')
+    options = p.parse_args()
+
+    for title, rows in run(options.servers, options.commands, options.latency):
+        report(title, rows)
+
+
+if __name__ == '__main__':
+    main()
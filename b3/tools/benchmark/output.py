@@ -0,0 +1,125 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Log messages from a few threads through the B3 logger, writing a rotating log file in the logging threads and in
+every asynchronous log mode, and report the amount of messages logged per second by the logging threads, the
+amount of messages written and the time spent skipping messages of a disabled level.
+
+    python -m b311.tools.benchmark.output --messages 50000 --threads 4 --logsize 1048576
+"""
+
+__version__ = '1.0'
+
+import argparse
+import logging
+import logging.handlers
+import os
+import shutil
+import tempfile
+import threading
+
+import b311.output
+
+from b311.output import AsyncHandler
+from b311.output import OutputHandler
+from b311.output import VERBOSE
+from b311.output import VERBOSE2
+from b311.tools.benchmark import Timer
+from b311.tools.benchmark import report
+
+
+def createLogger(name, path, logsize, logmode, logqueuesize):
+    """
+    Create a logger writing a rotating log file the way b311.output.getInstance() does.
+    """
+    logger = OutputHandler(name)
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=logsize, backupCount=5, encoding='UTF-8')
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)r', '%y%m%d %H:%M:%S'))
+    if logmode == 'default':
+        logger.addHandler(handler)
+    else:
+        logger.addHandler(AsyncHandler([handler], logqueuesize, drop=logmode == 'async_drop'))
+    logger.setLevel(VERBOSE)
+    return logger
+
+
+def countLines(path):
+    lines = 0
+    for name in os.listdir(os.path.dirname(path)):
+        if name.startswith(os.path.basename(path)):
+            with open(os.path.join(os.path.dirname(path), name), encoding='UTF-8') as f:
+                lines += sum(1 for _ in f)
+    return lines
+
+
+def run(messages, threads, logsize, logqueuesize):
+    """
+    :return: A list of (label, value)
+    """
+    rows = []
+    for logmode in b311.output.LOG_MODES:
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'b3.log')
+            logger = createLogger('benchmark.%s' % logmode, path, logsize, logmode, logqueuesize)
+
+            def work(n):
+                for i in range(messages // threads):
+                    logger.verbose('RCON sending (%s:%s) %r', '127.0.0.1', 27960, 'say thread %s message %s' % (n, i))
+
+            workers = [threading.Thread(target=work, args=(n,)) for n in range(threads)]
+            with Timer() as timer:
+                for worker in workers:
+                    worker.start()
+                for worker in workers:
+                    worker.join()
+            with Timer() as flush:
+                for handler in logger.handlers:
+                    handler.close()
+            logged = messages // threads * threads
+            rows.append(('%s: messages logged per second' % logmode, logged / timer.elapsed))
+            rows.append(('%s: time left writing after logging (ms)' % logmode, flush.elapsed * 1000))
+            # the async_drop mode adds a line telling how many messages were dropped
+            rows.append(('%s: lines written' % logmode, countLines(path)))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    logger = OutputHandler('benchmark.disabled')
+    logger.setLevel(VERBOSE)
+    with Timer() as timer:
+        for i in range(messages):
+            logger.verbose2('RCON: received %r', 'reply %s' % i)
+    rows.append(('disabled level: messages skipped per second', messages / timer.elapsed))
+    return rows
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--messages', type=int, default=50000, help='messages to log')
+    p.add_argument('--threads', type=int, default=4, help='threads logging messages')
+    p.add_argument('--logsize', type=int, default=1048576, help='size of the log file (in bytes)')
+    p.add_argument('--log-queue-size', type=int, default=10000, help='log messages waiting to be written at most')
+    options = p.parse_args()
+
+    report('%s messages logged from %s threads' % (options.messages, options.threads),
+           run(options.messages, options.threads, options.logsize, options.log_queue_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Replay recorded game logs through the tokenizer of q3a based parsers, trying every log line format in turn (the way
+the parsers did before dispatching the lines by action keyword) and with the action keyword index, then resolve the
+method handling every action, and report the amount of lines tokenized and dispatched per second, for every game.
+
+    python -m b311.tools.benchmark.q3alines iourt42:games_mp.log et:etconsole.log cod4:games_mp_cod4.log
+"""
+
+__version__ = '1.0'
+
+import argparse
+import re
+import string
+
+from b311.tools.benchmark import Timer
+from b311.tools.benchmark import createConsole
+from b311.tools.benchmark import getParserClass
+from b311.tools.benchmark import readLines
+from b311.tools.benchmark import report
+
+
+def matchOneByOne(console, line):
+    """
+    Try every log line format in turn (the way the q3a parsers did before using an action keyword index).
+    """
+    line = re.sub(console._lineClear, '', line, 1)
+    for f in console._lineFormats:
+        m = re.match(f, line)
+        if m:
+            return m
+    return None
+
+
+def getHandlerOneByOne(console, action):
+    """
+    Resolve the method handling an action (the way AbstractParser.parseLine() did before caching the handlers).
+    """
+    func = 'On%s' % string.capwords(action).replace(' ', '')
+    if hasattr(console, func):
+        return getattr(console, func)
+    return None
+
+
+def getAction(m):
+    try:
+        return m.group('action').lower()
+    except IndexError:
+        # formats without action group (i.e: damage lines of some games)
+        return 'damage'
+
+
+def run(parser, path):
+    """
+    :return: A list of (label, value)
+    """
+    console = createConsole(getParserClass(parser), storage=False)
+    lines = readLines(path)
+
+    with Timer() as oneByOne:
+        expected = [matchOneByOne(console, x) for x in lines]
+    with Timer() as indexed:
+        found = [console.matchLine(x)[0] for x in lines]
+
+    actions = [getAction(x) for x in found if x]
+    with Timer() as handlerOneByOne:
+        expectedHandlers = [getHandlerOneByOne(console, x) for x in actions]
+    with Timer() as handlerCached:
+        handlers = [console.getLineHandler(x) for x in actions]
+
+    return [
+        ('lines', len(lines)),
+        ('lines matched', len(actions)),
+        ('one by one: lines tokenized per second', len(lines) / oneByOne.elapsed),
+        ('keyword index: lines tokenized per second', len(lines) / indexed.elapsed),
+        ('keyword index: same formats and groups as one by one',
+         all((x and (x.re, x.groupdict())) == (y and (y.re, y.groupdict())) for x, y in zip(expected, found))),
+        ('capwords and hasattr: actions dispatched per second', len(actions) / handlerOneByOne.elapsed),
+        ('cached handlers: actions dispatched per second', len(actions) / handlerCached.elapsed),
+        ('cached handlers: same handlers', handlers == expectedHandlers),
+    ]
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('logs', nargs='+', metavar='PARSER:PATH', help='parser name and recorded game log file')
+    options = p.parse_args()
+
+    for log in options.logs:
+        parser, path = log.split(':', 1)
+        report('%s: %s' % (parser, path), run(parser, path))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Measure RCON round trip time of the q3a family parsers against a local UDP stub server, for every reply
+framing mode supported by b311.parsers.q3a.rcon.Rcon, then compare sending a burst of private messages (as
+done by sayDead) one at a time and through the asynchronous RCON pipeline.
+
+    python -m b311.tools.benchmark.q3arcon --latency 0.02 --iterations 20
+"""
+
+__version__ = '1.0'
+
+import argparse
+
+from b311.tools.benchmark import Timer
+from b311.tools.benchmark import createConsole
+from b311.tools.benchmark import loadParserClasses
+from b311.tools.benchmark import report
+from b311.tools.benchmark import summarize
+from b311.tools.benchmark.stubs import Q3aStubServer
+
+PARSERS = ['iourt41', 'iourt42', 'cod', 'cod2', 'cod4', 'cod5', 'cod6', 'cod7', 'cod8', 'et', 'etpro', 'smg',
+           'smg11', 'wop', 'wop15', 'oa081']
+
+COMMANDS = ['say "^7benchmark message"', 'status', 'sv_hostname', 'clientkick 99']
+
+
+def benchmark(parser_class, framing, server, commands, iterations):
+    """
+    Send every command the given amount of times and collect round trip times.
+    :return: A dict command -> list of milliseconds
+    """
+    console = createConsole(parser_class, storage=False)
+    rcon = parser_class.OutputClass(console, server.address, 'password')
+    rcon.reply_framing = framing
+    timings = dict((x, []) for x in commands)
+    for i in range(iterations):
+        for cmd in commands:
+            with Timer() as timer:
+                rcon.write(cmd)
+            timings[cmd].append(timer.elapsed * 1000)
+    rcon.stop()
+    return timings
+
+
+def burst(parser_class, server, size, rate_limit):
+    """
+    Send a burst of private messages followed by a status request, synchronously and then through the pipeline.
+    :return: A tuple (synchronous milliseconds, pipelined milliseconds)
+    """
+    console = createConsole(parser_class, storage=False)
+    rcon = parser_class.OutputClass(console, server.address, 'password')
+    rcon.rate_limit = rate_limit
+    commands = ['tell %s "^7burst message"' % cid for cid in range(size)]
+
+    with Timer() as sync_timer:
+        for cmd in commands:
+            rcon.write(cmd, maxRetries=1)
+        rcon.write('status')
+
+    with Timer() as async_timer:
+        futures = [rcon.writeAsync(cmd, maxRetries=1) for cmd in commands]
+        futures.append(rcon.writeAsync('status'))
+        for future in futures:
+            future.result()
+
+    rcon.stop()
+    return sync_timer.elapsed * 1000, async_timer.elapsed * 1000
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--parser', action='append', default=None, help='parser to benchmark (repeatable)')
+    p.add_argument('--latency', type=float, default=0.0, help='seconds the stub server waits before replying')
+    p.add_argument('--players', type=int, default=32, help='players listed in the status reply')
+    p.add_argument('--iterations', type=int, default=10, help='times every command is sent')
+    p.add_argument('--burst', type=int, default=20, help='private messages sent in a burst')
+    p.add_argument('--rate-limit', type=float, default=0, help='RCON commands per second (0 = unlimited)')
+    options = p.parse_args()
+
+    server = Q3aStubServer(latency=options.latency, players=options.players)
+    server.start()
+    try:
+        for name, parser_class in loadParserClasses(options.parser or PARSERS):
+            for framing in parser_class.OutputClass._replyFramingModes:
+                timings = benchmark(parser_class, framing, server, COMMANDS, options.iterations)
+                rows = []
+                for cmd in COMMANDS:
+                    stats = summarize(timings[cmd])
+                    rows.append(('%s p50/p95 (ms)' % cmd.split(' ', 1)[0],
+                                 '%0.1f / %0.1f' % (stats['p50'], stats['p95'])))
+                report('%s - %s framing' % (name, framing), rows)
+            sync_ms, async_ms = burst(parser_class, server, options.burst, options.rate_limit)
+            report('%s - burst of %s messages + status' % (name, options.burst), [
+                ('synchronous (ms)', sync_ms),
+                ('pipelined (ms)', async_ms),
+            ])
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
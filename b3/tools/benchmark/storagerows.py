@@ -0,0 +1,211 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Load clients, penalties, aliases, ip aliases and groups from result set rows, setting every column through the
+object properties (the way the storage did before using the row mappers) and with the row mappers, and report the
+amount of objects loaded per second, whether both give the same objects and the aliases created as a side effect
+of loading connected clients. The storage lookups used by the admin commands are then timed on an in-memory SQLite
+database.
+
+    python -m b311.tools.benchmark.storagerows --clients 2000 --rows 50000
+"""
+
+__version__ = '1.0'
+
+import argparse
+import random
+import time
+
+import b311.clients
+from b311.storage.mapper import aliasMapper
+from b311.storage.mapper import clientMapper
+from b311.storage.mapper import groupMapper
+from b311.storage.mapper import ipAliasMapper
+from b311.storage.mapper import penaltyMapper
+from b311.tools.benchmark import Timer
+from b311.tools.benchmark import createConsole
+from b311.tools.benchmark import report
+
+PENALTIES = ('Warning', 'TempBan', 'Kick', 'Ban', 'Notice')
+
+
+def seed(storage, clients, rnd):
+    """
+    Store clients, with a few aliases, ip aliases and penalties each.
+    """
+    now = int(time.time())
+    for n in range(clients):
+        cursor = storage.query("INSERT INTO clients (ip, connections, guid, pbid, name, auto_login, mask_level, "
+                               "group_bits, greeting, login, password, time_add, time_edit) "
+                               "VALUES (?, ?, ?, '', ?, 1, 0, ?, '', '', '', ?, ?)",
+                               ('10.%s.%s.%s' % (n // 65536, n // 256 % 256, n % 256), rnd.randint(1, 500),
+                                '%032X' % (n + 1), '^1Player^7%s' % n, rnd.choice((1, 2, 8)), now, now))
+        client_id = cursor.lastrowid
+        cursor.close()
+        for a in range(rnd.randint(1, 5)):
+            storage.query("INSERT INTO aliases (num_used, alias, client_id, time_add, time_edit) "
+                          "VALUES (?, ?, ?, ?, ?)", (rnd.randint(1, 20), 'Alias%s_%s' % (n, a), client_id, now,
+                                                     now)).close()
+            storage.query("INSERT INTO ipaliases (num_used, ip, client_id, time_add, time_edit) "
+                          "VALUES (?, ?, ?, ?, ?)", (rnd.randint(1, 20), '10.1.%s.%s' % (n % 256, a), client_id,
+                                                     now, now)).close()
+        for p in range(rnd.randint(0, 3)):
+            storage.query("INSERT INTO penalties (type, client_id, admin_id, duration, inactive, keyword, reason, "
+                          "data, time_add, time_edit, time_expire) VALUES (?, ?, 0, ?, 0, '', 'benchmark', '', ?, "
+                          "?, ?)", (rnd.choice(PENALTIES), client_id, rnd.randint(0, 600), now, now,
+                                    now + 3600)).close()
+
+
+def fetch(storage, table, limit):
+    """
+    :return: A (columns, list of row tuples) tuple
+    """
+    cursor = storage.query('SELECT * FROM %s LIMIT %s' % (table, limit))
+    columns = cursor.columns
+    return columns, [tuple(x) for x in cursor]
+
+
+def setattrLoad(storage, cls):
+    """
+    Return a function setting every column through the object properties (the way the storage did before using the
+    row mappers).
+    """
+    def load(columns, values, obj=None):
+        obj = obj if obj is not None else cls()
+        for k, v in zip(columns, values):
+            setattr(obj, storage.getVar(k), v)
+        return obj
+    return load
+
+
+def legacyPenalty(columns, values):
+    constructors = {'Warning': b311.clients.ClientWarning, 'TempBan': b311.clients.ClientTempBan,
+                    'Kick': b311.clients.ClientKick, 'Ban': b311.clients.ClientBan,
+                    'Notice': b311.clients.ClientNotice}
+    row = dict(zip(columns, values))
+    penalty = constructors.get(row['type'], b311.clients.Penalty)()
+    penalty.id = int(row['id'])
+    penalty.type = row['type']
+    penalty.keyword = row['keyword']
+    penalty.reason = row['reason']
+    penalty.data = row['data']
+    penalty.inactive = int(row['inactive'])
+    penalty.timeAdd = int(row['time_add'])
+    penalty.timeEdit = int(row['time_edit'])
+    penalty.timeExpire = int(row['time_expire'])
+    penalty.clientId = int(row['client_id'])
+    penalty.adminId = int(row['admin_id'])
+    penalty.duration = int(row['duration'])
+    return penalty
+
+
+def state(obj, columns, storage):
+    """
+    Return the values of the properties matching the given columns.
+    """
+    return tuple(getattr(obj, storage.getVar(x)) for x in columns) + (obj.__class__,)
+
+
+def run(clients, rows, seed_):
+    """
+    :return: A list of (title, rows) tuples
+    """
+    rnd = random.Random(seed_)
+    console = createConsole(queuesize=100000)
+    storage = console.storage
+    seed(storage, clients, rnd)
+
+    results = []
+    loaded = {}
+    for label, table, legacy, mapper in (
+        ('Client', 'clients', setattrLoad(storage, b311.clients.Client), clientMapper),
+        ('Penalty', 'penalties', legacyPenalty, penaltyMapper),
+        ('Alias', 'aliases', setattrLoad(storage, b311.clients.Alias), aliasMapper),
+        ('IpAlias', 'ipaliases', setattrLoad(storage, b311.clients.IpAlias), ipAliasMapper),
+        ('Group', 'groups', setattrLoad(storage, b311.clients.Group), groupMapper),
+    ):
+        columns, data = fetch(storage, table, rows)
+        sample = (data * (rows // max(len(data), 1) + 1))[:rows]
+        with Timer() as legacyTimer:
+            expected = [legacy(columns, x) for x in sample]
+        with Timer() as mapperTimer:
+            found = [mapper.create(columns, x) for x in sample]
+        loaded[table] = (columns, data)
+        results.append(('%s (%s rows)' % (label, len(sample)), [
+            ('properties: objects per second', len(sample) / legacyTimer.elapsed),
+            ('row mapper: objects per second', len(sample) / mapperTimer.elapsed),
+            ('row mapper: same objects', all(state(x, columns, storage) == state(y, columns, storage)
+                                             for x, y in zip(expected, found))),
+        ]))
+
+    # loading the storage data in connected clients (the authorization path)
+    columns, data = loaded['clients']
+    queued = [0]
+    queueClientAlias = storage.queueClientAlias
+
+    def countingQueueClientAlias(alias):
+        queued[0] += 1
+        return queueClientAlias(alias)
+
+    storage.queueClientAlias = countingQueueClientAlias
+    aliases = []
+    legacy = setattrLoad(storage, b311.clients.Client)
+    for load in (lambda c, x: legacy(columns, x, c), lambda c, x: clientMapper.load(c, columns, x)):
+        queued[0] = 0
+        for n, values in enumerate(data[:200]):
+            load(b311.clients.Client(console=console, cid=str(n), name='Connected%s' % n), values)
+        aliases.append(queued[0])
+    del storage.queueClientAlias
+
+    lookups = []
+    names = [x[columns.index('name')][2:8] for x in data]
+    ids = [x[columns.index('id')] for x in data]
+    for label, lookup in (
+        ('getClientsMatching (!find)', lambda n: storage.getClientsMatching({'name': names[n % len(names)]})),
+        ('getClientAliases (!aliases)', lambda n: storage.getClientAliases(b311.clients.Client(id=ids[n % len(ids)]))),
+        ('getClientPenalties', lambda n: storage.getClientPenalties(b311.clients.Client(id=ids[n % len(ids)]),
+                                                                    type=PENALTIES)),
+    ):
+        with Timer() as timer:
+            for n in range(1000):
+                lookup(n)
+        lookups.append(('%s: lookups per second' % label, 1000 / timer.elapsed))
+
+    results.append(('connected clients loaded from the storage (200)', [
+        ('properties: aliases queued', aliases[0]),
+        ('row mapper: aliases queued', aliases[1]),
+    ]))
+    results.append(('storage lookups (%s clients)' % clients, lookups))
+    storage.shutdown()
+    return results
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--clients', type=int, default=2000, help='clients stored in the database')
+    p.add_argument('--rows', type=int, default=50000, help='rows to load for each kind of object')
+    p.add_argument('--seed', type=int, default=311, help='random seed of the generated data')
+    options = p.parse_args()
+
+    for title, rows in run(options.clients, options.rows, options.seed):
+        report(title, rows)
+
+
+if __name__ == '__main__':
+    main()
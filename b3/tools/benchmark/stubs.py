@@ -0,0 +1,275 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Local game server stubs answering RCON commands, to be used by benchmarks.
+"""
+
+__version__ = '1.2'
+
+import re
+import socket
+import threading
+import time
+
+from b311.parsers.frostbite2.protocol import EncodePacket
+from b311.parsers.frostbite2.protocol import PacketBuffer
+from b311.parsers.frostbite2.protocol import generatePasswordHash
+
+
+class Q3aStubServer(threading.Thread):
+    """
+    UDP server answering q3a style RCON commands the way ioquake3 does: the output of a command is buffered
+    and flushed in datagrams of at most 1008 bytes, all of them sent within the same server frame.
+    Call of Duty: Black Ops framing (\\x00 prefixed commands, \\x01print replies) is supported too.
+    """
+    chunk_size = 1008
+    header = b'\xff\xff\xff\xff'
+
+    _reRcon = re.compile(br'^rcon\s+(?:"(?P<qpass>[^"]*)"|(?P<pass>\S+))\s+(?P<cmd>.*)$', re.DOTALL)
+    _reCod7 = re.compile(br'^\x00(?P<pass>\S+)\s+(?P<cmd>[^\x00]*)\x00?$', re.DOTALL)
+
+    def __init__(self, password='password', host='127.0.0.1', port=0, latency=0.0, players=32):
+        """
+        Object constructor.
+        :param password: The RCON password the stub accepts
+        :param host: The address to bind to
+        :param port: The port to bind to (0 to pick a free one)
+        :param latency: Seconds to wait before replying to a command (simulates network round trip time)
+        :param players: The amount of players listed in the status reply
+        """
+        threading.Thread.__init__(self, name='Q3aStubServer')
+        self.daemon = True
+        self.password = password.encode('latin-1')
+        self.latency = latency
+        self.players = players
+        self.received = []  # (timestamp, command) of every valid command received
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.socket.settimeout(0.2)
+        self.address = self.socket.getsockname()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        """
+        Stop the stub server.
+        """
+        self._stop_event.set()
+        self.join(2)
+        self.socket.close()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                data, addr = self.socket.recvfrom(65535)
+            except socket.timeout:
+                continue
+            except socket.error:
+                break
+            if not data.startswith(self.header):
+                continue
+            self.handle(data[len(self.header):], addr)
+
+    def handle(self, data, addr):
+        """
+        Handle a single datagram (without the 0xff header).
+        """
+        reply_header = self.header + b'print\n'
+        match = self._reRcon.match(data.rstrip(b'\n'))
+        if not match:
+            match = self._reCod7.match(data)
+            reply_header = self.header + b'\x01print\n'
+        if not match:
+            self.reply(addr, reply_header, self.query(data.strip()))
+            return
+
+        password = match.group('qpass') if 'qpass' in match.groupdict() and match.group('qpass') else \
+            match.group('pass')
+        if password != self.password:
+            self.reply(addr, reply_header, b'Bad rconpassword.\n')
+            return
+
+        cmd = match.group('cmd').strip()
+        self.received.append((time.time(), cmd))
+        self.reply(addr, reply_header, self.command(cmd))
+
+    def query(self, data):
+        """
+        Answer connectionless queries (getstatus, getinfo).
+        """
+        if data == b'getinfo':
+            return b'\\hostname\\stub\\mapname\\ut4_turnpike\\clients\\%d\\sv_maxclients\\32\n' % self.players
+        return b'\\sv_hostname\\stub\\mapname\\ut4_turnpike\n'
+
+    def command(self, cmd):
+        """
+        Return the console output of a command.
+        """
+        name = cmd.split(b' ', 1)[0].lower()
+        if name == b'status':
+            lines = [b'map: ut4_turnpike',
+                     b'num score ping name            lastmsg address               qport rate',
+                     b'--- ----- ---- --------------- ------- --------------------- ----- -----']
+            for cid in range(self.players):
+                lines.append(b'%3d %5d %4d Player%-9d %7d 10.0.%d.%d:27960 %5d 25000' % (
+                    cid, cid * 3, 50 + cid, cid, 0, cid // 250, cid % 250, 1000 + cid))
+            return b'\n'.join(lines) + b'\n\n'
+        if name in (b'say', b'bigtext'):
+            return b'broadcast: print "%s\\n"\n' % cmd[len(name):].strip()
+        return b''
+
+    def reply(self, addr, header, output):
+        """
+        Send the output of a command, split in as many datagrams as needed.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        chunks = [output[i:i + self.chunk_size] for i in range(0, len(output), self.chunk_size)] or [b'']
+        for chunk in chunks:
+            try:
+                self.socket.sendto(header + chunk, addr)
+            except socket.error:
+                pass
+
+
+class FrostbiteStubServer(threading.Thread):
+    """
+    TCP server answering Frostbite2 commands. Every connection gets its own reader thread and every
+    reply is sent after the configured latency without blocking the following commands, so commands
+    sent back to back are answered back to back, like a remote game server would.
+    """
+
+    def __init__(self, password='password', host='127.0.0.1', port=0, latency=0.0, players=32, bans=0, maps=20):
+        """
+        Object constructor.
+        :param password: The RCON password the stub accepts
+        :param host: The address to bind to
+        :param port: The port to bind to (0 to pick a free one)
+        :param latency: Seconds to wait before replying to a command (simulates network round trip time)
+        :param players: The amount of players listed by admin.listPlayers
+        :param bans: The amount of bans listed by banList.list
+        :param maps: The amount of maps listed by mapList.list
+        """
+        threading.Thread.__init__(self, name='FrostbiteStubServer')
+        self.daemon = True
+        self.password = password
+        self.latency = latency
+        self.players = players
+        self.bans = bans
+        self.maps = maps
+        self.salt = b'0123456789abcdef'
+        self.received = []  # (timestamp, words) of every command received
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        self.socket.listen(5)
+        self.socket.settimeout(0.2)
+        self.address = self.socket.getsockname()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        """
+        Stop the stub server.
+        """
+        self._stop_event.set()
+        self.join(2)
+        self.socket.close()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                conn, addr = self.socket.accept()
+            except socket.timeout:
+                continue
+            except socket.error:
+                break
+            worker = threading.Thread(target=self.serve, args=(conn,), name='FrostbiteStubConnection')
+            worker.daemon = True
+            worker.start()
+
+    def serve(self, conn):
+        """
+        Read the packets sent over a connection and reply to them.
+        """
+        send_lock = threading.Lock()
+        buf = PacketBuffer()
+        conn.settimeout(0.2)
+        # replies sent back to back must not wait for the ACK of the previous one
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        while not self._stop_event.is_set():
+            try:
+                if not buf.recv_into(conn):
+                    break
+            except socket.timeout:
+                continue
+            except socket.error:
+                break
+            for is_from_server, is_response, sequence, words in buf.packets():
+                if not is_response:
+                    self.received.append((time.time(), words))
+                    self.reply(conn, send_lock, sequence, self.command(words))
+        conn.close()
+
+    def command(self, words):
+        """
+        Return the reply words of a command.
+        """
+        name = words[0]
+        if name == 'login.hashed':
+            if len(words) == 1:
+                return ['OK', self.salt.hex().upper()]
+            if words[1] == generatePasswordHash(self.salt, self.password).hex().upper():
+                return ['OK']
+            return ['InvalidPasswordHash']
+        if name == 'admin.listPlayers':
+            reply = ['OK', '5', 'name', 'guid', 'teamId', 'squadId', 'kills', str(self.players)]
+            for cid in range(self.players):
+                reply += ['Player%s' % cid, 'EA_%032X' % cid, str(cid % 2 + 1), '0', str(cid)]
+            return reply
+        if name == 'banList.list':
+            offset = int(words[1]) if len(words) > 1 else 0
+            reply = ['OK']
+            for i in range(offset, min(offset + 100, self.bans)):
+                reply += ['guid', 'EA_%032X' % i, 'perm', '0', '0', 'banned by stub']
+            return reply
+        if name == 'mapList.list':
+            offset = int(words[1]) if len(words) > 1 else 0
+            indices = range(offset, min(offset + 100, self.maps))
+            reply = ['OK', str(len(indices)), '3']
+            for i in indices:
+                reply += ['MP_%03d' % i, 'ConquestLarge0', '2']
+            return reply
+        return ['OK']
+
+    def reply(self, conn, send_lock, sequence, words):
+        """
+        Send the reply to a command once the latency has elapsed.
+        """
+        def send():
+            with send_lock:
+                try:
+                    conn.sendall(EncodePacket(False, True, sequence, words))
+                except socket.error:
+                    pass
+
+        if self.latency:
+            timer = threading.Timer(self.latency, send)
+            timer.daemon = True
+            timer.start()
+        else:
+            send()
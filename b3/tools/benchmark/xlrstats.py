@@ -0,0 +1,169 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Replay the same random sequence of damages and kills through the XLRstats plugin, with every statistics change
+written at once and with the statistics kept in memory and written in batches, and report the amount of kills
+handled per second. A latency can be added to every query to simulate a database server on the network.
+
+    python -m b311.tools.benchmark.xlrstats --players 32 --kills 5000 --flush-every 500 --latency 0.001
+"""
+
+__version__ = '1.0'
+
+import argparse
+import os
+import random
+import time
+
+import b311.plugins.xlrstats
+from b311.plugins.xlrstats import ActionStats
+from b311.plugins.xlrstats import Bodyparts
+from b311.plugins.xlrstats import MapStats
+from b311.plugins.xlrstats import Opponents
+from b311.plugins.xlrstats import PlayerActions
+from b311.plugins.xlrstats import PlayerBody
+from b311.plugins.xlrstats import PlayerMaps
+from b311.plugins.xlrstats import PlayerStats
+from b311.plugins.xlrstats import StatsAccumulator
+from b311.plugins.xlrstats import WeaponStats
+from b311.plugins.xlrstats import WeaponUsage
+from b311.plugins.xlrstats import XlrstatsPlugin
+from b311.tools.benchmark import NullConfig
+from b311.tools.benchmark import Timer
+from b311.tools.benchmark import createConsole
+from b311.tools.benchmark import report
+from b311.tools.benchmark.clientauth import countQueries
+
+WEAPONS = ('UT_MOD_LR300', 'UT_MOD_AK103', 'UT_MOD_G36', 'UT_MOD_SPAS', 'UT_MOD_DEAGLE', 'UT_MOD_HK69')
+HITLOCS = ('HEAD', 'HELMET', 'TORSO', 'VEST', 'LEFT_ARM', 'RIGHT_ARM', 'GROIN', 'LEGS')
+
+
+class FrozenClock(object):
+    """
+    Stand-in for the time module of the plugin: assists are given for damage done in the last seconds, so the clock
+    is frozen for the stored statistics not to depend on the replay speed.
+    """
+
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+def createTables(plugin):
+    """
+    Create the XLRstats tables from the SQL scripts of the plugin source tree: the plugin looks for them under the
+    package name.
+    """
+    storage = plugin.console.storage
+    sqlpath = os.path.join(os.path.dirname(b311.plugins.xlrstats.__file__), 'sql', storage.protocol)
+    current = storage.getTables()
+    for name in dir(plugin):
+        if name.endswith('_table') and getattr(plugin, name) not in current:
+            with open(os.path.join(sqlpath, name[:-len('_table')] + '.sql'), 'r') as sqlfile:
+                storage.query(storage.getQueriesFromFile(sqlfile)[0] % getattr(plugin, name))
+
+
+def createPlugin(console, accumulate):
+    """
+    Create a XLRstats plugin ready to handle kills, without going through the whole plugin startup.
+    :param accumulate: Whether to keep the statistics in memory
+    """
+    plugin = XlrstatsPlugin(console, None)
+    plugin.config = NullConfig()
+    plugin.query = console.storage.query
+    createTables(plugin)
+    for cls, table in ((PlayerStats, plugin.playerstats_table), (WeaponStats, plugin.weaponstats_table),
+                       (WeaponUsage, plugin.weaponusage_table), (Bodyparts, plugin.bodyparts_table),
+                       (PlayerBody, plugin.playerbody_table), (Opponents, plugin.opponents_table),
+                       (MapStats, plugin.mapstats_table), (PlayerMaps, plugin.playermaps_table),
+                       (ActionStats, plugin.actionstats_table), (PlayerActions, plugin.playeractions_table)):
+        cls._table = table
+    if accumulate:
+        plugin._stats = StatsAccumulator(plugin)
+    plugin._xlrstats_active = True
+    return plugin
+
+
+def run(players, kills, assists, flushEvery, latency, accumulate, seed):
+    """
+    :return: A list of (label, value)
+    """
+    console = createConsole(queuesize=players * 2)
+    console.game.mapName = 'ut4_turnpike'
+    plugin = createPlugin(console, accumulate)
+    clients = [console.clients.newClient(str(cid), auth=False, id=cid + 1, guid='%032X' % (cid + 1),
+                                         name='Player%s' % cid, team=cid % 2 + 2) for cid in range(players)]
+    counter = countQueries(console.storage, latency)
+
+    rnd = random.Random(seed)
+    flushTime = 0.0
+    b311.plugins.xlrstats.time = FrozenClock(time.time())
+    try:
+        with Timer() as timer:
+            for n in range(1, kills + 1):
+                client, target = rnd.sample(clients, 2)
+                data = (100, rnd.choice(WEAPONS), rnd.choice(HITLOCS), 'MOD_%s' % n)
+                if rnd.random() < assists:
+                    plugin.damage(rnd.choice([x for x in clients if x is not target]), target, data)
+                plugin.kill(client, target, data)
+                if accumulate and n % flushEvery == 0:
+                    with Timer() as flush:
+                        plugin.flushStats()
+                    flushTime += flush.elapsed
+            with Timer() as flush:
+                plugin.flushStats()
+            flushTime += flush.elapsed
+    finally:
+        b311.plugins.xlrstats.time = time
+
+    cursor = console.storage.query('SELECT SUM(kills) AS kills, SUM(deaths) AS deaths, SUM(skill) AS skill '
+                                   'FROM %s' % plugin.playerstats_table)
+    totals = cursor.getRow()
+    cursor.close()
+    console.storage.shutdown()
+    return [
+        ('kills per second', kills / timer.elapsed),
+        ('queries per kill', float(counter[0]) / kills),
+        ('time spent flushing (ms)', flushTime * 1000),
+        ('stored kills / deaths', '%s / %s' % (totals['kills'], totals['deaths'])),
+        ('stored skill sum', '%0.3f' % totals['skill']),
+    ]
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--players', type=int, default=32, help='players on the server')
+    p.add_argument('--kills', type=int, default=5000, help='kills to replay')
+    p.add_argument('--assists', type=float, default=0.3, help='share of the kills preceded by damage of a third player')
+    p.add_argument('--flush-every', type=int, default=500, help='kills between two flushes of the statistics')
+    p.add_argument('--latency', type=float, default=0.0, help='seconds added to every query')
+    p.add_argument('--seed', type=int, default=311, help='random seed of the replayed sequence')
+    options = p.parse_args()
+
+    for label, accumulate in (('written at once', False), ('kept in memory', True)):
+        report('%s: %s kills between %s players, %0.1f ms per query' % (label, options.kills, options.players,
+                                                                         options.latency * 1000),
+               run(options.players, options.kills, options.assists, max(1, options.flush_every), options.latency,
+                   accumulate, options.seed))
+
+
+if __name__ == '__main__':
+    main()